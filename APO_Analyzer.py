@@ -8,6 +8,10 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+from utils.diag_log import get_logger
+
+log = get_logger("apo")
+
 
 
 @dataclass
@@ -335,9 +339,9 @@ class ApoRemnantAnalyzer:
                     site_name,
                 )
             )
+        # รายละเอียด APOPLUS ที่ค้างต่อ site → log ระดับ DEBUG (ข้ามทั้งก้อนถ้าไม่ได้เปิด)
         for wip, (site_name, _ws, _ap, _red_w, red_a), has_mismatch, _sort_name in self.rendered:
-            if has_mismatch and red_a:
-                print(f"\nSite: {site_name} ({wip})")
+            if has_mismatch and red_a and log.enabled():
 
                 # เก็บกลุ่มเส้นทางใน dict: { (src_label, dst_label): [lines] }
                 grouped_lines = {}
@@ -364,15 +368,15 @@ class ApoRemnantAnalyzer:
                         (no, src_hex, dst_hex, traffic, connno, connattr, conntype, state)
                     )
 
-                # ---- พิมพ์แบบกลุ่มต่อกลุ่ม ----
-                for i, ((src_label, dst_label), lines) in enumerate(grouped_lines.items(), start=1):
-                    print(f"   {src_label} → {dst_label}")
-                    print("    [APOPLUS]No    SourceNodeID      DestNodeID      TrafficID          ConnNo        ConnAttr       ConnType                     State")
-                    for no, src_hex, dst_hex, traffic, connno, connattr, conntype, state in lines:
-                        print(f"    [APOPLUS]{no:<4}   {src_hex:<16} {dst_hex:<16} {traffic:<16} {connno:<14} {connattr:<14} {conntype:<14} {state}")
-
-                    # ✅ เว้นบรรทัดหลังแต่ละกลุ่มเพื่อแยกตาราง
-                    print()
+                # ---- หนึ่ง record ต่อกลุ่มเส้นทาง ----
+                for (src_label, dst_label), lines in grouped_lines.items():
+                    log.debug(
+                        "apoplus_remnant", site=site_name, wip=wip, src=src_label, dst=dst_label,
+                        conns="; ".join(
+                            f"No={no} traffic={traffic} conn={connno} attr={connattr} type={conntype} state={state}"
+                            for no, _src, _dst, traffic, connno, connattr, conntype, state in lines
+                        ),
+                    )
 
         return self.rendered
 
@@ -503,12 +507,15 @@ def apo_kpi(rendered: list[tuple], apo_links: dict = None):
 
     # ---------- Donut Chart ----------
     df_summary = pd.DataFrame({
-        "Status": (["No APO Remnant"] * noapo_sites) + (["APO Remnant"] * apo_sites)
+        "Status": ["No APO Remnant", "APO Remnant"],
+        "Count": [noapo_sites, apo_sites],
     })
+    df_summary = df_summary[df_summary["Count"] > 0]   # สถานะที่ไม่มีเลย → ไม่มี slice (เหมือนเดิม)
 
     fig = px.pie(
         df_summary,
         names="Status",
+        values="Count",
         hole=0.5,
         color="Status",
         color_discrete_map={
@@ -1,8 +1,13 @@
 # cpu_analyzer.py
+import numpy as np
 import pandas as pd
 import streamlit as st
 from utils.filters import cascading_filter
-from pandas.io.formats.style import Styler
+from utils.schema import apply_schema
+from utils.chart_data import MAX_BARS, top_k
+from utils import lazy
+from utils.paged_table import paged_table
+from utils.styling import BLUE_CELL, GRAY_ROW, RED_CELL, MaskLayer, TableStyle, numeric, out_of_range, startswith
 import altair as alt
 
 
@@ -35,15 +40,10 @@ class CPU_Analyzer:
         self.df_abnormal_by_type = {}       # abnormal แยกตาม BoardType (SNP(E), NCPM, NCPQ)
 
     # ---------- Utilities ----------
-    @staticmethod
-    def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-        df.columns = (
-            df.columns.astype(str)
-            .str.strip()
-            .str.replace(r"\s+", " ", regex=True)
-            .str.replace("\u00a0", " ")
-        )
-        return df
+    def _apply_schema(self) -> None:
+        """normalize + cast (ข้อมูลจาก ingest ผ่าน schema มาแล้ว → ไม่ทำซ้ำ) / ref: threshold เป็น float64"""
+        self.df_cpu = apply_schema("cpu", self.df_cpu)
+        self.df_ref = apply_schema("cpu_ref", self.df_ref)
 
     def _check_required(self) -> None:
         required_cols = {self.COL_ME, self.COL_MOBJ, self.COL_VAL}
@@ -79,21 +79,12 @@ class CPU_Analyzer:
         )
         return df_merged
 
-    @staticmethod
-    def _row_has_issue(r, col_val, col_min, col_max) -> bool:
-        v  = r.get(col_val)
-        lo = r.get(col_min)
-        hi = r.get(col_max)
-        try:
-            return (pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi))
-        except:
-            return False
-
-    def _style_dataframe(self, df_view: pd.DataFrame) -> Styler:
-        for c in [self.COL_VAL, self.COL_MAX, self.COL_MIN]:
-            if c in df_view.columns:
-                df_view[c] = pd.to_numeric(df_view[c], errors="coerce")
+    def _issue_mask(self, df: pd.DataFrame):
+        """ค่า CPU อยู่นอก [Minimum, Maximum threshold] (ทั้งตารางในครั้งเดียว)"""
+        return out_of_range(numeric(df, self.COL_VAL), numeric(df, self.COL_MIN), numeric(df, self.COL_MAX))
 
+    def _table_style(self, df_view: pd.DataFrame) -> TableStyle:
+        """แปลง df_view เป็นเปอร์เซ็นต์ (in place) แล้วคืนไฮไลต์ + format ของทั้งตาราง"""
         # 🔹 ตรวจว่าเป็น ratio (0–1) หรือ % อยู่แล้ว
         max_val = df_view[self.COL_VAL].max()
         if pd.notna(max_val) and max_val <= 1:
@@ -103,49 +94,25 @@ class CPU_Analyzer:
         if "Minimum threshold" in df_view.columns and df_view[self.COL_MIN].max() <= 1:
             df_view[self.COL_MIN] = df_view[self.COL_MIN] * 100
 
-        def gray_row(r):
-            return [
-                'background-color:#e6e6e6;color:black'
-                if self._row_has_issue(r, self.COL_VAL, self.COL_MIN, self.COL_MAX) else ''
-                for _ in r
-            ]
-
-        def red_value(_):
-            return [
-                'background-color:#ff4d4d;color:white'
-                if (pd.notna(v) and pd.notna(hi) and pd.notna(lo) and (v > hi or v < lo))
-                else ''
-                for v, hi, lo in zip(
-                    df_view.get(self.COL_VAL, pd.Series(index=df_view.index)),
-                    df_view.get(self.COL_MAX, pd.Series(index=df_view.index)),
-                    df_view.get(self.COL_MIN, pd.Series(index=df_view.index)),
-                )
-            ]
-
-        def blue_route(_):
-            return [
-                'background-color:lightblue;color:black' if str(x).startswith("Preset") else ''
-                for x in df_view["Route"]
-            ] if "Route" in df_view.columns else []
-
-        styled = (
-            df_view.style
-            .apply(gray_row, axis=1)
-            .apply(red_value, subset=[self.COL_VAL] if self.COL_VAL in df_view.columns else [])
-            .apply(blue_route, subset=["Route"] if "Route" in df_view.columns else [])
-            .format({
+        # เทาทั้งแถว / แดงค่าที่ผิด / ฟ้า Route ที่เป็น Preset — mask ทั้งตารางครั้งเดียว
+        issue = self._issue_mask(df_view)
+        return TableStyle(
+            [
+                MaskLayer(GRAY_ROW, issue),
+                MaskLayer(RED_CELL, issue, [self.COL_VAL]),
+                MaskLayer(BLUE_CELL, startswith(df_view, "Route", "Preset"), ["Route"]),
+            ],
+            {
                 self.COL_VAL: "{:.2f}%",
                 self.COL_MAX: "{:.2f}%",
                 self.COL_MIN: "{:.2f}%",
-            })
+            },
         )
-        return styled
 
     # ---------- MAIN ----------
     def process(self) -> pd.DataFrame:
-        # 1) Normalize
-        self.df_cpu = self._normalize_columns(self.df_cpu)
-        self.df_ref = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) Check
         self._check_required()
@@ -175,9 +142,9 @@ class CPU_Analyzer:
         st.caption(f"CPU (showing {len(df_filtered)}/{len(df_result)} rows)")
 
         # 6) Overall status + abnormal เก็บเหมือน FAN
-        val = pd.to_numeric(df_result[self.COL_VAL], errors="coerce")
-        hi  = pd.to_numeric(df_result[self.COL_MAX], errors="coerce")
-        lo  = pd.to_numeric(df_result[self.COL_MIN], errors="coerce")
+        val = df_result[self.COL_VAL]
+        hi  = df_result[self.COL_MAX]
+        lo  = df_result[self.COL_MIN]
         ab_mask_all = (val > hi) | (val < lo)
 
         st.session_state["cpu_abn_count"] = int(ab_mask_all.fillna(False).sum())
@@ -187,15 +154,13 @@ class CPU_Analyzer:
         self.df_abnormal = df_result.loc[ab_mask_all].copy()
 
         # 7) Styled main table
-        styled = self._style_dataframe(df_filtered.copy())
+        df_view = df_filtered.copy()
+        table_style = self._table_style(df_view)
         st.markdown("### CPU Performance")
-        st.write(styled)
+        paged_table(df_view, key=f"{self.ns}_main", style=table_style)
 
         # 8) Summary banner
-        failed_rows = df_filtered.apply(
-            lambda r: self._row_has_issue(r, self.COL_VAL, self.COL_MIN, self.COL_MAX),
-            axis=1
-        )
+        failed_rows = self._issue_mask(df_filtered)
         st.markdown(
             "<div style='text-align:center; font-size:32px; font-weight:bold; color:{};'>CPU Performance {}</div>".format(
                 "red" if failed_rows.any() else "green",
@@ -216,14 +181,14 @@ class CPU_Analyzer:
 
         # 11) CPU% (คูณ 100 เพราะไฟล์ต้นทางเป็น ratio)
         for df_sub in [df_snp, df_ncpm, df_ncpq]:
-            df_sub["CPU%"] = pd.to_numeric(df_sub[self.COL_VAL], errors="coerce") * 100
+            df_sub["CPU%"] = df_sub[self.COL_VAL] * 100
 
         # ✅ เก็บ abnormal แยกตาม type
         self.df_abnormal_by_type = {}
         for btype, df_sub in {"SNP(E)": df_snp, "NCPM": df_ncpm, "NCPQ": df_ncpq}.items():
-            v  = pd.to_numeric(df_sub[self.COL_VAL], errors="coerce")
-            hi = pd.to_numeric(df_sub[self.COL_MAX], errors="coerce")
-            lo = pd.to_numeric(df_sub[self.COL_MIN], errors="coerce")
+            v  = df_sub[self.COL_VAL]
+            hi = df_sub[self.COL_MAX]
+            lo = df_sub[self.COL_MIN]
             ab_mask = (v > hi) | (v < lo)
             if ab_mask.any():
                 self.df_abnormal_by_type[btype] = df_sub.loc[ab_mask].copy()
@@ -234,9 +199,9 @@ class CPU_Analyzer:
 
         # ---------- Helpers ----------
         def plot_chart(df_sub: pd.DataFrame, title: str, height: int):
-            # ✅ เรียงจากมากไปน้อย
-            df_sub = df_sub.sort_values(by="CPU%", ascending=False).copy()
-            df_sub["Status"] = df_sub["CPU%"].apply(lambda x: "Overload" if x > 90 else "Normal")
+            # ✅ เรียงจากมากไปน้อย — เกิน MAX_BARS แท่ง → รวมที่เหลือเป็นแท่ง Others (บอร์ด Overload แยกแท่งเสมอ)
+            df_sub = top_k(df_sub[["Site-Obj", "CPU%"]], "CPU%", "Site-Obj", keep=df_sub["CPU%"] > 90)
+            df_sub["Status"] = np.where(df_sub["CPU%"] > 90, "Overload", "Normal")
 
             # ✅ กำหนด order ของ Y-axis ตาม DataFrame ที่เรียงแล้ว
             y_order = df_sub["Site-Obj"].tolist()
@@ -263,9 +228,9 @@ class CPU_Analyzer:
 
         def show_abnormal(df_sub: pd.DataFrame, title: str):
             st.markdown(f"#### {title} – Abnormal Rows")
-            v  = pd.to_numeric(df_sub[self.COL_VAL], errors="coerce") * 100
-            hi = pd.to_numeric(df_sub[self.COL_MAX], errors="coerce") * 100
-            lo = pd.to_numeric(df_sub[self.COL_MIN], errors="coerce") * 100
+            v  = df_sub[self.COL_VAL] * 100
+            hi = df_sub[self.COL_MAX] * 100
+            lo = df_sub[self.COL_MIN] * 100
             ab_mask = (v > hi) | (v < lo)
 
             if not ab_mask.any():
@@ -288,7 +253,7 @@ class CPU_Analyzer:
             # 🔹 Format % เฉพาะ 3 คอลัมน์นี้
             percent_cols = ["CPU utilization (%)", "Maximum threshold (%)", "Minimum threshold (%)"]
             for col in percent_cols:
-                df_abn[col] = pd.to_numeric(df_abn[col], errors="coerce").round(1).astype(str) + "%"
+                df_abn[col] = df_abn[col].round(1).astype(str) + "%"
 
             # ✅ Highlight CPU utilization (%) เป็นสีแดง
             def highlight_red(val):
@@ -310,18 +275,21 @@ class CPU_Analyzer:
         # 13) SNP(E)
         st.markdown(f"#### CPU Performance – SNP(E) Board")
 
-        rows = len(df_snp)
+        rows = min(len(df_snp), MAX_BARS)
         height_full = min(rows * 30, 2000)   # full chart
         height_preview = 400                 # preview chart
 
-        tab1, tab2 = st.tabs(["🔎 Preview (Top10)", "📊 Full chart"])
+        # สร้างกราฟเฉพาะ tab ที่เปิดอยู่
+        tab1, tab2 = lazy.tabs(["🔎 Preview (Top10)", "📊 Full chart"], key=f"{self.ns}_snp_tabs")
         with tab1:
-            df_top10 = df_snp.sort_values(by="CPU%", ascending=False).head(10)
-            st.altair_chart(plot_chart(df_top10, "SNP(E) CPU Utilization (Top 10)", height_preview),
-                            use_container_width=True)
+            if tab1.open:
+                df_top10 = df_snp.sort_values(by="CPU%", ascending=False).head(10)
+                st.altair_chart(plot_chart(df_top10, "SNP(E) CPU Utilization (Top 10)", height_preview),
+                                use_container_width=True)
         with tab2:
-            st.altair_chart(plot_chart(df_snp, "SNP(E) CPU Utilization (~100 Boards)", height_full),
-                            use_container_width=True)
+            if tab2.open:
+                st.altair_chart(plot_chart(df_snp, "SNP(E) CPU Utilization (~100 Boards)", height_full),
+                                use_container_width=True)
 
         show_abnormal(df_snp, "SNP(E)")
         st.markdown("<br><br><br>", unsafe_allow_html=True)
@@ -350,9 +318,8 @@ class CPU_Analyzer:
 
     def prepare(self) -> None:
         """เตรียมข้อมูล abnormal โดยไม่ render UI และไม่ใช้ cascading_filter"""
-        # 1) Normalize
-        self.df_cpu = self._normalize_columns(self.df_cpu)
-        self.df_ref = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) Check required columns
         self._check_required()
@@ -366,9 +333,9 @@ class CPU_Analyzer:
             return
 
         # 4) Detect abnormal
-        val = pd.to_numeric(df_merged[self.COL_VAL], errors="coerce")
-        hi  = pd.to_numeric(df_merged[self.COL_MAX], errors="coerce")
-        lo  = pd.to_numeric(df_merged[self.COL_MIN], errors="coerce")
+        val = df_merged[self.COL_VAL]
+        hi  = df_merged[self.COL_MAX]
+        lo  = df_merged[self.COL_MIN]
         ab_mask = (val > hi) | (val < lo)
 
         df_abn = df_merged.loc[ab_mask, [
@@ -1,6 +1,13 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 from utils.filters import cascading_filter
+from utils.excel_loader import load_reference
+from utils.schema import apply_schema
+from utils import lazy
+from utils.chart_data import downsample
+from utils.paged_table import paged_table
+from utils.styling import GRAY_ROW, RED_CELL, MaskLayer, TableStyle, numeric
 import plotly.graph_objects as go
 
 
@@ -59,16 +66,8 @@ class Client_Analyzer:
     # -------------------- Step 1: Normalize & Validate --------------------
     @staticmethod
     def _normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
-        return (
-            df.copy()
-            .rename(columns=lambda c: str(c))
-            .pipe(lambda _df: _df.set_axis(
-                _df.columns.astype(str)
-                .str.strip()
-                .str.replace(r"\s+", " ", regex=True)
-                .str.replace("\u00a0", " "), axis=1
-            ))
-        )
+        # ข้อมูลจาก ingest ผ่าน schema มาแล้ว (คืน object เดิม) / ไม่งั้น normalize + cast ที่นี่
+        return apply_schema("client", df)
 
     @staticmethod
     def _normalize_ref_cols(df: pd.DataFrame) -> pd.DataFrame:
@@ -99,7 +98,7 @@ class Client_Analyzer:
         return df2
 
     def _load_reference(self) -> pd.DataFrame:
-        ref = pd.read_excel(self.ref_path)
+        ref = load_reference("client_ref", self.ref_path)   # threshold เป็น float64 แล้ว
         ref = self._normalize_ref_cols(ref)
         self._validate_ref_cols(ref)
         ref["Mapping"] = ref["Mapping"].astype(str).str.strip()
@@ -120,14 +119,6 @@ class Client_Analyzer:
         )
         return df_merged
 
-    @staticmethod
-    def _numeric_cast(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
-        df2 = df.copy()
-        for c in cols:
-            if c in df2.columns:
-                df2.loc[:, c] = pd.to_numeric(df2[c], errors="coerce")
-        return df2
-
     # -------------------- Step 4: Filter UI (cascading_filter) --------------------
     def _apply_cascading_filter(self, df: pd.DataFrame):
         df_filtered, _sel = cascading_filter(
@@ -140,49 +131,45 @@ class Client_Analyzer:
         return df_filtered
 
     # -------------------- Step 5: Styling --------------------
-    def _row_has_issue(self, r: pd.Series) -> bool:
-        try:
-            # ตรวจสอบแถวที่มีค่า -60 ใน IN หรือ OUT ให้ถือว่าเป็น "Normal"
-            if r[self.COL_IN] == -60 or r[self.COL_OUT] == -60:
-                return False  # ไม่ถือเป็นปัญหาหรือ abnormal
-            return (
-                (r[self.COL_OUT] > r[self.COL_MAX_OUT]) or (r[self.COL_OUT] < r[self.COL_MIN_OUT]) or
-                (r[self.COL_IN] > r[self.COL_MAX_IN]) or (r[self.COL_IN] < r[self.COL_MIN_IN])
-            )
-        except Exception:
-            return False
-
-    def _highlight_critical_cells(self, val, colname, row) -> str:
-        try:
-            if colname == self.COL_OUT:
-                return 'background-color:#ff4d4d; color:white' if (val > row[self.COL_MAX_OUT] or val < row[self.COL_MIN_OUT]) else ''
-            elif colname == self.COL_IN:
-                return 'background-color:#ff4d4d; color:white' if (val > row[self.COL_MAX_IN] or val < row[self.COL_MIN_IN]) else ''
-            return ''
-        except Exception:
-            return ''
-
-    def _style_dataframe(self, df_view: pd.DataFrame):
-        styled_df = (
-            df_view.style
-            # เทาทั้งแถวเมื่อมีปัญหา
-            .apply(lambda r: ['background-color:#e6e6e6; color:black' if self._row_has_issue(r) else '' for _ in r], axis=1)
-            # แดงเฉพาะค่าที่ผิด (ทั้ง out/in)
-            .apply(lambda row: [self._highlight_critical_cells(row[colname], colname, row) for colname in df_view.columns], axis=1)
-            .format({
-                self.COL_MAX_OUT: "{:.2f}",
-                self.COL_MIN_OUT: "{:.2f}",
-                self.COL_MAX_IN: "{:.2f}",
-                self.COL_MIN_IN: "{:.2f}",
-                self.COL_OUT: "{:.2f}",
-                self.COL_IN: "{:.2f}",
-            })
+    def _critical_masks(self, df: pd.DataFrame) -> dict:
+        """{คอลัมน์: mask} ค่า Output / Input ที่อยู่นอก threshold ของแถวนั้น
+        (เทียบทีละขอบ: ขอบที่เป็น NaN ไม่นับ แต่อีกขอบยังตัดสินได้)"""
+        out, inp = numeric(df, self.COL_OUT), numeric(df, self.COL_IN)
+        return {
+            self.COL_OUT: (out > numeric(df, self.COL_MAX_OUT)) | (out < numeric(df, self.COL_MIN_OUT)),
+            self.COL_IN: (inp > numeric(df, self.COL_MAX_IN)) | (inp < numeric(df, self.COL_MIN_IN)),
+        }
+
+    def _issue_mask(self, df: pd.DataFrame):
+        """แถวที่มีปัญหา (Output หรือ Input ผิด threshold) — แถวที่มี -60 ใน IN หรือ OUT ถือว่า Normal"""
+        crit = self._critical_masks(df)
+        no_signal = (numeric(df, self.COL_IN) == -60) | (numeric(df, self.COL_OUT) == -60)
+        return (crit[self.COL_OUT] | crit[self.COL_IN]) & ~no_signal
+
+    def _critical_layers(self, df: pd.DataFrame) -> list:
+        """แดงเฉพาะค่าที่ผิด (ทั้ง out/in)"""
+        return [MaskLayer(RED_CELL, mask, [col]) for col, mask in self._critical_masks(df).items()]
+
+    def _num_formats(self) -> dict:
+        return {
+            self.COL_MAX_OUT: "{:.2f}",
+            self.COL_MIN_OUT: "{:.2f}",
+            self.COL_MAX_IN: "{:.2f}",
+            self.COL_MIN_IN: "{:.2f}",
+            self.COL_OUT: "{:.2f}",
+            self.COL_IN: "{:.2f}",
+        }
+
+    def _table_style(self, df_view: pd.DataFrame) -> TableStyle:
+        # เทาทั้งแถวเมื่อมีปัญหา + แดงเฉพาะค่าที่ผิด
+        return TableStyle(
+            [MaskLayer(GRAY_ROW, self._issue_mask(df_view)), *self._critical_layers(df_view)],
+            self._num_formats(),
         )
-        return styled_df
 
     # -------------------- Step 6: Banner --------------------
     def _render_status_banner(self, df_view: pd.DataFrame):
-        failed_rows = df_view.apply(self._row_has_issue, axis=1)
+        failed_rows = self._issue_mask(df_view)
         st.markdown(
             "<div style='text-align:center; font-size:32px; font-weight:bold; color:{};'>Client Performance {}</div>".format(
                 "red" if failed_rows.any() else "green",
@@ -192,9 +179,17 @@ class Client_Analyzer:
         )
         st.markdown("<br>", unsafe_allow_html=True)
         self._render_summary_kpi(self.df_filtered)
-        self._render_c2k_avg_slot_charts(df_view)
-        self._render_c2l_avg_slot_charts(df_view)
-        self._render_c4r_avg_slot_charts(df_view)
+
+        # กราฟ + ตารางของแต่ละ board type สร้างเฉพาะ tab ที่เปิดอยู่
+        renderers = {
+            "C2K": self._render_c2k_avg_slot_charts,
+            "C2L": self._render_c2l_avg_slot_charts,
+            "C4R": self._render_c4r_avg_slot_charts,
+        }
+        for tab, render in zip(lazy.tabs(list(renderers), key="client_board_tabs"), renderers.values()):
+            with tab:
+                if tab.open:
+                    render(df_view)
 
     # -------------------- VISUALIZATION --------------------
     def process(self):
@@ -221,22 +216,16 @@ class Client_Analyzer:
             self.COL_MAX_IN, self.COL_MIN_IN, self.COL_IN
         ]].copy()
 
-        # 5) แปลงเป็นตัวเลขก่อนเทียบ
-        self.df_result = self._numeric_cast(
-            self.df_result,
-            [self.COL_OUT, self.COL_IN, self.COL_MAX_OUT, self.COL_MIN_OUT, self.COL_MAX_IN, self.COL_MIN_IN]
-        )
-
-        # 6) Cascading filter
+        # 5) Cascading filter (ค่าวัด / threshold เป็น float จาก schema แล้ว ไม่ต้องแปลงก่อนเทียบ)
         self.df_filtered = self._apply_cascading_filter(self.df_result)
 
-        # 7) เรนเดอร์ตาราง + แบนเนอร์
+        # 6) เรนเดอร์ตาราง + แบนเนอร์
         st.markdown("### Client Performance")
 
        
         
-        styled_df = self._style_dataframe(self.df_filtered.copy())
-        st.dataframe(styled_df, use_container_width=True)
+        df_view = self.df_filtered.copy()
+        paged_table(df_view, key="client_main", style=self._table_style(df_view))
         self._render_status_banner(self.df_filtered)
 
     def _render_summary_kpi(self, df_view: pd.DataFrame) -> None:
@@ -246,12 +235,6 @@ class Client_Analyzer:
         # เตรียมข้อมูล
         df = df_view.copy()
         # กรองทิ้ง -60
-        df[self.COL_IN] = pd.to_numeric(df.get(self.COL_IN), errors="coerce")
-        df[self.COL_OUT] = pd.to_numeric(df.get(self.COL_OUT), errors="coerce")
-        df[self.COL_MIN_IN] = pd.to_numeric(df.get(self.COL_MIN_IN), errors="coerce")
-        df[self.COL_MAX_IN] = pd.to_numeric(df.get(self.COL_MAX_IN), errors="coerce")
-        df[self.COL_MIN_OUT] = pd.to_numeric(df.get(self.COL_MIN_OUT), errors="coerce")
-        df[self.COL_MAX_OUT] = pd.to_numeric(df.get(self.COL_MAX_OUT), errors="coerce")
         df = df[(df[self.COL_IN] != -60) & (df[self.COL_OUT] != -60)]
 
         if df.empty:
@@ -281,10 +264,10 @@ class Client_Analyzer:
 
         # รวมเป็นราย Link (Site + Measure Object)
         link_status = (
-            df.groupby(["Site Name", "Measure Object"])
+            df.groupby(["Site Name", "Measure Object"], observed=True)
             .agg(link_ok=("in_ok", "all"))
             .merge(
-                df.groupby(["Site Name", "Measure Object"]).agg(out_ok=("out_ok", "all")),
+                df.groupby(["Site Name", "Measure Object"], observed=True).agg(out_ok=("out_ok", "all")),
                 on=["Site Name", "Measure Object"],
                 how="left",
             )
@@ -312,6 +295,21 @@ class Client_Analyzer:
     # =====================================================================
     # C2K
     # =====================================================================
+    @staticmethod
+    def _reduce_slot_points(agg: pd.DataFrame, labels: pd.Series, colors_in: list, colors_out: list):
+        """
+        เลือก slot ที่จะวาดด้วย LTTB บน avg_in / avg_out ไม่เกิน MAX_POINTS จุด (slot ที่เป็นสีแดงอยู่ครบ)
+        แกน x คงตำแหน่งเดิมของ slot → ลำดับ / label ไม่เลื่อน
+        """
+        keep = (np.asarray(colors_in) == "red") | (np.asarray(colors_out) == "red")
+        pos = downsample([agg["avg_in"], agg["avg_out"]], keep=keep)
+        if len(pos) == len(agg):
+            return list(range(len(agg))), agg, labels, colors_in, colors_out
+        return (
+            pos.tolist(), agg.iloc[pos], labels.iloc[pos],
+            [colors_in[i] for i in pos], [colors_out[i] for i in pos],
+        )
+
     def _render_c2k_avg_slot_charts(self, df_view: pd.DataFrame) -> None:
         """C2K: Average Input/Output Power per Slot (lines+markers)"""
         st.markdown("### C2K Board Performance (Avg per Slot)")
@@ -322,8 +320,8 @@ class Client_Analyzer:
             st.info("No C2K rows found.")
             return
 
-        vin_raw = pd.to_numeric(df_c2k.get(self.COL_IN), errors="coerce")
-        vout_raw = pd.to_numeric(df_c2k.get(self.COL_OUT), errors="coerce")
+        vin_raw = df_c2k[self.COL_IN]
+        vout_raw = df_c2k[self.COL_OUT]
         mask_io = vin_raw.notna() | vout_raw.notna()
         mask_valid = (vin_raw != -60) & (vout_raw != -60)  # filter ทิ้ง input/output = -60
         df_c2k = df_c2k.loc[mask_io & mask_valid].copy()
@@ -335,20 +333,12 @@ class Client_Analyzer:
         slot = df_c2k["Measure Object"].str.extract(r"^(C2Kx\d+\[[^\]]+\])")[0]
         slot = slot.fillna(df_c2k["Measure Object"].str.extract(r"^(C2K[^\-\s]+)")[0])
         df_c2k["Board Slot"] = slot
-        for c in [
-            self.COL_IN, self.COL_OUT,
-            self.COL_MIN_IN, self.COL_MAX_IN,
-            self.COL_MIN_OUT, self.COL_MAX_OUT
-        ]:
-            if c in df_c2k.columns:
-                df_c2k[c] = pd.to_numeric(df_c2k[c], errors="coerce")
-
         order_pairs = df_c2k.drop_duplicates(subset=["Site Name", "Board Slot"]).reset_index(drop=True)
         order_pairs["_ord"] = range(len(order_pairs))
 
         # ---------------- Aggregate per Slot ----------------
         agg = (
-            df_c2k.groupby(["Site Name", "Board Slot"])
+            df_c2k.groupby(["Site Name", "Board Slot"], observed=True)
             .agg(
                 avg_in=(self.COL_IN, "mean"),
                 avg_out=(self.COL_OUT, "mean"),
@@ -380,11 +370,11 @@ class Client_Analyzer:
             & ((df_c2k[self.COL_OUT] < df_c2k[self.COL_MIN_OUT]) | (df_c2k[self.COL_OUT] > df_c2k[self.COL_MAX_OUT]))
         )
         slot_abnormal_in = (
-            df_c2k.groupby(["Site Name", "Board Slot"])["row_abnormal_in"]
+            df_c2k.groupby(["Site Name", "Board Slot"], observed=True)["row_abnormal_in"]
             .any().reset_index().rename(columns={"row_abnormal_in": "slot_abnormal_in"})
         )
         slot_abnormal_out = (
-            df_c2k.groupby(["Site Name", "Board Slot"])["row_abnormal_out"]
+            df_c2k.groupby(["Site Name", "Board Slot"], observed=True)["row_abnormal_out"]
             .any().reset_index().rename(columns={"row_abnormal_out": "slot_abnormal_out"})
         )
         agg = agg.merge(slot_abnormal_in, on=["Site Name", "Board Slot"], how="left")
@@ -404,6 +394,9 @@ class Client_Analyzer:
             fig.add_hrect(y0=float(unique_out.iloc[0]["min_out"]), y1=float(unique_out.iloc[0]["max_out"]),
                           fillcolor="blue", opacity=0.10, line_width=0)
 
+        # slot เกิน MAX_POINTS → ลดจุดก่อนวาด (slot สีแดงอยู่ครบ)
+        x_index, agg, labels, colors_in, colors_out = self._reduce_slot_points(agg, labels, colors_in, colors_out)
+
         fig.add_trace(go.Scatter(
             x=x_index, y=agg["avg_in"], mode="markers+text",
             marker=dict(color=colors_in, size=8, symbol="circle"), line=dict(color="orange"),
@@ -442,21 +435,11 @@ class Client_Analyzer:
                 self.COL_MAX_IN, self.COL_MIN_IN, self.COL_IN
             ]
 
-            # ✅ ใช้ style ให้เน้นแดงเฉพาะค่าที่ผิด
-            styled_abn = (
-                df_c2k_probs[cols_show].style
-                .apply(
-                    lambda row: [self._highlight_critical_cells(row[col], col, row) for col in df_c2k_probs[cols_show].columns],
-                    axis=1
-                )
-                .format("{:.2f}", subset=[
-                    self.COL_OUT, self.COL_IN,
-                    self.COL_MAX_OUT, self.COL_MIN_OUT,
-                    self.COL_MAX_IN, self.COL_MIN_IN
-                ])
+            # ✅ ใช้ style ให้เน้นแดงเฉพาะค่าที่ผิด (แบ่งหน้าเมื่อแถวเยอะ)
+            paged_table(
+                df_c2k_probs[cols_show], key="client_c2k_abn",
+                style=TableStyle(self._critical_layers(df_c2k_probs), self._num_formats()),
             )
-
-            st.dataframe(styled_abn, use_container_width=True)
             self.df_c2k_abn = df_c2k_probs[cols_show].copy()
         else:
             st.success("All C2K rows are within threshold.")
@@ -476,8 +459,8 @@ class Client_Analyzer:
             st.info("No C2L rows found.")
             return
 
-        vin_raw = pd.to_numeric(df_c2l.get(self.COL_IN), errors="coerce")
-        vout_raw = pd.to_numeric(df_c2l.get(self.COL_OUT), errors="coerce")
+        vin_raw = df_c2l[self.COL_IN]
+        vout_raw = df_c2l[self.COL_OUT]
         mask_io = vin_raw.notna() | vout_raw.notna()
         mask_valid = (vin_raw != -60) & (vout_raw != -60)
         df_c2l = df_c2l.loc[mask_io & mask_valid].copy()
@@ -488,19 +471,11 @@ class Client_Analyzer:
         slot = df_c2l["Measure Object"].str.extract(r"^(C2Lx\d+\[[^\]]+\])")[0]
         slot = slot.fillna(df_c2l["Measure Object"].str.extract(r"^(C2L[^\-\s]+)")[0])
         df_c2l["Board Slot"] = slot
-        for c in [
-            self.COL_IN, self.COL_OUT,
-            self.COL_MIN_IN, self.COL_MAX_IN,
-            self.COL_MIN_OUT, self.COL_MAX_OUT
-        ]:
-            if c in df_c2l.columns:
-                df_c2l[c] = pd.to_numeric(df_c2l[c], errors="coerce")
-
         order_pairs = df_c2l.drop_duplicates(subset=["Site Name", "Board Slot"]).reset_index(drop=True)
         order_pairs["_ord"] = range(len(order_pairs))
 
         agg = (
-            df_c2l.groupby(["Site Name", "Board Slot"])
+            df_c2l.groupby(["Site Name", "Board Slot"], observed=True)
             .agg(
                 avg_in=(self.COL_IN, "mean"),
                 avg_out=(self.COL_OUT, "mean"),
@@ -532,11 +507,11 @@ class Client_Analyzer:
             & ((df_c2l[self.COL_OUT] < df_c2l[self.COL_MIN_OUT]) | (df_c2l[self.COL_OUT] > df_c2l[self.COL_MAX_OUT]))
         )
         slot_abnormal_in = (
-            df_c2l.groupby(["Site Name", "Board Slot"])["row_abnormal_in"]
+            df_c2l.groupby(["Site Name", "Board Slot"], observed=True)["row_abnormal_in"]
             .any().reset_index().rename(columns={"row_abnormal_in": "slot_abnormal_in"})
         )
         slot_abnormal_out = (
-            df_c2l.groupby(["Site Name", "Board Slot"])["row_abnormal_out"]
+            df_c2l.groupby(["Site Name", "Board Slot"], observed=True)["row_abnormal_out"]
             .any().reset_index().rename(columns={"row_abnormal_out": "slot_abnormal_out"})
         )
         agg = agg.merge(slot_abnormal_in, on=["Site Name", "Board Slot"], how="left")
@@ -556,6 +531,9 @@ class Client_Analyzer:
             fig.add_hrect(y0=float(unique_out.iloc[0]["min_out"]), y1=float(unique_out.iloc[0]["max_out"]),
                           fillcolor="blue", opacity=0.10, line_width=0)
 
+        # slot เกิน MAX_POINTS → ลดจุดก่อนวาด (slot สีแดงอยู่ครบ)
+        x_index, agg, labels, colors_in, colors_out = self._reduce_slot_points(agg, labels, colors_in, colors_out)
+
         fig.add_trace(go.Scatter(
             x=x_index, y=agg["avg_in"], mode="markers+text",
             marker=dict(color=colors_in, size=8, symbol="circle"), line=dict(color="orange"),
@@ -594,19 +572,11 @@ class Client_Analyzer:
                 self.COL_MAX_IN, self.COL_MIN_IN, self.COL_IN
             ]
 
-            styled_abn = (
-                df_c2l_probs[cols_show].style
-                .apply(lambda row: [
-                    self._highlight_critical_cells(row[col], col, row)
-                    for col in df_c2l_probs[cols_show].columns
-                ], axis=1)
-                .format("{:.2f}", subset=[
-                    self.COL_OUT, self.COL_IN,
-                    self.COL_MAX_OUT, self.COL_MIN_OUT,
-                    self.COL_MAX_IN, self.COL_MIN_IN
-                ])
+            # ✅ แดงเฉพาะค่าที่ผิด (แบ่งหน้าเมื่อแถวเยอะ)
+            paged_table(
+                df_c2l_probs[cols_show], key="client_c2l_abn",
+                style=TableStyle(self._critical_layers(df_c2l_probs), self._num_formats()),
             )
-            st.dataframe(styled_abn, use_container_width=True)
             self.df_c2l_abn = df_c2l_probs[cols_show].copy()
         else:
             st.success("All C2L rows are within threshold.")
@@ -626,15 +596,6 @@ class Client_Analyzer:
             st.info("No C4R rows found.")
             return
 
-        # แปลงเลขทุกคอลัมน์ที่จำเป็น
-        for c in [
-            self.COL_IN, self.COL_OUT,
-            self.COL_MIN_IN, self.COL_MAX_IN,
-            self.COL_MIN_OUT, self.COL_MAX_OUT
-        ]:
-            if c in df_c4r.columns:
-                df_c4r[c] = pd.to_numeric(df_c4r[c], errors="coerce")
-
         vin_raw = df_c4r[self.COL_IN]
         vout_raw = df_c4r[self.COL_OUT]
 
@@ -657,7 +618,7 @@ class Client_Analyzer:
 
         # --- Aggregate avg per slot ---
         agg = (
-            df_c4r.groupby(["Site Name", "Board Slot"], as_index=False)
+            df_c4r.groupby(["Site Name", "Board Slot"], as_index=False, observed=True)
             .agg(
                 avg_in=(self.COL_IN, "mean"),
                 avg_out=(self.COL_OUT, "mean"),
@@ -691,11 +652,11 @@ class Client_Analyzer:
         )
 
         slot_abnormal_in = (
-            df_c4r.groupby(["Site Name", "Board Slot"], as_index=False)["row_abnormal_in"]
+            df_c4r.groupby(["Site Name", "Board Slot"], as_index=False, observed=True)["row_abnormal_in"]
             .any().rename(columns={"row_abnormal_in": "slot_abnormal_in"})
         )
         slot_abnormal_out = (
-            df_c4r.groupby(["Site Name", "Board Slot"], as_index=False)["row_abnormal_out"]
+            df_c4r.groupby(["Site Name", "Board Slot"], as_index=False, observed=True)["row_abnormal_out"]
             .any().rename(columns={"row_abnormal_out": "slot_abnormal_out"})
         )
 
@@ -726,6 +687,9 @@ class Client_Analyzer:
         fig.add_hrect(y0=MAIN_MIN_IN, y1=MAIN_MAX_IN, fillcolor="orange", opacity=0.10, line_width=0)
         fig.add_hrect(y0=MAIN_MIN_OUT, y1=MAIN_MAX_OUT, fillcolor="blue", opacity=0.10, line_width=0)
 
+        # slot เกิน MAX_POINTS → ลดจุดก่อนวาด (slot สีแดงอยู่ครบ)
+        x_index, agg, labels, colors_in, colors_out = self._reduce_slot_points(agg, labels, colors_in, colors_out)
+
         fig.add_trace(go.Scatter(
             x=x_index, y=agg["avg_in"], mode="markers+text",
             marker=dict(color=colors_in, size=8, symbol="circle"), line=dict(color="orange"),
@@ -764,19 +728,11 @@ class Client_Analyzer:
                 self.COL_MAX_IN, self.COL_MIN_IN, self.COL_IN
             ]
 
-            styled_abn = (
-                df_c4r_probs[cols_show].style
-                .apply(lambda row: [
-                    self._highlight_critical_cells(row[col], col, row)
-                    for col in df_c4r_probs[cols_show].columns
-                ], axis=1)
-                .format("{:.2f}", subset=[
-                    self.COL_OUT, self.COL_IN,
-                    self.COL_MAX_OUT, self.COL_MIN_OUT,
-                    self.COL_MAX_IN, self.COL_MIN_IN
-                ])
+            # ✅ แดงเฉพาะค่าที่ผิด (แบ่งหน้าเมื่อแถวเยอะ)
+            paged_table(
+                df_c4r_probs[cols_show], key="client_c4r_abn",
+                style=TableStyle(self._critical_layers(df_c4r_probs), self._num_formats()),
             )
-            st.dataframe(styled_abn, use_container_width=True)
             self.df_c4r_abn = df_c4r_probs[cols_show].copy()
         else:
             st.success("All C4R rows are within threshold.")
@@ -804,16 +760,12 @@ class Client_Analyzer:
             st.session_state["client_abn_count"] = 0
             return
 
-        # 4) Select important cols & numeric cast
+        # 4) Select important cols (ค่าวัด / threshold เป็น float จาก schema แล้ว)
         self.df_result = self.df_merged[[
             "Site Name", "ME", "Measure Object",
             self.COL_MAX_OUT, self.COL_MIN_OUT, self.COL_OUT,
             self.COL_MAX_IN, self.COL_MIN_IN, self.COL_IN
         ]].copy()
-        self.df_result = self._numeric_cast(
-            self.df_result,
-            [self.COL_OUT, self.COL_IN, self.COL_MAX_OUT, self.COL_MIN_OUT, self.COL_MAX_IN, self.COL_MIN_IN]
-        )
 
         # 5) Detect abnormal rows (per link)
         mask_abn = (
@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
               # ✅ เพิ่มบรรทัดนี้
 import plotly.express as px 
+from utils.chart_data import count_frame
 
 
 
@@ -241,8 +242,9 @@ class EOLAnalyzer(LossAnalyzer):
 
             # ---------- Donut ----------
             fig = px.pie(
-                df_status,
+                count_frame(status_list),
                 names="Status",
+                values="Count",
                 hole=0.5,
                 color="Status",
                 color_discrete_map={
@@ -499,8 +501,9 @@ class CoreAnalyzer(EOLAnalyzer):
 
             # ---------- Donut ----------
             fig = px.pie(
-                df_summary, 
-                names="Status", 
+                count_frame(status_list),
+                names="Status",
+                values="Count",
                 hole=0.5, 
                 color="Status",
                 color_discrete_map={
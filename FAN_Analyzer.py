@@ -1,6 +1,12 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 from utils.filters import cascading_filter
+from utils.schema import apply_schema
+from utils.chart_data import MAX_BARS, top_k
+from utils import lazy
+from utils.paged_table import paged_table
+from utils.styling import GRAY_ROW, RED_CELL, MaskLayer, TableStyle, numeric
 import altair as alt
 import re
 
@@ -34,14 +40,10 @@ class FAN_Analyzer:
         self.COL_MIN_TH = "Minimum threshold"
 
     # ---------- Utilities ----------
-    @staticmethod
-    def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-        df.columns = (
-            df.columns.astype(str)
-            .str.strip().str.replace(r"\s+", " ", regex=True)
-            .str.replace("\u00a0", " ")
-        )
-        return df
+    def _apply_schema(self) -> None:
+        """normalize + cast (ข้อมูลจาก ingest ผ่าน schema มาแล้ว → ไม่ทำซ้ำ) / ref: threshold เป็น float64"""
+        self.df_fan = apply_schema("fan", self.df_fan)
+        self.df_ref = apply_schema("fan_ref", self.df_ref)
 
     @staticmethod
     def extract_board(mobj: str) -> str:
@@ -81,53 +83,37 @@ class FAN_Analyzer:
         )
         return df_merged
 
-    @staticmethod
-    def _is_not_ok_rule(measure_object: str, value) -> bool:
-        try:
-            v = float(value)
-        except Exception:
-            return False
-
-        mo = str(measure_object)
-        if "FCC" in mo and v > 120:
-            return True
-        if "FCPP" in mo and v > 250:
-            return True
-        if "FCPL" in mo and v > 120:
-            return True
-        if "FCPS" in mo and v > 230:
-            return True
-        return False
-
-    def _style_dataframe(self, df_view: pd.DataFrame):
-        if self.COL_VALUE in df_view.columns:
-            df_view[self.COL_VALUE] = pd.to_numeric(df_view[self.COL_VALUE], errors="coerce")
-
-        highlight_mask = df_view.apply(
-            lambda r: self._is_not_ok_rule(r[self.COL_MOBJ], r[self.COL_VALUE]),
-            axis=1
+    # FanType ใน Measure Object → ความเร็วสูงสุดที่ยังปกติ (Rps)
+    FAN_LIMITS = {"FCC": 120, "FCPP": 250, "FCPL": 120, "FCPS": 230}
+
+    def _not_ok_mask(self, df: pd.DataFrame) -> pd.Series:
+        """แถวที่ความเร็วพัดลมเกิน FAN_LIMITS ตาม FanType ใน Measure Object (ทั้งตารางในครั้งเดียว)"""
+        value = numeric(df, self.COL_VALUE)
+        mobj = df[self.COL_MOBJ].astype(str)
+        mask = np.zeros(len(df), dtype=bool)
+        for fan_type, limit in self.FAN_LIMITS.items():
+            mask |= mobj.str.contains(fan_type, regex=False).fillna(False).to_numpy(dtype=bool) & (value > limit)
+        return pd.Series(mask, index=df.index)
+
+    def _table_style(self, df_view: pd.DataFrame):
+        """(ไฮไลต์ + format ทั้งตาราง, mask แถวที่ผิด) — ค่าพัดลมเป็น float จาก schema แล้ว"""
+        highlight_mask = self._not_ok_mask(df_view)
+
+        table_style = TableStyle(
+            [
+                MaskLayer(GRAY_ROW, highlight_mask),
+                MaskLayer(RED_CELL, highlight_mask, [self.COL_VALUE]),
+            ],
+            {self.COL_VALUE: "{:.2f}"},
         )
-
-        def gray_row(r):
-            return ['background-color:#e6e6e6;color:black' if highlight_mask.iloc[r.name] else '' for _ in r]
-
-        def red_value(_):
-            return ['background-color:#ff4d4d;color:white' if m else '' for m in highlight_mask]
-
-        styled_df = (
-            df_view.style
-            .apply(gray_row, axis=1)
-            .apply(red_value, subset=[self.COL_VALUE] if self.COL_VALUE in df_view.columns else [])
-            .format({self.COL_VALUE: "{:.2f}"})
-        )
-        return styled_df, highlight_mask
+        return table_style, highlight_mask
 
     # ---------- Chart ----------
     def _plot_chart(self, df_sub: pd.DataFrame, ftype: str, height: int, th: float):
-        df_sub = df_sub.sort_values(by="Avg Fan Speed (Rps)", ascending=False).copy()
-        df_sub["Status"] = df_sub["Avg Fan Speed (Rps)"].apply(
-            lambda x: "Abnormal" if x > th else "Normal"
-        )
+        # เกิน MAX_BARS แท่ง → รวมที่เหลือเป็นแท่ง Others (บอร์ดที่เกิน threshold แยกแท่งเสมอ)
+        speed = "Avg Fan Speed (Rps)"
+        df_sub = top_k(df_sub[["Site-Obj", speed]], speed, "Site-Obj", keep=df_sub[speed] > th)
+        df_sub["Status"] = np.where(df_sub[speed] > th, "Abnormal", "Normal")
 
         chart_bar = alt.Chart(df_sub).mark_bar().encode(
             x=alt.X("Avg Fan Speed (Rps)", title="Fan Speed (Rps)",
@@ -152,9 +138,8 @@ class FAN_Analyzer:
         self.df_abnormal = pd.DataFrame()
         self.df_abnormal_by_type = {}
 
-        # Normalize
-        self.df_fan = self._normalize_columns(self.df_fan)
-        self.df_ref = self._normalize_columns(self.df_ref)
+        # Normalize + cast
+        self._apply_schema()
 
         # Required check
         self._check_required()
@@ -183,9 +168,10 @@ class FAN_Analyzer:
         st.caption(f"FAN (showing {len(df_filtered)}/{len(df_result)} rows)")
 
         # Style table
-        styled_df, highlight_mask = self._style_dataframe(df_filtered.copy())
+        df_view = df_filtered.copy()
+        table_style, highlight_mask = self._table_style(df_view)
         st.markdown("### FAN Performance")
-        st.dataframe(styled_df, use_container_width=True)
+        paged_table(df_view, key=f"{self.ns}_main", style=table_style)
 
         # Status text
         st.markdown(
@@ -205,22 +191,19 @@ class FAN_Analyzer:
         # Average by group
         df_avg = (
             df_result
-            .groupby(["FanType", self.COL_ME, "Site Name", "Board"], as_index=False)[self.COL_VALUE]
+            .groupby(["FanType", self.COL_ME, "Site Name", "Board"], as_index=False, observed=True)[self.COL_VALUE]
             .mean()
             .rename(columns={self.COL_VALUE: "Avg Fan Speed (Rps)"})
         )
         df_avg["Site-Obj"] = df_avg["Site Name"].astype(str) + " - " + df_avg["Board"].astype(str)
 
         # Thresholds
-        thresholds = {"FCC": 120, "FCPP": 250, "FCPL": 120, "FCPS": 230}
+        thresholds = self.FAN_LIMITS
 
         # Abnormal table (per FanType)
         def show_abnormal_from_main(df_main: pd.DataFrame, title: str):
             st.markdown(f"#### {title} – Abnormal Rows")
-            ab_mask = df_main.apply(
-                lambda r: self._is_not_ok_rule(r[self.COL_MOBJ], r[self.COL_VALUE]),
-                axis=1
-            )
+            ab_mask = self._not_ok_mask(df_main)
 
             if not ab_mask.any():
                 st.info(" No abnormal rows (Normal)")
@@ -231,9 +214,9 @@ class FAN_Analyzer:
                 self.COL_MAX_TH, self.COL_MIN_TH, self.COL_VALUE
             ]].copy()
 
-            df_abn[self.COL_VALUE] = pd.to_numeric(df_abn[self.COL_VALUE], errors="coerce").round(2)
-            df_abn[self.COL_MAX_TH] = pd.to_numeric(df_abn[self.COL_MAX_TH], errors="coerce").round(2)
-            df_abn[self.COL_MIN_TH] = pd.to_numeric(df_abn[self.COL_MIN_TH], errors="coerce").round(2)
+            df_abn[self.COL_VALUE] = df_abn[self.COL_VALUE].round(2)
+            df_abn[self.COL_MAX_TH] = df_abn[self.COL_MAX_TH].round(2)
+            df_abn[self.COL_MIN_TH] = df_abn[self.COL_MIN_TH].round(2)
 
             # เก็บ abnormal
             self.df_abnormal = pd.concat([self.df_abnormal, df_abn], ignore_index=True)
@@ -273,19 +256,22 @@ class FAN_Analyzer:
                 unsafe_allow_html=True
             )
 
-            rows = len(df_sub)
+            rows = min(len(df_sub), MAX_BARS)
             height_full = min(rows * 30, 2000)
             height_preview = 400
 
             if ftype in ["FCC", "FCPL", "FCPS"]:
-                tab1, tab2 = st.tabs(["🔎 Preview (Top10)", "📊 Full chart"])
+                # สร้างกราฟเฉพาะ tab ที่เปิดอยู่
+                tab1, tab2 = lazy.tabs(["🔎 Preview (Top10)", "📊 Full chart"], key=f"{self.ns}_{ftype}_tabs")
                 with tab1:
-                    df_top10 = df_sub.sort_values(by="Avg Fan Speed (Rps)", ascending=False).head(10)
-                    st.altair_chart(self._plot_chart(df_top10, ftype, height_preview, th),
-                                    use_container_width=True)
+                    if tab1.open:
+                        df_top10 = df_sub.sort_values(by="Avg Fan Speed (Rps)", ascending=False).head(10)
+                        st.altair_chart(self._plot_chart(df_top10, ftype, height_preview, th),
+                                        use_container_width=True)
                 with tab2:
-                    st.altair_chart(self._plot_chart(df_sub, ftype, height_full, th),
-                                    use_container_width=True)
+                    if tab2.open:
+                        st.altair_chart(self._plot_chart(df_sub, ftype, height_full, th),
+                                        use_container_width=True)
             else:  # FCPP
                 st.altair_chart(self._plot_chart(df_sub, ftype, height_full, th),
                                 use_container_width=True)
@@ -301,9 +287,8 @@ class FAN_Analyzer:
         เตรียมข้อมูล FAN สำหรับ Summary (ไม่ render UI)
         return df_result ที่ merge แล้ว พร้อม abnormal เก็บใน self
         """
-        # 1) Normalize
-        self.df_fan = self._normalize_columns(self.df_fan)
-        self.df_ref = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) Required check
         self._check_required()
@@ -327,25 +312,19 @@ class FAN_Analyzer:
         df_result["Port"] = df_result[self.COL_MOBJ].apply(self.extract_port)
 
         # 6) Detect abnormal (รวมทั้งหมด)
-        ab_mask_all = df_result.apply(
-            lambda r: self._is_not_ok_rule(r[self.COL_MOBJ], r[self.COL_VALUE]),
-            axis=1
-        )
+        ab_mask_all = self._not_ok_mask(df_result)
 
         self.df_abnormal = df_result.loc[ab_mask_all].copy()
 
         # 7) Detect abnormal แยกตาม FanType
         self.df_abnormal_by_type = {}
-        thresholds = {"FCC": 120, "FCPP": 250, "FCPL": 120, "FCPS": 230}
+        thresholds = self.FAN_LIMITS
         for ftype, th in thresholds.items():
             df_sub = df_result[df_result["FanType"] == ftype].copy()
             if df_sub.empty:
                 continue
 
-            ab_mask = df_sub.apply(
-                lambda r: self._is_not_ok_rule(r[self.COL_MOBJ], r[self.COL_VALUE]),
-                axis=1
-            )
+            ab_mask = self._not_ok_mask(df_sub)
             if ab_mask.any():
                 self.df_abnormal_by_type[ftype] = df_sub.loc[ab_mask].copy()
 
@@ -1,9 +1,263 @@
 import re
-from collections import OrderedDict  # NEW: สำหรับเก็บตารางรายวันแบบเรียงลำดับ
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 from utils.filters import cascading_filter
+from utils.excel_loader import osc_load_threshold
+from utils.alarm_index import AlarmIndex, pair_keys, to_ns, window_nodes
+from utils.diag_log import get_logger
+from utils.paged_table import paged_table
+from utils.styling import RED_CELL, MaskLayer, TableStyle, numeric
+
+log = get_logger("fiberflapping")
+
+COL_DIFF = "Max - Min (dB)"
+COL_MIN_IN = "Min Value of Input Optical Power(dBm)"
+
+
+def match_alarms(df_windows: pd.DataFrame, df_fm_norm: pd.DataFrame) -> np.ndarray:
+    """
+    True = หน้าต่าง OSC (ME ↔ Target ME, Begin..End) มี alarm ของคู่โหนดเดียวกันที่เวลา overlap
+    (Occurrence Time <= End Time และ Clear Time >= Begin Time)
+    โหนดว่าง / NaN หรือไม่มี Begin/End Time ตรวจไม่ได้ → ไม่ match (= FLAPPING)
+
+    ทำทีเดียวทั้งตาราง: เรียง event ของทุกคู่โหนดตามเวลา (alarm ที่ Occurrence Time,
+    หน้าต่างที่ End Time) แล้วเก็บ Clear Time สูงสุดของ alarm ที่เริ่มแล้วในคู่เดียวกัน
+    หน้าต่างจะ match ถ้าค่านั้น >= Begin Time
+    """
+    n = len(df_windows)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    fm = df_fm_norm.dropna(subset=["fm_node1", "fm_node2", "Occurrence Time", "Clear Time"])
+
+    # โหนดว่าง / NaN ไม่มีทาง match → FLAPPING เหมือนเดิม
+    node_a, node_b, ok = window_nodes(df_windows)
+    keys, _ = pd.factorize(np.concatenate([
+        pair_keys(fm["fm_node1"].astype(str), fm["fm_node2"].astype(str)),
+        pair_keys(node_a, node_b),
+    ]))
+    fm_code, win_code = keys[:len(fm)], keys[len(fm):]
+
+    begin = df_windows["Begin Time"]
+    end = df_windows["End Time"]
+    win_pos = np.flatnonzero(ok)
+    if len(fm) == 0 or len(win_pos) == 0:
+        return np.zeros(n, dtype=bool)
+
+    # event: alarm (kind 0) มาก่อนหน้าต่าง (kind 1) เมื่อเวลาเท่ากัน → Occurrence Time <= End Time
+    code = np.concatenate([fm_code, win_code[win_pos]])
+    t = np.concatenate([to_ns(fm["Occurrence Time"]), to_ns(end)[win_pos]])
+    kind = np.concatenate([np.zeros(len(fm), dtype=np.int8), np.ones(len(win_pos), dtype=np.int8)])
+    val = np.concatenate([to_ns(fm["Clear Time"]), np.full(len(win_pos), np.iinfo(np.int64).min)])
+    order = np.lexsort((kind, t, code))
+    run_max = pd.Series(val[order]).groupby(code[order]).cummax().to_numpy()
+
+    is_win = kind[order] == 1
+    latest_clear = np.empty(len(win_pos), dtype=np.int64)
+    latest_clear[order[is_win] - len(fm)] = run_max[is_win]
+    matched = np.zeros(n, dtype=bool)
+    matched[win_pos] = latest_clear >= to_ns(begin)[win_pos]
+    return matched
+
+
+class FlappingSweep:
+    """
+    ผล Fiber Flapping ของทุก threshold ตั้งแต่ min_threshold ขึ้นไป จาก FM match รอบเดียว
+
+    แถว OSC ที่ผ่าน min_threshold ถูกเรียงตาม Max - Min (dB) ครั้งเดียว และตัดสิน flapping
+    (ไม่มี alarm overlap) ครั้งเดียว — threshold ใด ๆ จึงเป็นแค่ searchsorted:
+        sweep = analyzer.sweep()
+        df_nomatch = sweep.at(3.5)
+        curve = sweep.curve()
+    """
+
+    def __init__(
+        self,
+        df_optical_norm: pd.DataFrame,
+        df_fm_norm: pd.DataFrame,
+        min_threshold: float | None = None,
+        alarm_index: AlarmIndex | None = None,
+    ):
+        self.min_threshold = float(osc_load_threshold() if min_threshold is None else min_threshold)
+        df = df_optical_norm
+        if COL_MIN_IN in df.columns:
+            df = df[df[COL_MIN_IN] != -60]
+            log.info("no_signal_filtered", rows=len(df_optical_norm) - len(df))
+        df = df[df[COL_DIFF] > self.min_threshold].reset_index(drop=True)
+        self.candidates = df
+
+        if alarm_index is None:
+            flapping = ~match_alarms(df, df_fm_norm)
+        else:
+            # alarm ของ export นี้เข้าประวัติก่อน แล้วตัดสินหน้าต่างใหม่กับประวัติทั้งหมด
+            # (หน้าต่างที่เคยตัดสินแล้ว เช่น วันก่อน ๆ ใช้ผลเดิม)
+            alarm_index.add_alarms(df_fm_norm)
+            flapping = alarm_index.flapping(df)
+            alarm_index.save()
+        log.info("threshold_filtered", threshold=self.min_threshold, remaining=len(df), flapping=int(flapping.sum()))
+        if log.enabled():
+            self._log_flapping(df, flapping)
+
+        diff = df[COL_DIFF].to_numpy(dtype=float)
+        self._order = np.argsort(diff, kind="stable")
+        self._diff_sorted = diff[self._order]
+        self._flap_sorted = flapping[self._order]
+        # จำนวนแถว flapping ที่ diff > threshold = ผลรวมจากตำแหน่งนั้นถึงท้าย
+        self._flap_suffix = np.append(np.cumsum(self._flap_sorted[::-1])[::-1], 0)
+
+        # site (ME) นับเมื่อมีแถว flapping อย่างน้อยหนึ่งแถวที่ diff > threshold → ใช้ diff สูงสุดต่อ ME
+        flap_rows = df.loc[flapping, ["ME", COL_DIFF]]
+        self._site_max = np.sort(flap_rows.groupby("ME", observed=True)[COL_DIFF].max().to_numpy(dtype=float))
+
+    @staticmethod
+    def _log_flapping(df: pd.DataFrame, flapping: np.ndarray) -> None:
+        """รายละเอียดแถว FLAPPING ลง log ระดับ DEBUG (sampled) — เรียกเฉพาะตอนเปิด DEBUG"""
+        _, _, ok = window_nodes(df)
+        rows = df.loc[flapping, ["ME", "Target ME", "Begin Time", "End Time"]]
+        for idx, me, target, begin, end in rows.itertuples(name=None):
+            log.debug(
+                "flapping_window", row=idx, me=me, target=target, begin=begin, end=end,
+                reason="no_time_overlap" if ok[idx] else "missing_fields",
+            )
+
+    @property
+    def max_diff(self) -> float:
+        return float(self._diff_sorted[-1]) if len(self._diff_sorted) else self.min_threshold
+
+    def _start(self, threshold: float) -> int:
+        if threshold < self.min_threshold:
+            raise ValueError(f"threshold {threshold} is below the sweep minimum {self.min_threshold}")
+        return int(np.searchsorted(self._diff_sorted, threshold, side="right"))
+
+    def count(self, threshold: float) -> int:
+        return int(self._flap_suffix[self._start(threshold)])
+
+    def sites(self, threshold: float) -> int:
+        self._start(threshold)
+        return int(len(self._site_max) - np.searchsorted(self._site_max, threshold, side="right"))
+
+    def at(self, threshold: float) -> pd.DataFrame:
+        """แถว flapping ที่ Max - Min (dB) > threshold (เรียงตามลำดับเดิมของข้อมูล)"""
+        start = self._start(threshold)
+        rows = np.sort(self._order[start:][self._flap_sorted[start:]])
+        return self.candidates.iloc[rows].reset_index(drop=True)
+
+    def curve(self, thresholds=None, step: float = 0.1) -> pd.DataFrame:
+        """จำนวนแถว / site ที่ flapping ต่อ threshold (default: ทุก step จาก min ถึง max diff)"""
+        if thresholds is None:
+            thresholds = np.round(np.arange(self.min_threshold, max(self.max_diff, self.min_threshold) + step, step), 2)
+        thresholds = np.asarray(thresholds, dtype=float)
+        starts = np.searchsorted(self._diff_sorted, thresholds, side="right")
+        sites = len(self._site_max) - np.searchsorted(self._site_max, thresholds, side="right")
+        return pd.DataFrame({
+            "Threshold (dB)": thresholds,
+            "Flapping rows": self._flap_suffix[starts],
+            "Sites": sites,
+        })
+
+
+class DailyFlapping:
+    """
+    แบ่งแถว flapping ตามวัน (Begin Time) ครั้งเดียว — ใช้ทั้งการ์ดรายวัน, drill-down และตาราง report
+
+    เก็บแค่ตำแหน่งแถวของแต่ละวัน (ไม่ copy frame) แล้วดึงเป็น DataFrame ตอนที่ขอวันนั้นจริง ๆ
+    จำนวน site ต่อวัน และสรุป link/ครั้งต่อ Site Name ของทุกวันคำนวณด้วย groupby รอบเดียว
+    แถวที่ไม่มี Begin Time ไม่อยู่ในวันใด (เหมือน groupby เดิม)
+    """
+
+    def __init__(self, df_nomatch: pd.DataFrame):
+        self.df = df_nomatch
+        begin = pd.to_datetime(df_nomatch["Begin Time"])
+        day_codes, days = pd.factorize(begin.dt.normalize(), sort=True)   # NaT → -1
+        self.days = [d.date() for d in days]
+        self._day_codes = day_codes
+
+        # ตำแหน่งแถวของแต่ละวัน (ลำดับเดิมของข้อมูล)
+        order = np.argsort(day_codes, kind="stable")
+        order = order[day_codes[order] >= 0]
+        bounds = np.searchsorted(day_codes[order], np.arange(len(days) + 1))
+        self._rows = {day: order[bounds[i]:bounds[i + 1]] for i, day in enumerate(self.days)}
+        self._begin_ns = begin.to_numpy(dtype="datetime64[ns]")
+
+        # จำนวน ME ไม่ซ้ำต่อวัน
+        me_codes = pd.factorize(df_nomatch["ME"])[0] if "ME" in df_nomatch.columns else np.full(len(df_nomatch), -1)
+        ok = (day_codes >= 0) & (me_codes >= 0)
+        width = int(me_codes.max()) + 1 if ok.any() else 1
+        pairs = np.unique(day_codes[ok].astype(np.int64) * width + me_codes[ok])
+        self.site_counts = pd.DataFrame({
+            "Date": self.days,
+            "Sites": np.bincount(pairs // width, minlength=len(self.days)),
+        })
+
+        self._site_summary = self._summarize_sites()
+
+    def _summarize_sites(self) -> dict:
+        """{วัน: "Site (n links m times) ..."} ของทุกวันในรอบเดียว"""
+        df = self.df
+        if not {"Site Name", "ME", "Measure Object"}.issubset(df.columns) or df.empty:
+            return {}
+        # ดึง Target ME จาก Measure Object (แบบเดียวกับ normalize_optical)
+        g = pd.DataFrame({
+            "day": self._day_codes,
+            "site": df["Site Name"].to_numpy(),
+            "ME": df["ME"].to_numpy(),
+            "Target ME": FiberflappingAnalyzer.extract_targets(df["Measure Object"]).to_numpy(),
+        })
+        if isinstance(df["Site Name"].dtype, pd.CategoricalDtype):
+            g["site"] = pd.Categorical(g["site"], dtype=df["Site Name"].dtype)
+        g = g[g["day"] >= 0]
+        keys = ["day", "site"]
+        times = g.groupby(keys, observed=True, sort=True).size()
+        links = (
+            g.drop_duplicates(["day", "site", "ME", "Target ME"])
+            .groupby(keys, observed=True, sort=True).size()
+            .reindex(times.index)
+        )
+        out: dict = {}
+        for (day, site), n_links, n_times in zip(times.index, links.to_numpy(), times.to_numpy()):
+            out.setdefault(self.days[day], []).append(
+                f"{site} ({n_links} link{'s' if n_links > 1 else ''} {n_times} time{'s' if n_times > 1 else ''})"
+            )
+        return {day: " ".join(parts) for day, parts in out.items()}
+
+    def rows(self, day) -> pd.DataFrame:
+        """แถวของวันนั้น (ลำดับเดิม)"""
+        pos = self._rows.get(day)
+        return self.df.iloc[pos] if pos is not None else self.df.iloc[0:0]
+
+    def site_summary(self, day) -> str:
+        return self._site_summary.get(day, "")
+
+    def report_table(self, day) -> pd.DataFrame:
+        """ตารางของวันนั้นสำหรับ export (เรียงตาม Begin Time, คอลัมน์เหมือน drill-down)"""
+        pos = self._rows[day]
+        pos = pos[np.argsort(self._begin_ns[pos], kind="stable")]
+        return FiberflappingAnalyzer._select_view_columns(self.df.iloc[pos])
+
+    def tables(self) -> "DailyTables":
+        return DailyTables(self)
+
+
+class DailyTables(Mapping):
+    """{"YYYY-MM-DD": ตาราง report} แบบ lazy — สร้าง DataFrame ของวันนั้นครั้งแรกที่ถูกอ่าน"""
+
+    def __init__(self, daily: DailyFlapping):
+        self._daily = daily
+        self._keys = {str(day): day for day in daily.days}
+        self._built: dict = {}
+
+    def __getitem__(self, key: str) -> pd.DataFrame:
+        if key not in self._built:
+            self._built[key] = self._daily.report_table(self._keys[key])
+        return self._built[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
 
 
 class FiberflappingAnalyzer:
@@ -18,19 +272,35 @@ class FiberflappingAnalyzer:
     การใช้งาน:
         analyzer = FiberflappingAnalyzer(df_optical, df_fm, threshold=2.0)
         analyzer.process()
+
+    ลอง threshold อื่นโดยไม่ต้อง match ใหม่: analyzer.sweep().at(thr) (ดู FlappingSweep)
     """
 
+    DEFAULT_THRESHOLD = 2.0
+
     # -------------------- Regex --------------------
     # ดึงชื่อโหนดที่ลงท้ายด้วย _A หรือ _R เช่น CR_WCO_7807_031_1Z_A / SR_WCO_9006_043_1Z_A
     _NODE_PATTERN = re.compile(r'[A-Z]{2}_[A-Z0-9]+_\d{3,4}_[0-9]{3}_[0-9A-Z]+_[AR]')
-
-    def __init__(self, df_optical: pd.DataFrame, df_fm: pd.DataFrame, threshold: float = 2.0, ref_path: str = "data/Flapping.xlsx"):
+    # Target ME = ข้อความในวงเล็บของ Measure Object
+    _TARGET_PATTERN = re.compile(r"\(([^)]+)\)")
+
+    def __init__(
+        self,
+        df_optical: pd.DataFrame,
+        df_fm: pd.DataFrame,
+        threshold: float = DEFAULT_THRESHOLD,
+        ref_path: str = "data/Flapping.xlsx",
+        alarm_index: AlarmIndex | None = None,
+    ):
         self.df_optical_raw = df_optical
         self.df_fm_raw = df_fm
         self.threshold = threshold
         self.ref_path = ref_path
         self.df_ref = None  # Reference data for site names
         self.daily_tables = None  # NEW: เก็บผลตารางรายวันสำหรับ export/report
+        self._sweep = None  # FlappingSweep (สร้างครั้งแรกที่เรียก sweep())
+        # ประวัติ FM ข้ามวัน (utils/alarm_index.py) — None = match กับ FM ของชุดนี้อย่างเดียว
+        self.alarm_index = alarm_index
 
      
 
@@ -68,9 +338,49 @@ class FiberflappingAnalyzer:
     @staticmethod
     def _extract_target_from_measure_object(measure_obj: str) -> str | None:
         """ดึง Target ME จากข้อความในวงเล็บของ Measure Object"""
-        m = re.search(r"\(([^)]+)\)", str(measure_obj))
+        m = FiberflappingAnalyzer._TARGET_PATTERN.search(str(measure_obj))
         return m.group(1) if m else None
 
+    @staticmethod
+    def _map_distinct(values: pd.Series, extract) -> pd.Series:
+        """รัน extract (Series ของ str ไม่ซ้ำ → Series) ครั้งเดียวต่อค่าไม่ซ้ำ แล้วกระจายกลับเป็น category
+
+        Measure Object เป็น category อยู่แล้ว / Link ซ้ำกันมาก → regex ทำแค่ไม่กี่พันครั้งแทนทุกแถว
+        ค่าว่าง (NaN) ได้ผล NaN
+        """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        result = extract(pd.Series(uniques, dtype=object).astype(str))
+        res_codes, cats = pd.factorize(result, sort=True)
+        # code -1 (NaN ของ input) → -1 (NaN ของผล)
+        res_codes = np.append(res_codes, -1)[codes]
+        return pd.Series(pd.Categorical.from_codes(res_codes, categories=cats), index=values.index)
+
+    @classmethod
+    def extract_targets(cls, measure_obj: pd.Series) -> pd.Series:
+        """Target ME ของทั้งคอลัมน์ (vectorized) → category; แถวที่ไม่มีวงเล็บ = NaN"""
+        return cls._map_distinct(measure_obj, lambda s: s.str.extract(cls._TARGET_PATTERN, expand=False))
+
+    @classmethod
+    def extract_link_nodes(cls, links: pd.Series) -> pd.DataFrame:
+        """fm_node1 / fm_node2 ของทั้งคอลัมน์ Link (vectorized) → category
+
+        ผลเท่ากับ _extract_nodes_from_link ทีละแถว: โหนด 2 ตัวแรกตามลำดับที่ปรากฏ
+        ถ้าได้ไม่ถึง 2 ตัว → NaN ทั้งคู่
+        """
+        def nth(k):
+            def extract(s):
+                nodes = s.str.findall(cls._NODE_PATTERN)
+                return nodes.str[k].where(nodes.str.len() >= 2)
+            return extract
+
+        return pd.DataFrame({
+            "fm_node1": cls._map_distinct(links, nth(0)),
+            "fm_node2": cls._map_distinct(links, nth(1)),
+        })
+
     def _extract_nodes_from_link(self, link_val: str) -> tuple[str | None, str | None]:
         """
         ดึงชื่อโหนด 2 ตัวจากคอลัมน์ Link ของ FM
@@ -98,7 +408,7 @@ class FiberflappingAnalyzer:
         )
 
         # Extract Target ME จาก Measure Object: ค่าในวงเล็บ
-        df["Target ME"] = df["Measure Object"].apply(self._extract_target_from_measure_object)
+        df["Target ME"] = self.extract_targets(df["Measure Object"])
 
         # เพิ่ม Site Name จาก reference
         self.df_ref = self._load_reference()
@@ -132,127 +442,13 @@ class FiberflappingAnalyzer:
             raise ValueError("No 'Link*' column found in FM Alarm file.")
         link_col = link_cols[0]
 
-        # ✅ เตรียม fm_node1, fm_node2 เพื่อเร่งความเร็วขณะเทียบ
-        fm_nodes = df[link_col].apply(self._extract_nodes_from_link)
-        df["fm_node1"] = fm_nodes.apply(lambda x: x[0])
-        df["fm_node2"] = fm_nodes.apply(lambda x: x[1])
+        # ✅ เตรียม fm_node1, fm_node2 เพื่อเร่งความเร็วขณะเทียบ (category: โหนดซ้ำกันมาก)
+        nodes = self.extract_link_nodes(df[link_col])
+        df["fm_node1"] = nodes["fm_node1"]
+        df["fm_node2"] = nodes["fm_node2"]
 
         return df, link_col
 
-    # -------------------- Core Filtering --------------------
-    def filter_optical_by_threshold(self, df_optical_norm: pd.DataFrame) -> pd.DataFrame:
-        """
-        กรองข้อมูล Optical:
-          1. ตัดแถวที่ Min Value = -60 (ถือว่าไม่มีสัญญาณ)
-          2. เก็บเฉพาะแถวที่ Max - Min (dB) > threshold
-        """
-        df = df_optical_norm.copy()
-
-        # 1️⃣ ตัดแถวที่ Min Value = -60
-        if "Min Value of Input Optical Power(dBm)" in df.columns:
-            before = len(df)
-            df = df[df["Min Value of Input Optical Power(dBm)"] != -60]
-            after = len(df)
-            print(f"🔹 Filtered out {before - after} rows where Min Value = -60 dBm")
-
-        # 2️⃣ กรองตาม threshold
-        df_filtered = df[df["Max - Min (dB)"] > self.threshold].copy()
-
-        print(f"✅ Remaining rows after threshold filter: {len(df_filtered)}")
-        return df_filtered
-
-
-    def find_nomatch(self, df_filtered: pd.DataFrame, df_fm_norm: pd.DataFrame, link_col: str) -> pd.DataFrame:
-        """
-        Logic ใหม่: ตรวจทีละแถว โดยเทียบ 'คู่โหนด' กับคอลัมน์ Link ของ FM (สลับได้)
-        ถ้าไม่พบคู่โหนดใน FM → FLAPPING
-        ถ้าพบคู่โหนด → ตรวจเวลา overlap:
-            Occurrence Time <= End Time และ Clear Time >= Begin Time
-            - ถ้ามีอย่างน้อย 1 แถว overlap → MATCHED (not flapping)
-            - ถ้าไม่มี overlap เลย → FLAPPING
-        พิมพ์ log ลง terminal ทุกกรณี
-        """
-        result_rows = []
-
-        # เตรียมเฉพาะ FM rows ที่มีโหนดครบทั้ง 2 ข้าง
-        fm_valid = df_fm_norm.dropna(subset=["fm_node1", "fm_node2"]).copy()
-
-        for idx, row in df_filtered.reset_index(drop=True).iterrows():
-            node_a = str(row.get("ME", "")).strip()
-            node_b = str(row.get("Target ME", "")).strip()
-            begin_t = row.get("Begin Time", pd.NaT)
-            end_t = row.get("End Time", pd.NaT)
-
-            # ข้ามแถวที่ไม่มี node ใด node หนึ่ง
-            if not node_a or not node_b or pd.isna(begin_t) or pd.isna(end_t):
-                print(f"Row {idx}: ⚠️ Missing fields → ME='{node_a}', Target='{node_b}', Begin='{begin_t}', End='{end_t}' → Treat as FLAPPING")
-                result_rows.append(row)
-                continue
-
-            # หา FM ที่คู่โหนดตรง (สลับได้)
-            fm_pair_mask = (
-                ((fm_valid["fm_node1"] == node_a) & (fm_valid["fm_node2"] == node_b)) |
-                ((fm_valid["fm_node1"] == node_b) & (fm_valid["fm_node2"] == node_a))
-            )
-            fm_candidates = fm_valid[fm_pair_mask]
-
-           
-            # ไม่เจอคู่โหนดเลย → FLAPPING
-            if fm_candidates.empty:
-                print(
-                    f"Row {idx}: ME={node_a}, Target={node_b}\n"
-                    f"       No match in FM for link pair ({node_a} ↔ {node_b})\n"
-                    f"       Optical Time: {begin_t} → {end_t}\n"
-                    f"       → FLAPPING ✅ (no FM link found)"
-                )
-                result_rows.append(row)
-                continue
-
-            # มีคู่โหนดใน FM → ตรวจเวลา overlap (มีสักอัน overlap = MATCHED)
-            any_overlap = False
-            multi_logs = []
-            for j, fm_r in fm_candidates.iterrows():
-                fm_a, fm_b = fm_r["fm_node1"], fm_r["fm_node2"]
-                occ_t = fm_r.get("Occurrence Time", pd.NaT)
-                clr_t = fm_r.get("Clear Time", pd.NaT)
-
-                overlap = (
-                    pd.notna(occ_t)
-                    and pd.notna(clr_t)
-                    and (occ_t <= end_t)
-                    and (clr_t >= begin_t)
-                )
-                any_overlap = any_overlap or overlap
-
-                # เก็บ log ต่อรายการ
-                multi_logs.append(
-                    f"           FM Link: {fm_a}-{fm_b}, FM Time: {occ_t} → {clr_t} "
-                    f"({'Overlap ✅' if overlap else 'No overlap'})"
-                )
-
-            # ✅ พิมพ์เฉพาะกรณี FLAPPING เท่านั้น
-            if not any_overlap:
-                if len(multi_logs) == 1:
-                    header = (
-                        f"Row {idx}: ME={node_a}, Target={node_b}\n"
-                        f"       Found match in FM → Link: {fm_candidates.iloc[0]['fm_node1']}-{fm_candidates.iloc[0]['fm_node2']}\n"
-                        f"       Optical Time: {begin_t} → {end_t}\n"
-                    )
-                    print(header + multi_logs[0] + f"\n       Time overlap: False  → FLAPPING ✅")
-                else:
-                    print(
-                        f"Row {idx}: ME={node_a}, Target={node_b}\n"
-                        f"       Found multiple FM matches:\n" +
-                        "\n".join(multi_logs) + "\n" +
-                        f"       Optical Time: {begin_t} → {end_t}\n"
-                        f"       Overall Result → FLAPPING ✅"
-                    )
-
-                # เก็บเข้า result ถ้า 'ไม่ overlap ทั้งหมด' = FLAPPING
-                result_rows.append(row)
-
-        return pd.DataFrame(result_rows)
-
     # -------------------- View Preparation --------------------
     @staticmethod
     def prepare_view(df_nomatch: pd.DataFrame) -> pd.DataFrame:
@@ -275,8 +471,21 @@ class FiberflappingAnalyzer:
             df_view.loc[:, num_cols] = df_view[num_cols].apply(pd.to_numeric, errors="coerce")
         return df_view
 
+    @staticmethod
+    def _table_style(df_view: pd.DataFrame, threshold: float) -> TableStyle:
+        """แดงเฉพาะ "Max - Min (dB)" ที่เกิน threshold + ทศนิยม 2 ตำแหน่ง"""
+        return TableStyle(
+            [MaskLayer(RED_CELL, numeric(df_view, "Max - Min (dB)") > threshold, ["Max - Min (dB)"])],
+            {
+                "Max Value of Input Optical Power(dBm)": "{:.2f}",
+                "Min Value of Input Optical Power(dBm)": "{:.2f}",
+                "Max - Min (dB)": "{:.2f}",
+            },
+        )
+
     # -------------------- Rendering --------------------
-    def render(self, df_nomatch: pd.DataFrame) -> None:
+    def render(self, df_nomatch: pd.DataFrame, threshold: float | None = None) -> None:
+        threshold = self.threshold if threshold is None else threshold
         st.markdown("### OSC Power Flapping (No Alarm Match)")
 
         if df_nomatch.empty:
@@ -297,48 +506,31 @@ class FiberflappingAnalyzer:
         df_view = self.prepare_view(df_nomatch_filtered)
 
         # Highlight เฉพาะคอลัมน์ "Max - Min (dB)" > threshold
-        if "Max - Min (dB)" in df_view.columns:
-            styled_df = (
-                df_view.style
-                .apply(
-                    lambda _:
-                        ['background-color:#ff4d4d; color:white' if (v > self.threshold) else ''
-                         for v in df_view["Max - Min (dB)"]],
-                    subset=["Max - Min (dB)"]
-                )
-                .format({
-                    "Max Value of Input Optical Power(dBm)": "{:.2f}",
-                    "Min Value of Input Optical Power(dBm)": "{:.2f}",
-                    "Max - Min (dB)": "{:.2f}",
-                })
-            )
-            st.write(styled_df)
-        else:
-            st.dataframe(df_view, use_container_width=True)
+        paged_table(df_view, key="flapping_main", style=self._table_style(df_view, threshold))
         
         # คืนค่า view
         return df_view
 
     # -------------------- Weekly KPI (7-Day Summary) --------------------
-    def render_weekly_summary(self, df_nomatch: pd.DataFrame) -> None:
+    def render_weekly_summary(self, df_nomatch: pd.DataFrame, threshold: float | None = None) -> None:
         """Summary KPI: Flapping sites per day (7-day view with drill-down + graph at the end)"""
+        threshold = self.threshold if threshold is None else threshold
         if df_nomatch.empty:
             st.success("No unmatched fiber flapping records in past 7 days")
             return
 
-        df_nomatch = df_nomatch.copy()
-        df_nomatch["Date"] = pd.to_datetime(df_nomatch["Begin Time"]).dt.date
+        daily = DailyFlapping(df_nomatch)
+        if not daily.days:
+            st.success("No unmatched fiber flapping records in past 7 days")
+            return
 
         # หาช่วงวัน start → end
-        start_date = df_nomatch["Date"].min()
-        end_date   = df_nomatch["Date"].max()
+        start_date = daily.days[0]
+        end_date   = daily.days[-1]
         st.markdown(f"### Fiber Flapping Summary (Past 7 Days: {start_date} → {end_date})")
 
         # นับจำนวน site ต่อวัน
-        daily_counts = (
-            df_nomatch.groupby("Date")["ME"].nunique().reset_index()
-            .rename(columns={"ME": "Sites"})
-        )
+        daily_counts = daily.site_counts
 
         # เก็บวันที่เลือก
         if "selected_day" not in st.session_state:
@@ -346,9 +538,7 @@ class FiberflappingAnalyzer:
 
         # การ์ดรายวัน
         cols = st.columns(len(daily_counts))
-        for i, row in daily_counts.iterrows():
-            day = row["Date"]
-            count = row["Sites"]
+        for i, (day, count) in enumerate(zip(daily_counts["Date"], daily_counts["Sites"])):
             with cols[i]:
                 st.metric(label=str(day), value=f"{count} sites")
                 if st.button("Show Details", key=f"btn_{day}"):
@@ -357,28 +547,15 @@ class FiberflappingAnalyzer:
         # Drill-down ตาราง
         if st.session_state["selected_day"]:
             sel_day = st.session_state["selected_day"]
-            sel = df_nomatch[df_nomatch["Date"] == sel_day]
+            sel = daily.rows(sel_day)
 
-           
             st.markdown(f"#### Details for {sel_day}")
 
-            # 🔹 สรุปจำนวน flapping ต่อ Site Name (แบบใหม่)
-            if not sel.empty and "Site Name" in sel.columns and "ME" in sel.columns and "Measure Object" in sel.columns:
-                # ดึง Target ME จาก Measure Object (ใช้ regex ดึงในกรณีที่ยังไม่มี Target ME)
-                sel["Target ME"] = sel["Measure Object"].apply(
-                    lambda x: re.search(r"\(([^)]+)\)", str(x)).group(1) if pd.notna(x) and re.search(r"\(([^)]+)\)", str(x)) else None
-                )
-                summary_rows = []
-                for site, group in sel.groupby("Site Name"):
-                    # สร้างชุด link ไม่ซ้ำ (ME + Target ME)
-                    link_pairs = group[["ME", "Target ME"]].drop_duplicates()
-                    n_links = len(link_pairs)
-                    n_times = len(group)
-                    summary_rows.append(f"{site} ({n_links} link{'s' if n_links > 1 else ''} {n_times} time{'s' if n_times > 1 else ''})")
-
-                counts_str = " ".join(summary_rows)
+            # 🔹 สรุปจำนวน flapping ต่อ Site Name (คำนวณไว้แล้วทุกวันใน DailyFlapping)
+            counts_str = daily.site_summary(sel_day)
+            if counts_str:
                 st.markdown(counts_str)
-                
+
             if sel.empty:
                 st.info("No flapping records on this day")
             else:
@@ -392,24 +569,7 @@ class FiberflappingAnalyzer:
                 sel = sel[view_cols]
 
                 # ✅ ทำ highlight คอลัมน์ Max - Min (dB)
-                if "Max - Min (dB)" in sel.columns:
-                    styled_sel = (
-                        sel.style
-                        .apply(
-                            lambda _:
-                                ['background-color:#ff4d4d; color:white' if (v > self.threshold) else ''
-                                 for v in sel["Max - Min (dB)"]],
-                            subset=["Max - Min (dB)"]
-                        )
-                        .format({
-                            "Max Value of Input Optical Power(dBm)": "{:.2f}",
-                            "Min Value of Input Optical Power(dBm)": "{:.2f}",
-                            "Max - Min (dB)": "{:.2f}",
-                        })
-                    )
-                    st.write(styled_sel)
-                else:
-                    st.dataframe(sel, use_container_width=True)
+                paged_table(sel, key=f"flapping_day_{sel_day}", style=self._table_style(sel, threshold))
                     
 
         # 📊 กราฟรวม (ท้ายสุด)
@@ -443,35 +603,40 @@ class FiberflappingAnalyzer:
             out.loc[:, num_cols] = out[num_cols].apply(pd.to_numeric, errors="coerce").round(2)
         return out
 
-    def build_daily_tables(self, df_nomatch: pd.DataFrame) -> "OrderedDict[str, pd.DataFrame]":
+    def build_daily_tables(self, df_nomatch: pd.DataFrame) -> DailyTables:
         """
-        สร้าง dict รายวัน -> DataFrame (คอลัมน์เหมือน drill-down) สำหรับ export
+        สร้าง mapping รายวัน -> DataFrame (คอลัมน์เหมือน drill-down) สำหรับ export
         เช่น {"2025-06-17": df_table, "2025-06-18": df_table, ...}
+        ตารางของแต่ละวันถูกสร้างตอนอ่านครั้งแรก (DailyTables)
         """
-        if df_nomatch.empty:
-            self.daily_tables = OrderedDict()
-            return self.daily_tables
+        self.daily_tables = DailyFlapping(df_nomatch).tables()
+        return self.daily_tables
+
+    # -------------------- Threshold sweep --------------------
+    @staticmethod
+    def min_sweep_threshold() -> float:
+        """threshold ต่ำสุดที่ sweep / slider เลือกได้ = cutoff ที่ excel_loader ใช้ตัดแถว OSC ตอนโหลด"""
+        return osc_load_threshold()
 
-        df = df_nomatch.copy()
-        df["Date"] = pd.to_datetime(df["Begin Time"]).dt.date
+    def sweep(self) -> FlappingSweep:
+        """normalize + FM match ครั้งเดียว แล้วใช้ซ้ำได้กับทุก threshold ตั้งแต่ min_sweep_threshold()
 
-        tables = OrderedDict()
-        for day, g in df.sort_values("Begin Time").groupby("Date", sort=True):
-            tables[str(day)] = self._select_view_columns(g)
-        self.daily_tables = tables
-        return tables
+        (แถวที่ต่ำกว่า cutoff ตอนโหลดถูกตัดไปแล้ว จึงเลือก threshold ต่ำกว่านั้นไม่ได้)
+        """
+        if self._sweep is None:
+            df_optical_norm = self.normalize_optical()
+            df_fm_norm, _ = self.normalize_fm()
+            self._sweep = FlappingSweep(
+                df_optical_norm, df_fm_norm,
+                min_threshold=min(self.min_sweep_threshold(), self.threshold),
+                alarm_index=self.alarm_index,
+            )
+        return self._sweep
 
     # -------------------- Orchestration --------------------
     def process(self) -> None:
-        # 1) เตรียมข้อมูล
-        df_optical_norm = self.normalize_optical()
-        df_fm_norm, link_col = self.normalize_fm()
-
-        # 2) กรองตาม threshold
-        df_filtered = self.filter_optical_by_threshold(df_optical_norm)
-
-        # 3) หา no-match (ด้วย logic ใหม่)
-        df_nomatch = self.find_nomatch(df_filtered, df_fm_norm, link_col)
+        # 1-3) normalize + กรองตาม threshold + หา no-match (FM match รอบเดียว ใช้ซ้ำได้ทุก threshold)
+        df_nomatch = self.sweep().at(self.threshold)
 
         # 4) ตารางหลัก
         self.render(df_nomatch)
@@ -483,15 +648,8 @@ class FiberflappingAnalyzer:
         """
         เตรียมข้อมูลสำหรับ Summary/PDF (ไม่ render UI)
         """
-        # 1) เตรียมข้อมูล
-        df_optical_norm = self.normalize_optical()
-        df_fm_norm, link_col = self.normalize_fm()
-
-        # 2) กรองตาม threshold
-        df_filtered = self.filter_optical_by_threshold(df_optical_norm)
-
-        # 3) หา no-match (ด้วย logic ใหม่)
-        df_nomatch = self.find_nomatch(df_filtered, df_fm_norm, link_col)
+        # 1-3) normalize + กรองตาม threshold + หา no-match
+        df_nomatch = self.sweep().at(self.threshold)
 
         # 4) สร้าง abnormal tables
         if not df_nomatch.empty:
@@ -1,11 +1,31 @@
 # line_analyzer.py
 import re
+import numpy as np
 import pandas as pd
 import streamlit as st
 from utils.filters import cascading_filter
+from utils.schema import apply_schema
+from utils import lazy
+from utils.chart_data import downsample
+from utils.paged_table import paged_table
+from utils.styling import BLUE_CELL, GRAY_ROW, RED_CELL, MaskLayer, TableStyle, numeric, out_of_range, startswith
 import plotly.express as px
 import plotly.graph_objects as go
 
+COL_BER = "Instant BER After FEC"
+
+
+def normalize_call_ids(call_ids: pd.Series) -> pd.Series:
+    """Call ID → str.strip().str.lstrip("0") ทำกับค่าไม่ซ้ำเท่านั้น แล้วคืนเป็น category
+    (เรียกซ้ำกับผลที่ normalize แล้วได้ค่าเดิม — ทำงานแค่กับ categories)"""
+    cat = call_ids if isinstance(call_ids.dtype, pd.CategoricalDtype) else call_ids.astype("category")
+    norm = cat.cat.categories.astype(str).str.strip().str.lstrip("0")
+    remap, uniques = pd.factorize(norm, sort=True)   # "012" กับ "12" รวมเป็นค่าเดียว
+    codes = cat.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, remap[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=call_ids.index, name=call_ids.name)
+
+
 class Line_Analyzer:
     """
     ย้าย logic เดิมมารวมในคลาสเดียว:
@@ -84,15 +104,10 @@ class Line_Analyzer:
         self.df_abnormal_by_type = {}
 
     # ---------- Utilities ----------
-    @staticmethod
-    def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-        df.columns = (
-            df.columns.astype(str)
-            .str.replace(r'\s+', ' ', regex=True)
-            .str.replace('\u00a0', ' ')
-            .str.strip()
-        )
-        return df
+    def _apply_schema(self) -> None:
+        """normalize + cast (ข้อมูลจาก ingest ผ่าน schema มาแล้ว → ไม่ทำซ้ำ) / ref: Threshold + threshold in/out เป็น float64"""
+        self.df_line = apply_schema("line", self.df_line)
+        self.df_ref  = apply_schema("line_ref", self.df_ref)
 
     def _check_required(self) -> None:
         required_cols = {
@@ -113,6 +128,9 @@ class Line_Analyzer:
             + self.df_line["Measure Object"].astype(str).str.strip()
         )
         self.df_ref["Mapping"] = self.df_ref["Mapping"].astype(str).str.strip()
+        # normalize Call ID ที่ reference (ไม่กี่พันแถว) → แถวที่ merge แล้วได้ category ไปเลย
+        if "Call ID" in self.df_ref.columns:
+            self.df_ref["Call ID"] = normalize_call_ids(self.df_ref["Call ID"])
 
         # เลือกคอลัมน์จาก ref ที่ใช้จริง
         cols_ref = [
@@ -130,117 +148,67 @@ class Line_Analyzer:
         return df_merged
 
     def _apply_preset_route(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Route = "Preset N" เมื่อ Call ID อยู่ใน pmap (map ต่อ Call ID ไม่ซ้ำ ไม่ใช่ต่อแถว)"""
         df = df.copy()  # สร้าง copy เพื่อป้องกัน SettingWithCopyWarning
-        df["Call ID"] = df["Call ID"].astype(str).str.strip().str.lstrip("0")
-        df["Route"]   = df.apply(
-            lambda r: f"Preset {self.pmap[r['Call ID']]}" if r["Call ID"] in self.pmap else r["Route"],
-            axis=1
-        )
+        call_ids = normalize_call_ids(df["Call ID"])
+        df["Call ID"] = call_ids
+        if not self.pmap or df.empty:
+            return df
+
+        # label ต่อ category แล้วกระจายด้วย codes (ไม่อยู่ใน pmap → ใช้ Route เดิม)
+        labels = call_ids.cat.categories.map(
+            {cid: f"Preset {preset}" for cid, preset in self.pmap.items()}
+        ).to_numpy(dtype=object)
+        codes = call_ids.cat.codes.to_numpy()
+        preset = np.append(labels, None)[codes]   # code -1 (NaN) → None
+        hit = pd.notna(preset)
+        if hit.any():
+            df["Route"] = np.where(hit, preset, df["Route"].to_numpy(dtype=object))
         return df
 
-    @staticmethod
-    def _row_has_issue(r: pd.Series,
-                       col_ber: str,
-                       col_out: str, col_max_out: str, col_min_out: str,
-                       col_in: str,  col_max_in: str,  col_min_in: str) -> bool:
-        def _num(x):
-            try:
-                return float(x)
-            except Exception:
-                return float("nan")
-
-        ber = _num(r.get(col_ber))
-        vout, hi_out, lo_out = _num(r.get(col_out)), _num(r.get(col_max_out)), _num(r.get(col_min_out))
-        vin,  hi_in,  lo_in  = _num(r.get(col_in)),  _num(r.get(col_max_in)),  _num(r.get(col_min_in))
-
-        return (
-            (pd.notna(ber) and ber > 0) or
-            (pd.notna(vout) and pd.notna(hi_out) and pd.notna(lo_out) and (vout > hi_out or vout < lo_out)) or
-            (pd.notna(vin)  and pd.notna(hi_in)  and pd.notna(lo_in)  and (vin  > hi_in  or vin  < lo_in))
-        )
-
-    def _style_dataframe(self, df_view: pd.DataFrame) -> pd.io.formats.style.Styler:
-        col_ber = "Instant BER After FEC"
-
-        # ✅ บังคับคอลัมน์ตัวเลขทั้งหมดให้เป็น float (กัน error format 'E')
-        num_cols = [col_ber, self.col_out, self.col_in,
-                    self.col_max_out, self.col_min_out, self.col_max_in, self.col_min_in]
-        for c in num_cols:
-            if c in df_view.columns:
-                df_view[c] = pd.to_numeric(df_view[c], errors="coerce")
-        
-        # ✅ Threshold แยกต่างหาก - เก็บ None ไว้
-        if "Threshold" in df_view.columns:
-            # แปลงเฉพาะค่าที่ไม่ใช่ None/NaN
-            df_view["Threshold"] = df_view["Threshold"].apply(
-                lambda x: pd.to_numeric(x, errors="coerce") if pd.notna(x) and str(x).strip() != "" else x
-            )
-
-        def _has_issue_row(r):
-            return self._row_has_issue(
-                r,
-                col_ber,
-                self.col_out, self.col_max_out, self.col_min_out,
-                self.col_in,  self.col_max_in,  self.col_min_in
-            )
-
-        styled = (
-            df_view.style
-            # 🌑 ไฮไลต์ gray ถ้ามีปัญหา
-            .apply(lambda r: [
-                'background-color:#e6e6e6; color:black' if _has_issue_row(r) else ''
-                for _ in r
-            ], axis=1)
-
-            # 🔴 ไฮไลต์ BER abnormal (รวม None แต่ต้องมี Threshold)
-            .apply(lambda _: [
-                'background-color:#ff4d4d; color:white'
-                if (pd.notna(t) and (pd.isna(v) or (pd.notna(v) and v > 0))) else ''
-                for v, t in zip(df_view[col_ber], df_view.get("Threshold", []))
-            ], subset=[col_ber] if col_ber in df_view.columns else [])
-
-            # 🔴 ไฮไลต์ Output abnormal
-            .apply(lambda _: [
-                'background-color:#ff4d4d; color:white'
-                if (pd.notna(v) and pd.notna(hi) and pd.notna(lo) and (v > hi or v < lo)) else ''
-                for v, hi, lo in zip(
-                    df_view.get(self.col_out, []),
-                    df_view.get(self.col_max_out, []),
-                    df_view.get(self.col_min_out, []),
-                )
-            ], subset=[self.col_out] if self.col_out in df_view.columns else [])
-
-            # 🔴 ไฮไลต์ Input abnormal
-            .apply(lambda _: [
-                'background-color:#ff4d4d; color:white'
-                if (pd.notna(v) and pd.notna(hi) and pd.notna(lo) and (v > hi or v < lo)) else ''
-                for v, hi, lo in zip(
-                    df_view.get(self.col_in, []),
-                    df_view.get(self.col_max_in, []),
-                    df_view.get(self.col_min_in, []),
-                )
-            ], subset=[self.col_in] if self.col_in in df_view.columns else [])
-
-            # 🔵 ไฮไลต์ Route ที่เป็น Preset
-            .apply(lambda _: [
-                'background-color:lightblue; color:black'
-                if str(x).startswith("Preset") else ''
-                for x in df_view.get("Route", [])
-            ], subset=["Route"] if "Route" in df_view.columns else [])
+    def abnormal_cell_masks(self, df: pd.DataFrame) -> dict:
+        """{คอลัมน์: mask} เซลล์ที่ต้องเป็นสีแดง (ทั้งตารางในครั้งเดียว)
+        - BER: มี Threshold และ BER เป็น None หรือ > 0
+        - Output / Input: อยู่นอก [Minimum, Maximum threshold]
+        """
+        ber = numeric(df, COL_BER)
+        has_thr = df["Threshold"].notna().to_numpy() if "Threshold" in df.columns else np.ones(len(df), dtype=bool)
+        return {
+            COL_BER: has_thr & (np.isnan(ber) | (ber > 0)),
+            self.col_out: out_of_range(numeric(df, self.col_out), numeric(df, self.col_min_out), numeric(df, self.col_max_out)),
+            self.col_in: out_of_range(numeric(df, self.col_in), numeric(df, self.col_min_in), numeric(df, self.col_max_in)),
+        }
 
+    def _issue_mask(self, df: pd.DataFrame, cells: dict | None = None):
+        """แถวที่มีปัญหา: BER > 0 หรือ Output / Input ผิด threshold (BER ว่างไม่นับ)"""
+        cells = self.abnormal_cell_masks(df) if cells is None else cells
+        return (numeric(df, COL_BER) > 0) | cells[self.col_out] | cells[self.col_in]
+
+    def _table_style(self, df_view: pd.DataFrame) -> TableStyle:
+        """ไฮไลต์ + format ของทั้งตาราง (BER / Threshold / power เป็น float จาก schema แล้ว format 'E' ได้เลย)"""
+        cells = self.abnormal_cell_masks(df_view)
+        return TableStyle(
+            [
+                # 🌑 ไฮไลต์ gray ถ้ามีปัญหา
+                MaskLayer(GRAY_ROW, self._issue_mask(df_view, cells)),
+                # 🔴 ไฮไลต์ BER abnormal (รวม None แต่ต้องมี Threshold) / Output / Input abnormal
+                *[MaskLayer(RED_CELL, mask, [col]) for col, mask in cells.items()],
+                # 🔵 ไฮไลต์ Route ที่เป็น Preset
+                MaskLayer(BLUE_CELL, startswith(df_view, "Route", "Preset"), ["Route"]),
+            ],
             # ✅ กำหนดรูปแบบการแสดงผล
-            .format({
-                self.col_out: "{:.4f}", 
+            {
+                self.col_out: "{:.4f}",
                 self.col_in: "{:.4f}",
-                self.col_max_out: "{:.4f}", 
+                self.col_max_out: "{:.4f}",
                 self.col_min_out: "{:.4f}",
-                self.col_max_in: "{:.4f}",  
+                self.col_max_in: "{:.4f}",
                 self.col_min_in: "{:.4f}",
                 "Instant BER After FEC": "{:.2E}",   # 👈 ใช้ .2E ปลอดภัยชัวร์
                 "Threshold": "{:.2E}",               # 👈
-            }, na_rep="None")
+            },
+            na_rep="None",
         )
-        return styled
 
 
 
@@ -256,11 +224,8 @@ class Line_Analyzer:
         if not set(key_cols).issubset(df.columns):
             return df.copy()
 
-        def _num(s):
-            return pd.to_numeric(s, errors="coerce")
-
         rows = []
-        for (site, me, cid), g in df.groupby(key_cols, dropna=False):
+        for (site, me, cid), g in df.groupby(key_cols, dropna=False, observed=True):
             g = g.copy()
             routes = g.get("Route", pd.Series([], dtype=object)).astype(str).tolist()
             route = next((r for r in routes if r.startswith("Preset")), routes[0] if routes else None)
@@ -271,17 +236,17 @@ class Line_Analyzer:
                   if "Measure Object" in g.columns and has_power.any()
                   else (g["Measure Object"].iloc[0] if "Measure Object" in g.columns and len(g) else None))
 
-            ber = _num(g.get("Instant BER After FEC", pd.Series(dtype=float))).dropna()
-            thr = _num(g.get("Threshold", pd.Series(dtype=float))).dropna()
+            ber = g.get("Instant BER After FEC", pd.Series(dtype=float)).dropna()
+            thr = g.get("Threshold", pd.Series(dtype=float)).dropna()
             ber_val = ber.iloc[0] if len(ber) else float("nan")
             thr_val = thr.iloc[0] if len(thr) else float("nan")
 
-            vin_vals    = _num(g.get(self.col_in, pd.Series(dtype=float))).dropna()
-            vout_vals   = _num(g.get(self.col_out, pd.Series(dtype=float))).dropna()
-            min_in_vals = _num(g.get(self.col_min_in, pd.Series(dtype=float))).dropna()
-            max_in_vals = _num(g.get(self.col_max_in, pd.Series(dtype=float))).dropna()
-            min_out_vals= _num(g.get(self.col_min_out, pd.Series(dtype=float))).dropna()
-            max_out_vals= _num(g.get(self.col_max_out, pd.Series(dtype=float))).dropna()
+            vin_vals    = g.get(self.col_in, pd.Series(dtype=float)).dropna()
+            vout_vals   = g.get(self.col_out, pd.Series(dtype=float)).dropna()
+            min_in_vals = g.get(self.col_min_in, pd.Series(dtype=float)).dropna()
+            max_in_vals = g.get(self.col_max_in, pd.Series(dtype=float)).dropna()
+            min_out_vals= g.get(self.col_min_out, pd.Series(dtype=float)).dropna()
+            max_out_vals= g.get(self.col_max_out, pd.Series(dtype=float)).dropna()
 
             vin   = vin_vals.iloc[0] if len(vin_vals) else float("nan")
             vout  = vout_vals.iloc[0] if len(vout_vals) else float("nan")
@@ -302,9 +267,8 @@ class Line_Analyzer:
 
     # ---------- MAIN PIPELINE ----------
     def process(self) -> None:
-        # 1) Normalize columns
-        self.df_line = self._normalize_columns(self.df_line)
-        self.df_ref  = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) ตรวจ required
         self._check_required()
@@ -338,36 +302,27 @@ class Line_Analyzer:
         )
         st.caption(f"Line Performance (showing {len(df_filtered)}/{len(df_result)} rows)")
 
-        # 7.5) แปลงคอลัมน์ตัวเลขเป็น numeric ก่อนแสดงผล
-        df_filtered = df_filtered.copy()
-        numeric_cols = ["Instant BER After FEC", "Threshold", 
-                        self.col_in, self.col_out, 
-                        self.col_min_in, self.col_max_in, 
-                        self.col_min_out, self.col_max_out]
-        for col in numeric_cols:
-            if col in df_filtered.columns:
-                df_filtered[col] = pd.to_numeric(df_filtered[col], errors="coerce")
-
         # 8) สไตล์/ไฮไลต์ (ตารางดิบเพื่อการตรวจละเอียด)
-        styled = self._style_dataframe(df_filtered.copy())
+        df_view = df_filtered.copy()
+        table_style = self._table_style(df_view)
 
-        # 9) แสดงผลตาราง
+        # 9) แสดงผลตาราง (ส่งไป browser เฉพาะหน้าที่แสดง)
         st.markdown("### Line Performance")
-        st.dataframe(styled, use_container_width=True)
+        paged_table(df_view, key="line_main", style=table_style)
 
         # 10) รวมระดับ "เส้น" เพื่อใช้คำนวณ/กราฟให้ถูกต้อง
         df_lines = self._collapse_by_line(df_filtered.copy())
 
         # 11) สรุปสถานะหัวเรื่องจากระดับ "เส้น"
         def _line_fail(row: pd.Series) -> bool:
-            ber = pd.to_numeric(pd.Series([row.get("Instant BER After FEC")]))[0]
-            thr = pd.to_numeric(pd.Series([row.get("Threshold")]))[0]
-            vin = pd.to_numeric(pd.Series([row.get(self.col_in)]))[0]
-            vout= pd.to_numeric(pd.Series([row.get(self.col_out)]))[0]
-            min_in  = pd.to_numeric(pd.Series([row.get(self.col_min_in)]))[0]
-            max_in  = pd.to_numeric(pd.Series([row.get(self.col_max_in)]))[0]
-            min_out = pd.to_numeric(pd.Series([row.get(self.col_min_out)]))[0]
-            max_out = pd.to_numeric(pd.Series([row.get(self.col_max_out)]))[0]
+            ber = row.get("Instant BER After FEC")
+            thr = row.get("Threshold")
+            vin = row.get(self.col_in)
+            vout= row.get(self.col_out)
+            min_in  = row.get(self.col_min_in)
+            max_in  = row.get(self.col_max_in)
+            min_out = row.get(self.col_min_out)
+            max_out = row.get(self.col_max_out)
 
             fail_ber  = (pd.notna(thr) and pd.notna(ber) and ber > thr) or (pd.isna(thr) and pd.notna(ber) and ber != 0)
             fail_in   = (pd.notna(vin) and pd.notna(min_in) and pd.notna(max_in) and not (min_in <= vin <= max_in))
@@ -403,20 +358,20 @@ class Line_Analyzer:
         """แสดง Problem Call IDs ใช้ข้อมูลจากตารางหลัก"""
         # BER abnormal - ใช้เงื่อนไขเดียวกับตารางหลัก: v > 0 หรือ None
         # แต่ต้องมี Threshold ด้วย
-        ber_val = pd.to_numeric(df_view.get("Instant BER After FEC", pd.Series()), errors="coerce")
-        thr_val = pd.to_numeric(df_view.get("Threshold", pd.Series()), errors="coerce")
+        ber_val = df_view["Instant BER After FEC"]
+        thr_val = df_view["Threshold"]
         mask_ber = ((ber_val > 0) | ber_val.isna()) & thr_val.notna()
         
         # Input abnormal - ใช้คอลัมน์เดียวกับตารางหลัก
-        vin = pd.to_numeric(df_view.get(self.col_in, pd.Series()), errors="coerce")
-        min_in = pd.to_numeric(df_view.get(self.col_min_in, pd.Series()), errors="coerce")
-        max_in = pd.to_numeric(df_view.get(self.col_max_in, pd.Series()), errors="coerce")
+        vin = df_view[self.col_in]
+        min_in = df_view[self.col_min_in]
+        max_in = df_view[self.col_max_in]
         mask_input = (vin.notna() & min_in.notna() & max_in.notna() & ((vin < min_in) | (vin > max_in)))
         
         # Output abnormal - ใช้คอลัมน์เดียวกับตารางหลัก
-        vout = pd.to_numeric(df_view.get(self.col_out, pd.Series()), errors="coerce")
-        min_out = pd.to_numeric(df_view.get(self.col_min_out, pd.Series()), errors="coerce")
-        max_out = pd.to_numeric(df_view.get(self.col_max_out, pd.Series()), errors="coerce")
+        vout = df_view[self.col_out]
+        min_out = df_view[self.col_min_out]
+        max_out = df_view[self.col_max_out]
         mask_output = (vout.notna() & min_out.notna() & max_out.notna() & ((vout < min_out) | (vout > max_out)))
         
         # รวมทุกเงื่อนไข
@@ -433,90 +388,23 @@ class Line_Analyzer:
         
         fail_rows = df_view[mask_any_abnormal][columns_to_show].copy()
         
-        # แปลงค่าเป็น numeric ก่อน format
-        if "Instant BER After FEC" in fail_rows.columns:
-            fail_rows["Instant BER After FEC"] = pd.to_numeric(fail_rows["Instant BER After FEC"], errors="coerce")
-        if "Threshold" in fail_rows.columns:
-            fail_rows["Threshold"] = pd.to_numeric(fail_rows["Threshold"], errors="coerce")
-        if self.col_in in fail_rows.columns:
-            fail_rows[self.col_in] = pd.to_numeric(fail_rows[self.col_in], errors="coerce")
-        if self.col_out in fail_rows.columns:
-            fail_rows[self.col_out] = pd.to_numeric(fail_rows[self.col_out], errors="coerce")
-        if self.col_min_in in fail_rows.columns:
-            fail_rows[self.col_min_in] = pd.to_numeric(fail_rows[self.col_min_in], errors="coerce")
-        if self.col_max_in in fail_rows.columns:
-            fail_rows[self.col_max_in] = pd.to_numeric(fail_rows[self.col_max_in], errors="coerce")
-        if self.col_min_out in fail_rows.columns:
-            fail_rows[self.col_min_out] = pd.to_numeric(fail_rows[self.col_min_out], errors="coerce")
-        if self.col_max_out in fail_rows.columns:
-            fail_rows[self.col_max_out] = pd.to_numeric(fail_rows[self.col_max_out], errors="coerce")
-        
         st.markdown(f"**Problem Call IDs (BER/Input/Output abnormal)** - Found {len(fail_rows)} rows")
         
         if not fail_rows.empty:
-
-            def highlight_line_row(row):
-                styles = [""] * len(row)
-                col_map = {c: i for i, c in enumerate(fail_rows.columns)}
-
-                # ✅ BER check - ใช้เงื่อนไขเดียวกับตารางหลัก: v > 0 หรือ None
-                # แต่ต้องมี Threshold ด้วย
-                try:
-                    ber = float(row["Instant BER After FEC"])
-                    thr = float(row.get("Threshold", 0))
-                    if pd.notna(thr) and (pd.isna(ber) or ber > 0):
-                        styles[col_map["Instant BER After FEC"]] = "background-color:#ff4d4d; color:white"
-                except (ValueError, TypeError):
-                    # ถ้าแปลงเป็น float ไม่ได้ (None, NaN) ให้แสดงสีแดง
-                    # แต่ต้องตรวจสอบ Threshold ด้วย
-                    try:
-                        thr = float(row.get("Threshold", 0))
-                        if pd.notna(thr):
-                            styles[col_map["Instant BER After FEC"]] = "background-color:#ff4d4d; color:white"
-                    except (ValueError, TypeError):
-                        pass
-
-                # ✅ Input check - ใช้คอลัมน์เดียวกับตารางหลัก
-                if self.col_in in row:
-                    try:
-                        v = float(row[self.col_in])
-                        lo = float(row[self.col_min_in])
-                        hi = float(row[self.col_max_in])
-                        if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                            styles[col_map[self.col_in]] = "background-color:#ff4d4d; color:white"
-                    except (ValueError, TypeError):
-                        pass
-
-                # ✅ Output check - ใช้คอลัมน์เดียวกับตารางหลัก
-                if self.col_out in row:
-                    try:
-                        v = float(row[self.col_out])
-                        lo = float(row[self.col_min_out])
-                        hi = float(row[self.col_max_out])
-                        if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                            styles[col_map[self.col_out]] = "background-color:#ff4d4d; color:white"
-                    except (ValueError, TypeError):
-                        pass
-
-                return styles
-           
             fail_rows = fail_rows.reset_index(drop=True)
 
-            styled = (
-                fail_rows.style
-                .apply(highlight_line_row, axis=1)
-                .format({
-                    "Threshold": "{:.2E}",
-                    "Instant BER After FEC": "{:.2E}",
-                    self.col_in: "{:.4f}",
-                    self.col_out: "{:.4f}",
-                    self.col_min_in: "{:.4f}",
-                    self.col_max_in: "{:.4f}",
-                    self.col_min_out: "{:.4f}",
-                    self.col_max_out: "{:.4f}"
-                }, na_rep="-")
-            )
-            st.dataframe(styled, use_container_width=True)
+            layers = [MaskLayer(RED_CELL, mask, [col]) for col, mask in self.abnormal_cell_masks(fail_rows).items()]
+            formats = {
+                "Threshold": "{:.2E}",
+                "Instant BER After FEC": "{:.2E}",
+                self.col_in: "{:.4f}",
+                self.col_out: "{:.4f}",
+                self.col_min_in: "{:.4f}",
+                self.col_max_in: "{:.4f}",
+                self.col_min_out: "{:.4f}",
+                self.col_max_out: "{:.4f}"
+            }
+            paged_table(fail_rows, key="line_problem_ids", style=TableStyle(layers, formats, na_rep="-"))
 
         # ---------- VISUALS (KPI, Donut, Line Chart, Preset) ----------
     def _render_summary_kpi(self, df_view: pd.DataFrame) -> None:
@@ -524,8 +412,8 @@ class Line_Analyzer:
         st.markdown("### Summary KPI")
 
         # --- BER ---
-        ber = pd.to_numeric(df_view["Instant BER After FEC"].astype(str), errors="coerce").astype(float)
-        thr = pd.to_numeric(df_view["Threshold"].astype(str), errors="coerce").astype(float)
+        ber = df_view["Instant BER After FEC"]
+        thr = df_view["Threshold"]
 
         ok = (
             ((thr > 0) & (ber <= thr)) |
@@ -536,9 +424,9 @@ class Line_Analyzer:
         fail_ber_cnt = total_ber - ok_ber_cnt
 
         # --- Input ---
-        vin = pd.to_numeric(df_view.get(self.col_in), errors="coerce")
-        min_in = pd.to_numeric(df_view.get(self.col_min_in), errors="coerce")
-        max_in = pd.to_numeric(df_view.get(self.col_max_in), errors="coerce")
+        vin = df_view[self.col_in]
+        min_in = df_view[self.col_min_in]
+        max_in = df_view[self.col_max_in]
 
         total_in = len(df_view)
         ok_in = (vin >= min_in) & (vin <= max_in)
@@ -546,9 +434,9 @@ class Line_Analyzer:
         fail_in_cnt = total_in - ok_in_cnt
 
         # --- Output ---
-        vout = pd.to_numeric(df_view.get(self.col_out), errors="coerce")
-        min_out = pd.to_numeric(df_view.get(self.col_min_out), errors="coerce")
-        max_out = pd.to_numeric(df_view.get(self.col_max_out), errors="coerce")
+        vout = df_view[self.col_out]
+        min_out = df_view[self.col_min_out]
+        max_out = df_view[self.col_max_out]
 
         total_out = len(df_view)
         ok_out = (vout >= min_out) & (vout <= max_out)
@@ -582,14 +470,14 @@ class Line_Analyzer:
                 preset_used = int(preset_rows["PresetNo"].nunique())
                 
                 # คำนวณ abnormal status ต่อแถว
-                p_ber = pd.to_numeric(preset_rows.get("Instant BER After FEC"), errors="coerce")
-                p_thr = pd.to_numeric(preset_rows.get("Threshold"), errors="coerce")
-                p_vin = pd.to_numeric(preset_rows.get(self.col_in), errors="coerce")
-                p_min_in = pd.to_numeric(preset_rows.get(self.col_min_in), errors="coerce")
-                p_max_in = pd.to_numeric(preset_rows.get(self.col_max_in), errors="coerce")
-                p_vout = pd.to_numeric(preset_rows.get(self.col_out), errors="coerce")
-                p_min_out = pd.to_numeric(preset_rows.get(self.col_min_out), errors="coerce")
-                p_max_out = pd.to_numeric(preset_rows.get(self.col_max_out), errors="coerce")
+                p_ber = preset_rows["Instant BER After FEC"]
+                p_thr = preset_rows["Threshold"]
+                p_vin = preset_rows[self.col_in]
+                p_min_in = preset_rows[self.col_min_in]
+                p_max_in = preset_rows[self.col_max_in]
+                p_vout = preset_rows[self.col_out]
+                p_min_out = preset_rows[self.col_min_out]
+                p_max_out = preset_rows[self.col_max_out]
 
                 p_fail_ber = (p_ber > p_thr)
                 p_fail_in = (p_vin < p_min_in) | (p_vin > p_max_in)
@@ -614,8 +502,8 @@ class Line_Analyzer:
         if "Instant BER After FEC" not in df_view.columns:
             return
 
-        ber = pd.to_numeric(df_view["Instant BER After FEC"].astype(str), errors="coerce")
-        thr = pd.to_numeric(df_view.get("Threshold", pd.Series()), errors="coerce")
+        ber = df_view["Instant BER After FEC"]
+        thr = df_view["Threshold"]
         measured = ber.notna()
         
         # ใช้เงื่อนไขเดียวกับตารางหลัก: ber > 0 หรือ None = Fail, ber <= 0 = OK
@@ -655,20 +543,20 @@ class Line_Analyzer:
     def _render_abnormal_line_data(self, df_view: pd.DataFrame) -> None:
         """แสดงข้อมูล abnormal ที่มีปัญหา (สีแดง) สำหรับ Line Board Performance"""
         # ใช้เงื่อนไขเดียวกับตารางหลัก: BER + Input + Output abnormal
-        ber_val = pd.to_numeric(df_view.get("Instant BER After FEC", pd.Series()), errors="coerce")
-        thr_val = pd.to_numeric(df_view.get("Threshold", pd.Series()), errors="coerce")
+        ber_val = df_view["Instant BER After FEC"]
+        thr_val = df_view["Threshold"]
         mask_ber = ((ber_val > 0) | ber_val.isna()) & thr_val.notna()
         
         # Input abnormal
-        vin = pd.to_numeric(df_view.get(self.col_in, pd.Series()), errors="coerce")
-        min_in = pd.to_numeric(df_view.get(self.col_min_in, pd.Series()), errors="coerce")
-        max_in = pd.to_numeric(df_view.get(self.col_max_in, pd.Series()), errors="coerce")
+        vin = df_view[self.col_in]
+        min_in = df_view[self.col_min_in]
+        max_in = df_view[self.col_max_in]
         mask_input = (vin.notna() & min_in.notna() & max_in.notna() & ((vin < min_in) | (vin > max_in)))
         
         # Output abnormal
-        vout = pd.to_numeric(df_view.get(self.col_out, pd.Series()), errors="coerce")
-        min_out = pd.to_numeric(df_view.get(self.col_min_out, pd.Series()), errors="coerce")
-        max_out = pd.to_numeric(df_view.get(self.col_max_out, pd.Series()), errors="coerce")
+        vout = df_view[self.col_out]
+        min_out = df_view[self.col_min_out]
+        max_out = df_view[self.col_max_out]
         mask_output = (vout.notna() & min_out.notna() & max_out.notna() & ((vout < min_out) | (vout > max_out)))
         
         # รวมทุกเงื่อนไข abnormal
@@ -685,75 +573,23 @@ class Line_Analyzer:
         
         fail_rows = df_view[mask_any_abnormal][columns_to_show].copy()
         
-        # แปลงค่าเป็น numeric ก่อน format
-        numeric_cols = ["Instant BER After FEC", "Threshold", self.col_in, self.col_out, 
-                       self.col_min_in, self.col_max_in, self.col_min_out, self.col_max_out]
-        for col in numeric_cols:
-            if col in fail_rows.columns:
-                fail_rows[col] = pd.to_numeric(fail_rows[col], errors="coerce")
-        
         st.markdown(f"**Problem Call IDs (BER/Input/Output abnormal)** - Found {len(fail_rows)} rows")
         
         if not fail_rows.empty:
-            def highlight_abnormal_row(row):
-                styles = [""] * len(row)
-                col_map = {c: i for i, c in enumerate(fail_rows.columns)}
-                
-                # BER check
-                try:
-                    ber = float(row.get("Instant BER After FEC", 0))
-                    thr = float(row.get("Threshold", 0))
-                    if pd.notna(thr) and (pd.isna(ber) or ber > 0):
-                        styles[col_map["Instant BER After FEC"]] = "background-color:#ff4d4d; color:white"
-                except (ValueError, TypeError):
-                    try:
-                        thr = float(row.get("Threshold", 0))
-                        if pd.notna(thr):
-                            styles[col_map["Instant BER After FEC"]] = "background-color:#ff4d4d; color:white"
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Input check
-                if self.col_in in row:
-                    try:
-                        v = float(row[self.col_in])
-                        lo = float(row[self.col_min_in])
-                        hi = float(row[self.col_max_in])
-                        if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                            styles[col_map[self.col_in]] = "background-color:#ff4d4d; color:white"
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Output check
-                if self.col_out in row:
-                    try:
-                        v = float(row[self.col_out])
-                        lo = float(row[self.col_min_out])
-                        hi = float(row[self.col_max_out])
-                        if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                            styles[col_map[self.col_out]] = "background-color:#ff4d4d; color:white"
-                    except (ValueError, TypeError):
-                        pass
-                
-                return styles
-            
             fail_rows = fail_rows.reset_index(drop=True)
             
-            styled = (
-                fail_rows.style
-                .apply(highlight_abnormal_row, axis=1)
-                .format({
-                    "Threshold": "{:.2E}",
-                    "Instant BER After FEC": "{:.2E}",
-                    self.col_in: "{:.4f}",
-                    self.col_out: "{:.4f}",
-                    self.col_min_in: "{:.4f}",
-                    self.col_max_in: "{:.4f}",
-                    self.col_min_out: "{:.4f}",
-                    self.col_max_out: "{:.4f}"
-                }, na_rep="-")
-            )
-            st.dataframe(styled, use_container_width=True)
+            layers = [MaskLayer(RED_CELL, mask, [col]) for col, mask in self.abnormal_cell_masks(fail_rows).items()]
+            formats = {
+                "Threshold": "{:.2E}",
+                "Instant BER After FEC": "{:.2E}",
+                self.col_in: "{:.4f}",
+                self.col_out: "{:.4f}",
+                self.col_min_in: "{:.4f}",
+                self.col_max_in: "{:.4f}",
+                self.col_min_out: "{:.4f}",
+                self.col_max_out: "{:.4f}"
+            }
+            paged_table(fail_rows, key="line_abnormal", style=TableStyle(layers, formats, na_rep="-"))
         else:
             st.success("✅ All Line Board data is within normal parameters.")
 
@@ -767,8 +603,8 @@ class Line_Analyzer:
                 return
 
             # ---------- ใช้เฉพาะแถวที่มีค่า I/O จริง (กันแถว BER-only ออก) ----------
-            vin_raw  = pd.to_numeric(df_board_raw.get(self.col_in),  errors="coerce")
-            vout_raw = pd.to_numeric(df_board_raw.get(self.col_out), errors="coerce")
+            vin_raw  = df_board_raw[self.col_in]
+            vout_raw = df_board_raw[self.col_out]
             mask_io  = vin_raw.notna() | vout_raw.notna()
 
             df_board = df_board_raw.loc[mask_io].copy()
@@ -781,12 +617,21 @@ class Line_Analyzer:
             x_vals      = df_board["Measure Object"]
             site_labels = df_board["Site Name"]
 
-            vin     = pd.to_numeric(df_board.get(self.col_in),        errors="coerce")
-            vout    = pd.to_numeric(df_board.get(self.col_out),       errors="coerce")
-            min_in  = pd.to_numeric(df_board.get(self.col_min_in),    errors="coerce")
-            max_in  = pd.to_numeric(df_board.get(self.col_max_in),    errors="coerce")
-            min_out = pd.to_numeric(df_board.get(self.col_min_out),   errors="coerce")
-            max_out = pd.to_numeric(df_board.get(self.col_max_out),   errors="coerce")
+            vin     = df_board[self.col_in]
+            vout    = df_board[self.col_out]
+            min_in  = df_board[self.col_min_in]
+            max_in  = df_board[self.col_max_in]
+            min_out = df_board[self.col_min_out]
+            max_out = df_board[self.col_max_out]
+
+            # ---------- ลดจุด: พอร์ตเกิน MAX_POINTS → LTTB (พอร์ตที่ผิด threshold อยู่ครบ, แกน x คงตำแหน่งเดิม) ----------
+            bad = out_of_range(vin, min_in, max_in) | out_of_range(vout, min_out, max_out)
+            pos = downsample([vin, vout], keep=bad)
+            if len(pos) < len(df_board):
+                x_index = pos.tolist()
+                x_vals, site_labels, vin, vout, min_in, max_in, min_out, max_out = (
+                    s.iloc[pos] for s in (x_vals, site_labels, vin, vout, min_in, max_in, min_out, max_out)
+                )
 
             # ---------- สร้างกราฟ ----------
             fig = go.Figure()
@@ -854,10 +699,10 @@ class Line_Analyzer:
 
 
             # ---------- Problem Lines: ดึงบรรทัดจริงจาก df_board_raw ----------
-            min_in   = pd.to_numeric(df_board_raw.get(self.col_min_in),  errors="coerce")
-            max_in   = pd.to_numeric(df_board_raw.get(self.col_max_in),  errors="coerce")
-            min_out  = pd.to_numeric(df_board_raw.get(self.col_min_out), errors="coerce")
-            max_out  = pd.to_numeric(df_board_raw.get(self.col_max_out), errors="coerce")
+            min_in   = df_board_raw[self.col_min_in]
+            max_in   = df_board_raw[self.col_max_in]
+            min_out  = df_board_raw[self.col_min_out]
+            max_out  = df_board_raw[self.col_max_out]
 
             mask_problem = (
                 (vin_raw.notna()  & min_in.notna()  & max_in.notna()  & ((vin_raw  < min_in)  | (vin_raw  > max_in))) |
@@ -872,16 +717,6 @@ class Line_Analyzer:
             if not df_problems.empty:
                 st.markdown(f"**⚠️ Problem Lines for {board_name}:**")
 
-                # --- ก่อนทำ style: บังคับคอลัมน์ตัวเลขให้เป็น numeric เหมือนในตารางหลัก ---
-                num_cols = [
-                    "Threshold", "Instant BER After FEC",
-                    self.col_out, self.col_in,
-                    self.col_max_out, self.col_min_out, self.col_max_in, self.col_min_in
-                ]
-                for c in num_cols:
-                    if c in df_problems.columns:
-                        df_problems[c] = pd.to_numeric(df_problems[c], errors="coerce")
-
                 # --- เรียงคอลัมน์ให้ตรงกับ Line Performance ---
                 cols_like_main = [c for c in getattr(self, "main_cols", []) if c in df_problems.columns]
                 if not cols_like_main:
@@ -899,8 +734,8 @@ class Line_Analyzer:
                 df_display = df_problems[cols_like_main].reset_index(drop=True)
 
                 # --- ใช้สไตล์เดียวกันกับตารางหลัก (รวม format และการไฮไลต์ทั้งหมด) ---
-                styled = self._style_dataframe(df_display.copy())
-                st.dataframe(styled, use_container_width=True)
+                df_display = df_display.copy()
+                paged_table(df_display, key=f"line_board_{board_name}", style=self._table_style(df_display))
 
 
             else:
@@ -974,24 +809,25 @@ class Line_Analyzer:
         cols = st.columns(min(3, len(groups)))
         for idx, (preset, sub) in enumerate(groups):
             with cols[idx % len(cols)]:
-                with st.expander(f"Preset {preset} — {len(sub)} lines"):
-                    for _, r in sub.iterrows():
-                        st.write(f"- **{r['Site Name']}** → {r['Route']} _(Call {r['Call ID']})_")
+                exp = lazy.expander(f"Preset {preset} — {len(sub)} lines", key=f"exp_preset_{preset}")
+                with exp:
+                    if exp.open:
+                        for _, r in sub.iterrows():
+                            st.write(f"- **{r['Site Name']}** → {r['Route']} _(Call {r['Call ID']})_")
 
-                    if st.button(f"Show details: Preset {preset}", key=f"btn_preset_{preset}"):
-                        # ✅ ใช้ลำดับคอลัมน์จาก self.main_cols (ตัด order ออก)
-                        # ✅ กำหนดคอลัมน์ที่จะโชว์เฉพาะ Preset Drilldown
-                        preset_cols = ["Site Name", "ME", "Call ID", "Measure Object", "Route"]
+                        if st.button(f"Show details: Preset {preset}", key=f"btn_preset_{preset}"):
+                            # ✅ ใช้ลำดับคอลัมน์จาก self.main_cols (ตัด order ออก)
+                            # ✅ กำหนดคอลัมน์ที่จะโชว์เฉพาะ Preset Drilldown
+                            preset_cols = ["Site Name", "ME", "Call ID", "Measure Object", "Route"]
 
-                        df_show = sub[[c for c in preset_cols if c in sub.columns]]
-                        st.dataframe(df_show.reset_index(drop=True), use_container_width=True)
+                            df_show = sub[[c for c in preset_cols if c in sub.columns]]
+                            st.dataframe(df_show.reset_index(drop=True), use_container_width=True)
 
     # ---------- NEW: PREPARE (Summary/PDF) ----------
     def prepare(self) -> None:
         """เตรียม abnormal ทั้งหมดสำหรับ Summary/PDF (ไม่ render UI)"""
-        # 1) Normalize
-        self.df_line = self._normalize_columns(self.df_line)
-        self.df_ref  = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) Check required
         self._check_required()
@@ -1021,21 +857,21 @@ class Line_Analyzer:
 
         # 5.1 BER abnormal - ใช้เงื่อนไขเดียวกับตารางหลัก: v > 0 หรือ None
         # แต่ต้องมี Threshold ด้วย
-        ber_val = pd.to_numeric(df_result["Instant BER After FEC"], errors="coerce")
-        thr_val = pd.to_numeric(df_result["Threshold"], errors="coerce")
+        ber_val = df_result["Instant BER After FEC"]
+        thr_val = df_result["Threshold"]
         mask_ber = ((ber_val > 0) | ber_val.isna()) & thr_val.notna()
         df_ber = df_result.loc[mask_ber, ["Site Name", "ME", "Call ID", "Measure Object", "Threshold", "Instant BER After FEC"]].copy()
 
         # 5.2 Input abnormal - ใช้เงื่อนไขเดียวกับตารางหลัก
-        vin = pd.to_numeric(df_result.get(self.col_in, pd.Series()), errors="coerce")
-        min_in = pd.to_numeric(df_result.get(self.col_min_in, pd.Series()), errors="coerce")
-        max_in = pd.to_numeric(df_result.get(self.col_max_in, pd.Series()), errors="coerce")
+        vin = df_result[self.col_in]
+        min_in = df_result[self.col_min_in]
+        max_in = df_result[self.col_max_in]
         mask_input = (vin.notna() & min_in.notna() & max_in.notna() & ((vin < min_in) | (vin > max_in)))
         
         # 5.3 Output abnormal - ใช้เงื่อนไขเดียวกับตารางหลัก
-        vout = pd.to_numeric(df_result.get(self.col_out, pd.Series()), errors="coerce")
-        min_out = pd.to_numeric(df_result.get(self.col_min_out, pd.Series()), errors="coerce")
-        max_out = pd.to_numeric(df_result.get(self.col_max_out, pd.Series()), errors="coerce")
+        vout = df_result[self.col_out]
+        min_out = df_result[self.col_min_out]
+        max_out = df_result[self.col_max_out]
         mask_output = (vout.notna() & min_out.notna() & max_out.notna() & ((vout < min_out) | (vout > max_out)))
         
         # 5.4 รวมทุกเงื่อนไข abnormal (BER + Input + Output) - เหมือนกับ _render_abnormal_line_data()
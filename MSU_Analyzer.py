@@ -1,6 +1,10 @@
 import pandas as pd
 import streamlit as st
 from utils.filters import cascading_filter
+from utils.schema import apply_schema
+from utils.chart_data import top_k
+from utils.paged_table import paged_table
+from utils.styling import RED_CELL, MaskLayer, TableStyle, numeric
 
 class MSU_Analyzer:
     """
@@ -30,15 +34,10 @@ class MSU_Analyzer:
         self.df_abnormal_by_type = {}
 
     # ---------- Utilities ----------
-    @staticmethod
-    def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-        df.columns = (
-            df.columns.astype(str)
-            .str.strip()
-            .str.replace(r"\s+", " ", regex=True)
-            .str.replace("\u00a0", " ")
-        )
-        return df
+    def _apply_schema(self) -> None:
+        """normalize + cast (ข้อมูลจาก ingest ผ่าน schema มาแล้ว → ไม่ทำซ้ำ) / ref: threshold เป็น float64"""
+        self.df_msu = apply_schema("msu", self.df_msu)
+        self.df_ref = apply_schema("msu_ref", self.df_ref)
 
     def _check_required(self) -> None:
         required_cols = {self.COL_ME, self.COL_MOBJ, self.COL_LASER}
@@ -69,39 +68,21 @@ class MSU_Analyzer:
         )
         return df_merged
 
-    def _style_dataframe(self, df_view: pd.DataFrame) -> pd.io.formats.style.Styler:
-        # แปลงเป็น numeric
-        for c in [self.COL_LASER, self.COL_TH]:
-            if c in df_view.columns:
-                df_view[c] = pd.to_numeric(df_view[c], errors="coerce")
-
-        # ✅ ไฮไลต์คอลัมน์ Laser ถ้าเกิน threshold
-        def red_value(_):
-            return [
-                "background-color:#ff4d4d;color:white"
-                if (pd.notna(v) and pd.notna(th) and v > th)
-                else ""
-                for v, th in zip(
-                    df_view.get(self.COL_LASER, pd.Series(index=df_view.index)),
-                    df_view.get(self.COL_TH, pd.Series(index=df_view.index)),
-                )
-            ]
-
-        styled = (
-            df_view.style
-            .apply(red_value, subset=[self.COL_LASER] if self.COL_LASER in df_view.columns else [])
-            .format({
+    def _table_style(self, df_view: pd.DataFrame) -> TableStyle:
+        # ✅ ไฮไลต์คอลัมน์ Laser ถ้าเกิน threshold (NaN เทียบแล้วได้ False)
+        over = numeric(df_view, self.COL_LASER) > numeric(df_view, self.COL_TH)
+        return TableStyle(
+            [MaskLayer(RED_CELL, over, [self.COL_LASER])],
+            {
                 self.COL_LASER: "{:.2f}",
                 self.COL_TH: "{:.2f}",
-            })
+            },
         )
-        return styled
 
     # ---------- MAIN ----------
     def process(self) -> None:
-        # 1) Normalize
-        self.df_msu = self._normalize_columns(self.df_msu)
-        self.df_ref = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) Check required
         self._check_required()
@@ -132,10 +113,11 @@ class MSU_Analyzer:
         )
         st.caption(f"MSU (showing {len(df_filtered)}/{len(df_result)} rows)")
 
-        # 6) Main table (ใช้ Styler + format 2 ตำแหน่ง)
-        styled_main = self._style_dataframe(df_filtered.copy())
+        # 6) Main table (แบ่งหน้า + format 2 ตำแหน่ง)
+        df_view = df_filtered.copy()
+        table_style = self._table_style(df_view)
         st.markdown("### MSU Performance")
-        st.write(styled_main)
+        paged_table(df_view, key=f"{self.ns}_main", style=table_style)
 
         # 7) Summary banner
         failed_rows = df_filtered[self.COL_LASER] > df_filtered[self.COL_TH]
@@ -180,8 +162,13 @@ class MSU_Analyzer:
             unsafe_allow_html=True
         )
 
+        # เกิน MAX_BARS แท่ง → รวมพอร์ตที่เหลือเป็นแท่ง Others (พอร์ต Abnormal แยกแท่งเสมอ)
+        df_bars = top_k(
+            df_board[["Board", self.COL_LASER, "Status"]], self.COL_LASER, "Board",
+            keep=df_board["Status"] == "Abnormal", fill={"Status": "Normal"},
+        )
         fig_bar = px.bar(
-            df_board.sort_values(self.COL_LASER, ascending=False),
+            df_bars,
             x=self.COL_LASER, y="Board",
             orientation="h", color="Status",
             color_discrete_map={"Normal": "#5dcb61", "Abnormal": "red"},
@@ -199,7 +186,7 @@ class MSU_Analyzer:
             yaxis_title="Site | Board",
             yaxis=dict(autorange="reversed", tickfont=dict(size=14)),
             font=dict(size=13),
-            height=20 * len(df_board),
+            height=20 * len(df_bars),
             bargap=0.1
         )
         st.plotly_chart(fig_bar, use_container_width=True)
@@ -213,8 +200,8 @@ class MSU_Analyzer:
 
         if not df_abn.empty:
             # ✅ round 2 decimal (ไม่มีหน่วย)
-            df_abn[self.COL_TH]    = pd.to_numeric(df_abn[self.COL_TH], errors="coerce").round(2)
-            df_abn[self.COL_LASER] = pd.to_numeric(df_abn[self.COL_LASER], errors="coerce").round(2)
+            df_abn[self.COL_TH]    = df_abn[self.COL_TH].round(2)
+            df_abn[self.COL_LASER] = df_abn[self.COL_LASER].round(2)
 
             # ✅ Highlight Laser Bias Current(mA)
             def highlight_red(val):
@@ -246,9 +233,8 @@ class MSU_Analyzer:
     # ---------- PREPARE ----------
     def prepare(self) -> None:
         """เตรียมข้อมูล abnormal โดยไม่ render UI"""
-        # 1) Normalize
-        self.df_msu = self._normalize_columns(self.df_msu)
-        self.df_ref = self._normalize_columns(self.df_ref)
+        # 1) Normalize + cast
+        self._apply_schema()
 
         # 2) Check required
         self._check_required()
@@ -265,8 +251,8 @@ class MSU_Analyzer:
             return
 
         # 4) Detect abnormal
-        val = pd.to_numeric(df_merged[self.COL_LASER], errors="coerce")
-        th  = pd.to_numeric(df_merged[self.COL_TH], errors="coerce")
+        val = df_merged[self.COL_LASER]
+        th  = df_merged[self.COL_TH]
         ab_mask = val > th
 
         df_abn = df_merged.loc[ab_mask, [
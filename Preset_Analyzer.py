@@ -7,6 +7,10 @@ import io
 import pandas as pd
 import streamlit as st
 
+from utils.diag_log import get_logger
+
+log = get_logger("preset")
+
 # =========================
 # 1) แกน Preset (Regex + Parser + Evaluator)
 # =========================
@@ -144,19 +148,15 @@ class PresetStatusAnalyzer:
         self.summary = {"total": len(df), "passes": passes, "fails": fails}
        
         # ---------------------------
-        # ปริ้นเฉพาะ Abnormal (FAIL)
+        # log เฉพาะ Abnormal (FAIL) — utils.diag_log (sampled)
         # ---------------------------
-        abnormal_df = df[df["Verdict"] == "FAIL"]
-        if not abnormal_df.empty:
-            for _, row in abnormal_df.iterrows():
-                call_id = row.get("Call", "-")
-                ip      = row.get("IP", "")
-                reason  = row.get("Status", "")
-                pr_raw  = row.get("Preroute", "")
-                pr      = "-" if pd.isna(pr_raw) or pr_raw == "" else pr_raw
-                print(f"Call {call_id} | IP: {ip} | Preroute: {pr} | Reason: {reason}")
-        else:
-            print("✅ No abnormal preset detected.")
+        log.info("summary", total=len(df), passes=passes, fails=fails)
+        if fails and log.enabled():
+            for row in df[df["Verdict"] == "FAIL"].itertuples(index=False):
+                pr_raw = getattr(row, "Preroute", "")
+                pr     = "-" if pd.isna(pr_raw) or pr_raw == "" else pr_raw
+                log.debug("fail", call=getattr(row, "Call", "-"), ip=getattr(row, "IP", ""),
+                          preroute=pr, reason=getattr(row, "Status", ""))
 
         return self.df, self.summary
 
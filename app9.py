@@ -1,15 +1,18 @@
 import os
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import pytz
 import streamlit as st
 from streamlit_calendar import calendar
-import io, zipfile
+import io
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 import time
 import re
+import tempfile
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ====== IMPORT ANALYZERS ======
 from CPU_Analyzer import CPU_Analyzer
@@ -26,21 +29,41 @@ from Preset_Analyzer import (
 from APO_Analyzer import ApoRemnantAnalyzer
 from APO_Analyzer import apo_kpi
 # from viz import render_visualization, NetworkDashboardVisualizer  # Removed
-from supabase_config import get_supabase
+from supabase_config import get_supabase, storage_object_path, UPLOAD_CHUNK_SIZE
+from utils.schema import apply_schema
+from utils.excel_loader import load_reference, osc_load_threshold
+from utils.chart_data import count_frame
+from utils.ingest import parse_file
+from utils.columnar import bundle_path, decode_bundle
+from utils.combine import FrameCombiner
+from utils.alarm_index import get_alarm_index
+from utils import diag_log, lazy
+from utils.zip_extract import memory_budget
+from utils.result_cache import parse_cache, analysis_cache
+from utils.storage_cache import get_storage_cache
 
 
 # ====== CONFIG ======
 st.set_page_config(layout="wide")
-pd.set_option("styler.render.max_elements", 1_200_000)
+pd.set_option("styler.render.max_elements", 1_200_000)  # ตารางที่ยัง style ทั้งตาราง (สรุป / EOL) — ตารางหลักใช้ paged_table
 
 UPLOAD_DIR = "uploads"
+UPLOAD_WORKERS = 4  # จำนวนไฟล์ที่อัปโหลดพร้อมกัน
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # ====== SUPABASE INSTANCE ======
 supabase = get_supabase()
+log = diag_log.get_logger("app")
 
 
 # ====== FILE FUNCTIONS ======
+def _iter_chunks(buf, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """แบ่ง buffer เป็น chunk (อ่านผ่าน memoryview ไม่ copy ทั้งไฟล์)"""
+    view = memoryview(buf)
+    for start in range(0, view.nbytes, chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
 def save_file(upload_date: str, file, use_storage: bool = True):
     """บันทึกไฟล์ลง Supabase Storage (หรือดิสก์) และ metadata ใน Database
     
@@ -48,34 +71,73 @@ def save_file(upload_date: str, file, use_storage: bool = True):
         upload_date: วันที่อัปโหลด
         file: ไฟล์ที่อัปโหลด
         use_storage: ใช้ Supabase Storage (True) หรือเก็บบนดิสก์ (False)
+
+    เก็บแบบ content-addressed ตาม MD5: ถ้าเคยอัปโหลดไฟล์เนื้อหาเดียวกันแล้ว
+    จะสร้างแค่ metadata record ใหม่ที่ชี้ไป object เดิม (ไม่อัปโหลด/เขียนซ้ำ)
+    เรียกจาก worker thread ได้
+    Returns:
+        id ของ record ที่บันทึก (None ถ้าบันทึก metadata ไม่สำเร็จ)
     """
-    file_id = str(uuid.uuid4())
-    stored_name = f"{file_id}_{file.name}"
-    file_content = bytes(file.getbuffer())
+    buf = file.getbuffer()
+    file_size = buf.nbytes
+    checksum = hashlib.md5(buf).hexdigest()
+    
+    # ไฟล์ซ้ำ → ชี้ไป object เดิม
+    existing = supabase.find_upload_by_checksum(checksum)
+    if existing and (existing.get("storage_url") or os.path.exists(existing["stored_path"])):
+        return supabase.save_upload_record(
+            upload_date, file.name, existing["stored_path"], existing.get("storage_url"),
+            file_size=file_size, checksum=checksum, columnar_path=existing.get("columnar_path"),
+        )
     
+    object_path = storage_object_path(checksum, file.name)
     storage_url = None
     stored_path = None
     
     if use_storage and supabase.is_connected():
-        # อัปโหลดไป Supabase Storage
-        storage_path = f"{upload_date}/{stored_name}"
-        storage_url = supabase.upload_to_storage(file_content, storage_path)
+        # อัปโหลดไป Supabase Storage (ไฟล์ใหญ่ส่งเป็น chunk + retry)
+        storage_url = supabase.upload_stream_to_storage(
+            _iter_chunks(buf), object_path, file_size, upsert=True
+        )
         
         if storage_url:
-            stored_path = storage_path  # เก็บ path ใน storage
+            stored_path = object_path  # เก็บ path ใน storage
         else:
             # ถ้า upload ไม่สำเร็จ fallback ไปดิสก์
             use_storage = False
     
     if not use_storage or not storage_url:
         # เก็บบนดิสก์
-        stored_path = os.path.join(UPLOAD_DIR, upload_date, stored_name)
+        stored_path = os.path.join(UPLOAD_DIR, object_path)
         os.makedirs(os.path.dirname(stored_path), exist_ok=True)
-        with open(stored_path, "wb") as f:
-            f.write(file_content)
+        if not os.path.exists(stored_path):
+            tmp_path = f"{stored_path}.{uuid.uuid4().hex}.part"
+            with open(tmp_path, "wb") as f:
+                for chunk in _iter_chunks(buf):
+                    f.write(chunk)
+            os.replace(tmp_path, stored_path)
     
     # บันทึก metadata ลง Supabase Database
-    supabase.save_upload_record(upload_date, file.name, stored_path, storage_url)
+    return supabase.save_upload_record(
+        upload_date, file.name, stored_path, storage_url,
+        file_size=file_size, checksum=checksum,
+    )
+
+
+def save_files(upload_date: str, files, use_storage: bool = True, max_workers: int = UPLOAD_WORKERS):
+    """อัปโหลดหลายไฟล์พร้อมกัน (จำกัดจำนวน thread)
+
+    yield (file, error) ตามลำดับที่อัปโหลดเสร็จ — error เป็น None ถ้าสำเร็จ
+    (UI ต้องอัปเดตจาก main thread เท่านั้น จึงให้ผู้เรียกวน loop แสดงผลเอง)
+    """
+    def _upload(file):
+        if save_file(upload_date, file, use_storage=use_storage) is None:
+            raise RuntimeError("metadata record was not saved")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files)))) as pool:
+        futures = {pool.submit(_upload, f): f for f in files}
+        for fut in as_completed(futures):
+            yield futures[fut], fut.exception()
 
 def list_files_by_date(upload_date: str):
     """ดึงรายการไฟล์ตามวันที่จาก Supabase"""
@@ -84,10 +146,74 @@ def list_files_by_date(upload_date: str):
     # แปลง ID เป็น integer เพื่อป้องกัน type error
     return [(int(f["id"]), f["orig_filename"], f["stored_path"]) for f in files]
 
-def get_file_for_analysis(file_id):
-    """ดึงไฟล์สำหรับวิเคราะห์ (จาก Storage, Database, หรือดิสก์)"""
+def list_files_by_date_range(start: str, end: str):
+    """ไฟล์ทุกวันในช่วง start..end → [(id, orig_filename, stored_path, upload_date), ...]"""
+    files = supabase.get_files_by_date_range(start, end)
+    return [(int(f["id"]), f["orig_filename"], f["stored_path"], f["upload_date"]) for f in files]
+
+def get_file_for_analysis(file_id, with_record: bool = False):
+    """ดึงไฟล์สำหรับวิเคราะห์ (จาก Storage, Database, หรือดิสก์)
+
+    คืน file object ที่ seek ได้ (ผู้เรียกต้อง close เอง):
+    Storage → stream ลง SpooledTemporaryFile (เกิน budget จะ spill ลงดิสก์), ดิสก์ → เปิดไฟล์ตรง ๆ
+    with_record=True → คืน (file object, metadata record) แทน (ใช้ checksum ทำ cache)
+    """
+    fobj, record = _open_upload(file_id)
+    return (fobj, record) if with_record else fobj
+
+
+def prefetch_uploads(records, max_workers: int = UPLOAD_WORKERS) -> int:
+    """ดึงไฟล์จาก Storage ลง local cache ล่วงหน้า (records = row ของตาราง uploads)"""
+    items = [
+        (r["stored_path"], r.get("checksum"),
+         lambda dest, p=r["stored_path"]: supabase.download_to_file(p, dest))
+        for r in records if r.get("storage_url")
+    ]
+    try:
+        return get_storage_cache().prefetch(items, max_workers=max_workers)
+    except OSError as e:
+        log.warning("storage_cache_unavailable", error=e)
+        return 0
+
+
+def iter_files_for_analysis(file_ids, max_workers: int = UPLOAD_WORKERS):
+    """เปิดหลายไฟล์สำหรับวิเคราะห์แบบ pipeline
+
+    ดึง metadata ทุก id ใน query เดียว แล้วดาวน์โหลดพร้อมกันใน thread pool
+    yield (file_id, file object, columnar, record, error) ตามลำดับของ file_ids —
+    ผู้เรียก parse ไฟล์แรกได้ระหว่างที่ไฟล์ถัดไปยังดาวน์โหลดอยู่ (ผู้เรียกต้อง close file object เอง)
+    columnar=True → file object เป็น bundle Parquet/zstd (utils/columnar.py) แทนต้นฉบับ
+    """
+    ids = [int(f) for f in file_ids]
+    if not ids:
+        return
+    records = supabase.get_upload_records(ids) if supabase.is_connected() else {}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ids))))
+    futures = [(fid, pool.submit(_open_for_analysis, records[fid]) if fid in records else None) for fid in ids]
+    try:
+        for fid, fut in futures:
+            if fut is None:
+                yield fid, None, False, None, None
+                continue
+            try:
+                fobj, columnar = fut.result()
+                yield fid, fobj, columnar, records[fid], None
+            except Exception as e:
+                yield fid, None, False, records[fid], e
+    finally:
+        # ผู้เรียกหยุดกลางทาง → ปิดไฟล์ที่ดาวน์โหลดมาแล้วแต่ยังไม่ถูกใช้
+        pool.shutdown(wait=True, cancel_futures=True)
+        for _, fut in futures:
+            if fut is not None and fut.done() and not fut.cancelled() and fut.exception() is None:
+                fobj, _ = fut.result()
+                if fobj is not None and not fobj.closed:
+                    fobj.close()
+
+
+def _open_upload(file_id):
     if not supabase.is_connected():
-        return None
+        return None, None
     
     try:
         # แปลง file_id เป็น integer ถ้าเป็น string
@@ -96,60 +222,143 @@ def get_file_for_analysis(file_id):
                 file_id = int(file_id)
             else:
                 st.error(f"❌ Invalid file ID: {file_id}")
-                return None
+                return None, None
         
         # ดึงข้อมูลไฟล์
-        result = supabase.supabase.table("uploads").select("*").eq("id", file_id).execute()
-        if not result.data:
-            return None
-        
-        file_record = result.data[0]
-        stored_path = file_record["stored_path"]
-        storage_url = file_record.get("storage_url")
-        
-        # ลำดับความสำคัญ: Storage > Disk > Database (legacy)
-        
-        # 1. ลองดาวน์โหลดจาก Supabase Storage
-        if storage_url:
-            file_content = supabase.download_from_storage(stored_path)
-            if file_content:
-                return io.BytesIO(file_content)
-        
-        # 2. ลองอ่านจากดิสก์ (local)
-        if os.path.exists(stored_path):
-            with open(stored_path, "rb") as f:
-                return io.BytesIO(f.read())
+        file_record = supabase.get_upload_record(file_id)
+        if not file_record:
+            return None, None
         
-        # 3. ลองดึงจาก database (legacy - สำหรับไฟล์เก่า)
-        if file_record.get("file_content"):
-            import base64
-            file_content = base64.b64decode(file_record["file_content"])
-            return io.BytesIO(file_content)
-        
-        return None
+        fobj = _open_record(file_record)
+        return (fobj, file_record) if fobj is not None else (None, None)
         
     except Exception as e:
         st.error(f"❌ Failed to get file for analysis: {e}")
+        return None, None
+
+
+def _open_for_analysis(file_record):
+    """bundle columnar ก่อน (ถ้า tier แล้ว) ไม่งั้นต้นฉบับ → (file object, columnar)"""
+    fobj = _open_columnar(file_record)
+    if fobj is not None:
+        return fobj, True
+    return _open_record(file_record), False
+
+
+def _open_columnar(file_record):
+    path = file_record.get("columnar_path")
+    # bundle ของ parser รุ่นเก่า (version ใน path ไม่ตรง) → อ่านต้นฉบับแทน
+    if not path or not file_record.get("checksum") or path != bundle_path(file_record["checksum"]):
+        return None
+    local_path = supabase.local_path(path)
+    if local_path:
+        return open(local_path, "rb")
+    try:
+        # bundle เป็น content-addressed ตาม checksum ของต้นฉบับ → path เดียวพอเป็น key ของ cache
+        return get_storage_cache().open(path, None, lambda dest: supabase.download_to_file(path, dest))
+    except OSError as e:
+        log.warning("storage_cache_unavailable", error=e)
         return None
 
-def delete_file(file_id: int):
-    """ลบไฟล์ทั้งจากดิสก์และ Supabase"""
-    # ดึงข้อมูลไฟล์จาก Supabase
-    files = supabase.supabase.table("uploads").select("stored_path").eq("id", file_id).execute() if supabase.is_connected() else None
+
+def _open_record(file_record):
+    """เปิดไฟล์ตาม metadata record → file object ที่ seek ได้ หรือ None
+    (ไม่เรียก st.* เพื่อให้รันใน worker thread ได้)
+    """
+    stored_path = file_record["stored_path"]
+    storage_url = file_record.get("storage_url")
+    
+    # ลำดับความสำคัญ: Storage > Disk > Database (legacy)
     
-    if files and files.data:
-        stored_path = files.data[0]["stored_path"]
+    # 1. ลองดาวน์โหลดจาก Supabase Storage
+    if storage_url:
+        # backend แบบ local เก็บ object บนดิสก์อยู่แล้ว → เปิดตรง ๆ
+        local_path = supabase.local_path(stored_path)
+        if local_path:
+            return open(local_path, "rb")
+        # local disk cache ก่อน (key = stored_path + checksum, ตรวจ MD5 ตอนอ่าน)
         try:
-            os.remove(stored_path)  # ลบไฟล์จากดิสก์
-        except FileNotFoundError:
-            pass
+            cached = get_storage_cache().open(
+                stored_path, file_record.get("checksum"),
+                lambda dest: supabase.download_to_file(stored_path, dest),
+            )
+        except OSError as e:
+            log.warning("storage_cache_unavailable", error=e)
+            cached = None
+        if cached is not None:
+            return cached
+        spool = tempfile.SpooledTemporaryFile(max_size=memory_budget())
+        if supabase.download_to_file(stored_path, spool):
+            spool.seek(0)
+            return spool
+        spool.close()
+    
+    # 2. ลองอ่านจากดิสก์ (local)
+    if os.path.exists(stored_path):
+        return open(stored_path, "rb")
+    
+    # 3. ลองดึงจาก database (legacy - สำหรับไฟล์เก่า)
+    if file_record.get("file_content"):
+        import base64
+        file_content = base64.b64decode(file_record["file_content"])
+        return io.BytesIO(file_content)
+    
+    return None
+
+def delete_file(file_id: int):
+    """ลบไฟล์ทั้งจากดิสก์และ Supabase
+
+    object ถูกแชร์ระหว่าง record ที่ checksum ตรงกัน → ลบ object จริงเมื่อไม่มี record ไหนอ้างถึงแล้ว
+    พร้อม bundle columnar ของ checksum นั้น และผลใน parse_cache / storage cache
+    """
+    # ดึงข้อมูลไฟล์จาก Supabase
+    record = (
+        supabase.get_upload_record(file_id, "stored_path, storage_url, checksum, columnar_path")
+        if supabase.is_connected() else None
+    )
     
     # ลบจาก Supabase
     supabase.delete_file_record(file_id)
+    
+    if record:
+        stored_path = record["stored_path"]
+        if supabase.count_path_references(stored_path) > 0:
+            return
+        checksum = record.get("checksum")
+        if record.get("storage_url"):
+            supabase.delete_from_storage(stored_path)
+        else:
+            try:
+                os.remove(stored_path)  # ลบไฟล์จากดิสก์
+            except FileNotFoundError:
+                pass
+        if checksum:
+            _discard_checksum(checksum, stored_path, record.get("columnar_path"))
+
+
+def _discard_checksum(checksum: str, stored_path: str, columnar_path: str | None):
+    """ไม่มี record ของเนื้อหานี้เหลือแล้ว → ลบ bundle columnar + ผลที่ cache ไว้ของ checksum นี้"""
+    bundles = {bundle_path(checksum)} | ({columnar_path} if columnar_path else set())
+    # record เก่า (ก่อน dedup) อาจมี checksum เดียวกันแต่ stored_path ต่างกัน → ยังใช้ bundle ได้
+    if supabase.find_upload_by_checksum(checksum) is None:
+        for path in bundles:
+            supabase.delete_from_storage(path)
+    else:
+        bundles = set()
+    parse_cache.discard(lambda key: key[0] == checksum)
+    try:
+        cache = get_storage_cache()
+        cache.discard(stored_path, checksum)
+        for path in bundles:
+            cache.discard(path, None)
+    except OSError as e:
+        log.warning("storage_cache_unavailable", error=e)
 
-def list_dates_with_files():
-    """ดึงรายการวันที่ที่มีไฟล์จาก Supabase"""
-    return supabase.get_dates_with_files()
+def list_dates_with_files(month: date):
+    """จำนวนไฟล์ต่อวันเฉพาะช่วงที่ปฏิทินของเดือน month แสดง (รวมวันของเดือนข้างเคียงใน grid)"""
+    first = month.replace(day=1)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return supabase.get_dates_with_files(str(first - timedelta(days=7)), str(next_month + timedelta(days=14)))
 
 
 # ====== CLEAR SESSION ======
@@ -157,86 +366,94 @@ def clear_all_uploaded_data():
     st.session_state.clear()
 
 
-# ====== ZIP PARSER ======
-KW = {
-    "cpu": ("cpu",),
-    "fan": ("fan",),
-    "msu": ("msu",),
-    "client": ("client", "client board"),
-    "line":  ("line","line board"),       
-    "wason": ("wason","log","mobaxterm", "moba xterm", "moba"), 
-    "osc": ("osc","osc optical"),      
-    "fm":  ("fm","alarm","fault management"),
-    "atten": ("optical attenuation report", "optical_attenuation_report","optical attenuation"),
-    "preset": ("wason","log","mobaxterm", "moba xterm", "moba"),
-}
-
-LOADERS = {
-    ".xlsx": pd.read_excel,
-    ".xls": pd.read_excel,
-    ".txt":  lambda f: f.read().decode("utf-8", errors="ignore"),
-}
-
-def _ext(name: str) -> str:
-    name = name.lower()
-    return next((e for e in LOADERS if name.endswith(e)), "")
-
-def _kind(name):
-    n = name.lower()
-    hits = [k for k, kws in KW.items() if any(re.search(re.escape(s), n) for s in kws)]
-
-    # ---- Priority ----
-    if "wason" in hits:
-        return "wason"
-    if "preset" in hits:
-        return "preset"
-
-    # ---- เช็คว่า line ต้องเป็น Excel เท่านั้น ----
-    if "line" in hits and (n.endswith(".xlsx") or n.endswith(".xls") or n.endswith(".xlsm")):
-        return "line"
-
-    # ---- อื่น ๆ ตามปกติ ----
-    for k in ("fan","cpu","msu","client","osc","fm","atten"):
-        if k in hits:
-            return k
-
-    return hits[0] if hits else None
-
-
-def find_in_zip(zip_file):
-    found = {k: None for k in KW}
-    def walk(zf):
-        for name in zf.namelist():
-            if all(found.values()): 
-                return
-            if name.endswith("/"): 
-                continue
-            lname = name.lower()
-            if lname.endswith(".zip"):
-                try:
-                    walk(zipfile.ZipFile(io.BytesIO(zf.read(name))))
-                except:
-                    pass
-                continue
-            ext = _ext(lname)
-            kind = _kind(lname)
-            if not ext or not kind or found[kind]:
-                continue
-            try:
-                with zf.open(name) as f:
-                    df = LOADERS[ext](f)
-                    print("DEBUG LOADED:", kind, type(df), name)
+# ====== ZIP PARSER (utils/ingest.py) ======
+def parse_upload(fname: str, fobj, checksum: str | None = None, columnar: bool = False) -> dict:
+    """parse ไฟล์ที่อัปโหลด (ZIP / Excel / TXT) → {kind: (data, ชื่อไฟล์ต้นทาง)}
 
-                # ถ้าเป็น log (.txt) → เก็บเป็น string ใน key "wason_log"
-                if kind == "wason":
-                    found[kind] = (df, name)   # df = string
-                else:
-                    found[kind] = (df, name)   # df = DataFrame
+    ไฟล์เนื้อหาเดิม (checksum ตรงกัน) ใช้ผล parse เดิมจาก parse_cache ไม่ต้องแตกไฟล์ใหม่
+    columnar=True → fobj เป็น bundle ที่ parse ไว้แล้ว (utils/columnar.py) ผลเหมือนกัน จึงใช้ key เดียวกัน
+    """
+    # cutoff ของ OSC เปลี่ยน → แถวที่โหลดมาไม่เท่าเดิม จึงอยู่ใน key ด้วย
+    key = (checksum, fname.lower(), osc_load_threshold()) if checksum else None
+    if columnar:
+        return parse_cache.get_or_build(key, lambda: decode_bundle(fobj))
+    return parse_cache.get_or_build(key, lambda: parse_file(fname, fobj))
 
-            except:
-                continue
-    walk(zipfile.ZipFile(zip_file))
-    return found
+
+def _ref_version() -> tuple:
+    """mtime ของไฟล์ reference ใน data/ (เปลี่ยน reference → ผลวิเคราะห์ใน cache ใช้ไม่ได้)"""
+    try:
+        return tuple(sorted((e.name, e.stat().st_mtime) for e in os.scandir("data") if e.is_file()))
+    except FileNotFoundError:
+        return ()
+
+
+# attribute ที่ prepare() สร้าง และ Summary table / report อ่านต่อ (เก็บใน analysis_cache แทน analyzer ทั้งตัว)
+PREPARED_ATTRS = ("df_abnormal", "df_abnormal_by_type")
+
+
+def _prepare_analyzer(key: str, sources: tuple, build, prepared_attrs: tuple = PREPARED_ATTRS, version=None):
+    """สร้าง analyzer + prepare() แล้วเก็บลง session_state["{key}_analyzer"]
+
+    ถ้าข้อมูลต้นทาง (checksum ของไฟล์ใน sources) เคยวิเคราะห์แล้ว ใช้ผลจาก analysis_cache:
+    build() ใหม่ (constructor อย่างเดียว ไม่ prepare) แล้วใส่ผล prepared_attrs ที่เก็บไว้
+    พร้อม restore สถานะ sidebar ({key}_status / {key}_abn_count) ที่ prepare() เคยตั้งไว้
+    version: state อื่นที่ผลขึ้นกับ (เช่น version ของ alarm index) — อ่านใหม่หลัง prepare() เพื่อใช้เป็น key ตอนเก็บ
+    """
+    checksums = tuple(st.session_state.get(f"{k}_checksum") for k in sources)
+
+    def _cache_key():
+        if not all(checksums):
+            return None
+        return (key, checksums, _ref_version(), version() if version is not None else None)
+
+    built = {}
+
+    def _build():
+        analyzer = built["analyzer"] = build()
+        analyzer.prepare()
+        prepared = {a: getattr(analyzer, a) for a in prepared_attrs if hasattr(analyzer, a)}
+        state = {
+            k: st.session_state[k]
+            for k in (f"{key}_status", f"{key}_abn_count")
+            if k in st.session_state
+        }
+        return prepared, state
+
+    prepared, state = analysis_cache.get_or_build(_cache_key(), _build, store_key=_cache_key)
+    analyzer = built.get("analyzer")
+    if analyzer is None:
+        analyzer = build()
+        for attr, value in prepared.items():
+            setattr(analyzer, attr, value)
+    st.session_state.update(state)
+    st.session_state[f"{key}_analyzer"] = analyzer
+    return analyzer
+
+
+def _fiberflapping_analyzer(df_osc: pd.DataFrame, df_fm: pd.DataFrame) -> FiberflappingAnalyzer:
+    """analyzer จาก Run Analysis (มี sweep cache อยู่แล้ว) หรือสร้างใหม่จากข้อมูลใน session"""
+    analyzer = st.session_state.get("fiberflapping_analyzer")
+    if analyzer is None:
+        analyzer = FiberflappingAnalyzer(
+            df_optical=df_osc.copy(),
+            df_fm=df_fm.copy(),
+            threshold=FiberflappingAnalyzer.DEFAULT_THRESHOLD,
+            ref_path="data/Flapping.xlsx",  # ใช้ชื่อไฟล์ตัวใหญ่ และมี fallback ภายใน
+            alarm_index=get_alarm_index(),  # FM ของวันก่อน ๆ ยัง match หน้าต่างของวันนี้ได้
+        )
+        analyzer.prepare()  # Summary table ใช้ df_abnormal ของ analyzer ตัวนี้ต่อ
+        st.session_state["fiberflapping_analyzer"] = analyzer
+    return analyzer
+
+
+def _fiber_threshold_slider(sweep) -> float:
+    """slider threshold ของ Max - Min (dB): ต่ำสุด = FiberflappingAnalyzer.min_sweep_threshold() (แถวที่ต่ำกว่านั้นไม่ได้โหลดมา)"""
+    lo = float(sweep.min_threshold)
+    hi = max(round(sweep.max_diff + 0.05, 1), lo + 0.1)
+    current = st.session_state.get("fiber_threshold", FiberflappingAnalyzer.DEFAULT_THRESHOLD)
+    st.session_state["fiber_threshold"] = min(max(float(current), lo), hi)
+    return st.slider("Max - Min threshold (dB)", min_value=lo, max_value=hi, step=0.1, key="fiber_threshold")
 
 
 def safe_copy(obj):
@@ -284,6 +501,40 @@ def create_menu_with_indicators():
 menu_options = create_menu_with_indicators()
 menu = st.sidebar.radio("Select Activity", menu_options)
 
+# expander ใน sidebar สร้างเนื้อหาเฉพาะตอนเปิด (ทุกหน้า rerun ผ่านตรงนี้)
+_lat_exp = lazy.expander("⏱️ Supabase latency", key="supabase_latency_exp", parent=st.sidebar)
+with _lat_exp:
+    if _lat_exp.open:
+        _lat = get_supabase().latency.snapshot()
+        if _lat:
+            st.dataframe(pd.DataFrame(_lat), hide_index=True, use_container_width=True)
+        else:
+            st.caption("No Supabase calls yet")
+
+_log_exp = lazy.expander("🪵 Diagnostics log", key="diag_log_exp", parent=st.sidebar)
+with _log_exp:
+    if _log_exp.open:
+        _levels = ["DEBUG", "INFO", "WARNING", "ERROR"]
+        _level = st.selectbox("Log level", _levels, index=_levels.index(diag_log.current_level()), key="diag_log_level")
+        if _level != diag_log.current_level():
+            diag_log.set_level(_level)
+        _records = diag_log.recent(limit=500)
+        if _records:
+            _df_log = pd.DataFrame(_records)
+            _df_log["time"] = pd.to_datetime(_df_log["time"], unit="s", utc=True).dt.tz_convert("Asia/Bangkok").dt.strftime("%H:%M:%S")
+            _ns = st.multiselect("Namespace", sorted(_df_log["namespace"].unique()), key="diag_log_ns")
+            if _ns:
+                _df_log = _df_log[_df_log["namespace"].isin(_ns)]
+            st.dataframe(_df_log[["time", "level", "namespace", "message"]], hide_index=True, use_container_width=True)
+        else:
+            st.caption("No log records yet")
+        _dropped = diag_log.suppressed()
+        if _dropped:
+            st.caption("Sampled out: " + ", ".join(f"{ns}.{ev} ×{n:,}" for (ns, ev), n in sorted(_dropped.items())))
+        if st.button("Clear log", key="diag_log_clear"):
+            diag_log.clear()
+            st.rerun()
+
 # แปลงกลับเป็นชื่อเมนูเดิม (ลบจุดสีแดงและตัวเลข count ออก)
 # ตัวอย่าง: "🔴 Fiber Flapping (33)" → "Fiber Flapping"
 original_menu = re.sub(r"🔴 (.+?) \(\d+\)", r"\1", menu)  # ลบ emoji + count
@@ -330,25 +581,16 @@ if original_menu == "Home":
             
             total_files = len(files)
             uploaded_count = 0
+            status_text.text(f"📤 Uploading {total_files} file(s)...")
             
-            for i, file in enumerate(files):
-                # อัพเดท status
-                status_text.text(f"📤 Uploading {file.name}... ({i+1}/{total_files})")
-                
-                # อัพเดท progress bar
-                progress = (i + 1) / total_files
-                progress_bar.progress(progress)
-                
-                # อัปโหลดไฟล์
-                try:
-                    save_file(str(chosen_date), file, use_storage=use_storage)
+            # อัปโหลดพร้อมกันหลายไฟล์ แล้วอัพเดท progress ตามลำดับที่เสร็จ
+            for i, (file, err) in enumerate(save_files(str(chosen_date), files, use_storage=use_storage)):
+                if err is None:
                     uploaded_count += 1
-                except Exception as e:
-                    st.error(f"❌ Failed to upload {file.name}: {e}")
-                
-                # เพิ่ม delay เล็กน้อยเพื่อให้เห็น progress
-                import time
-                time.sleep(0.5)
+                    status_text.text(f"📤 Uploaded {file.name} ({i+1}/{total_files})")
+                else:
+                    st.error(f"❌ Failed to upload {file.name}: {err}")
+                progress_bar.progress((i + 1) / total_files)
             
             # เสร็จสิ้น
             progress_bar.progress(1.0)
@@ -365,8 +607,23 @@ if original_menu == "Home":
             st.rerun()
 
     st.subheader("Calendar")
+    # เดือนที่แสดงอยู่ — ปุ่มเลื่อนเดือนของเราเอง เพื่อให้ดึงจำนวนไฟล์เฉพาะเดือนนี้
+    if "calendar_month" not in st.session_state:
+        st.session_state["calendar_month"] = date.today().replace(day=1)
+    cal_month = st.session_state["calendar_month"]
+    nav_prev, nav_title, nav_next = st.columns([1, 4, 1])
+    with nav_prev:
+        if st.button("◀", key="cal_prev"):
+            cal_month = (cal_month - timedelta(days=1)).replace(day=1)
+    with nav_next:
+        if st.button("▶", key="cal_next"):
+            cal_month = (cal_month + timedelta(days=32)).replace(day=1)
+    st.session_state["calendar_month"] = cal_month
+    with nav_title:
+        st.markdown(f"**{cal_month:%B %Y}**")
+
     events = []
-    for d, cnt in list_dates_with_files():
+    for d, cnt in list_dates_with_files(cal_month):
         events.append({
             "title": f"{cnt} file(s)",
             "start": d,
@@ -378,10 +635,12 @@ if original_menu == "Home":
         events=events,
         options={
             "initialView": "dayGridMonth",
+            "initialDate": str(cal_month),
+            "headerToolbar": {"left": "", "center": "", "right": ""},
             "height": "400px",
             "selectable": True,
         },
-        key="calendar",
+        key=f"calendar_{cal_month}",
     )
 
     if "selected_date" not in st.session_state:
@@ -399,16 +658,35 @@ if original_menu == "Home":
 
     selected_date = st.session_state["selected_date"]
 
-    st.subheader(f"Files for {selected_date}")
-    files_list = list_files_by_date(selected_date)
+    # หลายวัน: เลือกไฟล์จากทั้งช่วงวันที่ แล้ววิเคราะห์รวมกันเป็นชุดเดียว (utils/combine.py)
+    combine_dates = st.checkbox(
+        "📆 Combine multiple dates",
+        key="combine_dates",
+        help="Analyze files from a date range together (overlapping time windows are counted once)",
+    )
+    if combine_dates:
+        sel = date.fromisoformat(selected_date)
+        date_range = st.date_input("Date range", value=(sel - timedelta(days=6), sel), key="combine_range")
+        if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+            range_start, range_end = date_range
+        else:  # ยังเลือกไม่ครบสองวัน
+            range_start = range_end = date_range[0] if date_range else sel
+        st.subheader(f"Files for {range_start} → {range_end}")
+        files_list = [
+            (fid, fname, fpath, f"{d} · {fname}")
+            for fid, fname, fpath, d in list_files_by_date_range(str(range_start), str(range_end))
+        ]
+    else:
+        st.subheader(f"Files for {selected_date}")
+        files_list = [(fid, fname, fpath, fname) for fid, fname, fpath in list_files_by_date(selected_date)]
     if not files_list:
         st.info("No files for this date")
     else:
         selected_files = []
-        for fid, fname, fpath in files_list:
+        for fid, fname, fpath, label in files_list:
             col1, col2 = st.columns([4, 1])
             with col1:
-                checked = st.checkbox(fname, key=f"chk_{fid}")
+                checked = st.checkbox(label, key=f"chk_{fid}")
                 if checked:
                     selected_files.append((fid, fname, fpath))
             with col2:
@@ -450,7 +728,15 @@ if original_menu == "Home":
                 
                 clear_all_uploaded_data()
                 
-                for i, (fid, fname, fpath) in enumerate(selected_files):
+                # ข้อมูลชนิดเดียวกันจากหลายไฟล์ → รวมเป็นชุดเดียว (ไฟล์ก่อนชนะเมื่อช่วงเวลาซ้อนกัน)
+                combiner = FrameCombiner()
+                source_keys = {}
+                
+                # metadata ดึงครั้งเดียว + ดาวน์โหลดพร้อมกันล่วงหน้า ระหว่างที่ parse ไฟล์ก่อนหน้า
+                names = {fid: fname for fid, fname, _ in selected_files}
+                opened = iter_files_for_analysis([fid for fid, _, _ in selected_files])
+                for i, (fid, file_bytes, columnar, record, err) in enumerate(opened):
+                    fname = names[fid]
                     # อัพเดท status
                     analysis_status.text(f"🔍 Analyzing {fname}... ({i+1}/{total_files})")
                     
@@ -459,8 +745,8 @@ if original_menu == "Home":
                     analysis_progress.progress(progress)
                     
                     try:
-                        # ดึงไฟล์จาก database หรือดิสก์
-                        file_bytes = get_file_for_analysis(fid)
+                        if err is not None:
+                            raise err
                         
                         if file_bytes is None:
                             st.warning(f"⚠️ File not found: {fname}")
@@ -473,43 +759,44 @@ if original_menu == "Home":
                                 st.rerun()
                             continue
                         
-                        lname = fname.lower()  # ใช้ชื่อไฟล์แทน path
-                        if lname.endswith(".zip"):
-                            zip_bytes = file_bytes
-                            res = find_in_zip(zip_bytes)
-                            # record results from zip
-                            for kind, pack in res.items():
-                                if not pack:
-                                    continue
-                                df, zname = pack
-                                if kind == "wason":
-                                    st.session_state["wason_log"] = df    # ✅ string log
-                                    st.session_state["wason_file"] = zname
-                                else:
-                                    st.session_state[f"{kind}_data"] = df # ✅ DataFrame
-                                    st.session_state[f"{kind}_file"] = zname
-                            processed_files += 1
-                        else:
-                            # Direct Excel/TXT file
-                            ext = _ext(lname)
-                            kind = _kind(lname)
-                            if not ext or not kind:
-                                raise ValueError("Unsupported file type or cannot infer kind")
-                            data = LOADERS[ext](file_bytes)
-                            if kind == "wason":
-                                st.session_state["wason_log"] = data
-                                st.session_state["wason_file"] = fname
-                            else:
-                                st.session_state[f"{kind}_data"] = data
-                                st.session_state[f"{kind}_file"] = fname
-                            processed_files += 1
+                        # parse (ไฟล์เนื้อหาซ้ำใช้ผลเดิมตาม checksum)
+                        checksum = (record or {}).get("checksum")
+                        res = None
+                        if columnar:
+                            try:
+                                res = parse_upload(fname, file_bytes, checksum, columnar=True)
+                            except Exception as e:
+                                # bundle เสีย/อ่านไม่ได้ → กลับไปใช้ต้นฉบับ
+                                log.warning("columnar_unusable", file=fname, error=e)
+                                file_bytes.close()
+                                file_bytes = _open_record(record)
+                                if file_bytes is None:
+                                    raise
+                        if res is None:
+                            res = parse_upload(fname, file_bytes, checksum)
+                        combiner.add_parsed(res)
+                        for kind, (_, src_name) in res.items():
+                            source_keys.setdefault(kind, []).append(f"{checksum}:{src_name}" if checksum else None)
+                        processed_files += 1
                         
                     except Exception as e:
                         st.error(f"❌ Failed to analyze {fname}: {e}")
-                    
-                    # เพิ่ม delay เล็กน้อยเพื่อให้เห็น progress
-                    import time
-                    time.sleep(0.3)
+                    finally:
+                        if file_bytes is not None:
+                            file_bytes.close()
+                
+                for kind, (data, src_name) in combiner.result().items():
+                    if kind == "wason":
+                        st.session_state["wason_log"] = data    # ✅ string log
+                        st.session_state["wason_file"] = src_name
+                    else:
+                        st.session_state[f"{kind}_data"] = data # ✅ DataFrame
+                        st.session_state[f"{kind}_file"] = src_name
+                    # cache key ของข้อมูลรวม = checksum ของทุกไฟล์ตามลำดับ (ไฟล์ไหนไม่มี checksum → ไม่ cache)
+                    keys = source_keys.get(kind, [])
+                    st.session_state[f"{kind}_checksum"] = "|".join(keys) if keys and all(keys) else None
+                    if combiner.dropped(kind):
+                        st.caption(f"{kind.upper()}: skipped {combiner.dropped(kind):,} row(s) already covered by an earlier file")
                 
                 # เสร็จสิ้นการวิเคราะห์
                 analysis_progress.progress(1.0)
@@ -520,71 +807,58 @@ if original_menu == "Home":
                 # ==============================
                 analysis_status.text("🔄 Initializing analyzers for sidebar indicators...")
                 
+                # analyzer ของข้อมูลเดิม (checksum เดิม) ใช้ผล prepare() จาก cache (ตาราง + สถานะ ไม่ใช่ object ทั้งตัว)
                 # Initialize CPU analyzer
                 if st.session_state.get("cpu_data") is not None:
                     try:
-                        df_ref = pd.read_excel("data/CPU.xlsx")
-                        analyzer = CPU_Analyzer(
+                        _prepare_analyzer("cpu", ("cpu",), lambda: CPU_Analyzer(
                             df_cpu=st.session_state["cpu_data"].copy(),
-                            df_ref=df_ref.copy(),
+                            df_ref=load_reference("cpu_ref", "data/CPU.xlsx"),
                             ns="cpu_summary"
-                        )
-                        analyzer.prepare()
-                        st.session_state["cpu_analyzer"] = analyzer
+                        ))
                     except Exception as e:
                         st.write(f"CPU analyzer initialization failed: {e}")
                 
                 # Initialize FAN analyzer
                 if st.session_state.get("fan_data") is not None:
                     try:
-                        df_ref = pd.read_excel("data/FAN.xlsx")
-                        analyzer = FAN_Analyzer(
+                        _prepare_analyzer("fan", ("fan",), lambda: FAN_Analyzer(
                             df_fan=st.session_state["fan_data"].copy(),
-                            df_ref=df_ref.copy(),
+                            df_ref=load_reference("fan_ref", "data/FAN.xlsx"),
                             ns="fan_summary"
-                        )
-                        analyzer.prepare()
-                        st.session_state["fan_analyzer"] = analyzer
+                        ))
                     except Exception as e:
                         st.write(f"FAN analyzer initialization failed: {e}")
                 
                 # Initialize MSU analyzer
                 if st.session_state.get("msu_data") is not None:
                     try:
-                        df_ref = pd.read_excel("data/MSU.xlsx")
-                        analyzer = MSU_Analyzer(
+                        _prepare_analyzer("msu", ("msu",), lambda: MSU_Analyzer(
                             df_msu=st.session_state["msu_data"].copy(),
-                            df_ref=df_ref.copy(),
+                            df_ref=load_reference("msu_ref", "data/MSU.xlsx"),
                             ns="msu_summary"
-                        )
-                        analyzer.prepare()
-                        st.session_state["msu_analyzer"] = analyzer
+                        ))
                     except Exception as e:
                         st.write(f"MSU analyzer initialization failed: {e}")
                 
                 # Initialize Line analyzer
                 if st.session_state.get("line_data") is not None:
                     try:
-                        df_ref = pd.read_excel("data/Line.xlsx")
-                        analyzer = Line_Analyzer(
+                        _prepare_analyzer("line", ("line",), lambda: Line_Analyzer(
                             df_line=st.session_state["line_data"].copy(),
-                            df_ref=df_ref.copy(),
+                            df_ref=load_reference("line_ref", "data/Line.xlsx"),
                             ns="line_summary"
-                        )
-                        analyzer.prepare()
-                        st.session_state["line_analyzer"] = analyzer
+                        ))
                     except Exception as e:
                         st.write(f"Line analyzer initialization failed: {e}")
                 
                 # Initialize Client analyzer
                 if st.session_state.get("client_data") is not None:
                     try:
-                        analyzer = Client_Analyzer(
+                        _prepare_analyzer("client", ("client",), lambda: Client_Analyzer(
                             df_client=st.session_state["client_data"].copy(),
                             ref_path="data/Client.xlsx"
-                        )
-                        analyzer.prepare()
-                        st.session_state["client_analyzer"] = analyzer
+                        ))
                     except Exception as e:
                         st.write(f"Client analyzer initialization failed: {e}")
                 
@@ -592,40 +866,35 @@ if original_menu == "Home":
                 if (st.session_state.get("osc_data") is not None and 
                     st.session_state.get("fm_data") is not None):
                     try:
-                        analyzer = FiberflappingAnalyzer(
+                        _prepare_analyzer("fiberflapping", ("osc", "fm"), lambda: FiberflappingAnalyzer(
                             df_optical=st.session_state["osc_data"].copy(),
                             df_fm=st.session_state["fm_data"].copy(),
-                            threshold=2.0,
-                            ref_path="data/Flapping.xlsx"
-                        )
-                        analyzer.prepare()
-                        st.session_state["fiberflapping_analyzer"] = analyzer
+                            threshold=FiberflappingAnalyzer.DEFAULT_THRESHOLD,
+                            ref_path="data/Flapping.xlsx",
+                            alarm_index=get_alarm_index(),
+                        ), prepared_attrs=(*PREPARED_ATTRS, "_sweep"), version=lambda: get_alarm_index().version)
                     except Exception as e:
                         st.write(f"Fiberflapping analyzer initialization failed: {e}")
                 
                 # Initialize EOL analyzer
                 if st.session_state.get("atten_data") is not None:
                     try:
-                        analyzer = EOLAnalyzer(
+                        _prepare_analyzer("eol", ("atten",), lambda: EOLAnalyzer(
                             df_ref=None,
                             df_raw_data=st.session_state["atten_data"].copy(),
                             ref_path="data/EOL.xlsx"
-                        )
-                        analyzer.prepare()
-                        st.session_state["eol_analyzer"] = analyzer
+                        ), prepared_attrs=("abnormal_tables",))
                     except Exception as e:
                         st.write(f"EOL analyzer initialization failed: {e}")
                 
                 # Initialize Core analyzer
                 if st.session_state.get("atten_data") is not None:
                     try:
-                        analyzer = CoreAnalyzer(
+                        _prepare_analyzer("core", ("atten",), lambda: CoreAnalyzer(
                             df_ref=None,
                             df_raw_data=st.session_state["atten_data"].copy(),
                             ref_path="data/EOL.xlsx"
-                        )
-                        analyzer.prepare()
-                        st.session_state["core_analyzer"] = analyzer
+                        ), prepared_attrs=("abnormal_tables",))
                     except Exception as e:
                         st.write(f"Core analyzer initialization failed: {e}")
                 
@@ -721,7 +990,7 @@ elif original_menu == "CPU":
             cpu_status.text("📊 Loading CPU reference data...")
             cpu_progress.progress(0.2)
             
-            df_ref = pd.read_excel("data/CPU.xlsx")
+            df_ref = load_reference("cpu_ref", "data/CPU.xlsx")
             cpu_progress.progress(0.4)
             
             cpu_status.text("🔍 Initializing CPU analyzer...")
@@ -755,7 +1024,7 @@ elif original_menu == "CPU":
 elif original_menu == "FAN":
     if st.session_state.get("fan_data") is not None:
         try:
-            df_ref = pd.read_excel("data/FAN.xlsx")
+            df_ref = load_reference("fan_ref", "data/FAN.xlsx")
             analyzer = FAN_Analyzer(
                 df_fan=safe_copy(st.session_state.get("fan_data")),
                 df_ref=df_ref.copy(),
@@ -763,7 +1032,7 @@ elif original_menu == "FAN":
             )
             analyzer.process()
             st.session_state["fan_analyzer"] = analyzer
-            st.write("DEBUG set fan_analyzer", st.session_state["fan_analyzer"])
+            log.debug("fan_analyzer_set", rows=len(analyzer.df_fan), abnormal=len(analyzer.df_abnormal))
 
         except Exception as e:
             st.error(f"An error occurred during processing: {e}")
@@ -774,7 +1043,7 @@ elif original_menu == "FAN":
 elif original_menu == "MSU":
     if st.session_state.get("msu_data") is not None:
         try:
-            df_ref = pd.read_excel("data/MSU.xlsx")
+            df_ref = load_reference("msu_ref", "data/MSU.xlsx")
             analyzer = MSU_Analyzer(
                 df_msu=safe_copy(st.session_state.get("msu_data")),
                 df_ref=df_ref.copy(),
@@ -801,7 +1070,7 @@ elif original_menu == "Line board":
 
     if df_line is not None:
         try:
-            df_ref = pd.read_excel("data/Line.xlsx")
+            df_ref = load_reference("line_ref", "data/Line.xlsx")
             analyzer = Line_Analyzer(
                 df_line=df_line.copy(),   # ✅ ต้องเป็น DataFrame
                 df_ref=df_ref.copy(),
@@ -824,9 +1093,6 @@ elif original_menu == "Client board":
     st.markdown("### Client Board")
     if st.session_state.get("client_data") is not None:
         try:
-            # โหลด Reference
-            df_ref = pd.read_excel("data/Client.xlsx")
-            
             # สร้าง Analyzer
             analyzer = Client_Analyzer(
                 df_client=st.session_state.client_data.copy(),
@@ -849,13 +1115,44 @@ elif original_menu == "Fiber Flapping":
 
     if (df_osc is not None) and (df_fm is not None):
         try:
-            analyzer = FiberflappingAnalyzer(
-                df_optical=df_osc.copy(),
-                df_fm=df_fm.copy(),
-                threshold=2.0,   # คงเดิม
-                ref_path="data/Flapping.xlsx"  # ใช้ชื่อไฟล์ตัวใหญ่ และมี fallback ภายใน
-            )
-            analyzer.process()
+            analyzer = _fiberflapping_analyzer(df_osc, df_fm)
+            # FM match ครั้งเดียว (เก็บใน analyzer) → เลื่อน threshold ได้ทันทีไม่ต้อง match ใหม่
+            sweep = analyzer.sweep()
+            threshold = _fiber_threshold_slider(sweep)
+            df_nomatch = sweep.at(threshold)
+            analyzer.render(df_nomatch, threshold=threshold)
+            analyzer.render_weekly_summary(df_nomatch, threshold=threshold)
+
+            # เนื้อหา expander สร้างเฉพาะตอนเปิด
+            curve_exp = lazy.expander("📈 Flapping vs threshold", key="fiber_curve_exp")
+            with curve_exp:
+                if curve_exp.open:
+                    curve = sweep.curve()
+                    fig = px.line(curve, x="Threshold (dB)", y=["Flapping rows", "Sites"], markers=False,
+                                  title="Fiber Flapping count by Max - Min threshold")
+                    fig.add_vline(x=threshold, line_dash="dash", line_color="red")
+                    st.plotly_chart(fig, use_container_width=True)
+
+            history_exp = lazy.expander("🗂️ FM alarm history", key="fm_history_exp")
+            with history_exp:
+                if history_exp.open:
+                    index = get_alarm_index()
+                    info = index.stats()
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Alarms", f"{info['alarms']:,}")
+                    c2.metric("Links", f"{info['links']:,}")
+                    c3.metric("Judged windows", f"{info['windows']:,}")
+                    if info["first_alarm"] is not None:
+                        st.caption(
+                            f"Alarms from {info['first_alarm']:%Y-%m-%d %H:%M} to {info['last_alarm']:%Y-%m-%d %H:%M} "
+                            f"| updated {info['updated_at']}"
+                        )
+                    st.caption("OSC windows already judged keep their result; new windows are matched against every FM export seen so far.")
+                    if st.button("Reset FM alarm history", key="fm_index_reset"):
+                        index.clear()
+                        st.session_state.pop("fiberflapping_analyzer", None)
+                        analysis_cache.clear()
+                        st.rerun()
             st.caption(
                 f"Using OSC: {st.session_state.get('osc_file')} | "
                 f"FM: {st.session_state.get('fm_file')}"
@@ -913,7 +1210,7 @@ elif original_menu == "Dashboard":
     # ตรวจสอบการเชื่อมต่อ Supabase
     supabase = get_supabase()
     if supabase.is_connected():
-        st.success("✅ Connected to Supabase Database")
+        st.success(f"✅ Connected to {supabase.backend_name} Database")
         
         # ==============================
         # Dashboard content will be displayed here
@@ -946,7 +1243,7 @@ elif original_menu == "Dashboard":
 
             site = str(row.get("Site Name", "-"))
             board = str(row.get("Measure Object", "-"))
-            cpu_pct = pd.to_numeric(row.get("CPU utilization ratio"), errors="coerce")
+            cpu_pct = row.get("CPU utilization ratio")
             if pd.notna(cpu_pct) and cpu_pct <= 1:
                 cpu_pct = cpu_pct * 100.0
 
@@ -994,7 +1291,7 @@ elif original_menu == "Dashboard":
             if df_type.empty:
                 return None
             # convert to percent if needed
-            val = pd.to_numeric(df_type["CPU utilization ratio"], errors="coerce")
+            val = df_type["CPU utilization ratio"]
             if pd.notna(val.max()) and val.max() <= 1:
                 val = val * 100.0
             df_type["CPU%"] = val
@@ -1004,16 +1301,9 @@ elif original_menu == "Dashboard":
         # Build merged CPU (from session if available)
         try:
             if st.session_state.get("cpu_data") is not None:
-                cpu_df = st.session_state["cpu_data"].copy()
-                ref = pd.read_excel("data/CPU.xlsx")
-
-                # Normalize columns
-                cpu_df.columns = (
-                    cpu_df.columns.astype(str).str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                )
-                ref.columns = (
-                    ref.columns.astype(str).str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                )
+                # ข้อมูล + reference ผ่าน schema แล้ว (ค่าวัด / threshold เป็น float64) → ไม่ต้อง cast ซ้ำ
+                cpu_df = apply_schema("cpu", st.session_state["cpu_data"]).copy()
+                ref = load_reference("cpu_ref", "data/CPU.xlsx")
 
                 # Merge
                 cpu_df["Mapping Format"] = (
@@ -1057,7 +1347,7 @@ elif original_menu == "Dashboard":
 
             site = str(row.get("Site Name", "-"))
             board = str(row.get("Measure Object", "-"))
-            rps = pd.to_numeric(row.get("Value of Fan Rotate Speed(Rps)"), errors="coerce")
+            rps = row.get("Value of Fan Rotate Speed(Rps)")
             value = float(rps) if pd.notna(rps) else 0.0
 
             # Bands relative to threshold (green/yellow/orange/red)
@@ -1116,23 +1406,14 @@ elif original_menu == "Dashboard":
             df_type = df_merged[df_merged["Measure Object"].astype(str).str.contains(type_token, na=False)].copy()
             if df_type.empty:
                 return None
-            val = pd.to_numeric(df_type["Value of Fan Rotate Speed(Rps)"], errors="coerce")
-            df_type["RpsVal"] = val
+            df_type["RpsVal"] = df_type["Value of Fan Rotate Speed(Rps)"]
             df_type = df_type.sort_values("RpsVal", ascending=False)
             return df_type.iloc[0] if not df_type.empty else None
 
         try:
             if st.session_state.get("fan_data") is not None:
-                fan_df = st.session_state["fan_data"].copy()
-                ref = pd.read_excel("data/FAN.xlsx")
-
-                # Normalize columns
-                fan_df.columns = (
-                    fan_df.columns.astype(str).str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                )
-                ref.columns = (
-                    ref.columns.astype(str).str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                )
+                fan_df = apply_schema("fan", st.session_state["fan_data"]).copy()
+                ref = load_reference("fan_ref", "data/FAN.xlsx")
 
                 # Merge with reference
                 fan_df["Mapping Format"] = (
@@ -1196,15 +1477,8 @@ elif original_menu == "Dashboard":
 
         try:
             if st.session_state.get("msu_data") is not None:
-                msu_df = st.session_state["msu_data"].copy()
-                ref = pd.read_excel("data/MSU.xlsx")
-
-                # Normalize
-                for df_ in (msu_df, ref):
-                    df_.columns = (
-                        df_.columns.astype(str)
-                        .str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                    )
+                msu_df = apply_schema("msu", st.session_state["msu_data"]).copy()
+                ref = load_reference("msu_ref", "data/MSU.xlsx")
 
                 # Merge with reference for Site Name
                 msu_df["Mapping Format"] = (
@@ -1223,10 +1497,6 @@ elif original_menu == "Dashboard":
                     "Site Name", "ME", "Measure Object", "Laser Bias Current(mA)"
                 ]].copy()
 
-                merged["Laser Bias Current(mA)"] = pd.to_numeric(
-                    merged["Laser Bias Current(mA)"], errors="coerce"
-                )
-
                 # Find maximum mA row
                 row_max = merged.sort_values("Laser Bias Current(mA)", ascending=False).iloc[0] if not merged.empty else None
 
@@ -1247,7 +1517,7 @@ elif original_menu == "Dashboard":
                         st.markdown("<div style='color:gray;'>Normal < 1100, Abnormal > 1100</div>", unsafe_allow_html=True)
 
                 # Counts
-                vals = pd.to_numeric(merged["Laser Bias Current(mA)"], errors="coerce")
+                vals = merged["Laser Bias Current(mA)"]
                 abn_cnt = int((vals > 1100).sum())
                 ok_cnt = int((vals < 1100).sum())
                 total = int(vals.notna().sum())
@@ -1268,15 +1538,8 @@ elif original_menu == "Dashboard":
         st.markdown("## Line")
         try:
             if st.session_state.get("line_data") is not None:
-                df_line = st.session_state["line_data"].copy()
-                ref = pd.read_excel("data/Line.xlsx")
-
-                # Normalize
-                for df_ in (df_line, ref):
-                    df_.columns = (
-                        df_.columns.astype(str)
-                        .str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                    )
+                df_line = apply_schema("line", st.session_state["line_data"]).copy()
+                ref = load_reference("line_ref", "data/Line.xlsx")
 
                 # Merge
                 df_line["Mapping Format"] = (
@@ -1294,15 +1557,14 @@ elif original_menu == "Dashboard":
                     how="inner",
                 )
 
-                # Cast
-                ber = pd.to_numeric(merged.get("Instant BER After FEC"), errors="coerce")
-                thr = pd.to_numeric(merged.get("Threshold"), errors="coerce")
-                vin = pd.to_numeric(merged.get("Input Optical Power(dBm)"), errors="coerce")
-                vout = pd.to_numeric(merged.get("Output Optical Power (dBm)"), errors="coerce")
-                min_in = pd.to_numeric(merged.get("Minimum threshold(in)"), errors="coerce")
-                max_in = pd.to_numeric(merged.get("Maximum threshold(in)"), errors="coerce")
-                min_out = pd.to_numeric(merged.get("Minimum threshold(out)"), errors="coerce")
-                max_out = pd.to_numeric(merged.get("Maximum threshold(out)"), errors="coerce")
+                ber = merged["Instant BER After FEC"]
+                thr = merged["Threshold"]
+                vin = merged["Input Optical Power(dBm)"]
+                vout = merged["Output Optical Power (dBm)"]
+                min_in = merged["Minimum threshold(in)"]
+                max_in = merged["Maximum threshold(in)"]
+                min_out = merged["Minimum threshold(out)"]
+                max_out = merged["Maximum threshold(out)"]
 
                 total = int(len(merged))
                 ber_abn = int(((thr.notna()) & (ber.notna()) & (ber > thr)).sum())
@@ -1342,14 +1604,14 @@ elif original_menu == "Dashboard":
                         preset_total = int(preset_df_temp["PresetNo"].nunique())
                         
                         # คำนวณ abnormal ต่อแถว
-                        pber = pd.to_numeric(preset_df_temp.get("Instant BER After FEC"), errors="coerce")
-                        pthr = pd.to_numeric(preset_df_temp.get("Threshold"), errors="coerce")
-                        pinv = pd.to_numeric(preset_df_temp.get("Input Optical Power(dBm)"), errors="coerce")
-                        pinL = pd.to_numeric(preset_df_temp.get("Minimum threshold(in)"), errors="coerce")
-                        pinH = pd.to_numeric(preset_df_temp.get("Maximum threshold(in)"), errors="coerce")
-                        pout = pd.to_numeric(preset_df_temp.get("Output Optical Power (dBm)"), errors="coerce")
-                        poutL = pd.to_numeric(preset_df_temp.get("Minimum threshold(out)"), errors="coerce")
-                        poutH = pd.to_numeric(preset_df_temp.get("Maximum threshold(out)"), errors="coerce")
+                        pber = preset_df_temp["Instant BER After FEC"]
+                        pthr = preset_df_temp["Threshold"]
+                        pinv = preset_df_temp["Input Optical Power(dBm)"]
+                        pinL = preset_df_temp["Minimum threshold(in)"]
+                        pinH = preset_df_temp["Maximum threshold(in)"]
+                        pout = preset_df_temp["Output Optical Power (dBm)"]
+                        poutL = preset_df_temp["Minimum threshold(out)"]
+                        poutH = preset_df_temp["Maximum threshold(out)"]
                         
                         row_abn = (
                             (pber.notna() & pthr.notna() & (pber > pthr)) |
@@ -1376,14 +1638,14 @@ elif original_menu == "Dashboard":
                     preset_df = preset_df.copy()
                     preset_df["PresetNo"] = preset_df["Route"].astype(str).str.extract(r"Preset\s*(\\d+)")
                     # Determine abnormal for each row
-                    pber = pd.to_numeric(preset_df.get("Instant BER After FEC"), errors="coerce")
-                    pthr = pd.to_numeric(preset_df.get("Threshold"), errors="coerce")
-                    pinv = pd.to_numeric(preset_df.get("Input Optical Power(dBm)"), errors="coerce")
-                    pinL = pd.to_numeric(preset_df.get("Minimum threshold(in)"), errors="coerce")
-                    pinH = pd.to_numeric(preset_df.get("Maximum threshold(in)"), errors="coerce")
-                    pout = pd.to_numeric(preset_df.get("Output Optical Power (dBm)"), errors="coerce")
-                    poutL= pd.to_numeric(preset_df.get("Minimum threshold(out)"), errors="coerce")
-                    poutH= pd.to_numeric(preset_df.get("Maximum threshold(out)"), errors="coerce")
+                    pber = preset_df["Instant BER After FEC"]
+                    pthr = preset_df["Threshold"]
+                    pinv = preset_df["Input Optical Power(dBm)"]
+                    pinL = preset_df["Minimum threshold(in)"]
+                    pinH = preset_df["Maximum threshold(in)"]
+                    pout = preset_df["Output Optical Power (dBm)"]
+                    poutL = preset_df["Minimum threshold(out)"]
+                    poutH = preset_df["Maximum threshold(out)"]
 
                     row_abn = (
                         (pber.notna() & pthr.notna() & (pber > pthr)) |
@@ -1416,15 +1678,8 @@ elif original_menu == "Dashboard":
         st.markdown("## Client")
         try:
             if st.session_state.get("client_data") is not None:
-                df_client = st.session_state["client_data"].copy()
-                ref = pd.read_excel("data/Client.xlsx")
-
-                # Normalize
-                for df_ in (df_client, ref):
-                    df_.columns = (
-                        df_.columns.astype(str)
-                        .str.strip().str.replace(r"\s+", " ", regex=True).str.replace("\u00a0", " ")
-                    )
+                df_client = apply_schema("client", st.session_state["client_data"]).copy()
+                ref = load_reference("client_ref", "data/Client.xlsx")
 
                 df_client["Mapping Format"] = (
                     df_client["ME"].astype(str).str.strip() + df_client["Measure Object"].astype(str).str.strip()
@@ -1442,12 +1697,12 @@ elif original_menu == "Dashboard":
                     how="inner",
                 )
 
-                vin = pd.to_numeric(merged.get("Input Optical Power(dBm)"), errors="coerce")
-                vout = pd.to_numeric(merged.get("Output Optical Power (dBm)"), errors="coerce")
-                min_in = pd.to_numeric(merged.get("Minimum threshold(in)"), errors="coerce")
-                max_in = pd.to_numeric(merged.get("Maximum threshold(in)"), errors="coerce")
-                min_out = pd.to_numeric(merged.get("Minimum threshold(out)"), errors="coerce")
-                max_out = pd.to_numeric(merged.get("Maximum threshold(out)"), errors="coerce")
+                vin = merged["Input Optical Power(dBm)"]
+                vout = merged["Output Optical Power (dBm)"]
+                min_in = merged["Minimum threshold(in)"]
+                max_in = merged["Maximum threshold(in)"]
+                min_out = merged["Minimum threshold(out)"]
+                max_out = merged["Maximum threshold(out)"]
 
                 # Exclude invalid -60
                 mask_valid = (vin != -60) & (vout != -60)
@@ -1482,6 +1737,7 @@ elif original_menu == "Dashboard":
                 eol = EOLAnalyzer(df_ref=None, df_raw_data=df_raw.copy(), ref_path="data/EOL.xlsx")
                 df_result = eol.build_result_df()
                 if not df_result.empty:
+                    # คงไว้: atten เก็บค่าดิบ (Fiber Break = ค่าที่ไม่ใช่ตัวเลข) → ผลต่างของ EOL ยังเป็น object
                     vals = pd.to_numeric(df_result.get("Loss current - Loss EOL"), errors="coerce")
                     remark = df_result.get("Remark").astype(str).fillna("")
                     status = []
@@ -1493,7 +1749,7 @@ elif original_menu == "Dashboard":
                         else:
                             status.append("EOL Normal")
                     with cols[0]:
-                        fig = px.pie(pd.DataFrame({"Status": status}), names="Status", hole=0.5,
+                        fig = px.pie(count_frame(status), names="Status", values="Count", hole=0.5,
                                      color="Status",
                                      color_discrete_map={"EOL Normal": "green", "EOL Excess Loss": "red", "EOL Fiber Break": "gold"})
                         fig.update_traces(textinfo="value+label")
@@ -1529,7 +1785,7 @@ elif original_menu == "Dashboard":
                         else:
                             status.append("Core Normal")
                     with cols[1]:
-                        fig = px.pie(pd.DataFrame({"Status": status}), names="Status", hole=0.5,
+                        fig = px.pie(count_frame(status), names="Status", values="Count", hole=0.5,
                                      color="Status",
                                      color_discrete_map={"Core Normal": "green", "Core Loss Excess": "red", "Core Fiber Break": "gold"})
                         fig.update_traces(textinfo="value+label")
@@ -1554,10 +1810,12 @@ elif original_menu == "Dashboard":
                 apo_sites = sum(1 for x in rendered if x[2])
                 noapo_sites = sum(1 for x in rendered if not x[2])
                 df_summary = pd.DataFrame({
-                    "Status": (["No APO Remnant"] * noapo_sites) + (["APO Remnant"] * apo_sites)
+                    "Status": ["No APO Remnant", "APO Remnant"],
+                    "Count": [noapo_sites, apo_sites],
                 })
+                df_summary = df_summary[df_summary["Count"] > 0]   # สถานะที่ไม่มีเลย → ไม่มี slice (เหมือนเดิม)
                 with cols[2]:
-                    fig = px.pie(df_summary, names="Status", hole=0.5,
+                    fig = px.pie(df_summary, names="Status", values="Count", hole=0.5,
                                  color="Status",
                                  color_discrete_map={"No APO Remnant": "green", "APO Remnant": "red"})
                     fig.update_traces(textinfo="value+label")
@@ -1578,17 +1836,12 @@ elif original_menu == "Dashboard":
             df_osc = st.session_state.get("osc_data")
             df_fm  = st.session_state.get("fm_data")
             if (df_osc is not None) and (df_fm is not None):
-                # Build minimal pipeline to get unmatched flapping per day
-                analyzer_ff = FiberflappingAnalyzer(
-                    df_optical=df_osc.copy(),
-                    df_fm=df_fm.copy(),
-                    threshold=2.0,
-                    ref_path="data/Flapping.xlsx",
-                )
-                df_opt = analyzer_ff.normalize_optical()
-                df_fm_norm, link_col = analyzer_ff.normalize_fm()
-                df_filtered = analyzer_ff.filter_optical_by_threshold(df_opt)
-                df_nomatch = analyzer_ff.find_nomatch(df_filtered, df_fm_norm, link_col)
+                # unmatched flapping per day ที่ threshold เดียวกับหน้า Fiber Flapping
+                sweep = _fiberflapping_analyzer(df_osc, df_fm).sweep()
+                df_nomatch = sweep.at(max(
+                    st.session_state.get("fiber_threshold", FiberflappingAnalyzer.DEFAULT_THRESHOLD),
+                    sweep.min_threshold,
+                ))
 
                 if df_nomatch.empty:
                     st.success("No unmatched fiber flapping records.")
@@ -90,8 +90,7 @@ class AuthManager:
             
             # บันทึกลง Supabase
             if self.supabase.is_connected():
-                result = self.supabase.supabase.table('users').insert(user_data).execute()
-                if result.data:
+                if self.supabase.insert_user(user_data):
                     st.success("Registration successful!")
                     return True
             
@@ -125,9 +124,8 @@ class AuthManager:
         """ตรวจสอบ credentials"""
         try:
             if self.supabase.is_connected():
-                result = self.supabase.supabase.table('users').select('*').eq('email', email).eq('is_active', True).execute()
-                if result.data:
-                    user = result.data[0]
+                user = self.supabase.get_user_by_email(email, active_only=True)
+                if user:
                     stored_hash = user.get('password_hash')
                     if stored_hash and self._verify_password(password, stored_hash):
                         return True
@@ -140,9 +138,7 @@ class AuthManager:
         """ดึงข้อมูลผู้ใช้จาก email"""
         try:
             if self.supabase.is_connected():
-                result = self.supabase.supabase.table('users').select('id, email, name, role, is_active').eq('email', email).execute()
-                if result.data:
-                    return result.data[0]
+                return self.supabase.get_user_by_email(email, 'id, email, name, role, is_active')
             return None
         except Exception as e:
             st.error(f"Get user error: {e}")
@@ -152,8 +148,7 @@ class AuthManager:
         """ตรวจสอบว่ามีผู้ใช้ email นี้แล้วหรือไม่"""
         try:
             if self.supabase.is_connected():
-                result = self.supabase.supabase.table('users').select('id').eq('email', email).execute()
-                return len(result.data) > 0
+                return self.supabase.get_user_by_email(email, 'id') is not None
             return False
         except Exception as e:
             st.error(f"User exists check error: {e}")
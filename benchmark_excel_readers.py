@@ -0,0 +1,173 @@
+"""
+Benchmark Excel reader backends ที่ใช้ตอน ingest (utils/excel_loader.py)
+
+เทียบเวลาโหลดและ peak memory ของ:
+  - pandas     : pd.read_excel (engine default = openpyxl) อ่านทุกคอลัมน์/ทุกแถว
+  - openpyxl   : stream read-only + projection/predicate ตาม LoadSpec
+  - calamine   : stream ผ่าน python-calamine + projection/predicate ตาม LoadSpec
+
+ข้อมูลที่ใช้:
+  1. ไฟล์ Excel ตัวอย่างใน ZIP ใต้ uploads/ (ชนิดไฟล์เดาจากชื่อแบบเดียวกับ app9._kind)
+  2. workbook สังเคราะห์ (FAN / Client / OSC) ตามจำนวนแถวที่กำหนด
+
+วิธีใช้:
+    python benchmark_excel_readers.py
+    python benchmark_excel_readers.py --rows 10000 50000 200000 --repeat 3
+    python benchmark_excel_readers.py --no-samples --rows 100000
+"""
+import argparse
+import glob
+import io
+import os
+import time
+import tracemalloc
+import warnings
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from utils.excel_loader import LOAD_SPECS, READERS, load_excel
+
+warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+
+# keyword → kind (ย่อจาก app9.KW เพื่อไม่ต้อง import app Streamlit)
+_KIND_KW = (
+    ("fan", "fan"), ("cpu", "cpu"), ("msu", "msu"), ("client", "client"),
+    ("line", "line"), ("osc", "osc"), ("fm", "alarm"), ("fm", "fault management"),
+    ("atten", "optical attenuation"),
+)
+
+
+def _guess_kind(name: str):
+    n = name.lower()
+    for kind, kw in _KIND_KW:
+        if kw in n:
+            return kind
+    return None
+
+
+def sample_workbooks(root: str = "uploads"):
+    """(label, kind, bytes) ของ Excel ใน ZIP ตัวอย่าง (ไม่ซ้ำชื่อไฟล์)"""
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(root, "**", "*.zip"), recursive=True)):
+        try:
+            zf = zipfile.ZipFile(path)
+        except zipfile.BadZipFile:
+            continue
+        for name in zf.namelist():
+            base = os.path.basename(name)
+            if not base.lower().endswith((".xlsx", ".xlsm")) or base in seen:
+                continue
+            kind = _guess_kind(base)
+            if kind in LOAD_SPECS:
+                seen.add(base)
+                yield base[:48], kind, zf.read(name)
+
+
+def synthetic_workbook(kind: str, rows: int, seed: int = 0) -> bytes:
+    """สร้าง workbook หน้าตาเหมือน export จาก NMS (มีคอลัมน์ที่ไม่ได้ใช้ปนอยู่ด้วย)"""
+    rng = np.random.default_rng(seed)
+    base = {
+        "Begin Time": ["2025-06-24 10:00:00"] * rows,
+        "End Time": ["2025-06-24 10:15:00"] * rows,
+        "Granularity": "15 minutes",
+        "ME": rng.choice([f"CR_WCO_{i:04d}_034_1Z_A" for i in range(200)], rows),
+        "ME IP": "30.40.145.1",
+    }
+    if kind == "fan":
+        base["Measure Object"] = rng.choice([f"FCC[0-1-100]-Fan[FanID:{i}]" for i in range(1, 13)], rows)
+        v = rng.uniform(30, 140, rows).round(2)
+        base.update({
+            "Max Value of Fan Rotate Speed(Rps)": v + 1,
+            "Min Value of Fan Rotate Speed(Rps)": v - 1,
+            "Value of Fan Rotate Speed(Rps)": v,
+        })
+    elif kind == "client":
+        base["Measure Object"] = rng.choice([f"C2Kx20[0-34-17]-OAC_Bi:{i}(T{i}/R{i})" for i in range(1, 21)], rows)
+        vin = rng.choice([-60.0, -5.9, -12.3], rows)
+        vout = rng.uniform(-4, -2, rows).round(2)
+        base.update({
+            "Max Value of Output Optical Power(dBm)": vout + 0.1,
+            "Min Value of Output Optical Power(dBm)": vout - 0.1,
+            "Input Optical Power(dBm)": vin,
+            "Max Value of Input Optical Power(dBm)": vin + 0.1,
+            "Min Value of Input Optical Power(dBm)": vin - 0.1,
+            "Output Optical Power (dBm)": vout,
+        })
+    elif kind == "osc":
+        base["Measure Object"] = rng.choice([f"OSC[0-1-{i}](CR_WCO_7701_034_1Z_A)" for i in range(1, 9)], rows)
+        vmin = rng.choice([-60.0, -20.0, -15.5], rows)
+        base.update({
+            "Max Value of Input Optical Power(dBm)": vmin + rng.choice([0.5, 1.0, 2.5, 3.0], rows),
+            "Min Value of Input Optical Power(dBm)": vmin,
+            "Input Optical Power(dBm)": vmin + 0.1,
+            "Max Value of Output Optical Power(dBm)": -3.2,
+            "Min Value of Output Optical Power(dBm)": -3.3,
+            "Output Optical Power (dBm)": -3.25,
+        })
+    else:
+        raise ValueError(f"no synthetic generator for {kind}")
+    buf = io.BytesIO()
+    pd.DataFrame(base).to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def _measure(fn, repeat: int):
+    best, peak, out = None, 0, None
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        _, p = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        best = dt if best is None else min(best, dt)
+        peak = max(peak, p)
+    return best, peak, out
+
+
+def bench_one(label: str, kind: str, data: bytes, repeat: int):
+    backends = {"pandas": lambda: pd.read_excel(io.BytesIO(data))}
+    for name in READERS:
+        backends[name] = lambda name=name: load_excel(kind, io.BytesIO(data), reader=name)
+
+    rows = []
+    for name, fn in backends.items():
+        try:
+            secs, peak, df = _measure(fn, repeat)
+            rows.append((label, kind, name, f"{secs:.3f}", f"{peak / 1e6:.1f}", f"{df.shape[0]}x{df.shape[1]}"))
+        except ImportError:
+            rows.append((label, kind, name, "n/a", "n/a", "not installed"))
+        except Exception as e:
+            rows.append((label, kind, name, "err", "err", str(e)[:40]))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="*", default=[10_000, 50_000],
+                    help="จำนวนแถวของ workbook สังเคราะห์ (default: 10000 50000)")
+    ap.add_argument("--kinds", nargs="*", default=["fan", "client", "osc"])
+    ap.add_argument("--repeat", type=int, default=1, help="วัดกี่รอบแล้วเอาเวลาที่ดีที่สุด")
+    ap.add_argument("--no-samples", action="store_true", help="ข้ามไฟล์ตัวอย่างใน uploads/")
+    args = ap.parse_args()
+
+    results = []
+    if not args.no_samples:
+        for label, kind, data in sample_workbooks():
+            results += bench_one(label, kind, data, args.repeat)
+    for n in args.rows:
+        for kind in args.kinds:
+            print(f"building synthetic {kind} workbook ({n:,} rows)...")
+            results += bench_one(f"synthetic-{n}", kind, synthetic_workbook(kind, n), args.repeat)
+
+    header = ("workbook", "kind", "reader", "seconds", "peak MB", "result")
+    widths = [max(len(str(r[i])) for r in results + [header]) for i in range(len(header))]
+    print()
+    for r in [header] + results:
+        print("  ".join(str(v).ljust(w) for v, w in zip(r, widths)))
+
+
+if __name__ == "__main__":
+    main()
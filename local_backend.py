@@ -0,0 +1,463 @@
+"""
+Backend แบบ local: SQLite (metadata + users) + filesystem (แทน Supabase Storage)
+
+มี method ชุดเดียวกับ SupabaseManager ที่แอปใช้ จึงสลับกันได้ผ่าน get_supabase()
+ใช้รันแอปแบบ offline, dev, test และ benchmark โดยไม่ต้องต่อเน็ต
+
+ตั้งค่า (Streamlit secrets หรือ env):
+    STORAGE_BACKEND = auto | supabase | local   (auto = Supabase ถ้ามี secrets ไม่งั้น local)
+    LOCAL_DB_PATH   = files.db
+    LOCAL_STORAGE_DIR = uploads/storage
+"""
+import base64
+import hashlib
+import mimetypes
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
+
+from utils.latency import latency
+
+DEFAULT_DB_PATH = "files.db"
+DEFAULT_STORAGE_DIR = os.path.join("uploads", "storage")
+_COPY_BLOCK = 1024 * 1024
+
+UPLOAD_COLUMNS = {
+    "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+    "upload_date": "TEXT",
+    "orig_filename": "TEXT",
+    "stored_path": "TEXT",
+    "storage_url": "TEXT",
+    "file_size": "INTEGER",
+    "file_type": "TEXT",
+    "mime_type": "TEXT",
+    "checksum": "TEXT",
+    "file_content": "TEXT",  # legacy (base64) — ไฟล์ใหม่ไม่ใช้
+    "columnar_path": "TEXT",  # bundle Parquet/zstd (utils/columnar.py)
+    "created_at": "TEXT",
+}
+USER_COLUMNS = ("id", "email", "name", "role", "password_hash", "is_active", "created_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    %s
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL UNIQUE,
+    name TEXT,
+    role TEXT DEFAULT 'user',
+    password_hash TEXT,
+    is_active INTEGER DEFAULT 1,
+    created_at TEXT
+);
+""" % ",\n    ".join(f"{c} {d}" for c, d in UPLOAD_COLUMNS.items())
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_uploads_date ON uploads(upload_date);
+CREATE INDEX IF NOT EXISTS idx_uploads_created_at ON uploads(created_at);
+CREATE INDEX IF NOT EXISTS idx_uploads_checksum ON uploads(checksum);
+CREATE INDEX IF NOT EXISTS idx_uploads_stored_path ON uploads(stored_path);
+CREATE INDEX IF NOT EXISTS idx_users_email_active ON users(email, is_active);
+"""
+
+
+def _setting(name: str, default: str) -> str:
+    value = None
+    try:
+        import streamlit as st
+        value = st.secrets.get(name)
+    except Exception:
+        pass
+    return value or os.getenv(name) or default
+
+
+class LocalManager:
+    """SQLite + filesystem ที่มี interface เดียวกับ SupabaseManager"""
+
+    backend_name = "Local SQLite"
+
+    def __init__(self, db_path: str | None = None, storage_dir: str | None = None):
+        self.db_path = db_path or _setting("LOCAL_DB_PATH", DEFAULT_DB_PATH)
+        self.storage_bucket: str = "network-files"
+        self.storage_root = os.path.join(storage_dir or _setting("LOCAL_STORAGE_DIR", DEFAULT_STORAGE_DIR), self.storage_bucket)
+        self.latency = latency
+        # sqlite3 connection ใช้ข้าม thread ไม่ได้ → แยก connection ต่อ thread
+        self._local = threading.local()
+        self._init_db()
+
+    # ===== CONNECTION =====
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # files.db รุ่นเก่ามีแค่ 5 คอลัมน์ → เติมคอลัมน์ที่ขาด
+        existing = {r["name"] for r in conn.execute("PRAGMA table_info(uploads)")}
+        for col, decl in UPLOAD_COLUMNS.items():
+            if col not in existing:
+                conn.execute(f"ALTER TABLE uploads ADD COLUMN {col} {decl}")
+        conn.executescript(_INDEXES)
+        conn.commit()
+
+    def is_connected(self) -> bool:
+        return True
+
+    @staticmethod
+    def _columns(columns: str, allowed) -> str:
+        if columns.strip() == "*":
+            return "*"
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        unknown = [c for c in cols if c not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        return ", ".join(cols)
+
+    # ===== STORAGE MANAGEMENT =====
+    def _object_path(self, file_path: str) -> str:
+        path = os.path.normpath(os.path.join(self.storage_root, file_path))
+        if not path.startswith(os.path.normpath(self.storage_root) + os.sep):
+            raise ValueError(f"Invalid storage path: {file_path}")
+        return path
+
+    def local_path(self, file_path: str) -> Optional[str]:
+        """path จริงบนดิสก์ของ object (ให้ผู้เรียกเปิดตรง ๆ ไม่ต้อง copy ผ่าน cache)"""
+        path = self._object_path(file_path)
+        return path if os.path.exists(path) else None
+
+    def public_url(self, file_path: str) -> str:
+        return f"local://{self.storage_bucket}/{file_path}"
+
+    def _write_object(self, chunks: Iterable[bytes], file_path: str, upsert: bool) -> Optional[str]:
+        dest = self._object_path(file_path)
+        if os.path.exists(dest) and not upsert:
+            print(f"❌ Object already exists: {file_path}")
+            return None
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f"{dest}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return self.public_url(file_path)
+
+    @latency.timed("storage.upload")
+    def upload_to_storage(self, file_bytes: bytes, file_path: str, upsert: bool = False) -> Optional[str]:
+        try:
+            return self._write_object([file_bytes], file_path, upsert)
+        except Exception as e:
+            print(f"❌ Storage upload error: {e}")
+            return None
+
+    @latency.timed("storage.upload_stream")
+    def upload_stream_to_storage(
+        self,
+        chunks: Iterable[bytes],
+        file_path: str,
+        total_size: int,
+        chunk_size: int = 0,
+        retries: int = 3,
+        upsert: bool = False,
+    ) -> Optional[str]:
+        try:
+            return self._write_object(chunks, file_path, upsert)
+        except Exception as e:
+            print(f"❌ Chunked storage upload error: {e}")
+            return None
+
+    @latency.timed("storage.download")
+    def download_from_storage(self, file_path: str) -> Optional[bytes]:
+        try:
+            with open(self._object_path(file_path), "rb") as f:
+                return f.read()
+        except Exception as e:
+            print(f"Storage download error: {e}")
+            return None
+
+    @latency.timed("storage.download_stream")
+    def download_to_file(self, file_path: str, dest, chunk_size: int = _COPY_BLOCK) -> bool:
+        try:
+            with open(self._object_path(file_path), "rb") as f:
+                shutil.copyfileobj(f, dest, chunk_size)
+            return True
+        except Exception as e:
+            print(f"Storage download error: {e}")
+            return False
+
+    @latency.timed("storage.delete")
+    def delete_from_storage(self, file_path: str) -> bool:
+        try:
+            os.remove(self._object_path(file_path))
+            return True
+        except Exception as e:
+            print(f"Storage delete error: {e}")
+            return False
+
+    # ===== FILE MANAGEMENT =====
+    @latency.timed("uploads.insert")
+    def save_upload_record(
+        self,
+        upload_date: str,
+        orig_filename: str,
+        stored_path: str,
+        storage_url: str = None,
+        file_size: Optional[int] = None,
+        checksum: Optional[str] = None,
+        columnar_path: Optional[str] = None,
+    ) -> Optional[int]:
+        try:
+            if checksum is None and os.path.exists(stored_path):
+                file_size = os.path.getsize(stored_path)
+                md5 = hashlib.md5()
+                with open(stored_path, "rb") as f:
+                    for block in iter(lambda: f.read(_COPY_BLOCK), b""):
+                        md5.update(block)
+                checksum = md5.hexdigest()
+
+            conn = self._conn()
+            cur = conn.execute(
+                """INSERT INTO uploads (upload_date, orig_filename, stored_path, storage_url,
+                                        file_size, file_type, mime_type, checksum, created_at, columnar_path)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    upload_date, orig_filename, stored_path, storage_url,
+                    file_size or 0,
+                    os.path.splitext(orig_filename)[1].lower(),
+                    mimetypes.guess_type(orig_filename)[0] or "application/octet-stream",
+                    checksum,
+                    datetime.now().isoformat(),
+                    columnar_path,
+                ),
+            )
+            conn.commit()
+            return cur.lastrowid
+        except Exception as e:
+            print(f"❌ Failed to save upload record: {e}")
+            return None
+
+    @latency.timed("uploads.get")
+    def get_upload_record(self, file_id: int, columns: str = "*") -> Optional[dict]:
+        try:
+            cols = self._columns(columns, UPLOAD_COLUMNS)
+            row = self._conn().execute(f"SELECT {cols} FROM uploads WHERE id = ?", (int(file_id),)).fetchone()
+            return dict(row) if row else None
+        except Exception as e:
+            print(f"Upload record lookup error: {e}")
+            return None
+
+    @latency.timed("uploads.get_many")
+    def get_upload_records(self, file_ids: list, columns: str = "*", batch_size: int = 500) -> dict:
+        if not file_ids:
+            return {}
+        records = {}
+        ids = list(dict.fromkeys(int(i) for i in file_ids))
+        try:
+            cols = self._columns(columns, UPLOAD_COLUMNS)
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                marks = ",".join("?" * len(batch))
+                for row in self._conn().execute(f"SELECT {cols} FROM uploads WHERE id IN ({marks})", batch):
+                    records[int(row["id"])] = dict(row)
+        except Exception as e:
+            print(f"Batch upload record lookup error: {e}")
+        return records
+
+    @latency.timed("uploads.by_checksum")
+    def find_upload_by_checksum(self, checksum: str) -> Optional[dict]:
+        if not checksum:
+            return None
+        row = self._conn().execute(
+            "SELECT id, stored_path, storage_url, file_size, columnar_path FROM uploads WHERE checksum = ? ORDER BY id LIMIT 1",
+            (checksum,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    @latency.timed("uploads.count_refs")
+    def count_path_references(self, stored_path: str) -> int:
+        row = self._conn().execute("SELECT COUNT(*) FROM uploads WHERE stored_path = ?", (stored_path,)).fetchone()
+        return int(row[0])
+
+    @latency.timed("uploads.file_content")
+    def get_file_content(self, file_id: int) -> Optional[bytes]:
+        row = self._conn().execute("SELECT file_content FROM uploads WHERE id = ?", (int(file_id),)).fetchone()
+        if not row or not row["file_content"]:
+            return None
+        return base64.b64decode(row["file_content"])
+
+    @latency.timed("uploads.by_date")
+    def get_files_by_date(self, upload_date: str) -> list:
+        rows = self._conn().execute(
+            "SELECT id, orig_filename, stored_path FROM uploads WHERE upload_date = ? ORDER BY id",
+            (upload_date,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    @latency.timed("uploads.by_date_range")
+    def get_files_by_date_range(self, start: str, end: str) -> list:
+        rows = self._conn().execute(
+            """SELECT id, orig_filename, stored_path, upload_date FROM uploads
+               WHERE upload_date BETWEEN ? AND ? ORDER BY upload_date, id""",
+            (start, end),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    @latency.timed("uploads.delete")
+    def delete_file_record(self, file_id: int) -> bool:
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM uploads WHERE id = ?", (int(file_id),))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"❌ Failed to delete file record: {e}")
+            return False
+
+    @latency.timed("uploads.dates")
+    def get_dates_with_files(self, start: Optional[str] = None, end: Optional[str] = None) -> list:
+        sql = "SELECT upload_date, COUNT(*) FROM uploads WHERE 1 = 1"
+        params = []
+        if start:
+            sql += " AND upload_date >= ?"
+            params.append(start)
+        if end:
+            sql += " AND upload_date < ?"
+            params.append(end)
+        sql += " GROUP BY upload_date ORDER BY upload_date"
+        return [(r[0], int(r[1])) for r in self._conn().execute(sql, params)]
+
+    def invalidate_date_counts(self) -> None:
+        """นับจาก SQLite ตรง ๆ ทุกครั้งอยู่แล้ว (ไม่มี cache ให้ล้าง)"""
+
+    # ===== BULK (storage_maintenance.py) =====
+    def iter_upload_records(self, columns: str = "*", page_size: int = 1000) -> Iterator[list]:
+        cols = self._columns(columns, UPLOAD_COLUMNS)
+        last_id = 0
+        while True:
+            rows = self._conn().execute(
+                f"SELECT {cols} FROM uploads WHERE id > ? ORDER BY id LIMIT ?", (last_id, page_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [dict(r) for r in rows]
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]["id"]
+
+    def list_storage_objects(self, prefix: str = "", page_size: int = 1000) -> Iterator[Tuple[str, int]]:
+        root = self.storage_root
+        for dirpath, _, names in os.walk(os.path.join(root, prefix) if prefix else root):
+            for n in names:
+                if n.endswith(".part"):
+                    continue
+                full = os.path.join(dirpath, n)
+                yield os.path.relpath(full, root).replace(os.sep, "/"), os.path.getsize(full)
+
+    @latency.timed("uploads.update")
+    def update_upload_record(self, file_id: int, data: dict) -> bool:
+        data = {k: v for k, v in data.items() if k in UPLOAD_COLUMNS and k != "id"}
+        if not data:
+            return False
+        try:
+            conn = self._conn()
+            sets = ", ".join(f"{k} = ?" for k in data)
+            conn.execute(f"UPDATE uploads SET {sets} WHERE id = ?", [*data.values(), int(file_id)])
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Upload record update error: {e}")
+            return False
+
+    @latency.timed("uploads.update_by")
+    def update_upload_records_by(self, column: str, value, data: dict) -> bool:
+        data = {k: v for k, v in data.items() if k in UPLOAD_COLUMNS and k != "id"}
+        if column not in UPLOAD_COLUMNS or not data:
+            return False
+        try:
+            conn = self._conn()
+            sets = ", ".join(f"{k} = ?" for k in data)
+            conn.execute(f"UPDATE uploads SET {sets} WHERE {column} = ?", [*data.values(), value])
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Upload record update error: {e}")
+            return False
+
+    @latency.timed("storage.move")
+    def move_object(self, src: str, dst: str) -> bool:
+        try:
+            target = self._object_path(dst)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(self._object_path(src), target)
+            return True
+        except Exception as e:
+            print(f"Storage move error: {e}")
+            return False
+
+    @latency.timed("uploads.delete_many")
+    def delete_file_records(self, file_ids: list, batch_size: int = 500) -> int:
+        ids = [int(i) for i in file_ids]
+        conn = self._conn()
+        deleted = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            cur = conn.execute(f"DELETE FROM uploads WHERE id IN ({','.join('?' * len(batch))})", batch)
+            deleted += cur.rowcount
+        conn.commit()
+        return deleted
+
+    @latency.timed("storage.delete_many")
+    def delete_objects(self, paths: list, batch_size: int = 500) -> int:
+        deleted = 0
+        for p in paths:
+            try:
+                os.remove(self._object_path(p))
+                deleted += 1
+            except Exception as e:
+                print(f"Storage delete error: {e}")
+        return deleted
+
+    # ===== USERS =====
+    @latency.timed("users.insert")
+    def insert_user(self, user_data: dict) -> Optional[dict]:
+        data = {k: v for k, v in user_data.items() if k in USER_COLUMNS and k != "id"}
+        if "is_active" in data:
+            data["is_active"] = int(bool(data["is_active"]))
+        cols = ", ".join(data)
+        marks = ", ".join("?" * len(data))
+        conn = self._conn()
+        cur = conn.execute(f"INSERT INTO users ({cols}) VALUES ({marks})", list(data.values()))
+        conn.commit()
+        return self._user_row(conn.execute("SELECT * FROM users WHERE id = ?", (cur.lastrowid,)).fetchone())
+
+    @latency.timed("users.by_email")
+    def get_user_by_email(self, email: str, columns: str = "*", active_only: bool = False) -> Optional[dict]:
+        cols = self._columns(columns, USER_COLUMNS)
+        sql = f"SELECT {cols} FROM users WHERE email = ?"
+        if active_only:
+            sql += " AND is_active = 1"
+        return self._user_row(self._conn().execute(sql + " LIMIT 1", (email,)).fetchone())
+
+    @staticmethod
+    def _user_row(row) -> Optional[dict]:
+        if row is None:
+            return None
+        user = dict(row)
+        if "is_active" in user:
+            user["is_active"] = bool(user["is_active"])
+        return user
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+เครื่องมือดูแลไฟล์ที่อัปโหลด: เทียบ DB (uploads) / ดิสก์ / Storage bucket แล้วซ่อมหรือลบทีละ batch
+(แทน migrate_files_to_db.py และ cleanup_missing_files.py)
+
+คำสั่ง:
+    python storage_maintenance.py scan               # รายงานอย่างเดียว
+    python storage_maintenance.py migrate --dry-run  # ไฟล์บนดิสก์ / legacy base64 → Storage แล้วแก้ record
+    python storage_maintenance.py prune --dry-run    # ลบ record ที่ไม่มีไฟล์จริง + object ที่ไม่มี record อ้างถึง
+    python storage_maintenance.py tier --dry-run     # สร้าง bundle Parquet/zstd + ย้ายต้นฉบับเก่าไป cold/
+
+ตัวเลือก:
+    --workers N      จำนวนไฟล์ที่อัปโหลดพร้อมกัน (default 4)
+    --batch-size N   จำนวน record / object ต่อ batch (default 100)
+    --checkpoint P   ไฟล์ JSON เก็บ id ที่ทำเสร็จแล้ว (default .cache/storage_maintenance.json)
+    --no-resume      ไม่ใช้ checkpoint เดิม (เริ่มใหม่ทั้งหมด)
+    --yes            ไม่ต้องถามยืนยันก่อนแก้ข้อมูล
+    --cold-after-days N  อายุต้นฉบับก่อนย้ายไป cold/ (default COLD_AFTER_DAYS หรือ 30)
+
+ใช้ backend เดียวกับแอป (get_supabase → Supabase หรือ SQLite ตาม STORAGE_BACKEND)
+prune ควรรันตอนไม่มีใครอัปโหลด: object ที่เพิ่งอัปโหลดแต่ยังไม่บันทึก record จะถูกมองว่าไม่มีเจ้าของ
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from supabase_config import UPLOAD_CHUNK_SIZE, get_supabase, storage_object_path
+from utils.columnar import bundle_bytes, bundle_path, cold_after_days, cold_path, COLD_PREFIX
+from utils.ingest import parse_file
+
+DEFAULT_CHECKPOINT = os.path.join(".cache", "storage_maintenance.json")
+RECORD_COLUMNS = "id, upload_date, orig_filename, stored_path, storage_url, checksum, file_size, columnar_path, created_at"
+
+
+# -------------------- checkpoint --------------------
+class Checkpoint:
+    """id ที่ทำเสร็จแล้วแยกตามขั้นตอน — เขียนแบบ atomic หลังจบทุก batch"""
+
+    def __init__(self, path: str, resume: bool = True):
+        self.path = path
+        self.done = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {k: set(v) for k, v in json.load(f).items()}
+
+    def has(self, step: str, key) -> bool:
+        return key in self.done.get(step, ())
+
+    def add(self, step: str, keys) -> None:
+        self.done.setdefault(step, set()).update(keys)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: sorted(v) for k, v in self.done.items()}, f)
+        os.replace(tmp, self.path)
+
+
+# -------------------- throughput --------------------
+class Throughput:
+    def __init__(self, label: str, total: int):
+        self.label, self.total = label, total
+        self.count, self.bytes, self.failed = 0, 0, 0
+        self.t0 = time.perf_counter()
+
+    def add(self, nbytes: int = 0, ok: bool = True) -> None:
+        self.count += 1
+        self.bytes += nbytes
+        if not ok:
+            self.failed += 1
+
+    def report(self) -> str:
+        dt = max(time.perf_counter() - self.t0, 1e-9)
+        return (
+            f"{self.label}: {self.count}/{self.total} done ({self.failed} failed), "
+            f"{self.bytes / 1e6:.1f} MB, {self.count / dt:.1f} items/s, {self.bytes / 1e6 / dt:.2f} MB/s"
+        )
+
+
+def _batches(items, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# -------------------- scan --------------------
+def scan(db, batch_size: int) -> dict:
+    """เทียบ 3 แหล่งด้วย bulk listing → สรุปสถานะของทุก record และ object"""
+    t0 = time.perf_counter()
+    objects = dict(db.list_storage_objects())
+    records = [r for page in db.iter_upload_records(RECORD_COLUMNS) for r in page]
+
+    ok, migrate, missing = [], [], []
+    for r in records:
+        path = r["stored_path"]
+        if r.get("storage_url") and path in objects:
+            ok.append(r)
+        elif os.path.exists(path):
+            migrate.append(r)
+        else:
+            missing.append(r)
+
+    # ไฟล์เก่าที่เก็บเป็น base64 ใน DB: ดึง file_content เฉพาะ record ที่หาไฟล์ไม่เจอ
+    legacy_ids = set()
+    for batch in _batches([r["id"] for r in missing], batch_size):
+        for fid, row in db.get_upload_records(batch, "id, file_content").items():
+            if row.get("file_content"):
+                legacy_ids.add(fid)
+    migrate += [r for r in missing if r["id"] in legacy_ids]
+    missing = [r for r in missing if r["id"] not in legacy_ids]
+
+    missing_ids = {r["id"] for r in missing}
+    referenced = {r["stored_path"] for r in records if r["id"] not in missing_ids}
+    # bundle columnar เป็นของ record ที่ checksum ตรงกัน (ไม่ใช่ orphan)
+    referenced |= {bundle_path(r["checksum"]) for r in records if r.get("checksum") and r["id"] not in missing_ids}
+    orphans = sorted(p for p in objects if p not in referenced)
+
+    print(f"Scanned {len(records)} records and {len(objects)} storage objects in {time.perf_counter() - t0:.1f}s")
+    print(f"  OK (in storage)        : {len(ok)}")
+    print(f"  To migrate             : {len(migrate)} ({len(legacy_ids)} legacy base64)")
+    print(f"  Missing everywhere     : {len(missing)}")
+    print(f"  Orphan storage objects : {len(orphans)} ({sum(objects[p] for p in orphans) / 1e6:.1f} MB)")
+    return {
+        "objects": objects, "ok": ok, "migrate": migrate, "missing": missing,
+        "orphans": orphans, "legacy": legacy_ids,
+    }
+
+
+# -------------------- migrate --------------------
+def _open_source(db, record, legacy: bool):
+    if not legacy and os.path.exists(record["stored_path"]):
+        return open(record["stored_path"], "rb")
+    row = db.get_upload_record(record["id"], "id, file_content")
+    return io.BytesIO(base64.b64decode(row["file_content"]))
+
+
+def _chunks(f, size: int = UPLOAD_CHUNK_SIZE):
+    for block in iter(lambda: f.read(size), b""):
+        yield block
+
+
+def _migrate_one(db, record, objects: dict, legacy: bool) -> int:
+    """อัปโหลดไฟล์หนึ่งไฟล์ (stream ทีละ chunk) แล้วชี้ record ไปที่ object → จำนวน bytes"""
+    with _open_source(db, record, legacy) as f:
+        md5 = hashlib.md5()
+        for block in _chunks(f):
+            md5.update(block)
+        checksum = md5.hexdigest()
+        size = f.tell()
+        key = storage_object_path(checksum, record["orig_filename"])
+
+        if key in objects:
+            url = db.public_url(key)
+        else:
+            f.seek(0)
+            url = db.upload_stream_to_storage(_chunks(f), key, size, upsert=True)
+            if not url:
+                raise RuntimeError("upload failed")
+
+    data = {"stored_path": key, "storage_url": url, "checksum": checksum, "file_size": size}
+    if legacy:
+        data["file_content"] = None
+    if not db.update_upload_record(record["id"], data):
+        raise RuntimeError("record update failed")
+    return size
+
+
+def migrate(db, state: dict, ckpt: Checkpoint, args) -> None:
+    todo = [r for r in state["migrate"] if not ckpt.has("migrate", r["id"])]
+    print(f"\nMigrate: {len(todo)} file(s) to upload ({len(state['migrate']) - len(todo)} already done per checkpoint)")
+    if not todo:
+        return
+    if args.dry_run:
+        for r in todo[:20]:
+            print(f"  would upload #{r['id']} {r['orig_filename']} ({r['stored_path']})")
+        if len(todo) > 20:
+            print(f"  ... and {len(todo) - 20} more")
+        return
+    if not _confirm(args, f"Upload {len(todo)} file(s) and update their records?"):
+        return
+
+    stats = Throughput("migrate", len(todo))
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for batch in _batches(todo, args.batch_size):
+            futures = {
+                pool.submit(_migrate_one, db, r, state["objects"], r["id"] in state["legacy"]): r
+                for r in batch
+            }
+            done = []
+            for fut in as_completed(futures):
+                r = futures[fut]
+                try:
+                    stats.add(fut.result())
+                    done.append(r["id"])
+                except Exception as e:
+                    stats.add(ok=False)
+                    print(f"  ❌ #{r['id']} {r['orig_filename']}: {e}")
+            ckpt.add("migrate", done)
+            ckpt.save()
+            print("  " + stats.report())
+
+
+# -------------------- prune --------------------
+def prune(db, state: dict, ckpt: Checkpoint, args) -> None:
+    todo = [r for r in state["missing"] if not ckpt.has("prune_records", r["id"])]
+    ids = [r["id"] for r in todo]
+    orphans = [p for p in state["orphans"] if not ckpt.has("prune_objects", p)]
+    print(f"\nPrune: {len(ids)} record(s) without a file, {len(orphans)} orphan object(s)")
+    if not ids and not orphans:
+        return
+    if args.dry_run:
+        # รายการเดียวกับที่รันจริงจะลบ (ตัดที่ checkpoint บอกว่าลบไปแล้วออก)
+        for r in todo[:20]:
+            print(f"  would delete record #{r['id']} {r['orig_filename']} ({r['stored_path']})")
+        if len(todo) > 20:
+            print(f"  ... and {len(todo) - 20} more record(s)")
+        for p in orphans[:20]:
+            print(f"  would delete object {p}")
+        if len(orphans) > 20:
+            print(f"  ... and {len(orphans) - 20} more object(s)")
+        return
+    if not _confirm(args, f"Delete {len(ids)} record(s) and {len(orphans)} object(s)?"):
+        return
+
+    stats = Throughput("records", len(ids))
+    for batch in _batches(ids, args.batch_size):
+        n = db.delete_file_records(batch, batch_size=args.batch_size)
+        for _ in batch:
+            stats.add(ok=n == len(batch))
+        if n == len(batch):
+            ckpt.add("prune_records", batch)
+            ckpt.save()
+        print("  " + stats.report())
+
+    stats = Throughput("objects", len(orphans))
+    for batch in _batches(orphans, args.batch_size):
+        n = db.delete_objects(batch, batch_size=args.batch_size)
+        for p in batch:
+            stats.add(state["objects"].get(p, 0), ok=n == len(batch))
+        if n == len(batch):
+            ckpt.add("prune_objects", batch)
+            ckpt.save()
+        print("  " + stats.report())
+
+
+# -------------------- tier --------------------
+def _encode_one(db, record, objects: dict) -> int:
+    """parse ต้นฉบับ → bundle Parquet/zstd ที่ bundle_path(checksum) → ขนาด bundle (0 = ใช้ของเดิม)"""
+    key = bundle_path(record["checksum"])
+    size = 0
+    if key not in objects:
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as f:
+            local = db.local_path(record["stored_path"])
+            if local:
+                with open(local, "rb") as src:
+                    for block in _chunks(src):
+                        f.write(block)
+            elif not db.download_to_file(record["stored_path"], f):
+                raise RuntimeError("download failed")
+            f.seek(0)
+            data = bundle_bytes(parse_file(record["orig_filename"], f))
+        if data is None:
+            raise RuntimeError("tables cannot be stored as Parquet; keeping the original only")
+        if not db.upload_to_storage(data, key, upsert=True):
+            raise RuntimeError("bundle upload failed")
+        size = len(data)
+    if not db.update_upload_records_by("checksum", record["checksum"], {"columnar_path": key}):
+        raise RuntimeError("record update failed")
+    return size
+
+
+def _move_cold(db, src: str) -> str:
+    dst = cold_path(src)
+    if not db.move_object(src, dst):
+        raise RuntimeError("move failed")
+    if not db.update_upload_records_by("stored_path", src, {"stored_path": dst, "storage_url": db.public_url(dst)}):
+        raise RuntimeError("record update failed")
+    return dst
+
+
+def tier(db, state: dict, ckpt: Checkpoint, args) -> None:
+    """ขั้น 1: สร้าง bundle ให้ทุก checksum ที่ยังไม่มี / ขั้น 2: ย้ายต้นฉบับที่เก่าแล้วไป cold/"""
+    # หนึ่ง object ต่อ checksum → ทำครั้งเดียวต่อ checksum แม้มีหลาย record ชี้ไป
+    by_checksum = {}
+    for r in state["ok"]:
+        if r.get("checksum"):
+            by_checksum.setdefault(r["checksum"], []).append(r)
+
+    encode = [
+        rs[0] for c, rs in by_checksum.items()
+        if not ckpt.has("tier_encode", c)
+        and (bundle_path(c) not in state["objects"] or any(r.get("columnar_path") != bundle_path(c) for r in rs))
+    ]
+    cutoff = (datetime.now() - timedelta(days=args.cold_after_days)).isoformat()
+    cold = sorted({
+        r["stored_path"] for c, rs in by_checksum.items() for r in rs
+        if not r["stored_path"].startswith(COLD_PREFIX + "/")
+        and max(x.get("created_at") or "" for x in rs) < cutoff
+        and (bundle_path(c) in state["objects"] or any(e["checksum"] == c for e in encode))
+    })
+    print(f"\nTier: {len(encode)} upload(s) to encode, {len(cold)} original(s) older than {args.cold_after_days} days to move to {COLD_PREFIX}/")
+    if not encode and not cold:
+        return
+    if args.dry_run:
+        for r in encode[:20]:
+            print(f"  would encode #{r['id']} {r['orig_filename']} → {bundle_path(r['checksum'])}")
+        for p in cold[:20]:
+            print(f"  would move {p} → {cold_path(p)}")
+        return
+    if not _confirm(args, f"Encode {len(encode)} upload(s) and move {len(cold)} original(s) to cold storage?"):
+        return
+
+    encoded = set()
+    stats = Throughput("encode", len(encode))
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for batch in _batches(encode, args.batch_size):
+            futures = {pool.submit(_encode_one, db, r, state["objects"]): r for r in batch}
+            done = []
+            for fut in as_completed(futures):
+                r = futures[fut]
+                try:
+                    stats.add(fut.result())
+                    done.append(r["checksum"])
+                except Exception as e:
+                    stats.add(ok=False)
+                    print(f"  ❌ #{r['id']} {r['orig_filename']}: {e}")
+            encoded.update(done)
+            ckpt.add("tier_encode", done)
+            ckpt.save()
+            print("  " + stats.report())
+
+    # ย้ายเฉพาะต้นฉบับที่มี bundle แล้วจริง (encode ล้มเหลว → เก็บไว้ที่เดิม)
+    ready = {c for c in by_checksum if bundle_path(c) in state["objects"]} | encoded
+    checksum_of = {r["stored_path"]: r["checksum"] for rs in by_checksum.values() for r in rs}
+    cold = [p for p in cold if checksum_of[p] in ready and not ckpt.has("tier_cold", p)]
+    stats = Throughput("cold", len(cold))
+    for batch in _batches(cold, args.batch_size):
+        done = []
+        for p in batch:
+            try:
+                _move_cold(db, p)
+                stats.add(state["objects"].get(p, 0))
+                done.append(p)
+            except Exception as e:
+                stats.add(ok=False)
+                print(f"  ❌ {p}: {e}")
+        ckpt.add("tier_cold", done)
+        ckpt.save()
+        print("  " + stats.report())
+
+
+def _confirm(args, question: str) -> bool:
+    if args.yes:
+        return True
+    return input(f"{question} (y/N): ").strip().lower() in ("y", "yes")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["scan", "migrate", "prune", "tier"])
+    ap.add_argument("--dry-run", action="store_true", help="แสดงสิ่งที่จะทำ โดยไม่แก้ข้อมูล")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=100)
+    ap.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    ap.add_argument("--no-resume", action="store_true", help="ไม่ใช้ checkpoint เดิม")
+    ap.add_argument("--yes", action="store_true", help="ไม่ถามยืนยัน")
+    ap.add_argument("--cold-after-days", type=int, default=None, help="อายุต้นฉบับก่อนย้ายไป cold/")
+    args = ap.parse_args()
+    args.workers = max(1, args.workers)
+    args.batch_size = max(1, args.batch_size)
+    if args.cold_after_days is None:
+        args.cold_after_days = cold_after_days()
+
+    db = get_supabase()
+    if not db.is_connected():
+        print("ERROR: Cannot connect to the metadata backend")
+        sys.exit(1)
+    print(f"Backend: {db.backend_name}")
+
+    ckpt = Checkpoint(args.checkpoint, resume=not args.no_resume)
+    state = scan(db, args.batch_size)
+    if args.command == "migrate":
+        migrate(db, state, ckpt, args)
+    elif args.command == "prune":
+        prune(db, state, ckpt, args)
+    elif args.command == "tier":
+        tier(db, state, ckpt, args)
+
+
+if __name__ == "__main__":
+    main()
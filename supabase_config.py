@@ -1,19 +1,55 @@
 import os
 import streamlit as st
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from typing import Optional
 from datetime import datetime
 import hashlib
 import mimetypes
 import base64
 import io
+import time
+from typing import Iterable, Iterator, Tuple
+
+import httpx
+
+from utils.diag_log import get_logger
+from utils.latency import latency
+
+log = get_logger("supabase")
+
+# Supabase resumable upload ต้องใช้ chunk ขนาด 6 MB
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+# timeout ต่อ call (วินาที): metadata ต้องไม่ค้างหน้าเว็บ, transfer (ไฟล์ใหญ่) ให้นานกว่า
+CONNECT_TIMEOUT = 5.0
+REQUEST_TIMEOUT = 15.0
+TRANSFER_TIMEOUT = 120.0
+# ผลการตรวจว่า bucket มีอยู่ ใช้ซ้ำได้กี่วินาที
+BUCKET_CHECK_TTL = 600
+# จำนวนไฟล์ต่อวันของปฏิทิน (ล้างทันทีเมื่ออัปโหลด/ลบใน process นี้; TTL กันกรณี process อื่นแก้ข้อมูล)
+DATE_COUNTS_TTL = 120
+
+def storage_object_path(checksum: str, filename: str) -> str:
+    """path แบบ content-addressed: ไฟล์เนื้อหาเดียวกันใช้ object เดียวกันเสมอ"""
+    ext = os.path.splitext(filename)[1].lower()
+    return f"objects/{checksum[:2]}/{checksum}{ext}"
 
 class SupabaseManager:
     """จัดการการเชื่อมต่อและใช้งาน Supabase Database"""
     
+    backend_name = "Supabase"
+    
     def __init__(self):
         self.supabase: Optional[Client] = None
         self.storage_bucket: str = "network-files"
+        self._url: Optional[str] = None
+        self._key: Optional[str] = None
+        # connection pool (keep-alive) ใช้ร่วมกันทั้ง PostgREST / Storage / stream download / TUS
+        self._http: Optional[httpx.Client] = None
+        self._bucket_checked_at: float = 0.0
+        # {(start, end): (เวลาที่ดึง, [(date, count), ...])}
+        self._date_counts_cache: dict = {}
+        self.latency = latency
         self._init_connection()
     
     def _init_connection(self):
@@ -29,10 +65,29 @@ class SupabaseManager:
                 self.supabase = None
                 return
             
-            self.supabase = create_client(url, key)
+            self._http = httpx.Client(
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+                follow_redirects=True,
+                http2=True,
+            )
+            self.supabase = create_client(
+                url, key,
+                options=ClientOptions(
+                    httpx_client=self._http,
+                    postgrest_client_timeout=REQUEST_TIMEOUT,
+                    storage_client_timeout=int(TRANSFER_TIMEOUT),
+                ),
+            )
+            self._url, self._key = url.rstrip("/"), key
             
         except Exception as e:
-            # Silent fail - will check with is_connected()
+            # ไม่แสดงบน UI (เช็คที่ is_connected()) แต่ต้องมีใน log ว่าทำไมต่อไม่ได้
+            # เช่น ไม่มี h2 (http2=True) หรือ supabase รุ่นเก่าที่ ClientOptions ไม่มี httpx_client
+            log.error("init_connection_failed", error=e)
+            if self._http is not None:
+                self._http.close()
+                self._http = None
             self.supabase = None
     
     def is_connected(self) -> bool:
@@ -40,9 +95,39 @@ class SupabaseManager:
         return self.supabase is not None
     
     # ===== STORAGE MANAGEMENT =====
-    def upload_to_storage(self, file_bytes: bytes, file_path: str) -> Optional[str]:
+    def _bucket_exists(self) -> bool:
+        """ตรวจว่า bucket มีอยู่ (cache ผลไว้ BUCKET_CHECK_TTL วินาที แทนการ list ทุกครั้งที่อัปโหลด)"""
+        if time.monotonic() - self._bucket_checked_at < BUCKET_CHECK_TTL:
+            return True
+        try:
+            with latency.track("storage.list_buckets"):
+                buckets = self.supabase.storage.list_buckets()
+        except Exception as e:
+            # list ไม่ได้ (เช่น anon key ไม่มีสิทธิ์) → ลองอัปโหลดต่อไป ให้ error จริงมาจาก upload
+            print(f"⚠️ Could not list buckets: {e}")
+            return True
+        if self.storage_bucket not in [b.name for b in buckets]:
+            print(f"❌ Bucket '{self.storage_bucket}' not found!")
+            return False
+        self._bucket_checked_at = time.monotonic()
+        return True
+
+    def local_path(self, file_path: str) -> Optional[str]:
+        """object ของ Supabase ไม่มี path บนดิสก์ (ต้องดาวน์โหลด)"""
+        return None
+    
+    def public_url(self, file_path: str) -> Optional[str]:
+        """public URL ของ object (ไม่ตรวจว่ามีอยู่จริง)"""
+        if not self.is_connected():
+            return None
+        return self.supabase.storage.from_(self.storage_bucket).get_public_url(file_path)
+    
+    @latency.timed("storage.upload")
+    def upload_to_storage(self, file_bytes: bytes, file_path: str, upsert: bool = False) -> Optional[str]:
         """อัปโหลดไฟล์ไปยัง Supabase Storage
         
+        upsert=True ใช้กับ path แบบ content-addressed (เขียนทับด้วยเนื้อหาเดียวกันได้)
+        
         Returns:
             Public URL ของไฟล์ หรือ None ถ้าไม่สำเร็จ
         """
@@ -53,23 +138,17 @@ class SupabaseManager:
         try:
             print(f"🔄 Uploading to storage: {file_path} ({len(file_bytes)} bytes)")
             
-            # ตรวจสอบว่า bucket มีอยู่หรือไม่
-            try:
-                buckets = self.supabase.storage.list_buckets()
-                bucket_names = [b.name for b in buckets]
-                print(f"📦 Available buckets: {bucket_names}")
-                
-                if self.storage_bucket not in bucket_names:
-                    print(f"❌ Bucket '{self.storage_bucket}' not found!")
-                    return None
-            except Exception as e:
-                print(f"⚠️ Could not list buckets: {e}")
+            if not self._bucket_exists():
+                return None
             
             # อัปโหลดไฟล์
             result = self.supabase.storage.from_(self.storage_bucket).upload(
                 path=file_path,
                 file=file_bytes,
-                file_options={"content-type": "application/octet-stream"}
+                file_options={
+                    "content-type": "application/octet-stream",
+                    "upsert": "true" if upsert else "false",
+                }
             )
             
             print(f"📤 Upload result: {result}")
@@ -83,6 +162,108 @@ class SupabaseManager:
             print(f"❌ Storage upload error: {e}")
             return None
     
+    @latency.timed("storage.upload_stream")
+    def upload_stream_to_storage(
+        self,
+        chunks: Iterable[bytes],
+        file_path: str,
+        total_size: int,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+        retries: int = 3,
+        upsert: bool = False,
+    ) -> Optional[str]:
+        """อัปโหลดไฟล์จาก iterator ของ chunk (ขนาด chunk_size ยกเว้นก้อนสุดท้าย)
+
+        - ไฟล์เล็ก (≤ 1 chunk) → upload ครั้งเดียวผ่าน upload_to_storage (retry ได้)
+        - ไฟล์ใหญ่ → Supabase resumable upload (TUS) ทีละ chunk, chunk ที่ล้มเหลว
+          จะถาม offset จาก server (HEAD) แล้วส่งต่อจากจุดนั้น
+        chunks ถูกอ่านตามลำดับครั้งเดียว (ผู้เรียก hash ระหว่าง yield ได้)
+
+        Returns:
+            Public URL ของไฟล์ หรือ None ถ้าไม่สำเร็จ
+        """
+        if not self.is_connected():
+            print("❌ Supabase not connected")
+            return None
+
+        if total_size <= chunk_size:
+            payload = b"".join(chunks)
+            for attempt in range(1, retries + 1):
+                url = self.upload_to_storage(payload, file_path, upsert=upsert)
+                if url:
+                    return url
+                time.sleep(0.5 * attempt)
+            return None
+
+        try:
+            headers = {
+                "authorization": f"Bearer {self._key}",
+                "apikey": self._key,
+                "tus-resumable": "1.0.0",
+                "x-upsert": "true" if upsert else "false",
+            }
+            b64 = lambda v: base64.b64encode(v.encode()).decode()
+            meta = ",".join([
+                f"bucketName {b64(self.storage_bucket)}",
+                f"objectName {b64(file_path)}",
+                f"contentType {b64('application/octet-stream')}",
+            ])
+            http = self._http
+            timeout = httpx.Timeout(TRANSFER_TIMEOUT, connect=CONNECT_TIMEOUT)
+            resp = http.post(
+                f"{self._url}/storage/v1/upload/resumable",
+                headers={**headers, "upload-length": str(total_size), "upload-metadata": meta},
+                timeout=timeout,
+            )
+            resp.raise_for_status()
+            location = resp.headers["location"]
+
+            offset = 0
+            for chunk in chunks:
+                # ส่งเฉพาะส่วนที่ server ยังไม่มี: chunk[offset - start:] ที่ upload-offset = offset
+                start, end = offset, offset + len(chunk)
+                attempt = 0
+                while offset < end:
+                    try:
+                        r = http.patch(
+                            location,
+                            content=chunk[offset - start:],
+                            headers={
+                                **headers,
+                                "upload-offset": str(offset),
+                                "content-type": "application/offset+octet-stream",
+                            },
+                            timeout=timeout,
+                        )
+                        r.raise_for_status()
+                        new_offset = int(r.headers.get("upload-offset", end))
+                        if new_offset <= offset:
+                            raise RuntimeError(f"server offset did not advance past {offset}")
+                        offset = new_offset
+                    except Exception as e:
+                        attempt += 1
+                        if attempt >= retries:
+                            raise
+                        print(f"⚠️ Chunk at {offset} failed ({e}), retry {attempt}/{retries}")
+                        time.sleep(0.5 * attempt)
+                        # server อาจรับไปแล้วบางส่วน/ทั้งหมด → ถาม offset จริง แล้วส่งต่อจากตรงนั้น
+                        head = http.head(location, headers=headers, timeout=timeout)
+                        if head.status_code < 400 and "upload-offset" in head.headers:
+                            server_offset = int(head.headers["upload-offset"])
+                            if server_offset < start:
+                                # ข้อมูลก่อน chunk นี้หายไปแล้ว ส่งซ้ำไม่ได้ (chunks อ่านได้ครั้งเดียว)
+                                raise RuntimeError(
+                                    f"server offset {server_offset} is behind chunk start {start}"
+                                ) from e
+                            offset = server_offset
+
+            return self.supabase.storage.from_(self.storage_bucket).get_public_url(file_path)
+
+        except Exception as e:
+            print(f"❌ Chunked storage upload error: {e}")
+            return None
+
+    @latency.timed("storage.download")
     def download_from_storage(self, file_path: str) -> Optional[bytes]:
         """ดาวน์โหลดไฟล์จาก Supabase Storage
         
@@ -100,6 +281,43 @@ class SupabaseManager:
             print(f"Storage download error: {e}")
             return None
     
+    @latency.timed("storage.download_stream")
+    def download_to_file(self, file_path: str, dest, chunk_size: int = 1024 * 1024) -> bool:
+        """ดาวน์โหลดไฟล์จาก Storage แบบ stream ลง file object (ไม่ถือทั้งไฟล์ไว้ใน RAM)
+
+        ใช้ signed URL + httpx stream; ถ้าทำไม่ได้ fallback เป็น download_from_storage
+        Returns:
+            True ถ้าเขียนลง dest สำเร็จ
+        """
+        if not self.is_connected():
+            return False
+
+        try:
+            signed = self.supabase.storage.from_(self.storage_bucket).create_signed_url(file_path, 300)
+            url = signed.get("signedURL") or signed.get("signedUrl")
+            if url:
+                timeout = httpx.Timeout(TRANSFER_TIMEOUT, connect=CONNECT_TIMEOUT)
+                with self._http.stream("GET", url, timeout=timeout) as resp:
+                    resp.raise_for_status()
+                    for chunk in resp.iter_bytes(chunk_size):
+                        dest.write(chunk)
+                return True
+        except Exception as e:
+            print(f"Storage stream download error: {e}")
+            # เขียนไปบางส่วนแล้ว → ล้างทิ้งก่อน fallback
+            try:
+                dest.seek(0)
+                dest.truncate()
+            except Exception:
+                return False
+
+        content = self.download_from_storage(file_path)
+        if not content:
+            return False
+        dest.write(content)
+        return True
+
+    @latency.timed("storage.delete")
     def delete_from_storage(self, file_path: str) -> bool:
         """ลบไฟล์จาก Supabase Storage"""
         if not self.is_connected():
@@ -114,19 +332,34 @@ class SupabaseManager:
             return False
     
     # ===== FILE MANAGEMENT =====
-    def save_upload_record(self, upload_date: str, orig_filename: str, stored_path: str, storage_url: str = None) -> Optional[int]:
-        """บันทึก metadata การอัปโหลดไฟล์ (ไม่เก็บ file_content)"""
+    @latency.timed("uploads.insert")
+    def save_upload_record(
+        self,
+        upload_date: str,
+        orig_filename: str,
+        stored_path: str,
+        storage_url: str = None,
+        file_size: Optional[int] = None,
+        checksum: Optional[str] = None,
+        columnar_path: Optional[str] = None,
+    ) -> Optional[int]:
+        """บันทึก metadata การอัปโหลดไฟล์ (ไม่เก็บ file_content)
+
+        ถ้าผู้เรียกส่ง file_size / checksum มา (คำนวณระหว่างเขียน) จะไม่อ่านไฟล์ซ้ำจากดิสก์
+        """
         if not self.is_connected():
             return None
         
         try:
-            # คำนวณข้อมูลไฟล์จากดิสก์
-            file_size = 0
-            checksum = None
-            if os.path.exists(stored_path):
+            # คำนวณข้อมูลไฟล์จากดิสก์ (กรณีไม่ได้ส่งมา)
+            if checksum is None and os.path.exists(stored_path):
                 file_size = os.path.getsize(stored_path)
+                md5 = hashlib.md5()
                 with open(stored_path, "rb") as f:
-                    checksum = hashlib.md5(f.read()).hexdigest()
+                    for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                        md5.update(block)
+                checksum = md5.hexdigest()
+            file_size = file_size or 0
             
             file_extension = os.path.splitext(orig_filename)[1].lower()
             mime_type = mimetypes.guess_type(orig_filename)[0] or "application/octet-stream"
@@ -143,8 +376,11 @@ class SupabaseManager:
                 "checksum": checksum,
                 "created_at": datetime.now().isoformat()
             }
+            if columnar_path:
+                data["columnar_path"] = columnar_path
             
             result = self.supabase.table("uploads").insert(data).execute()
+            self.invalidate_date_counts()
             if result.data:
                 return result.data[0]["id"]
             return None
@@ -153,6 +389,84 @@ class SupabaseManager:
             st.error(f"❌ Failed to save upload record: {e}")
             return None
     
+    @latency.timed("uploads.get")
+    def get_upload_record(self, file_id: int, columns: str = "*") -> Optional[dict]:
+        """ดึง record ของไฟล์ตาม id (None ถ้าไม่พบ)"""
+        if not self.is_connected():
+            return None
+        
+        try:
+            result = self.supabase.table("uploads").select(columns).eq("id", file_id).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            print(f"Upload record lookup error: {e}")
+            return None
+    
+    @latency.timed("uploads.get_many")
+    def get_upload_records(self, file_ids: list, columns: str = "*", batch_size: int = 100) -> dict:
+        """ดึง record หลายไฟล์ด้วย in_ query (แบ่งเป็นชุดละ batch_size id) → {id: record}
+        columns ต้องมี id อยู่ด้วย
+        """
+        if not self.is_connected() or not file_ids:
+            return {}
+        
+        records = {}
+        ids = list(dict.fromkeys(int(i) for i in file_ids))
+        try:
+            for start in range(0, len(ids), batch_size):
+                result = (
+                    self.supabase.table("uploads")
+                    .select(columns)
+                    .in_("id", ids[start:start + batch_size])
+                    .execute()
+                )
+                for row in result.data or []:
+                    records[int(row["id"])] = row
+        except Exception as e:
+            print(f"Batch upload record lookup error: {e}")
+        return records
+    
+    @latency.timed("uploads.by_checksum")
+    def find_upload_by_checksum(self, checksum: str) -> Optional[dict]:
+        """หา record ที่มีเนื้อหาเดียวกัน (checksum ตรงกัน) สำหรับ dedup ตอนอัปโหลด"""
+        if not self.is_connected() or not checksum:
+            return None
+        
+        try:
+            result = (
+                self.supabase.table("uploads")
+                .select("id, stored_path, storage_url, file_size, columnar_path")
+                .eq("checksum", checksum)
+                .order("id")
+                .limit(1)
+                .execute()
+            )
+            return result.data[0] if result.data else None
+        except Exception as e:
+            print(f"Checksum lookup error: {e}")
+            return None
+    
+    @latency.timed("uploads.count_refs")
+    def count_path_references(self, stored_path: str) -> int:
+        """จำนวน record ที่ชี้ไปยัง object เดียวกัน (ใช้ตัดสินว่าลบ object ได้หรือยัง)"""
+        if not self.is_connected():
+            return 0
+        
+        try:
+            result = (
+                self.supabase.table("uploads")
+                .select("id", count="exact")
+                .eq("stored_path", stored_path)
+                .limit(1)
+                .execute()
+            )
+            return int(result.count or 0)
+        except Exception as e:
+            print(f"Reference count error: {e}")
+            # ไม่แน่ใจ → ถือว่ายังมีคนใช้ (ไม่ลบ object)
+            return 1
+    
+    @latency.timed("uploads.file_content")
     def get_file_content(self, file_id: int) -> Optional[bytes]:
         """ดึงเนื้อหาไฟล์จาก database"""
         if not self.is_connected():
@@ -183,6 +497,7 @@ class SupabaseManager:
             st.error(f"❌ Failed to get file content: {e}")
             return None
     
+    @latency.timed("uploads.by_date")
     def get_files_by_date(self, upload_date: str) -> list:
         """ดึงรายการไฟล์ตามวันที่"""
         if not self.is_connected():
@@ -195,6 +510,28 @@ class SupabaseManager:
             st.error(f"❌ Failed to get files by date: {e}")
             return []
     
+    @latency.timed("uploads.by_date_range")
+    def get_files_by_date_range(self, start: str, end: str) -> list:
+        """ดึงรายการไฟล์ระหว่างวันที่ start ถึง end (รวมทั้งสองวัน) เรียงตามวันแล้วตาม id"""
+        if not self.is_connected():
+            return []
+        
+        try:
+            result = (
+                self.supabase.table("uploads")
+                .select("id, orig_filename, stored_path, upload_date")
+                .gte("upload_date", start)
+                .lte("upload_date", end)
+                .order("upload_date")
+                .order("id")
+                .execute()
+            )
+            return result.data or []
+        except Exception as e:
+            st.error(f"❌ Failed to get files by date range: {e}")
+            return []
+    
+    @latency.timed("uploads.delete")
     def delete_file_record(self, file_id: int) -> bool:
         """ลบข้อมูลไฟล์"""
         if not self.is_connected():
@@ -202,35 +539,222 @@ class SupabaseManager:
         
         try:
             self.supabase.table("uploads").delete().eq("id", file_id).execute()
+            self.invalidate_date_counts()
             return True
         except Exception as e:
             st.error(f"❌ Failed to delete file record: {e}")
             return False
     
-    def get_dates_with_files(self) -> list:
-        """ดึงรายการวันที่ที่มีไฟล์"""
+    @latency.timed("uploads.dates")
+    def get_dates_with_files(self, start: Optional[str] = None, end: Optional[str] = None) -> list:
+        """จำนวนไฟล์ต่อวันในช่วง [start, end) (วันที่ ISO "YYYY-MM-DD"; None = ไม่จำกัด)
+
+        นับฝั่ง server ผ่าน RPC upload_date_counts (ดู supabase_schema.sql) และ cache ผลไว้
+        ถ้ายังไม่ได้สร้าง function → select เฉพาะ upload_date ในช่วงนั้นแล้วนับเอง
+        """
         if not self.is_connected():
             return []
         
+        key = (start, end)
+        cached = self._date_counts_cache.get(key)
+        if cached and time.monotonic() - cached[0] < DATE_COUNTS_TTL:
+            return cached[1]
+        
         try:
-            result = self.supabase.table("uploads").select("upload_date").execute()
-            if not result.data:
-                return []
-            
-            # นับจำนวนไฟล์ต่อวัน
-            date_counts = {}
-            for row in result.data:
-                date = row["upload_date"]
-                date_counts[date] = date_counts.get(date, 0) + 1
+            try:
+                result = self.supabase.rpc(
+                    "upload_date_counts", {"start_date": start, "end_date": end}
+                ).execute()
+                counts = [(row["upload_date"], int(row["file_count"])) for row in result.data or []]
+            except Exception as e:
+                print(f"upload_date_counts RPC unavailable ({e}); counting client-side")
+                query = self.supabase.table("uploads").select("upload_date")
+                if start:
+                    query = query.gte("upload_date", start)
+                if end:
+                    query = query.lt("upload_date", end)
+                result = query.execute()
+                
+                # นับจำนวนไฟล์ต่อวัน
+                date_counts = {}
+                for row in result.data or []:
+                    date = row["upload_date"]
+                    date_counts[date] = date_counts.get(date, 0) + 1
+                counts = list(date_counts.items())
             
-            return [(date, count) for date, count in date_counts.items()]
+            self._date_counts_cache[key] = (time.monotonic(), counts)
+            return counts
         except Exception as e:
             st.error(f"❌ Failed to get dates with files: {e}")
             return []
+    
+    def invalidate_date_counts(self) -> None:
+        """ล้าง cache จำนวนไฟล์ต่อวัน (เรียกหลังอัปโหลด/ลบ)"""
+        self._date_counts_cache.clear()
+
+    # ===== BULK (storage_maintenance.py) =====
+    def iter_upload_records(self, columns: str = "*", page_size: int = 1000) -> Iterator[list]:
+        """ทุก record ของ uploads แบบแบ่งหน้า (keyset ตาม id) — yield ทีละหน้า (columns ต้องมี id)"""
+        if not self.is_connected():
+            return
+        last_id = 0
+        while True:
+            with latency.track("uploads.page"):
+                result = (
+                    self.supabase.table("uploads")
+                    .select(columns)
+                    .gt("id", last_id)
+                    .order("id")
+                    .limit(page_size)
+                    .execute()
+                )
+            rows = result.data or []
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]["id"]
+    
+    def list_storage_objects(self, prefix: str = "", page_size: int = 1000) -> Iterator[Tuple[str, int]]:
+        """ทุก object ใน bucket (recursive) → (path, size)"""
+        if not self.is_connected():
+            return
+        bucket = self.supabase.storage.from_(self.storage_bucket)
+        folders = [prefix.strip("/")]
+        while folders:
+            folder = folders.pop()
+            offset = 0
+            while True:
+                with latency.track("storage.list"):
+                    items = bucket.list(folder or None, {"limit": page_size, "offset": offset})
+                for item in items:
+                    path = f"{folder}/{item['name']}" if folder else item["name"]
+                    if item.get("id") is None:  # folder
+                        folders.append(path)
+                    else:
+                        yield path, int((item.get("metadata") or {}).get("size") or 0)
+                if len(items) < page_size:
+                    break
+                offset += page_size
+    
+    @latency.timed("uploads.update")
+    def update_upload_record(self, file_id: int, data: dict) -> bool:
+        """แก้ metadata ของ record"""
+        if not self.is_connected():
+            return False
+        try:
+            self.supabase.table("uploads").update(data).eq("id", file_id).execute()
+            return True
+        except Exception as e:
+            print(f"Upload record update error: {e}")
+            return False
+    
+    @latency.timed("uploads.update_by")
+    def update_upload_records_by(self, column: str, value, data: dict) -> bool:
+        """แก้ทุก record ที่ column == value (เช่น ทุก record ที่ใช้ object / checksum เดียวกัน)"""
+        if not self.is_connected():
+            return False
+        try:
+            self.supabase.table("uploads").update(data).eq(column, value).execute()
+            return True
+        except Exception as e:
+            print(f"Upload record update error: {e}")
+            return False
+    
+    @latency.timed("storage.move")
+    def move_object(self, src: str, dst: str) -> bool:
+        """ย้าย object ภายใน bucket"""
+        if not self.is_connected():
+            return False
+        try:
+            self.supabase.storage.from_(self.storage_bucket).move(src, dst)
+            return True
+        except Exception as e:
+            print(f"Storage move error: {e}")
+            return False
+    
+    @latency.timed("uploads.delete_many")
+    def delete_file_records(self, file_ids: list, batch_size: int = 100) -> int:
+        """ลบหลาย record ด้วย in_ query → จำนวนที่ลบสำเร็จ"""
+        if not self.is_connected():
+            return 0
+        ids = [int(i) for i in file_ids]
+        deleted = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            try:
+                self.supabase.table("uploads").delete().in_("id", batch).execute()
+                deleted += len(batch)
+            except Exception as e:
+                print(f"Batch delete error: {e}")
+        if deleted:
+            self.invalidate_date_counts()
+        return deleted
+    
+    @latency.timed("storage.delete_many")
+    def delete_objects(self, paths: list, batch_size: int = 100) -> int:
+        """ลบหลาย object ใน bucket → จำนวนที่ลบสำเร็จ"""
+        if not self.is_connected():
+            return 0
+        deleted = 0
+        for start in range(0, len(paths), batch_size):
+            batch = list(paths[start:start + batch_size])
+            try:
+                self.supabase.storage.from_(self.storage_bucket).remove(batch)
+                deleted += len(batch)
+            except Exception as e:
+                print(f"Storage batch delete error: {e}")
+        return deleted
+    
+    # ===== USERS =====
+    @latency.timed("users.insert")
+    def insert_user(self, user_data: dict) -> Optional[dict]:
+        """เพิ่มผู้ใช้ใหม่ → record ที่บันทึกแล้ว"""
+        if not self.is_connected():
+            return None
+        result = self.supabase.table("users").insert(user_data).execute()
+        return result.data[0] if result.data else None
+    
+    @latency.timed("users.by_email")
+    def get_user_by_email(self, email: str, columns: str = "*", active_only: bool = False) -> Optional[dict]:
+        """ดึงผู้ใช้ตาม email (active_only=True → เฉพาะ is_active)"""
+        if not self.is_connected():
+            return None
+        query = self.supabase.table("users").select(columns).eq("email", email)
+        if active_only:
+            query = query.eq("is_active", True)
+        result = query.limit(1).execute()
+        return result.data[0] if result.data else None
+
+def configured_backend() -> str:
+    """STORAGE_BACKEND จาก Streamlit secrets หรือ env: auto | supabase | local (default: auto)"""
+    name = None
+    try:
+        name = st.secrets.get("STORAGE_BACKEND")
+    except Exception:
+        pass
+    name = name or os.getenv("STORAGE_BACKEND") or "auto"
+    return str(name).strip().lower()
+
+# Global instance (สร้างครั้งแรกที่เรียก get_supabase)
+_manager = None
 
-# Global instance
-supabase_manager = SupabaseManager()
+def get_supabase():
+    """Get global metadata/storage backend instance
 
-def get_supabase() -> SupabaseManager:
-    """Get global Supabase manager instance"""
-    return supabase_manager
+    auto → Supabase ถ้ามี secrets ครบ ไม่งั้นใช้ SQLite + filesystem (local_backend.LocalManager)
+    """
+    global _manager
+    if _manager is None:
+        backend = configured_backend()
+        if backend == "local":
+            from local_backend import LocalManager
+            _manager = LocalManager()
+        else:
+            manager = SupabaseManager()
+            if backend == "auto" and not manager.is_connected():
+                from local_backend import LocalManager
+                manager = LocalManager()
+            _manager = manager
+    return _manager
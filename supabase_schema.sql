@@ -18,14 +18,52 @@ CREATE TABLE IF NOT EXISTS uploads (
     file_type TEXT, -- ประเภทไฟล์ (zip, xlsx, txt, etc.)
     mime_type TEXT, -- MIME type
     checksum TEXT, -- MD5 checksum สำหรับตรวจสอบความสมบูรณ์
+    columnar_path TEXT, -- bundle Parquet/zstd ของไฟล์นี้ (storage_maintenance.py tier)
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- ฐานข้อมูลที่สร้างก่อนมีคอลัมน์นี้
+ALTER TABLE uploads ADD COLUMN IF NOT EXISTS columnar_path TEXT;
+
 -- Index for faster queries
 CREATE INDEX IF NOT EXISTS idx_uploads_date ON uploads(upload_date);
 CREATE INDEX IF NOT EXISTS idx_uploads_created_at ON uploads(created_at);
 CREATE INDEX IF NOT EXISTS idx_uploads_file_type ON uploads(file_type);
 CREATE INDEX IF NOT EXISTS idx_uploads_file_size ON uploads(file_size);
+-- content-addressed dedup: หาไฟล์เดิมจาก checksum / นับ reference ของ object ก่อนลบ
+CREATE INDEX IF NOT EXISTS idx_uploads_checksum ON uploads(checksum);
+CREATE INDEX IF NOT EXISTS idx_uploads_stored_path ON uploads(stored_path);
+
+-- ============================================
+-- USERS TABLE (auth.py)
+-- ============================================
+CREATE TABLE IF NOT EXISTS users (
+    id BIGSERIAL PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    name TEXT,
+    role TEXT DEFAULT 'user',
+    password_hash TEXT,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_email_active ON users(email, is_active);
+
+-- ============================================
+-- CALENDAR: จำนวนไฟล์ต่อวัน (นับฝั่ง server เฉพาะช่วงที่ปฏิทินแสดง)
+-- ============================================
+-- upload_date เป็น TEXT รูปแบบ YYYY-MM-DD จึงเทียบช่วงแบบ string ได้ (ใช้ idx_uploads_date)
+CREATE OR REPLACE FUNCTION upload_date_counts(start_date TEXT DEFAULT NULL, end_date TEXT DEFAULT NULL)
+RETURNS TABLE (upload_date TEXT, file_count BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT u.upload_date, COUNT(*) AS file_count
+    FROM uploads u
+    WHERE (start_date IS NULL OR u.upload_date >= start_date)
+      AND (end_date IS NULL OR u.upload_date < end_date)
+    GROUP BY u.upload_date
+    ORDER BY u.upload_date;
+$$;
 
 -- ============================================
 -- ROW LEVEL SECURITY POLICIES
@@ -10,6 +10,10 @@ from MSU_Analyzer import MSU_Analyzer
 from Line_Analyzer import Line_Analyzer
 from Client_Analyzer import Client_Analyzer
 from Fiberflapping_Analyzer import FiberflappingAnalyzer
+from utils.alarm_index import get_alarm_index
+from utils.excel_loader import load_reference
+from utils import lazy
+from utils.styling import PINK_CELL, RED_CELL, MaskLayer, numeric, out_of_range, style_masks
 from EOL_Core_Analyzer import EOLAnalyzer, CoreAnalyzer
 from Preset_Analyzer import PresetStatusAnalyzer
 from APO_Analyzer import ApoRemnantAnalyzer
@@ -27,7 +31,8 @@ def _ensure_analyzer(key: str, analyzer_cls, ref_file: str, ns: str):
 
     if st.session_state.get(analyzer_key) is None and st.session_state.get(data_key) is not None:
         try:
-            df_ref = pd.read_excel(ref_file)
+            # reference (cpu/fan/msu/line) ผ่าน schema + cache ต่อ mtime / ตัวอื่นให้ class โหลดเองจาก ref_file
+            df_ref = load_reference(f"{key}_ref", ref_file) if key in ("cpu", "fan", "msu", "line") else None
 
             if key == "cpu":
                 analyzer = analyzer_cls(
@@ -66,8 +71,9 @@ def _ensure_analyzer(key: str, analyzer_cls, ref_file: str, ns: str):
                     analyzer = analyzer_cls(
                         df_optical=df_optical.copy(),
                         df_fm=df_fm.copy(),
-                        threshold=2.0,
-                        ref_path=ref_file
+                        threshold=FiberflappingAnalyzer.DEFAULT_THRESHOLD,
+                        ref_path=ref_file,
+                        alarm_index=get_alarm_index(),
                     )
                 else:
                     return
@@ -545,6 +551,47 @@ class SummaryTableReport:
                 # แสดงปุ่มปกติเมื่อยังไม่ได้กด Generate
                 st.info("💡 Click 'Generate PDF Report' to create your comprehensive network inspection report")
 
+    @staticmethod
+    def _render_flapping_day(df_day: pd.DataFrame, cols_to_show: list) -> None:
+        """รายชื่อไซต์ + ตาราง flapping ของวันเดียว"""
+        # สรุปจำนวน flapping ต่อ Site Name เรียงจากมากไปน้อย
+        site_counts_str = ""
+        if not df_day.empty and "Site Name" in df_day.columns:
+            counts = df_day["Site Name"].value_counts().reset_index()
+            counts.columns = ["Site Name", "Count"]
+
+            # สร้างข้อความรวมในบรรทัดเดียว เช่น Jasmine_Z-E33 (3 links)
+            site_counts_str = " ".join([
+                f"{r['Site Name']} ({r['Count']} link{'s' if r['Count'] > 1 else ''})"
+                for _, r in counts.iterrows()
+            ])
+
+        # รายชื่อไซต์ (วันที่ + จำนวนไซต์อยู่ที่หัว expander)
+        st.markdown(site_counts_str)
+
+        # เลือกคอลัมน์ที่จะแสดง
+        df_show = df_day[[c for c in cols_to_show if c in df_day.columns]].copy()
+
+        # แปลงคอลัมน์ตัวเลขเป็น numeric
+        numeric_cols = [
+            "Max Value of Input Optical Power(dBm)",
+            "Min Value of Input Optical Power(dBm)",
+            "Max - Min (dB)"
+        ]
+        for col in numeric_cols:
+            if col in df_show.columns:
+                df_show[col] = pd.to_numeric(df_show[col], errors="coerce")
+
+        # Format ทศนิยม 2 ตำแหน่ง
+        format_dict = {col: "{:.2f}" for col in numeric_cols if col in df_show.columns}
+
+        styled = (
+            # Highlight Max - Min (dB) > 2.0
+            style_masks(df_show, [MaskLayer(PINK_CELL, numeric(df_show, "Max - Min (dB)") > 2.0, ["Max - Min (dB)"])])
+            .format(format_dict, na_rep="-")
+        )
+        st.dataframe(styled, use_container_width=True, height=min(len(df_show) * 35 + 38, 400))
+
     def _render_row(self, type_name, task_name, details, status, df_abn, value_col: str, df_abn_by_type=None):
         """วาด summary row + toggle abnormal"""
         col1, col2, col3, col4, col5 = st.columns([1, 1, 3, 1, 1])
@@ -602,15 +649,10 @@ class SummaryTableReport:
                     df_abn = df_abn[cols_to_show].copy()
 
                     numeric_cols = [c for c in df_abn.columns if c not in ["Site Name", "ME", "Measure Object"]]
-                    for c in numeric_cols:
-                        df_abn[c] = pd.to_numeric(df_abn[c], errors="coerce")
 
                     styled = (
-                        df_abn.style
+                        style_masks(df_abn, [MaskLayer(PINK_CELL, numeric(df_abn, "CPU utilization ratio") > 0, ["CPU utilization ratio"])])
                         .format({c: "{:.2f}" for c in numeric_cols}, na_rep="-")
-                        .applymap(lambda v: "background-color:#ff9999; color:black"
-                                if isinstance(v, (int, float)) and pd.notna(v) and v > 0 else "",
-                                subset=["CPU utilization ratio"])
                     )
                     st.dataframe(styled, use_container_width=True)
 
@@ -621,15 +663,10 @@ class SummaryTableReport:
                     df_abn = df_abn[cols_to_show].copy()
 
                     numeric_cols = [c for c in df_abn.columns if c not in ["Site Name", "ME", "Measure Object"]]
-                    for c in numeric_cols:
-                        df_abn[c] = pd.to_numeric(df_abn[c], errors="coerce")
 
                     styled = (
-                        df_abn.style
+                        style_masks(df_abn, [MaskLayer(PINK_CELL, numeric(df_abn, "Value of Fan Rotate Speed(Rps)") > 0, ["Value of Fan Rotate Speed(Rps)"])])
                         .format({c: "{:.2f}" for c in numeric_cols}, na_rep="-")
-                        .applymap(lambda v: "background-color:#ff9999; color:black"
-                                if isinstance(v, (int, float)) and pd.notna(v) and v > 0 else "",
-                                subset=["Value of Fan Rotate Speed(Rps)"])
                     )
                     st.dataframe(styled, use_container_width=True)
 
@@ -640,15 +677,10 @@ class SummaryTableReport:
                     df_abn = df_abn[cols_to_show].copy()
 
                     numeric_cols = [c for c in df_abn.columns if c not in ["Site Name", "ME", "Measure Object"]]
-                    for c in numeric_cols:
-                        df_abn[c] = pd.to_numeric(df_abn[c], errors="coerce")
 
                     styled = (
-                        df_abn.style
+                        style_masks(df_abn, [MaskLayer(PINK_CELL, numeric(df_abn, "Laser Bias Current(mA)") > 0, ["Laser Bias Current(mA)"])])
                         .format({c: "{:.2f}" for c in numeric_cols}, na_rep="-")
-                        .applymap(lambda v: "background-color:#ff9999; color:black"
-                                if isinstance(v, (int, float)) and pd.notna(v) and v > 0 else "",
-                                subset=["Laser Bias Current(mA)"])
                     )
                     st.dataframe(styled, use_container_width=True)
 
@@ -669,54 +701,11 @@ class SummaryTableReport:
                         ]
                         df_abn = df_abn[[c for c in cols_to_show if c in df_abn.columns]].copy()
 
-                        # แปลงค่าเป็น numeric
-                        numeric_cols = [c for c in df_abn.columns if c not in ["Site Name", "ME", "Measure Object", "Call ID", "Route"]]
-                        for c in numeric_cols:
-                            df_abn[c] = pd.to_numeric(df_abn[c], errors="coerce")
-
-                        def highlight_line_row(row):
-                            styles = [""] * len(row)
-                            col_map = {c: i for i, c in enumerate(df_abn.columns)}
-
-                            # BER check - ใช้เงื่อนไขเดียวกับ _render_abnormal_line_data()
-                            try:
-                                ber = float(row.get("Instant BER After FEC", 0))
-                                thr = float(row.get("Threshold", 0))
-                                if pd.notna(thr) and (pd.isna(ber) or ber > 0):
-                                    styles[col_map["Instant BER After FEC"]] = "background-color:#ff4d4d; color:white"
-                            except (ValueError, TypeError):
-                                try:
-                                    thr = float(row.get("Threshold", 0))
-                                    if pd.notna(thr):
-                                        styles[col_map["Instant BER After FEC"]] = "background-color:#ff4d4d; color:white"
-                                except (ValueError, TypeError):
-                                    pass
-
-                            # Input check
-                            try:
-                                v = float(row.get("Input Optical Power(dBm)", 0))
-                                lo = float(row.get("Minimum threshold(in)", 0))
-                                hi = float(row.get("Maximum threshold(in)", 0))
-                                if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                                    styles[col_map["Input Optical Power(dBm)"]] = "background-color:#ff4d4d; color:white"
-                            except (ValueError, TypeError):
-                                pass
-
-                            # Output check
-                            try:
-                                v = float(row.get("Output Optical Power (dBm)", 0))
-                                lo = float(row.get("Minimum threshold(out)", 0))
-                                hi = float(row.get("Maximum threshold(out)", 0))
-                                if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                                    styles[col_map["Output Optical Power (dBm)"]] = "background-color:#ff4d4d; color:white"
-                            except (ValueError, TypeError):
-                                pass
-
-                            return styles
-
                         styled = (
-                            df_abn.style
-                            .apply(highlight_line_row, axis=1)
+                            style_masks(df_abn, [
+                                MaskLayer(RED_CELL, mask, [col])
+                                for col, mask in line_analyzer.abnormal_cell_masks(df_abn).items()
+                            ])
                             .format({
                                 "Threshold": "{:.2E}",
                                 "Instant BER After FEC": "{:.2E}",
@@ -741,27 +730,14 @@ class SummaryTableReport:
                     ]
                     df_abn = df_abn[[c for c in cols_to_show if c in df_abn.columns]].copy()
 
-                    def highlight_client_row(row):
-                        styles = [""] * len(row)
-                        col_map = {c: i for i, c in enumerate(df_abn.columns)}
-
-                        try:
-                            v, lo, hi = row["Output Optical Power (dBm)"], row["Minimum threshold(out)"], row["Maximum threshold(out)"]
-                            if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                                styles[col_map["Output Optical Power (dBm)"]] = "background-color:#ff9999; color:black"
-                        except:
-                            pass
-
-                        try:
-                            v, lo, hi = row["Input Optical Power(dBm)"], row["Minimum threshold(in)"], row["Maximum threshold(in)"]
-                            if pd.notna(v) and pd.notna(lo) and pd.notna(hi) and (v < lo or v > hi):
-                                styles[col_map["Input Optical Power(dBm)"]] = "background-color:#ff9999; color:black"
-                        except:
-                            pass
-
-                        return styles
-
-                    styled = df_abn.style.apply(highlight_client_row, axis=1)
+                    # แดงเฉพาะค่าที่อยู่นอก threshold (Output / Input)
+                    styled = style_masks(df_abn, [
+                        MaskLayer(PINK_CELL, out_of_range(numeric(df_abn, value), numeric(df_abn, lo), numeric(df_abn, hi)), [value])
+                        for value, lo, hi in (
+                            ("Output Optical Power (dBm)", "Minimum threshold(out)", "Maximum threshold(out)"),
+                            ("Input Optical Power(dBm)", "Minimum threshold(in)", "Maximum threshold(in)"),
+                        )
+                    ])
                     st.dataframe(styled, use_container_width=True)
 
                 # ===================== FIBER FLAPPING =====================
@@ -771,9 +747,6 @@ class SummaryTableReport:
                         df_with_date = df_abn.copy()
                         df_with_date["Date"] = pd.to_datetime(df_with_date["Begin Time"]).dt.date
                         
-                        # เรียงตามวัน (เก่า -> ใหม่)
-                        dates_sorted = sorted(df_with_date["Date"].unique())
-                        
                         cols_to_show = [
                             "Begin Time", "End Time", "Site Name", "ME", "Measure Object",
                             "Max Value of Input Optical Power(dBm)",
@@ -781,60 +754,16 @@ class SummaryTableReport:
                             "Max - Min (dB)"
                         ]
                         
-                        # แสดงข้อมูลแต่ละวัน
-                        for date in dates_sorted:
-                            df_day = df_with_date[df_with_date["Date"] == date].copy()
+                        # แสดงข้อมูลแต่ละวัน (เก่า -> ใหม่) — ตารางของวันสร้างเฉพาะตอนเปิด expander (วันล่าสุดเปิดไว้)
+                        days = list(df_with_date.groupby("Date", sort=True))
+                        for i, (date, df_day) in enumerate(days):
                             num_sites = df_day["ME"].nunique() if "ME" in df_day.columns else len(df_day)
-                            
-                            # สรุปจำนวน flapping ต่อ Site Name เรียงจากมากไปน้อย
-                            site_counts_str = ""
-                            if not df_day.empty and "Site Name" in df_day.columns:
-                                counts = df_day["Site Name"].value_counts().reset_index()
-                                counts.columns = ["Site Name", "Count"]
-                                
-                                # สร้างข้อความรวมในบรรทัดเดียว เช่น Jasmine_Z-E33 (3 links)
-                                site_counts_str = " ".join([
-                                    f"{r['Site Name']} ({r['Count']} link{'s' if r['Count'] > 1 else ''})"
-                                    for _, r in counts.iterrows()
-                                ])
-                            
-                            # หัวข้อวัน + รายชื่อไซต์
-                            st.markdown(f"**{date} ({num_sites} sites)** {site_counts_str}")
-                            
-                            # เลือกคอลัมน์ที่จะแสดง
-                            df_show = df_day[[c for c in cols_to_show if c in df_day.columns]].copy()
-                            
-                            # แปลงคอลัมน์ตัวเลขเป็น numeric
-                            numeric_cols = [
-                                "Max Value of Input Optical Power(dBm)",
-                                "Min Value of Input Optical Power(dBm)",
-                                "Max - Min (dB)"
-                            ]
-                            for col in numeric_cols:
-                                if col in df_show.columns:
-                                    df_show[col] = pd.to_numeric(df_show[col], errors="coerce")
-                            
-                            # Highlight Max - Min (dB) > 2.0
-                            def hl_flapping(val):
-                                try:
-                                    if float(val) > 2.0:
-                                        return "background-color: #ff9999; color: black"
-                                except:
-                                    pass
-                                return ""
-                            
-                            # Format ทศนิยม 2 ตำแหน่ง
-                            format_dict = {col: "{:.2f}" for col in numeric_cols if col in df_show.columns}
-                            
-                            styled = (
-                                df_show.style
-                                .applymap(hl_flapping, subset=["Max - Min (dB)"] if "Max - Min (dB)" in df_show.columns else [])
-                                .format(format_dict, na_rep="-")
+                            day_exp = lazy.expander(
+                                f"{date} ({num_sites} sites)", key=f"flapping_row_{date}", expanded=i == len(days) - 1
                             )
-                            st.dataframe(styled, use_container_width=True, height=min(len(df_show) * 35 + 38, 400))
-                            
-                            # เว้นบรรทัดระหว่างวัน
-                            st.markdown("")
+                            with day_exp:
+                                if day_exp.open:
+                                    self._render_flapping_day(df_day, cols_to_show)
                     else:
                         st.info("No abnormal fiber flapping data to display")
 
@@ -0,0 +1,107 @@
+# tests/test_fiberflapping_extract.py
+"""
+extract_link_nodes / extract_targets (vectorized) ต้องได้ผลเท่ากับของเดิมทีละแถว:
+  - _extract_nodes_from_link (findall → 2 โหนดแรก / ไม่ถึง 2 ตัว → None ทั้งคู่)
+  - Target ME = _TARGET_PATTERN.search(str(x)) → group(1) / ไม่มีวงเล็บ → None
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from Fiberflapping_Analyzer import FiberflappingAnalyzer
+
+N1 = "CR_WCO_7807_031_1Z_A"
+N2 = "SR_WCO_9006_043_1Z_A"
+N3 = "CR_BKK_1234_001_2A_R"
+
+LINKS = [
+    np.nan,
+    None,
+    12345,
+    3.5,
+    "",
+    "no node here",
+    f"{N1}",                                  # โหนดเดียว
+    f"{N1}-{N2}",                             # 2 โหนด
+    f"Link: {N1} <-> {N2} (OTS)",
+    f"{N1}/{N2}/{N3}",                        # 3 โหนด → 2 ตัวแรก
+    f"{N3} {N1} {N2}",
+    f"{N1}-{N2}",                             # ค่าซ้ำ
+    f"cr_wco_7807_031_1z_a-{N2}",             # ตัวพิมพ์เล็กไม่ match
+]
+
+MEASURE_OBJECTS = [
+    np.nan,
+    None,
+    42,
+    7.25,
+    "",
+    "OSC-1-IN",                               # ไม่มีวงเล็บ
+    f"1-OSC-1(IN)({N1})",                     # หลายวงเล็บ → ตัวแรก
+    f"OSC-2 ({N2})",
+    f"OSC-2 ({N2})",                          # ค่าซ้ำ
+    "OSC-3 ()",                               # วงเล็บว่างไม่ match
+    "OSC-4 (unclosed",
+]
+
+
+def _missing_to_none(values):
+    return [None if pd.isna(v) else v for v in values]
+
+
+def _expected_target(value):
+    m = FiberflappingAnalyzer._TARGET_PATTERN.search(str(value))
+    return m.group(1) if m else None
+
+
+@pytest.fixture
+def analyzer():
+    return FiberflappingAnalyzer(df_optical=pd.DataFrame(), df_fm=pd.DataFrame())
+
+
+@pytest.mark.parametrize("dtype", [object, "category"])
+def test_extract_link_nodes_matches_row_wise(analyzer, dtype):
+    links = pd.Series(LINKS, dtype=object)
+    if dtype == "category":
+        # category ผสมชนิดไม่ได้ → เทียบกับข้อความแบบเดียวกับ astype(str) (NaN คงเป็น NaN)
+        links = links.where(links.isna(), links.astype(str)).astype("category")
+
+    got = FiberflappingAnalyzer.extract_link_nodes(links)
+    expected = [analyzer._extract_nodes_from_link(v) for v in links]
+
+    assert list(got.columns) == ["fm_node1", "fm_node2"]
+    assert got.index.equals(links.index)
+    assert _missing_to_none(got["fm_node1"]) == [e[0] for e in expected]
+    assert _missing_to_none(got["fm_node2"]) == [e[1] for e in expected]
+
+
+def test_extract_link_nodes_cases():
+    got = FiberflappingAnalyzer.extract_link_nodes(pd.Series(LINKS, dtype=object))
+    pairs = list(zip(_missing_to_none(got["fm_node1"]), _missing_to_none(got["fm_node2"])))
+    assert pairs[0] == (None, None)                 # NaN
+    assert pairs[2] == (None, None)                 # ไม่ใช่ string
+    assert pairs[6] == (None, None)                 # โหนดเดียว
+    assert pairs[7] == (N1, N2)
+    assert pairs[9] == (N1, N2)                     # 3 โหนด
+    assert pairs[10] == (N3, N1)
+
+
+@pytest.mark.parametrize("dtype", [object, "category"])
+def test_extract_targets_matches_re_search(dtype):
+    mo = pd.Series(MEASURE_OBJECTS, dtype=object)
+    if dtype == "category":
+        mo = mo.where(mo.isna(), mo.astype(str)).astype("category")
+
+    got = FiberflappingAnalyzer.extract_targets(mo)
+    # ของเดิม: re.search บน str(x) ทุกแถว (NaN → "nan" → ไม่ match)
+    expected = [_expected_target(v) for v in mo]
+
+    assert isinstance(got.dtype, pd.CategoricalDtype)
+    assert got.index.equals(mo.index)
+    assert _missing_to_none(got) == expected
+    assert _missing_to_none(got) == [_expected_target(v) for v in MEASURE_OBJECTS]
+
+
+def test_extract_on_empty_series():
+    assert FiberflappingAnalyzer.extract_targets(pd.Series([], dtype=object)).empty
+    assert FiberflappingAnalyzer.extract_link_nodes(pd.Series([], dtype=object)).empty
@@ -0,0 +1,210 @@
+# tests/test_fiberflapping_sweep.py
+"""
+FlappingSweep.at(thr) (match_alarms / AlarmIndex) ต้องได้แถวเดียวกับ logic เดิมทีละแถว:
+  - filter_optical_by_threshold: ตัด Min = -60 แล้วเก็บ Max - Min (dB) > threshold
+  - find_nomatch: เทียบคู่โหนด ME ↔ Target ME กับ fm_node1/fm_node2 (สลับได้)
+    มี alarm ที่ Occurrence Time <= End Time และ Clear Time >= Begin Time → MATCHED
+    ไม่มีเลย / โหนดว่าง / ไม่มีเวลา → FLAPPING
+
+สองฟังก์ชันด้านล่างคือของเดิมใน FiberflappingAnalyzer (ตัด log ออก) — เก็บไว้เป็นตัวอ้างอิงเท่านั้น
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from Fiberflapping_Analyzer import COL_DIFF, COL_MIN_IN, FlappingSweep
+from utils.alarm_index import AlarmIndex
+
+N1 = "CR_WCO_7807_031_1Z_A"
+N2 = "SR_WCO_9006_043_1Z_A"
+N3 = "CR_BKK_1234_001_2A_R"
+N4 = "SR_BKK_5678_002_3B_R"
+
+MIN_THRESHOLD = 1.0
+THRESHOLDS = [1.0, 1.5, 2.0, 2.75, 3.0, 4.5, 10.0]
+T0 = pd.Timestamp("2026-01-05 00:00")
+
+
+# ---- reference implementation (ของเดิม ทีละแถว) ----
+def filter_optical_by_threshold(df_optical_norm: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    df = df_optical_norm.copy()
+    if COL_MIN_IN in df.columns:
+        df = df[df[COL_MIN_IN] != -60]
+    return df[df[COL_DIFF] > threshold].copy()
+
+
+def find_nomatch(df_filtered: pd.DataFrame, df_fm_norm: pd.DataFrame) -> pd.DataFrame:
+    result_rows = []
+    fm_valid = df_fm_norm.dropna(subset=["fm_node1", "fm_node2"]).copy()
+
+    for _, row in df_filtered.reset_index(drop=True).iterrows():
+        node_a = str(row.get("ME", "")).strip()
+        node_b = str(row.get("Target ME", "")).strip()
+        begin_t = row.get("Begin Time", pd.NaT)
+        end_t = row.get("End Time", pd.NaT)
+
+        if not node_a or not node_b or pd.isna(begin_t) or pd.isna(end_t):
+            result_rows.append(row)
+            continue
+
+        fm_pair_mask = (
+            ((fm_valid["fm_node1"] == node_a) & (fm_valid["fm_node2"] == node_b)) |
+            ((fm_valid["fm_node1"] == node_b) & (fm_valid["fm_node2"] == node_a))
+        )
+        fm_candidates = fm_valid[fm_pair_mask]
+        if fm_candidates.empty:
+            result_rows.append(row)
+            continue
+
+        any_overlap = False
+        for _, fm_r in fm_candidates.iterrows():
+            occ_t = fm_r.get("Occurrence Time", pd.NaT)
+            clr_t = fm_r.get("Clear Time", pd.NaT)
+            overlap = (
+                pd.notna(occ_t)
+                and pd.notna(clr_t)
+                and (occ_t <= end_t)
+                and (clr_t >= begin_t)
+            )
+            any_overlap = any_overlap or overlap
+        if not any_overlap:
+            result_rows.append(row)
+
+    return pd.DataFrame(result_rows)
+
+
+# ---- random data ----
+def _minutes(rng, n, lo=0, hi=600):
+    return T0 + pd.to_timedelta(rng.integers(lo, hi, n), unit="min")
+
+
+def _make_frames(seed: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    nodes = np.array([N1, N2, N3, N4], dtype=object)
+
+    # หน้าต่าง OSC: เวลาเป็นนาทีเต็ม (ชนขอบ alarm ได้บ่อย), diff เป็นขั้น 0.25 (ชน threshold ได้)
+    n = 240
+    me = rng.choice(nodes, n).astype(object)
+    target = rng.choice(nodes, n).astype(object)
+    begin = _minutes(rng, n)
+    end = begin + pd.to_timedelta(rng.integers(0, 60, n), unit="min")
+    mx = rng.integers(-200, -100, n) / 10
+    diff = rng.integers(0, 24, n) * 0.25
+    mn = mx - diff
+
+    # โหนดว่าง / NaN / มีช่องว่าง, เวลา NaT, Min = -60
+    me[rng.random(n) < 0.04] = ""
+    me[rng.random(n) < 0.04] = np.nan
+    target[rng.random(n) < 0.04] = np.nan
+    target[rng.random(n) < 0.03] = "  "
+    pad = rng.random(n) < 0.05
+    me[pad] = [f" {x} " if isinstance(x, str) and x else x for x in me[pad]]
+    begin = begin.where(rng.random(n) >= 0.04)
+    end = end.where(rng.random(n) >= 0.04)
+    mn[rng.random(n) < 0.05] = -60
+
+    df_optical = pd.DataFrame({
+        "rid": np.arange(n),
+        "ME": me,
+        "Target ME": target,
+        "Begin Time": begin,
+        "End Time": end,
+        "Max Value of Input Optical Power(dBm)": mx,
+        COL_MIN_IN: mn,
+    })
+    df_optical[COL_DIFF] = df_optical["Max Value of Input Optical Power(dBm)"] - df_optical[COL_MIN_IN]
+    df_optical[COL_DIFF] = df_optical[COL_DIFF].round(2)
+
+    # alarm: หลายตัวต่อคู่, ทั้ง A→B และ B→A
+    m = 120
+    a = rng.choice(nodes, m).astype(object)
+    b = rng.choice(nodes, m).astype(object)
+    occ = _minutes(rng, m)
+    clr = occ + pd.to_timedelta(rng.integers(0, 90, m), unit="min")
+    a[rng.random(m) < 0.05] = None
+    occ = occ.where(rng.random(m) >= 0.05)
+    clr = clr.where(rng.random(m) >= 0.05)
+
+    # alarm ที่ชนขอบหน้าต่างพอดี: Clear = Begin / Occurrence = End (ยัง overlap) และพลาดขอบไป 1 นาที
+    # 12 หน้าต่างแรกได้ทีละแบบ ที่เหลือได้แต่ตัวที่พลาด (หลาย alarm ต่อคู่ แต่ไม่มีตัวไหน overlap)
+    edge = rng.choice(np.flatnonzero(begin.notna() & end.notna()), 20, replace=False)
+    one = pd.Timedelta(minutes=1)
+    extra = []
+    for k, i in enumerate(edge):
+        x, y = me[i], target[i]
+        if k % 2:
+            x, y = y, x
+        e = [
+            (x, y, begin[i] - 2 * one, begin[i]),
+            (y, x, end[i], end[i] + one),
+            (x, y, begin[i] - 3 * one, begin[i] - one),
+            (y, x, end[i] + one, end[i] + 2 * one),
+        ]
+        extra.extend(e[k % 4: k % 4 + 1] if k < 12 else e[2:])
+
+    df_fm = pd.DataFrame({
+        "fm_node1": list(a) + [e[0] for e in extra],
+        "fm_node2": list(b) + [e[1] for e in extra],
+        "Occurrence Time": list(occ) + [e[2] for e in extra],
+        "Clear Time": list(clr) + [e[3] for e in extra],
+    })
+    df_fm["Occurrence Time"] = pd.to_datetime(df_fm["Occurrence Time"])
+    df_fm["Clear Time"] = pd.to_datetime(df_fm["Clear Time"])
+    # fm_node มาจาก regex จึงไม่มีช่องว่าง — ตัวที่คัดลอกจากหน้าต่างที่ pad / ว่าง ต้องทำให้เหมือนกัน
+    for col in ("fm_node1", "fm_node2"):
+        df_fm[col] = df_fm[col].map(lambda v: v.strip() if isinstance(v, str) else v)
+    df_fm.loc[df_fm["fm_node1"].eq("") | df_fm["fm_node2"].eq(""), ["fm_node1", "fm_node2"]] = None
+    return df_optical, df_fm
+
+
+def _expected(df_optical, df_fm, thr) -> list:
+    out = find_nomatch(filter_optical_by_threshold(df_optical, thr), df_fm)
+    return [] if out.empty else out["rid"].astype(int).tolist()
+
+
+# ---- tests ----
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_sweep_matches_per_row_reference(seed):
+    df_optical, df_fm = _make_frames(seed)
+    sweep = FlappingSweep(df_optical, df_fm, min_threshold=MIN_THRESHOLD)
+    for thr in THRESHOLDS:
+        got = sweep.at(thr)
+        expected = _expected(df_optical, df_fm, thr)
+        assert got["rid"].tolist() == expected, thr
+        assert sweep.count(thr) == len(expected)
+        assert got.index.equals(pd.RangeIndex(len(expected)))
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sweep_with_alarm_index_matches_reference(seed, tmp_path):
+    df_optical, df_fm = _make_frames(seed)
+    sweep = FlappingSweep(
+        df_optical, df_fm, min_threshold=MIN_THRESHOLD, alarm_index=AlarmIndex(str(tmp_path)),
+    )
+    for thr in THRESHOLDS:
+        assert sweep.at(thr)["rid"].tolist() == _expected(df_optical, df_fm, thr), thr
+
+
+def test_edge_cases_are_exercised():
+    """ข้อมูลสุ่มต้องมีกรณีที่ตั้งใจไว้จริง (ไม่งั้น test ข้างบนผ่านแบบไม่มีความหมาย)"""
+    df_optical, df_fm = _make_frames(0)
+    assert df_optical["Begin Time"].isna().any() and df_optical["End Time"].isna().any()
+    assert df_optical["ME"].isna().any() and df_optical["ME"].eq("").any()
+    assert df_optical["Target ME"].isna().any()
+    assert (df_optical[COL_MIN_IN] == -60).any()
+    assert df_optical[COL_DIFF].isin(THRESHOLDS).any()
+
+    fm = df_fm.dropna()
+    pairs = fm.groupby(["fm_node1", "fm_node2"]).size()
+    assert (pairs > 1).any()
+    assert any((b, a) in pairs.index for a, b in pairs.index if a != b)
+    win = df_optical.dropna(subset=["Begin Time", "End Time"])
+    assert fm["Clear Time"].isin(win["Begin Time"]).any()
+    assert fm["Occurrence Time"].isin(win["End Time"]).any()
+
+
+def test_below_min_threshold_rejected():
+    df_optical, df_fm = _make_frames(0)
+    sweep = FlappingSweep(df_optical, df_fm, min_threshold=MIN_THRESHOLD)
+    with pytest.raises(ValueError):
+        sweep.at(MIN_THRESHOLD - 0.5)
@@ -0,0 +1,88 @@
+# tests/test_tus_upload.py
+"""
+upload_stream_to_storage (TUS): PATCH ที่ล้มเหลวต้องส่งต่อจาก offset ที่ server มีจริง (HEAD)
+ไม่ใช่ส่ง chunk เดิมทั้งก้อนที่ offset เดิม (server ตอบ 409)
+
+server จำลองด้วย httpx.MockTransport: เก็บ byte ที่ได้รับ, ตรวจ upload-offset เหมือน TUS จริง
+"""
+import httpx
+import pytest
+from supabase import create_client
+
+import supabase_config
+from supabase_config import SupabaseManager
+
+URL = "https://proj.supabase.co"
+LOCATION = f"{URL}/storage/v1/upload/resumable/abc"
+
+
+class FakeTus:
+    """TUS server ขนาดเล็ก: fail = {ครั้งที่ของ PATCH: จำนวน byte ที่รับก่อนตัดการเชื่อมต่อ}"""
+
+    def __init__(self, fail: dict):
+        self.data = bytearray()
+        self.fail = fail
+        self.patches = []   # (upload-offset, จำนวน byte ที่ส่งมา)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(201, headers={"location": LOCATION})
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"upload-offset": str(len(self.data))})
+        assert request.method == "PATCH"
+        offset = int(request.headers["upload-offset"])
+        body = request.read()
+        self.patches.append((offset, len(body)))
+        if offset != len(self.data):
+            return httpx.Response(409)
+        n = len(self.patches)
+        if n in self.fail:
+            self.data += body[: self.fail[n]]
+            raise httpx.ReadError("connection reset", request=request)
+        self.data += body
+        return httpx.Response(204, headers={"upload-offset": str(len(self.data))})
+
+
+def _manager(server: FakeTus) -> SupabaseManager:
+    db = SupabaseManager.__new__(SupabaseManager)   # ไม่ต่อ Supabase จริง (ไม่อ่าน secrets)
+    db.supabase = create_client(URL, "test-key")
+    db.storage_bucket = "network-files"
+    db._url, db._key = URL, "test-key"
+    db._http = httpx.Client(transport=httpx.MockTransport(server))
+    return db
+
+
+@pytest.fixture(autouse=True)
+def _no_sleep(monkeypatch):
+    monkeypatch.setattr(supabase_config.time, "sleep", lambda s: None)
+
+
+def _upload(db, payload: bytes, chunk_size: int, retries: int = 3):
+    chunks = (payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size))
+    return db.upload_stream_to_storage(chunks, "objects/ab/abc.zip", len(payload), chunk_size=chunk_size, retries=retries)
+
+
+def test_resumes_from_server_offset_after_partial_patch():
+    payload = bytes(range(256)) * 4          # 1024 byte, chunk ละ 300
+    server = FakeTus(fail={2: 120})          # chunk ที่สอง: server รับไป 120 byte แล้วหลุด
+    url = _upload(_manager(server), payload, chunk_size=300)
+
+    assert url == f"{URL}/storage/v1/object/public/network-files/objects/ab/abc.zip"
+    assert bytes(server.data) == payload
+    # retry ส่งเฉพาะส่วนที่เหลือของ chunk ที่ offset จริง ไม่มี 409
+    assert server.patches == [(0, 300), (300, 300), (420, 180), (600, 300), (900, 124)]
+
+
+def test_chunk_fully_received_before_failure_is_not_resent():
+    payload = b"x" * 900
+    server = FakeTus(fail={1: 300})          # server รับครบแต่คำตอบหาย
+    assert _upload(_manager(server), payload, chunk_size=300)
+    assert bytes(server.data) == payload
+    assert server.patches == [(0, 300), (300, 300), (600, 300)]
+
+
+def test_gives_up_after_retries():
+    payload = b"y" * 900
+    server = FakeTus(fail={2: 10, 3: 10, 4: 10})
+    assert _upload(_manager(server), payload, chunk_size=300, retries=3) is None
+    assert [p[0] for p in server.patches] == [0, 300, 310, 320]
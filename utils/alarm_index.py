@@ -0,0 +1,257 @@
+# utils/alarm_index.py
+"""
+ประวัติ FM alarm แบบถาวร (ข้ามวัน / ข้าม session) สำหรับ Fiber Flapping
+
+- alarm ของทุก FM export ที่เคยวิเคราะห์ถูกต่อท้ายเข้า index (alarm ซ้ำจาก export ที่ทับกันเก็บครั้งเดียว)
+- ค้นตามคู่โหนด (A↔B ไม่สนลำดับ): แต่ละคู่เก็บ alarm เรียงตาม Occurrence Time พร้อม
+  Clear Time สูงสุดสะสม — "มี alarm ไหน overlap กับ [Begin, End] ไหม" ตอบได้ด้วย searchsorted ครั้งเดียว
+  (ใช้แทน interval tree: ต้องการแค่ว่ามี overlap หรือไม่ ไม่ต้องรู้ว่าตัวไหน)
+- alarm ที่คร่อมเที่ยงคืน (มาใน export ของเมื่อวาน) จึง match หน้าต่าง OSC ของวันนี้ได้
+- ผลของหน้าต่าง OSC ที่ตัดสินแล้วถูกบันทึกไว้ → วิเคราะห์สัปดาห์ซ้ำ วันเก่าได้ผลเดิมทุกครั้ง
+  เฉพาะหน้าต่างใหม่เท่านั้นที่ match กับประวัติทั้งหมด
+
+เก็บเป็น Parquet ใต้ FM_INDEX_DIR (default .cache/fm_index)
+"""
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.diag_log import get_logger
+
+DEFAULT_INDEX_DIR = os.path.join(".cache", "fm_index")
+_ALARMS = "alarms.parquet"
+_WINDOWS = "windows.parquet"
+_META = "meta.json"
+_NO_CLEAR = np.iinfo(np.int64).min
+
+log = get_logger("alarm_index")
+
+
+def pair_keys(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """key ของคู่โหนดแบบไม่สนลำดับ (A↔B = B↔A)"""
+    a = a.to_numpy(dtype=object)
+    b = b.to_numpy(dtype=object)
+    swap = b < a
+    lo, hi = np.where(swap, b, a), np.where(swap, a, b)
+    return (pd.Series(lo, dtype=object) + "\t" + pd.Series(hi, dtype=object)).to_numpy(dtype=object)
+
+
+def to_ns(s: pd.Series) -> np.ndarray:
+    return pd.to_datetime(s).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def window_nodes(df_windows: pd.DataFrame) -> Tuple[pd.Series, pd.Series, np.ndarray]:
+    """(ME, Target ME, แถวที่ตรวจได้) ของหน้าต่าง OSC — โหนดว่าง / NaN / ไม่มีเวลา ตรวจไม่ได้ (= FLAPPING)"""
+    node_a = df_windows["ME"].astype(str).str.strip().fillna("")
+    node_b = df_windows["Target ME"].astype(str).str.strip().fillna("")
+    ok = (
+        (node_a != "").to_numpy() & (node_b != "").to_numpy()
+        & df_windows["Begin Time"].notna().to_numpy() & df_windows["End Time"].notna().to_numpy()
+    )
+    return node_a, node_b, ok
+
+
+def _window_hashes(df_windows: pd.DataFrame) -> np.ndarray:
+    node_a, node_b, _ = window_nodes(df_windows)
+    key = pd.DataFrame({
+        "a": node_a.to_numpy(dtype=object),
+        "b": node_b.to_numpy(dtype=object),
+        "begin": pd.to_datetime(df_windows["Begin Time"]).to_numpy(dtype="datetime64[ns]"),
+        "end": pd.to_datetime(df_windows["End Time"]).to_numpy(dtype="datetime64[ns]"),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+class AlarmIndex:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("FM_INDEX_DIR", DEFAULT_INDEX_DIR)
+        self._lock = threading.RLock()
+        # alarm ทั้งหมด เรียงตาม (pair, occurrence)
+        self._pairs = np.empty(0, dtype=object)
+        self._occ = np.empty(0, dtype=np.int64)
+        self._clr = np.empty(0, dtype=np.int64)
+        self._clr_max = np.empty(0, dtype=np.int64)   # Clear Time สูงสุดสะสมภายในคู่เดียวกัน
+        self._segments: Dict[str, Tuple[int, int]] = {}
+        self._alarm_hashes = np.empty(0, dtype=np.uint64)
+        # ผลที่ตัดสินแล้ว: hash ของหน้าต่าง → flapping
+        self._win_keys = np.empty(0, dtype=np.uint64)
+        self._win_flap = np.empty(0, dtype=bool)
+        self.updated_at: Optional[str] = None
+        # เพิ่มทุกครั้งที่ชุด alarm เปลี่ยน (load / add / clear) → ใช้ใน cache key ของผลวิเคราะห์
+        self.version = 0
+        self._load()
+
+    # -------------------- persistence --------------------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _load(self) -> None:
+        try:
+            alarms = pd.read_parquet(self._path(_ALARMS))
+            windows = pd.read_parquet(self._path(_WINDOWS))
+            with open(self._path(_META), encoding="utf-8") as f:
+                self.updated_at = json.load(f).get("updated_at")
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                log.warning("load_failed", root=self.root, error=e)
+            return
+        self._set_alarms(
+            alarms["pair"].to_numpy(dtype=object),
+            alarms["occurrence"].to_numpy(dtype=np.int64),
+            alarms["clear"].to_numpy(dtype=np.int64),
+        )
+        order = np.argsort(windows["key"].to_numpy(dtype=np.uint64), kind="stable")
+        self._win_keys = windows["key"].to_numpy(dtype=np.uint64)[order]
+        self._win_flap = windows["flapping"].to_numpy(dtype=bool)[order]
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            self.updated_at = pd.Timestamp.now().isoformat(timespec="seconds")
+            parts = {
+                _ALARMS: pd.DataFrame({"pair": self._pairs, "occurrence": self._occ, "clear": self._clr}),
+                _WINDOWS: pd.DataFrame({"key": self._win_keys, "flapping": self._win_flap}),
+            }
+            for name, df in parts.items():
+                tmp = self._path(f"{name}.tmp")
+                df.to_parquet(tmp, engine="pyarrow", compression="zstd", index=False)
+                os.replace(tmp, self._path(name))
+            tmp = self._path(f"{_META}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"updated_at": self.updated_at}, f)
+            os.replace(tmp, self._path(_META))
+
+    def clear(self) -> None:
+        """ลบประวัติทั้งหมด (alarm + ผลที่ตัดสินแล้ว)"""
+        with self._lock:
+            self._set_alarms(np.empty(0, dtype=object), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+            self._win_keys = np.empty(0, dtype=np.uint64)
+            self._win_flap = np.empty(0, dtype=bool)
+            for name in (_ALARMS, _WINDOWS, _META):
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+            self.updated_at = None
+
+    # -------------------- alarms --------------------
+    def _set_alarms(self, pairs: np.ndarray, occ: np.ndarray, clr: np.ndarray) -> None:
+        codes, uniques = pd.factorize(pairs, sort=True)
+        order = np.lexsort((occ, codes))
+        self._pairs, self._occ, self._clr = pairs[order], occ[order], clr[order]
+        codes = codes[order]
+        self._clr_max = pd.Series(self._clr).groupby(codes).cummax().to_numpy(dtype=np.int64)
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.concatenate([[0], bounds]) if len(codes) else np.empty(0, dtype=int)
+        stops = np.concatenate([bounds, [len(codes)]]) if len(codes) else np.empty(0, dtype=int)
+        self._segments = {uniques[codes[s]]: (int(s), int(e)) for s, e in zip(starts, stops)}
+        self._alarm_hashes = np.unique(self._hash_alarms(self._pairs, self._occ, self._clr))
+        self.version += 1
+
+    @staticmethod
+    def _hash_alarms(pairs, occ, clr) -> np.ndarray:
+        df = pd.DataFrame({"pair": pairs, "occ": occ, "clr": clr})
+        return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+    def add_alarms(self, df_fm_norm: pd.DataFrame) -> int:
+        """ต่อ alarm ของ FM export (ผ่าน normalize_fm แล้ว) เข้า index → จำนวน alarm ใหม่"""
+        fm = df_fm_norm.dropna(subset=["fm_node1", "fm_node2", "Occurrence Time", "Clear Time"])
+        if fm.empty:
+            return 0
+        pairs = pair_keys(fm["fm_node1"].astype(str), fm["fm_node2"].astype(str))
+        occ, clr = to_ns(fm["Occurrence Time"]), to_ns(fm["Clear Time"])
+        hashes = self._hash_alarms(pairs, occ, clr)
+        with self._lock:
+            new = ~np.isin(hashes, self._alarm_hashes)
+            # alarm ซ้ำภายใน export เดียวกันก็เก็บครั้งเดียว (ไม่มีผลกับการตัดสิน overlap)
+            _, first = np.unique(hashes, return_index=True)
+            keep = np.zeros(len(hashes), dtype=bool)
+            keep[first] = True
+            new &= keep
+            if not new.any():
+                return 0
+            self._set_alarms(
+                np.concatenate([self._pairs, pairs[new]]),
+                np.concatenate([self._occ, occ[new]]),
+                np.concatenate([self._clr, clr[new]]),
+            )
+            return int(new.sum())
+
+    # -------------------- query --------------------
+    def match(self, df_windows: pd.DataFrame) -> np.ndarray:
+        """True = มี alarm ในประวัติของคู่โหนดเดียวกันที่ overlap กับหน้าต่าง
+        (Occurrence Time <= End Time และ Clear Time >= Begin Time)"""
+        n = len(df_windows)
+        matched = np.zeros(n, dtype=bool)
+        node_a, node_b, ok = window_nodes(df_windows)
+        if not ok.any() or not self._segments:
+            return matched
+        pos = np.flatnonzero(ok)
+        keys = pair_keys(node_a.iloc[pos], node_b.iloc[pos])
+        begin = to_ns(df_windows["Begin Time"].iloc[pos])
+        end = to_ns(df_windows["End Time"].iloc[pos])
+        codes, uniques = pd.factorize(keys)
+        with self._lock:
+            for code, key in enumerate(uniques):
+                seg = self._segments.get(key)
+                if seg is None:
+                    continue
+                rows = np.flatnonzero(codes == code)
+                s, e = seg
+                # alarm ที่เริ่มก่อน/ตรง End Time = prefix ของคู่นี้ → Clear Time สูงสุดของ prefix >= Begin Time?
+                k = np.searchsorted(self._occ[s:e], end[rows], side="right")
+                hit = k > 0
+                latest = np.full(len(rows), _NO_CLEAR, dtype=np.int64)
+                latest[hit] = self._clr_max[s:e][k[hit] - 1]
+                matched[pos[rows]] = latest >= begin[rows]
+        return matched
+
+    def flapping(self, df_windows: pd.DataFrame) -> np.ndarray:
+        """True = FLAPPING (ไม่มี alarm overlap) — หน้าต่างที่เคยตัดสินแล้วใช้ผลเดิม
+        หน้าต่างใหม่ match กับประวัติทั้งหมดแล้วบันทึกผล"""
+        keys = _window_hashes(df_windows)
+        with self._lock:
+            if len(self._win_keys):
+                idx = np.minimum(np.searchsorted(self._win_keys, keys), len(self._win_keys) - 1)
+                known = self._win_keys[idx] == keys
+            else:
+                idx = np.zeros(len(keys), dtype=np.intp)
+                known = np.zeros(len(keys), dtype=bool)
+            result = np.empty(len(keys), dtype=bool)
+            result[known] = self._win_flap[idx[known]]
+            fresh = np.flatnonzero(~known)
+            if len(fresh):
+                result[fresh] = ~self.match(df_windows.iloc[fresh])
+                new_keys, first = np.unique(keys[fresh], return_index=True)
+                all_keys = np.concatenate([self._win_keys, new_keys])
+                all_flap = np.concatenate([self._win_flap, result[fresh][first]])
+                order = np.argsort(all_keys, kind="stable")
+                self._win_keys, self._win_flap = all_keys[order], all_flap[order]
+        return result
+
+    # -------------------- info --------------------
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "alarms": int(len(self._occ)),
+                "links": len(self._segments),
+                "windows": int(len(self._win_keys)),
+                "first_alarm": pd.Timestamp(self._occ.min()) if len(self._occ) else None,
+                "last_alarm": pd.Timestamp(self._occ.max()) if len(self._occ) else None,
+                "updated_at": self.updated_at,
+            }
+
+
+_default_index: Optional[AlarmIndex] = None
+
+
+def get_alarm_index() -> AlarmIndex:
+    """index กลางของ process (โหลดจากดิสก์ครั้งแรกที่เรียก)"""
+    global _default_index
+    if _default_index is None:
+        _default_index = AlarmIndex()
+    return _default_index
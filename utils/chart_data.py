@@ -0,0 +1,113 @@
+# utils/chart_data.py
+"""
+ลดข้อมูลก่อนส่งเข้ากราฟ (Altair / Plotly) — ขนาด JSON ของกราฟไม่โตตามจำนวนบอร์ด / ลิงก์
+
+- top_k        : bar chart → K แท่งค่ามากสุด + แท่ง "Others (N)" แทนที่เหลือ (แถวที่ keep ไว้ไม่ถูกรวม)
+- count_frame  : donut / pie → นับก่อน (1 แถวต่อสถานะ) แทน list ยาวเท่าจำนวนลิงก์
+- downsample   : series หนาแน่น → LTTB (Largest-Triangle-Three-Buckets) ต่อ series แล้ว union ตำแหน่ง
+                 + ตำแหน่งที่ keep (เช่น จุดผิด threshold) อยู่ครบ (ถ้าจำนวนเองไม่เกินเพดาน)
+
+ทุกฟังก์ชันมีเพดานจุดต่อกราฟ (MAX_BARS / MAX_POINTS) — ข้อมูลที่ไม่เกินเพดานคืนเหมือนเดิมทุกแถว
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+MAX_BARS = 60        # แท่งต่อ bar chart (รวมแท่ง Others)
+MAX_POINTS = 1500    # จุดต่อ series ของ line / scatter
+
+
+def top_k(
+    df: pd.DataFrame,
+    value: str,
+    label: str,
+    k: int = MAX_BARS,
+    *,
+    keep=None,
+    agg: str = "mean",
+    others: str = "Others",
+    fill: Optional[dict] = None,
+) -> pd.DataFrame:
+    """
+    K แถวที่ value มากสุด (เรียงมาก → น้อย) + แถว "Others (N)" ท้ายสุด ที่ value = agg ของแถวที่เหลือ
+    keep = mask แถวที่ต้องแสดงแยกเสมอ (นับรวมใน K ก่อน)
+    fill = ค่าของคอลัมน์อื่นในแถว Others (ที่ไม่ระบุ → NaN)
+    """
+    if len(df) <= k:
+        return df.sort_values(by=value, ascending=False)
+    v = pd.to_numeric(df[value], errors="coerce").to_numpy(dtype=float)
+    must = _mask(keep, len(df))
+
+    # keep ก่อน แล้วเติมด้วยค่ามากสุด (NaN ท้ายสุด) จนครบ k - 1 แถว (เหลือ 1 ที่ให้ Others)
+    rank = np.lexsort((-np.nan_to_num(v, nan=-np.inf), ~must))
+    chosen = np.zeros(len(df), dtype=bool)
+    chosen[rank[:k - 1]] = True
+
+    rest = v[~chosen]
+    rest = rest[~np.isnan(rest)]
+    shown = df[chosen].sort_values(by=value, ascending=False)
+    n_rest = int((~chosen).sum())
+    row = {**(fill or {}), label: f"{others} ({n_rest})", value: getattr(np, agg)(rest) if rest.size else np.nan}
+    return pd.concat([shown, pd.DataFrame([row])], ignore_index=True)
+
+
+def _mask(keep, n: int) -> np.ndarray:
+    if keep is None:
+        return np.zeros(n, dtype=bool)
+    if isinstance(keep, pd.Series):
+        keep = keep.fillna(False)
+    return np.asarray(keep, dtype=bool)
+
+
+def count_frame(values, name: str = "Status", order: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """[name, Count] หนึ่งแถวต่อค่า (ตาม order ถ้าให้มา ค่าที่ไม่พบ → ไม่มีแถว)"""
+    counts = pd.Series(values, dtype=object).value_counts(sort=order is None)
+    if order is not None:
+        counts = counts.reindex([o for o in order if o in counts.index])
+    return pd.DataFrame({name: counts.index.astype(str), "Count": counts.to_numpy(dtype=int)})
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """ตำแหน่งที่เลือกด้วย LTTB (x เรียงจากน้อยไปมาก, ไม่มี NaN) — จุดแรก/สุดท้ายอยู่เสมอ"""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)   # n_out - 2 bucket ระหว่างจุดแรก/สุดท้าย
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # ค่าเฉลี่ยของ bucket ถัดไป (bucket สุดท้าย → จุดสุดท้าย)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(ys: Sequence, max_points: int = MAX_POINTS, *, keep=None) -> np.ndarray:
+    """
+    ตำแหน่งแถว (เรียงน้อย → มาก) สำหรับวาดหลาย series ที่ใช้แกน x ร่วมกัน (x = ลำดับแถว) ไม่เกิน max_points
+    - keep = mask ตำแหน่งที่ต้องอยู่เสมอ (เช่น แถวผิด threshold) ถ้าเกินเพดานเองจะถูกเลือกแบบเว้นระยะเท่ากัน
+    - โควตาที่เหลือแบ่งให้แต่ละ series เลือกด้วย LTTB (ข้าม NaN) แล้ว union
+    """
+    ys = [pd.to_numeric(pd.Series(y), errors="coerce").to_numpy(dtype=float) for y in ys]
+    n = len(ys[0]) if ys else 0
+    if n <= max_points:
+        return np.arange(n)
+    kept = np.flatnonzero(_mask(keep, n))
+    if len(kept) >= max_points:
+        return kept[np.linspace(0, len(kept) - 1, max_points).astype(int)]
+
+    picked = [kept]
+    budget = (max_points - len(kept)) // max(len(ys), 1)
+    for y in ys:
+        pos = np.flatnonzero(~np.isnan(y))
+        if len(pos) and budget:
+            picked.append(pos[lttb(pos.astype(float), y[pos], budget)])
+    return np.unique(np.concatenate(picked))
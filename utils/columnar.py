@@ -0,0 +1,123 @@
+# utils/columnar.py
+"""
+รูปแบบ columnar ของไฟล์ที่อัปโหลด (ผลจาก utils.ingest.parse_file ที่ encode แล้ว)
+
+หนึ่ง upload → หนึ่ง bundle (ZIP แบบ stored) ที่ path columnar/v<BUNDLE_VERSION>/<md5[:2]>/<md5>.zip:
+  manifest.json       {kind: {member, source, type}} + osc_load_threshold ตอนที่ parse
+  <kind>.parquet      ตารางที่ผ่าน apply_schema แล้ว (Parquet + zstd, dtype/category ครบ)
+  <kind>.txt.zst      log (WASON) บีบอัดด้วย zstd
+
+อ่าน bundle ได้ผลเหมือน parse_file ทุกประการ แต่ไม่ต้อง parse Excel ใหม่
+ใช้ pyarrow ทั้ง Parquet และ zstd (ไม่ต้องมี dependency เพิ่ม)
+
+ไฟล์ต้นฉบับที่เก่ากว่า COLD_AFTER_DAYS (และมี bundle แล้ว) ย้ายไปไว้ใต้ COLD_PREFIX
+"""
+import io
+import json
+import os
+import zipfile
+from typing import Optional
+
+import pandas as pd
+
+from utils.diag_log import get_logger
+from utils.excel_loader import OSC_LOAD_THRESHOLD, osc_load_threshold
+from utils.schema import SCHEMA_ATTR, SCHEMAS
+
+log = get_logger("columnar")
+
+BUNDLE_PREFIX = "columnar"
+COLD_PREFIX = "cold"
+DEFAULT_COLD_AFTER_DAYS = 30
+# เปลี่ยนเมื่อผลของ parse_file เปลี่ยน (v2: รวมหลายไฟล์ชนิดเดียวกันใน ZIP)
+# path มี version → bundle เก่าไม่ถูกอ่าน, tier สร้างใหม่ และ prune ลบของเก่าเป็น orphan
+BUNDLE_VERSION = 2
+_MANIFEST = "manifest.json"
+
+
+def bundle_path(checksum: str) -> str:
+    """path ของ bundle (content-addressed ตาม checksum ของไฟล์ต้นฉบับ)"""
+    return f"{BUNDLE_PREFIX}/v{BUNDLE_VERSION}/{checksum[:2]}/{checksum}.zip"
+
+
+def cold_path(stored_path: str) -> str:
+    return stored_path if stored_path.startswith(COLD_PREFIX + "/") else f"{COLD_PREFIX}/{stored_path}"
+
+
+def cold_after_days() -> int:
+    """อายุ (วัน) ของต้นฉบับก่อนย้ายไป cold: COLD_AFTER_DAYS ใน secrets / env"""
+    value = None
+    try:
+        import streamlit as st
+        value = st.secrets.get("COLD_AFTER_DAYS")
+    except Exception:
+        pass
+    try:
+        return int(value or os.getenv("COLD_AFTER_DAYS") or DEFAULT_COLD_AFTER_DAYS)
+    except ValueError:
+        return DEFAULT_COLD_AFTER_DAYS
+
+
+def encode_bundle(parsed: dict, dest) -> bool:
+    """เขียน bundle ของ {kind: (data, source)} ลง file object dest
+
+    คืน False ถ้ามีตารางที่ Parquet เก็บได้ไม่ครบ (เช่น คอลัมน์ object ปนหลายชนิด)
+    — ให้ใช้ต้นฉบับต่อไปแทนที่จะได้ข้อมูลที่ต่างจากเดิม
+    """
+    import pyarrow as pa
+
+    manifest = {"version": BUNDLE_VERSION, "osc_load_threshold": osc_load_threshold(), "kinds": {}}
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_STORED) as zf:
+        for kind, (data, source) in parsed.items():
+            if isinstance(data, pd.DataFrame):
+                buf = io.BytesIO()
+                try:
+                    data.to_parquet(buf, engine="pyarrow", compression="zstd", index=False)
+                except (pa.ArrowException, ValueError, TypeError) as e:
+                    log.warning("parquet_unsupported", kind=kind, source=source, error=e)
+                    return False
+                member = f"{kind}.parquet"
+                zf.writestr(member, buf.getvalue())
+                manifest["kinds"][kind] = {"member": member, "source": source, "type": "table"}
+            elif isinstance(data, str):
+                raw = data.encode("utf-8")
+                member = f"{kind}.txt.zst"
+                zf.writestr(member, pa.compress(raw, codec="zstd", asbytes=True))
+                manifest["kinds"][kind] = {"member": member, "source": source, "type": "text", "size": len(raw)}
+            else:
+                return False
+        zf.writestr(_MANIFEST, json.dumps(manifest, ensure_ascii=False))
+    return True
+
+
+def decode_bundle(fobj) -> dict:
+    """อ่าน bundle → {kind: (data, source)} (รูปแบบเดียวกับ parse_file)"""
+    import pyarrow as pa
+
+    out = {}
+    with zipfile.ZipFile(fobj) as zf:
+        manifest = json.loads(zf.read(_MANIFEST))
+        if manifest.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported columnar bundle version: {manifest.get('version')}")
+        # OSC ใน bundle ถูกตัดที่ cutoff สูงกว่าปัจจุบัน → ขาดแถว ให้ parse ต้นฉบับใหม่
+        cutoff = float(manifest.get("osc_load_threshold", OSC_LOAD_THRESHOLD))
+        if "osc" in manifest["kinds"] and cutoff > osc_load_threshold():
+            raise ValueError(f"Columnar bundle OSC rows were cut at {cutoff} dB (current cutoff {osc_load_threshold()} dB)")
+        for kind, meta in manifest["kinds"].items():
+            with zf.open(meta["member"]) as member:
+                if meta["type"] == "table":
+                    df = pd.read_parquet(io.BytesIO(member.read()), engine="pyarrow")
+                    # pandas รุ่นเก่าไม่เก็บ attrs ใน Parquet
+                    if kind in SCHEMAS and SCHEMA_ATTR not in df.attrs:
+                        df.attrs[SCHEMA_ATTR] = kind
+                    out[kind] = (df, meta["source"])
+                else:
+                    raw = pa.decompress(member.read(), decompressed_size=meta["size"], codec="zstd", asbytes=True)
+                    out[kind] = (raw.decode("utf-8"), meta["source"])
+    return out
+
+
+def bundle_bytes(parsed: dict) -> Optional[bytes]:
+    """encode_bundle ลงหน่วยความจำ (None ถ้า encode ไม่ได้)"""
+    buf = io.BytesIO()
+    return buf.getvalue() if encode_bundle(parsed, buf) else None
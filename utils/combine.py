@@ -0,0 +1,117 @@
+# utils/combine.py
+"""
+รวมข้อมูลชนิดเดียวกันจากหลายไฟล์ / หลายวัน เป็น DataFrame เดียว (ใช้กับทุก analyzer ได้เหมือนไฟล์เดียว)
+
+- เพิ่มทีละ frame (add) — เก็บเฉพาะแถวที่ยังไม่เคยเห็น ไม่ถือ frame ดิบทุกตัวไว้จนจบ
+- ช่วงเวลาที่ export ซ้อนกัน: แถวที่ key ซ้ำกับไฟล์ก่อนหน้า (ME + Measure Object + ช่วงเวลา) ถูกตัดทิ้ง
+  ไฟล์ที่เพิ่มก่อนชนะ / แถวซ้ำภายในไฟล์เดียวกันคงไว้เหมือนเดิม (ไฟล์เดียว → ผลเท่าเดิมทุกแถว)
+- category ของแต่ละไฟล์ไม่เท่ากัน → union ก่อน concat (ไม่หลุดเป็น object)
+- log (WASON) → ต่อกันตามลำดับ ข้าม log ที่ซ้ำทั้งไฟล์
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from utils.schema import SCHEMA_ATTR, SCHEMAS
+
+# คอลัมน์ที่ระบุ "การวัดครั้งเดียวกัน" — kind ที่ไม่มีในนี้ (fm, atten) ใช้ทั้งแถว
+DEDUP_KEYS: Dict[str, Tuple[str, ...]] = {
+    kind: ("ME", "Measure Object", "Begin Time", "End Time")
+    for kind in ("cpu", "fan", "msu", "line", "client", "osc")
+}
+
+
+def _row_hashes(df: pd.DataFrame, kind: str) -> np.ndarray:
+    keys = [c for c in DEDUP_KEYS.get(kind, ()) if c in df.columns]
+    # ไม่มีคอลัมน์เวลา → แยกช่วงเวลาไม่ได้ ใช้ทั้งแถวแทน
+    if not any(c in keys for c in ("Begin Time", "End Time")):
+        keys = list(df.columns)
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+
+class _KindFrames:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.frames: List[pd.DataFrame] = []
+        self.seen = np.empty(0, dtype=np.uint64)   # hash ของ key ที่มีแล้ว (sorted, unique)
+        self.sources: List[str] = []
+        self.dropped = 0
+
+    def add(self, df: pd.DataFrame, source: str) -> None:
+        hashes = _row_hashes(df, self.kind)
+        if self.seen.size:
+            fresh = ~np.isin(hashes, self.seen, assume_unique=False)
+            self.dropped += int((~fresh).sum())
+            if not fresh.all():
+                df, hashes = df[fresh], hashes[fresh]
+        self.seen = np.union1d(self.seen, hashes)
+        if len(df) or not self.frames:
+            self.frames.append(df)
+        self.sources.append(source)
+
+    def result(self) -> pd.DataFrame:
+        if len(self.frames) == 1:
+            return self.frames[0]
+        frames = self.frames
+        # union category ของทุกไฟล์ก่อน concat เพื่อให้ dtype ยังเป็น category
+        for c in frames[0].columns:
+            if not all(c in f.columns for f in frames):
+                continue
+            if any(isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames):
+                frames = [f if isinstance(f[c].dtype, pd.CategoricalDtype) else f.assign(**{c: f[c].astype("category")})
+                          for f in frames]
+                cats = union_categoricals([f[c].array for f in frames], ignore_order=True).categories
+                frames = [f.assign(**{c: f[c].cat.set_categories(cats)}) for f in frames]
+        out = pd.concat(frames, ignore_index=True)
+        if self.kind in SCHEMAS:
+            out.attrs[SCHEMA_ATTR] = self.kind
+        return out
+
+
+class FrameCombiner:
+    """สะสม {kind: data} จากหลายไฟล์ตามลำดับ แล้วคืนผลรวมแบบเดียวกับ parse_file"""
+
+    def __init__(self):
+        self._tables: Dict[str, _KindFrames] = {}
+        self._logs: Dict[str, List[Tuple[str, str]]] = {}
+
+    def add(self, kind: str, data, source: str) -> None:
+        if isinstance(data, pd.DataFrame):
+            self._tables.setdefault(kind, _KindFrames(kind)).add(data, source)
+        elif isinstance(data, str):
+            logs = self._logs.setdefault(kind, [])
+            if all(text != data for text, _ in logs):
+                logs.append((data, source))
+
+    def add_parsed(self, parsed: dict) -> None:
+        for kind, (data, source) in parsed.items():
+            self.add(kind, data, source)
+
+    def sources(self, kind: str) -> List[str]:
+        if kind in self._tables:
+            return list(self._tables[kind].sources)
+        return [src for _, src in self._logs.get(kind, [])]
+
+    def dropped(self, kind: str) -> int:
+        """จำนวนแถวที่ตัดทิ้งเพราะซ้ำกับไฟล์ก่อนหน้า"""
+        t = self._tables.get(kind)
+        return t.dropped if t else 0
+
+    def result(self) -> Dict[str, Tuple[object, str]]:
+        out = {}
+        for kind, t in self._tables.items():
+            out[kind] = (t.result(), source_label(t.sources))
+        for kind, logs in self._logs.items():
+            out[kind] = ("\n".join(text for text, _ in logs), source_label([src for _, src in logs]))
+        return out
+
+
+def source_label(sources: List[str]) -> Optional[str]:
+    """ชื่อไฟล์ต้นทางสำหรับแสดงผล: ไฟล์เดียว → ชื่อเดิม, หลายไฟล์ → ชื่อแรก (+N files)"""
+    if not sources:
+        return None
+    if len(sources) == 1:
+        return sources[0]
+    return f"{sources[0]} (+{len(sources) - 1} files)"
@@ -0,0 +1,203 @@
+# utils/diag_log.py
+"""
+log วินิจฉัยแบบมีโครงสร้าง (แทน print ใน loop ของ analyzer / ingest)
+
+- namespace ต่อ analyzer: get_logger("fiberflapping") → logger "netmon.fiberflapping"
+- แต่ละ record = event + fields (เช่น log.debug("flapping_window", row=3, me="...")) → กรอง/แสดงเป็นตารางได้
+- ระดับ DEBUG / INFO ถูก rate limit + sample ต่อ (namespace, event):
+  LOG_BURST record แรกในแต่ละ LOG_WINDOW_S วินาทีผ่านหมด จากนั้นเก็บ 1 ใน LOG_SAMPLE_EVERY
+  (WARNING ขึ้นไปผ่านทุกครั้ง) จำนวนที่ถูกตัดทิ้งนับไว้ใน suppressed()
+- ทุก record ที่ผ่านเก็บใน ring buffer ขนาด LOG_BUFFER_SIZE → UI เปิดดูได้ (recent())
+- stdout/stderr ได้เฉพาะ LOG_CONSOLE_LEVEL ขึ้นไป (default WARNING) → container log ไม่ท่วม
+
+ค่าตั้งทั้งหมดอ่านจาก secrets / env (LOG_LEVEL default INFO)
+เช็ค log.enabled() ก่อนสร้างข้อความที่แพงใน hot loop
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+ROOT = "netmon"
+_DEFAULTS = {
+    "LOG_LEVEL": "INFO",
+    "LOG_CONSOLE_LEVEL": "WARNING",
+    "LOG_BUFFER_SIZE": 2000,
+    "LOG_BURST": 20,
+    "LOG_WINDOW_S": 60,
+    "LOG_SAMPLE_EVERY": 100,
+}
+
+
+def _setting(name: str):
+    """ค่าตั้งจาก secrets / env (fallback = _DEFAULTS)"""
+    default = _DEFAULTS[name]
+    value = None
+    try:
+        import streamlit as st
+        value = st.secrets.get(name)
+    except Exception:
+        pass
+    value = value or os.getenv(name)
+    if value is None:
+        return default
+    if isinstance(default, int):
+        try:
+            return int(value)
+        except ValueError:
+            return default
+    return str(value).upper()
+
+
+class _Sampler:
+    """rate limit + sampling ต่อ key (namespace, event)"""
+
+    def __init__(self, burst: int, window_s: float, every: int):
+        self.burst = burst
+        self.window_s = window_s
+        self.every = max(every, 1)
+        self._state: Dict[Tuple[str, str], list] = {}   # key → [window_start, count]
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: Tuple[str, str]) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            st = self._state.get(key)
+            if st is None or now - st[0] > self.window_s:
+                st = self._state[key] = [now, 0]
+            st[1] += 1
+            n = st[1]
+            if n <= self.burst or (n - self.burst) % self.every == 0:
+                return True
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+
+    def suppressed(self) -> Dict[Tuple[str, str], int]:
+        with self._lock:
+            return dict(self._suppressed)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state.clear()
+            self._suppressed.clear()
+
+
+class RingBufferHandler(logging.Handler):
+    """เก็บ record ล่าสุดเป็น dict (ขนาดคงที่)"""
+
+    def __init__(self, capacity: int):
+        super().__init__()
+        self.records: deque = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append({
+            "time": record.created,
+            "level": record.levelname,
+            "namespace": getattr(record, "namespace", record.name),
+            "event": getattr(record, "event", ""),
+            "message": record.getMessage(),
+            "fields": getattr(record, "fields", {}),
+        })
+
+
+class DiagLogger:
+    """logger ของ namespace หนึ่ง: event + fields, sampling ก่อนสร้าง LogRecord"""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._log = logging.getLogger(f"{ROOT}.{namespace}")
+
+    def enabled(self, level: int = logging.DEBUG) -> bool:
+        return self._log.isEnabledFor(level)
+
+    def log(self, level: int, event: str, **fields) -> None:
+        if not self._log.isEnabledFor(level):
+            return
+        if level < logging.WARNING and not _sampler.allow((self.namespace, event)):
+            return
+        text = " ".join(f"{k}={v}" for k, v in fields.items())
+        self._log.log(
+            level, f"{event} {text}" if text else event,
+            extra={"namespace": self.namespace, "event": event, "fields": fields},
+            stacklevel=3,
+        )
+
+    def debug(self, event: str, **fields) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields) -> None:
+        self.log(logging.ERROR, event, **fields)
+
+
+_sampler: Optional[_Sampler] = None
+_buffer: Optional[RingBufferHandler] = None
+_loggers: Dict[str, DiagLogger] = {}
+_setup_lock = threading.Lock()
+
+
+def _setup() -> None:
+    global _sampler, _buffer
+    with _setup_lock:
+        if _buffer is not None:
+            return
+        root = logging.getLogger(ROOT)
+        root.setLevel(_setting("LOG_LEVEL"))
+        root.propagate = False
+        _buffer = RingBufferHandler(_setting("LOG_BUFFER_SIZE"))
+        console = logging.StreamHandler()
+        console.setLevel(_setting("LOG_CONSOLE_LEVEL"))
+        console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root.addHandler(_buffer)
+        root.addHandler(console)
+        _sampler = _Sampler(_setting("LOG_BURST"), _setting("LOG_WINDOW_S"), _setting("LOG_SAMPLE_EVERY"))
+
+
+def get_logger(namespace: str) -> DiagLogger:
+    if _buffer is None:
+        _setup()
+    if namespace not in _loggers:
+        _loggers[namespace] = DiagLogger(namespace)
+    return _loggers[namespace]
+
+
+def set_level(level: str) -> None:
+    """เปลี่ยนระดับ log ทั้ง process ขณะรัน (เช่น เปิด DEBUG จาก UI ชั่วคราว)"""
+    _setup()
+    logging.getLogger(ROOT).setLevel(level)
+
+
+def current_level() -> str:
+    _setup()
+    return logging.getLevelName(logging.getLogger(ROOT).level)
+
+
+def recent(min_level: str = "DEBUG", namespace: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """record ล่าสุดใน ring buffer (ใหม่สุดก่อน)"""
+    _setup()
+    floor = logging.getLevelName(min_level)
+    rows = [
+        r for r in reversed(_buffer.records)
+        if logging.getLevelName(r["level"]) >= floor and (namespace is None or r["namespace"] == namespace)
+    ]
+    return rows[:limit] if limit else rows
+
+
+def suppressed() -> Dict[Tuple[str, str], int]:
+    """{(namespace, event): จำนวน record ที่ถูก sampling ตัดทิ้ง}"""
+    _setup()
+    return _sampler.suppressed()
+
+
+def clear() -> None:
+    _setup()
+    _buffer.records.clear()
+    _sampler.reset()
@@ -0,0 +1,291 @@
+# utils/excel_loader.py
+"""
+โหลด workbook แบบ projection + predicate pushdown
+
+แต่ละ kind มี LoadSpec บอกว่า:
+  - ต้องใช้คอลัมน์ไหนบ้าง (columns / prefixes) → คอลัมน์อื่นไม่ถูกอ่านเข้า DataFrame
+  - row predicate ราคาถูกที่ใช้ตัดแถวทิ้งระหว่าง stream (เช่น OSC: Min == -60 หรือ Max-Min <= threshold)
+
+อ่านทีละแถวผ่าน reader backend (python-calamine หรือ openpyxl read-only) จึงไม่ต้องสร้าง
+DataFrame เต็มก่อนกรอง เลือก backend ได้ด้วย EXCEL_READER (secrets/env): auto | calamine | openpyxl | pandas
+ถ้า backend ที่เลือกใช้ไม่ได้ จะลองตัวถัดไป และสุดท้าย fallback ไป pd.read_excel แล้วกรองแบบ vectorized
+"""
+import io
+import os
+import re
+import threading
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from utils.diag_log import get_logger
+from utils.schema import SCHEMAS, apply_schema, normalize_columns
+
+log = get_logger("excel_loader")
+
+# threshold (default) ที่ใช้ตัดแถว OSC ตอนโหลด — ตั้งได้ด้วย OSC_LOAD_THRESHOLD (secrets/env)
+# ค่าเดียวกันเป็นค่าต่ำสุดของ slider หน้า Fiber Flapping (FiberflappingAnalyzer.min_sweep_threshold)
+OSC_LOAD_THRESHOLD = 2.0
+
+COL_MAX_IN = "Max Value of Input Optical Power(dBm)"
+COL_MIN_IN = "Min Value of Input Optical Power(dBm)"
+
+# predicate factory: รับ {column: index} แล้วคืนฟังก์ชันที่ตัดสินจาก tuple ของแถว
+RowPredicate = Callable[[Dict[str, int]], Callable[[tuple], bool]]
+
+
+@dataclass(frozen=True)
+class LoadSpec:
+    kind: str
+    columns: Tuple[str, ...]
+    prefixes: Tuple[str, ...] = ()
+    row_predicate: Optional[RowPredicate] = None
+    # เวอร์ชัน vectorized ของ predicate เดียวกัน (ใช้ตอน fallback)
+    frame_predicate: Optional[Callable[[pd.DataFrame], pd.Series]] = None
+
+    def wants(self, col: str) -> bool:
+        return col in self.columns or any(col.startswith(p) for p in self.prefixes)
+
+
+def osc_load_threshold() -> float:
+    """threshold ที่ใช้ตัดแถว OSC ตอนโหลด: OSC_LOAD_THRESHOLD ใน Streamlit secrets หรือ env (default 2.0)"""
+    value = None
+    try:
+        import streamlit as st
+        value = st.secrets.get("OSC_LOAD_THRESHOLD")
+    except Exception:
+        pass
+    if value is None:
+        value = os.getenv("OSC_LOAD_THRESHOLD")
+    try:
+        # ตั้ง 0 ได้ (โหลดทุกแถวที่ Min != -60) จึงเช็ค None แทน falsy
+        return OSC_LOAD_THRESHOLD if value in (None, "") else float(value)
+    except (TypeError, ValueError):
+        return OSC_LOAD_THRESHOLD
+
+
+def _to_float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _osc_row_predicate(idx: Dict[str, int]) -> Callable[[tuple], bool]:
+    i_max, i_min = idx.get(COL_MAX_IN), idx.get(COL_MIN_IN)
+    if i_max is None or i_min is None:
+        return lambda row: True
+    thr = osc_load_threshold()
+
+    def keep(row: tuple) -> bool:
+        vmin = _to_float(row[i_min])
+        if vmin == -60:
+            return False
+        # NaN เทียบแล้วได้ False → ตัดทิ้งเหมือน FlappingSweep
+        return (_to_float(row[i_max]) - vmin) > thr
+    return keep
+
+
+def _osc_frame_predicate(df: pd.DataFrame) -> pd.Series:
+    if COL_MAX_IN not in df.columns or COL_MIN_IN not in df.columns:
+        return pd.Series(True, index=df.index)
+    vmax = pd.to_numeric(df[COL_MAX_IN], errors="coerce")
+    vmin = pd.to_numeric(df[COL_MIN_IN], errors="coerce")
+    return (vmin != -60) & ((vmax - vmin) > osc_load_threshold())
+
+
+def _cols(kind: str, *extra: str) -> Tuple[str, ...]:
+    s = SCHEMAS[kind]
+    out = []
+    for c in (*s.required, *s.numeric, *s.datetime, *extra):
+        if c not in out:
+            out.append(c)
+    return tuple(out)
+
+
+_DISPLAY = ("Begin Time", "End Time", "Granularity", "ME IP")
+
+LOAD_SPECS: Dict[str, LoadSpec] = {
+    "cpu": LoadSpec("cpu", _cols("cpu", *_DISPLAY)),
+    "fan": LoadSpec("fan", _cols("fan", *_DISPLAY)),
+    "msu": LoadSpec("msu", _cols("msu", *_DISPLAY)),
+    "line": LoadSpec("line", _cols("line", *_DISPLAY)),
+    "client": LoadSpec("client", _cols("client", *_DISPLAY)),
+    "osc": LoadSpec(
+        "osc", _cols("osc", *_DISPLAY),
+        row_predicate=_osc_row_predicate,
+        frame_predicate=_osc_frame_predicate,
+    ),
+    # FM: ใช้แค่เวลา + คอลัมน์ Link* (ชื่อจริงต่างกันตาม export)
+    "fm": LoadSpec("fm", _cols("fm"), prefixes=("Link",)),
+    "atten": LoadSpec("atten", _cols("atten", "Link Name")),
+}
+
+
+def _normalize_name(c) -> str:
+    # ต้องให้ผลเหมือน utils.schema.normalize_columns
+    return re.sub(r"\s+", " ", str(c).replace("\u00a0", " ")).strip()
+
+
+# -------------------- Reader backends --------------------
+# แต่ละ backend คืน iterator ของแถว (tuple) ของ sheet แรก โดยแถวแรกเป็น header
+# ค่าว่างต้องเป็น None ให้เหมือนกันทุก backend
+
+@contextmanager
+def _rows_calamine(src) -> Iterator[Iterator[tuple]]:
+    from python_calamine import CalamineWorkbook
+
+    wb = CalamineWorkbook.from_filelike(src)
+    try:
+        sheet = wb.get_sheet_by_index(0)
+        # calamine คืน "" สำหรับ cell ว่าง → แปลงเป็น None
+        yield (tuple(None if v == "" else v for v in row) for row in sheet.iter_rows())
+    finally:
+        close = getattr(wb, "close", None)
+        if close:
+            close()
+
+
+@contextmanager
+def _rows_openpyxl(src) -> Iterator[Iterator[tuple]]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(src, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        # ไฟล์ export จาก NMS มักเขียน dimension ผิด (A1:A1) → ให้ openpyxl อ่านจนจบจริง
+        ws.reset_dimensions()
+        yield ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+READERS: Dict[str, Callable] = {
+    "calamine": _rows_calamine,
+    "openpyxl": _rows_openpyxl,
+}
+
+# ลำดับเมื่อ EXCEL_READER=auto (หรือไม่ได้ตั้ง): เร็วสุดก่อน
+AUTO_ORDER = ("calamine", "openpyxl")
+
+
+def configured_reader() -> str:
+    """ชื่อ backend จาก config: EXCEL_READER ใน Streamlit secrets หรือ env (default: auto)"""
+    name = None
+    try:
+        import streamlit as st
+        name = st.secrets.get("EXCEL_READER")
+    except Exception:
+        pass
+    name = name or os.getenv("EXCEL_READER") or "auto"
+    return str(name).strip().lower()
+
+
+def reader_order(preferred: str | None = None) -> Tuple[str, ...]:
+    """backend ที่จะลองตามลำดับ: ตัวที่เลือกก่อน แล้วตามด้วยตัวอื่นเป็น fallback"""
+    preferred = (preferred or configured_reader()).lower()
+    if preferred == "pandas":
+        return ()
+    if preferred not in READERS:
+        return AUTO_ORDER
+    return (preferred,) + tuple(r for r in AUTO_ORDER if r != preferred)
+
+
+def _materialize(rows: Iterator[tuple], spec: LoadSpec) -> pd.DataFrame:
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    names = [_normalize_name(h) if h is not None else "" for h in header]
+    picked, seen = [], set()
+    for i, n in enumerate(names):
+        # ชื่อซ้ำ: เก็บคอลัมน์แรก (pandas จะเติม .1 ให้ตัวหลัง ซึ่ง spec ไม่ได้ใช้อยู่แล้ว)
+        if n and n not in seen and spec.wants(n):
+            picked.append((i, n))
+            seen.add(n)
+    idx = {n: i for i, n in picked}
+    keep = spec.row_predicate(idx) if spec.row_predicate else None
+
+    data = {n: [] for _, n in picked}
+    for row in rows:
+        if row is None or all(v is None for v in row):
+            continue
+        if keep is not None and not keep(row):
+            continue
+        width = len(row)
+        for i, n in picked:
+            data[n].append(row[i] if i < width else None)
+    return pd.DataFrame(data)
+
+
+def stream_excel(src, spec: LoadSpec, reader: str) -> pd.DataFrame:
+    if hasattr(src, "seek"):
+        src.seek(0)
+    with READERS[reader](src) as rows:
+        return _materialize(rows, spec)
+
+
+def _fallback_pandas(src, spec: LoadSpec) -> pd.DataFrame:
+    if hasattr(src, "seek"):
+        src.seek(0)
+    df = normalize_columns(pd.read_excel(src))
+    df = df[[c for c in df.columns if spec.wants(c)]]
+    if spec.frame_predicate is not None:
+        df = df[spec.frame_predicate(df)]
+    return df.reset_index(drop=True)
+
+
+def load_excel(kind: str, src, ext: str = ".xlsx", reader: str | None = None) -> pd.DataFrame:
+    """
+    อ่าน workbook ของ kind ที่ระบุ โดยอ่านเฉพาะคอลัมน์ที่ใช้ + ตัดแถวตาม predicate
+    reader: "calamine" / "openpyxl" / "pandas" / "auto" (None = ตาม config)
+    backend ที่ใช้ไม่ได้ (ไม่ได้ติดตั้ง / อ่านไฟล์ไม่ได้) จะ fallback ไปตัวถัดไป และสุดท้าย pd.read_excel
+    kind ที่ไม่มี LoadSpec → pd.read_excel ปกติ
+    """
+    spec = LOAD_SPECS.get(kind)
+    if spec is None:
+        return pd.read_excel(src)
+
+    # reader ต้อง seek ได้ → ถ้า seek ไม่ได้ (หรือเป็น ZipExtFile ที่ seek ช้ามาก) อ่านเป็น bytes ก่อน
+    # temp file จาก utils.zip_extract / ไฟล์บนดิสก์ ใช้ได้ตรง ๆ ไม่ต้อง copy เข้า RAM
+    if not isinstance(src, str):
+        seekable = getattr(src, "seekable", None)
+        if isinstance(src, zipfile.ZipExtFile) or not (seekable and seekable()):
+            src = io.BytesIO(src.read())
+
+    # .xls รองรับเฉพาะ calamine
+    order = reader_order(reader)
+    if ext == ".xls":
+        order = tuple(r for r in order if r == "calamine")
+
+    for name in order:
+        try:
+            return stream_excel(src, spec, name)
+        except ImportError:
+            continue
+        except Exception as e:
+            log.warning("reader_failed", reader=name, kind=kind, error=e)
+    return _fallback_pandas(src, spec)
+
+
+# ---- reference workbook ----
+# (kind, path) → (mtime, DataFrame ที่ผ่าน schema แล้ว) / อ่านใหม่เมื่อไฟล์ใน data/ ถูกแก้
+_REFERENCES: Dict[Tuple[str, str], Tuple[float, pd.DataFrame]] = {}
+_REF_LOCK = threading.Lock()
+
+
+def load_reference(kind: str, path: str) -> pd.DataFrame:
+    """
+    reference workbook (data/*.xlsx) ที่ normalize + cast ตาม schema ของ kind (เช่น "cpu_ref") แล้ว
+    อ่านจากดิสก์ครั้งเดียวต่อ mtime — คืนสำเนา (analyzer เพิ่มคอลัมน์ order / Mapping ลงไปเอง)
+    """
+    mtime = os.path.getmtime(path)
+    with _REF_LOCK:
+        hit = _REFERENCES.get((kind, path))
+    if hit is None or hit[0] != mtime:
+        hit = (mtime, apply_schema(kind, pd.read_excel(path)))
+        with _REF_LOCK:
+            _REFERENCES[(kind, path)] = hit
+    return hit[1].copy()
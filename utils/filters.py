@@ -1,7 +1,144 @@
 # utils/filters.py
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import streamlit as st
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class FilterIndex:
+    """
+    index ของคอลัมน์ที่ใช้กรอง (สร้างครั้งเดียวต่อเนื้อหาของคอลัมน์ — ดู filter_index):
+      - codes ต่อคอลัมน์ (ลำดับเดียวกับ options ที่ sort แล้ว, -1 = NaN)
+      - inverted index: ค่า → ตำแหน่งแถว (สร้างเมื่อคอลัมน์นั้นถูกเลือกครั้งแรก)
+    options / แถวที่ผ่าน ได้จาก intersection ของตำแหน่ง แทน astype(str) + unique ทุกชั้นทุก rerun
+    ผลของแต่ละชุด selection ถูกจำไว้ (LRU) → rerun ที่ selection เดิมไม่ต้องคำนวณใหม่
+    index เดียวอาจถูกใช้ร่วมกันหลาย session (ข้อมูลเนื้อหาเดียวกัน) → memo / postings อยู่ใต้ lock
+    """
+
+    MEMO_SIZE = 32
+
+    def __init__(self, df: pd.DataFrame, cols: Sequence[str], factorized: Optional[Dict[str, tuple]] = None):
+        self.n = len(df)
+        self._lock = threading.Lock()
+        self._codes: Dict[str, np.ndarray] = {}
+        self._labels: Dict[str, List[str]] = {}
+        self._lookup: Dict[str, Dict[str, int]] = {}
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._memo: OrderedDict = OrderedDict()   # selection (tuple) → ผลของ cascade
+        for c in cols:
+            codes, uniques = factorized[c] if factorized is not None else _factorize(df[c])
+            # ข้อความแบบเดียวกับ astype(str) เดิม / ค่าต่างชนิดที่เป็นข้อความเดียวกันรวมเป็น option เดียว
+            text = pd.Series(uniques).astype(str).to_numpy(dtype=object)
+            labels = sorted(set(text))
+            lookup = {s: i for i, s in enumerate(labels)}
+            remap = np.array([lookup[s] for s in text] + [-1], dtype=np.int64)   # code -1 (NaN) → -1
+            self._codes[c] = remap[codes]
+            self._labels[c] = labels
+            self._lookup[c] = lookup
+
+    def _rows_of(self, col: str, values: Sequence[str]) -> np.ndarray:
+        """ตำแหน่งแถว (เรียงแล้ว) ที่คอลัมน์ col มีค่าอยู่ใน values"""
+        if col not in self._postings:
+            codes = self._codes[col]
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(-1, len(self._labels[col]) + 1))
+            self._postings[col] = (order, bounds)
+        order, bounds = self._postings[col]
+        wanted = [self._lookup[col][v] for v in values if v in self._lookup[col]]
+        # bounds[k + 1] : bounds[k + 2] = แถวของ code k (bounds[0] เริ่มที่ code -1)
+        parts = [order[bounds[k + 1]:bounds[k + 2]] for k in wanted]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def options(self, col: str, rows: Optional[np.ndarray] = None) -> List[str]:
+        """option ที่เรียงแล้วของ col จากแถว rows (None = ทุกแถว)"""
+        codes = self._codes[col] if rows is None else self._codes[col][rows]
+        present = np.bincount(codes + 1, minlength=len(self._labels[col]) + 1)[1:] > 0
+        labels = self._labels[col]
+        return [labels[i] for i in np.flatnonzero(present)]
+
+    def cascade(self, cols: Sequence[str], selections: Dict[str, List[str]]):
+        """
+        (options ต่อคอลัมน์, selection ที่ตัดค่าที่ไม่อยู่ใน options แล้ว, ตำแหน่งแถวสุดท้าย)
+        ชั้นที่ i ได้ options จากแถวที่ผ่าน selection ของชั้นก่อนหน้า / ตำแหน่ง None = ทุกแถว
+        """
+        key = tuple((c, tuple(selections.get(c, ()))) for c in cols)
+        with self._lock:
+            hit = self._memo.get(key)
+            if hit is not None:
+                self._memo.move_to_end(key)
+                return hit
+            return self._cascade(key, cols, selections)
+
+    def _cascade(self, key: tuple, cols: Sequence[str], selections: Dict[str, List[str]]):
+        rows: Optional[np.ndarray] = None
+        options_per_col, valid = [], {}
+        for c in cols:
+            opts = self.options(c, rows)
+            options_per_col.append(opts)
+            present = set(opts)
+            valid[c] = [x for x in selections.get(c, ()) if x in present]
+            if valid[c]:
+                picked = self._rows_of(c, valid[c])
+                rows = picked if rows is None else np.intersect1d(rows, picked, assume_unique=True)
+
+        result = (options_per_col, valid, rows)
+        self._memo[key] = result
+        if len(self._memo) > self.MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return result
+
+
+def _factorize(s: pd.Series) -> tuple:
+    """(codes, uniques) ของคอลัมน์ — category ใช้ codes / categories เดิม (ไม่ต้อง factorize ใหม่), NaN = -1"""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories
+    return pd.factorize(s)
+
+
+# index ต่อ "เนื้อหา" ของคอลัมน์ที่กรอง (LRU): analyzer สร้าง df_result ใหม่ทุก rerun
+# แต่ข้อมูลเดิม → codes / ค่าไม่ซ้ำเดิม → ใช้ index เดิมได้ (รวมถึงข้าม session ที่เปิดไฟล์เดียวกัน)
+INDEX_CACHE_SIZE = 16
+_INDEXES: "OrderedDict[tuple, FilterIndex]" = OrderedDict()
+_INDEX_LOCK = threading.Lock()
+
+
+def _content_key(cols: Tuple[str, ...], factorized: Dict[str, tuple]) -> Optional[tuple]:
+    """key จาก codes + hash ของค่าไม่ซ้ำ ต่อคอลัมน์ (ถูกกว่า hash ทุกแถว) / hash ไม่ได้ → None"""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        for c in cols:
+            codes, uniques = factorized[c]
+            h.update(str(codes.dtype).encode())
+            h.update(np.ascontiguousarray(codes).tobytes())
+            h.update(pd.util.hash_pandas_object(pd.Index(uniques), index=False).to_numpy().tobytes())
+    except TypeError:
+        return None
+    return (cols, h.hexdigest())
+
+
+def filter_index(df: pd.DataFrame, cols: Sequence[str]) -> FilterIndex:
+    cols = tuple(cols)
+    factorized = {c: _factorize(df[c]) for c in cols}
+    key = _content_key(cols, factorized)
+    if key is None:
+        return FilterIndex(df, cols, factorized)
+    with _INDEX_LOCK:
+        index = _INDEXES.get(key)
+        if index is not None:
+            _INDEXES.move_to_end(key)
+            return index
+    index = FilterIndex(df, cols, factorized)
+    with _INDEX_LOCK:
+        _INDEXES[key] = index
+        _INDEXES.move_to_end(key)
+        while len(_INDEXES) > INDEX_CACHE_SIZE:
+            _INDEXES.popitem(last=False)
+    return index
+
 
 def cascading_filter(
     df: pd.DataFrame,
@@ -28,23 +165,15 @@ def cascading_filter(
     if not active_cols:
         return df.reset_index(drop=True), {}
 
-    # สร้าง options ทีละชั้นด้วย mask สะสม
-    masks = [pd.Series(True, index=df.index)]
-    options_per_col = []
-    for i, c in enumerate(active_cols):
-        m = masks[-1]
-        opts = sorted(df.loc[m, c].dropna().astype(str).unique())
-        options_per_col.append(opts)
-
-        # prune ค่าเลือกที่ไม่อยู่ใน opts (กัน selection ค้าง)
-        valid_sel = [x for x in st.session_state[f"{ns}_f_{c}"] if x in opts]
-        st.session_state[f"{ns}_f_{c}"] = valid_sel
+    # options ทีละชั้นจาก index (สร้างครั้งเดียวต่อเนื้อหา ใช้ซ้ำข้าม rerun / จำผลต่อชุด selection)
+    index = filter_index(df, active_cols)
+    options_per_col, selections, rows = index.cascade(
+        active_cols, {c: st.session_state[f"{ns}_f_{c}"] for c in active_cols}
+    )
 
-        # อัปเดต mask สำหรับคอลัมน์ถัดไป
-        if valid_sel:
-            masks.append(m & df[c].astype(str).isin(valid_sel))
-        else:
-            masks.append(m)
+    # prune ค่าเลือกที่ไม่อยู่ใน opts (กัน selection ค้าง)
+    for c in active_cols:
+        st.session_state[f"{ns}_f_{c}"] = list(selections[c])
 
     # วาด widgets เป็นแถวเดียว + ปุ่ม Clear
     cols_widgets = st.columns([1] * len(active_cols) + [0.8])
@@ -63,13 +192,7 @@ def cascading_filter(
     with cols_widgets[-1]:
         st.button(clear_text, on_click=_clear)
 
-    # สร้าง final mask จาก selections ทั้งหมด
-    final_mask = pd.Series(True, index=df.index)
-    selections: Dict[str, List[str]] = {}
-    for c in active_cols:
-        sel = st.session_state.get(f"{ns}_f_{c}", [])
-        selections[c] = sel
-        if sel:
-            final_mask &= df[c].astype(str).isin(sel)
-
-    return df[final_mask].reset_index(drop=True), selections
+    # แถวที่ผ่านทุก selection = ผลของชั้นสุดท้าย
+    if rows is None:
+        return df.reset_index(drop=True), {c: list(v) for c, v in selections.items()}
+    return df.iloc[rows].reset_index(drop=True), {c: list(v) for c, v in selections.items()}
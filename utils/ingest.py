@@ -0,0 +1,123 @@
+# utils/ingest.py
+"""
+parse ไฟล์ที่อัปโหลด (ZIP / Excel / TXT) → {kind: (data, ชื่อไฟล์ต้นทาง)}
+
+แยกออกจาก app9 เพื่อให้เครื่องมือนอก Streamlit (storage_maintenance.py) ใช้ parser ตัวเดียวกันได้
+- kind เดาจากชื่อไฟล์ตาม KW
+- Excel ที่มี LoadSpec → อ่านเฉพาะคอลัมน์/แถวที่ใช้ (utils.excel_loader)
+- ทุกตารางผ่าน apply_schema ครั้งเดียวตอน ingest
+- ZIP ที่มีหลายไฟล์ชนิดเดียวกัน → รวมเป็นตารางเดียว (utils.combine)
+"""
+import re
+
+import pandas as pd
+
+from utils.combine import FrameCombiner
+from utils.diag_log import get_logger
+from utils.excel_loader import LOAD_SPECS, load_excel
+from utils.schema import apply_schema
+from utils.zip_extract import iter_zip_members
+
+KW = {
+    "cpu": ("cpu",),
+    "fan": ("fan",),
+    "msu": ("msu",),
+    "client": ("client", "client board"),
+    "line":  ("line","line board"),
+    "wason": ("wason","log","mobaxterm", "moba xterm", "moba"),
+    "osc": ("osc","osc optical"),
+    "fm":  ("fm","alarm","fault management"),
+    "atten": ("optical attenuation report", "optical_attenuation_report","optical attenuation"),
+    "preset": ("wason","log","mobaxterm", "moba xterm", "moba"),
+}
+
+LOADERS = {
+    ".xlsx": pd.read_excel,
+    ".xls": pd.read_excel,
+    ".txt":  lambda f: f.read().decode("utf-8", errors="ignore"),
+}
+
+log = get_logger("ingest")
+
+
+def load_table(kind: str, ext: str, f):
+    """อ่านไฟล์ตาม kind: Excel ที่มี LoadSpec → อ่านเฉพาะคอลัมน์/แถวที่ใช้, อื่น ๆ → LOADERS"""
+    if kind in LOAD_SPECS and ext in (".xlsx", ".xls"):
+        return load_excel(kind, f, ext)
+    return LOADERS[ext](f)
+
+
+def file_ext(name: str) -> str:
+    name = name.lower()
+    return next((e for e in LOADERS if name.endswith(e)), "")
+
+
+def detect_kind(name):
+    n = name.lower()
+    hits = [k for k, kws in KW.items() if any(re.search(re.escape(s), n) for s in kws)]
+
+    # ---- Priority ----
+    if "wason" in hits:
+        return "wason"
+    if "preset" in hits:
+        return "preset"
+
+    # ---- เช็คว่า line ต้องเป็น Excel เท่านั้น ----
+    if "line" in hits and (n.endswith(".xlsx") or n.endswith(".xls") or n.endswith(".xlsm")):
+        return "line"
+
+    # ---- อื่น ๆ ตามปกติ ----
+    for k in ("fan","cpu","msu","client","osc","fm","atten"):
+        if k in hits:
+            return k
+
+    return hits[0] if hits else None
+
+
+def find_in_zip(zip_file):
+    """ทุกไฟล์ใน ZIP (รวม ZIP ชั้นใน) → {kind: (data, source) หรือ None}
+
+    หลายไฟล์ชนิดเดียวกัน (เช่น export FAN ทั้งสัปดาห์) ถูกรวมเป็นตารางเดียว ตัดช่วงเวลาที่ซ้อนกันออก
+    ไฟล์ที่อ่านไม่ได้ถูกข้าม (log warning) / ไฟล์ที่ขาดคอลัมน์ที่ต้องมี → ValueError ระบุชื่อไฟล์และคอลัมน์
+    """
+    combiner = FrameCombiner()
+
+    def want(name: str) -> bool:
+        lname = name.lower()
+        return bool(file_ext(lname)) and detect_kind(lname) is not None
+
+    # member ถูก stream ลง temp file ทีละตัว (จำกัด RAM ด้วย ZIP_MEMORY_BUDGET_MB)
+    for name, f in iter_zip_members(zip_file, want=want):
+        lname = name.lower()
+        ext = file_ext(lname)
+        kind = detect_kind(lname)
+        try:
+            df = load_table(kind, ext, f)
+        except Exception as e:
+            # อ่านไม่ได้ (ไฟล์เสีย / ไม่ใช่ Excel จริง) → ข้ามเฉพาะไฟล์นี้
+            log.warning("member_failed", kind=kind, member=name, error=e)
+            continue
+        log.debug("member_loaded", kind=kind, type=type(df).__name__, member=name)
+        # normalize + validate + cast dtype ครั้งเดียวตอน ingest
+        # ถ้าเป็น log (.txt) → เก็บเป็น string ใน key "wason_log"
+        # คอลัมน์ที่ต้องมีขาด → แจ้งผู้เรียกพร้อมชื่อไฟล์ใน ZIP (เหมือนไฟล์เดี่ยวใน parse_file) ไม่ข้ามเงียบ ๆ
+        try:
+            df = apply_schema(kind, df)
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}") from e
+        combiner.add(kind, df, name)
+    found = {k: None for k in KW}
+    found.update(combiner.result())
+    return found
+
+
+def parse_file(fname: str, fobj) -> dict:
+    """parse ไฟล์หนึ่งไฟล์ (ZIP / Excel / TXT) → {kind: (data, ชื่อไฟล์ต้นทาง)} เฉพาะ kind ที่พบ"""
+    lname = fname.lower()
+    if lname.endswith(".zip"):
+        return {k: v for k, v in find_in_zip(fobj).items() if v}
+    ext = file_ext(lname)
+    kind = detect_kind(lname)
+    if not ext or not kind:
+        raise ValueError("Unsupported file type or cannot infer kind")
+    return {kind: (apply_schema(kind, load_table(kind, ext, fobj)), fname)}
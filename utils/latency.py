@@ -0,0 +1,102 @@
+# utils/latency.py
+"""
+histogram ของ latency ต่อ operation (เช่น "storage.upload", "uploads.select")
+
+ใช้ bucket คงที่ (ms) จึงใช้หน่วยความจำคงที่ไม่ว่าจะเรียกกี่ครั้ง
+percentile ประมาณจากขอบบนของ bucket
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # ช่องสุดท้าย = เกิน bucket สูงสุด
+        self.total = 0
+        self.errors = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float, ok: bool = True) -> None:
+        i = 0
+        while i < len(self.buckets) and ms > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return float(self.buckets[i]) if i < len(self.buckets) else self.max_ms
+        return self.max_ms
+
+
+class LatencyRecorder:
+    """เก็บ LatencyHistogram แยกตามชื่อ operation (thread-safe)"""
+
+    def __init__(self):
+        self._hists: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, op: str, ms: float, ok: bool = True) -> None:
+        with self._lock:
+            self._hists.setdefault(op, LatencyHistogram()).observe(ms, ok)
+
+    @contextmanager
+    def track(self, op: str):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(op, (time.perf_counter() - t0) * 1000, ok)
+
+    def timed(self, op: str):
+        """decorator: จับเวลาทุกครั้งที่เรียกฟังก์ชัน"""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.track(op):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def snapshot(self) -> List[dict]:
+        """สรุปต่อ operation: calls / errors / avg / p50 / p95 / max (ms)"""
+        with self._lock:
+            rows = []
+            for op, h in sorted(self._hists.items()):
+                rows.append({
+                    "operation": op,
+                    "calls": h.total,
+                    "errors": h.errors,
+                    "avg_ms": round(h.sum_ms / h.total, 1) if h.total else 0.0,
+                    "p50_ms": h.percentile(0.50),
+                    "p95_ms": h.percentile(0.95),
+                    "max_ms": round(h.max_ms, 1),
+                })
+            return rows
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hists.clear()
+
+
+# recorder กลางของ process
+latency = LatencyRecorder()
@@ -0,0 +1,63 @@
+# utils/lazy.py
+"""
+tab / expander ที่บอกได้ว่าเปิดอยู่หรือไม่ → สร้างกราฟ / ตารางเฉพาะส่วนที่มองเห็น
+
+    preview, full = lazy.tabs(["🔎 Preview", "📊 Full chart"], key="cpu_snp_tabs")
+    with full:
+        if full.open:
+            st.altair_chart(build_full_chart())
+
+- Streamlit ที่รองรับ on_change="rerun" (tabs / expander ติดตาม state ฝั่ง server) → ใช้ .open ของ container จริง
+  เปลี่ยน tab / เปิด expander = rerun แล้ว build เฉพาะส่วนที่เปิด
+- Streamlit รุ่นเก่า: tabs → radio แนวนอนเลือกได้ทีละ tab (build แค่ tab ที่เลือกเหมือนกัน),
+  expander → open = True เสมอ (ทำงานเหมือนเดิมทุกอย่าง)
+- key ต้องไม่ซ้ำในหน้า (state ของ tab / expander ผูกกับ key)
+"""
+import inspect
+from typing import List, Sequence
+
+import streamlit as st
+
+# tabs / expander ที่มี on_change → รายงาน .open ได้
+_TRACKS_OPEN = "on_change" in inspect.signature(st.tabs).parameters
+
+
+class _Pane:
+    """container + open (สำหรับ fallback ที่ container จริงไม่มี .open)"""
+
+    def __init__(self, container, open: bool):
+        self._container = container
+        self.open = open
+
+    def __enter__(self):
+        self._container.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._container.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._container, name)
+
+
+def tabs(labels: Sequence[str], *, key: str) -> List:
+    """เหมือน st.tabs แต่ทุก tab มี .open (True เฉพาะ tab ที่แสดงอยู่)"""
+    if _TRACKS_OPEN:
+        panes = st.tabs(list(labels), key=key, on_change="rerun")
+        if all(p.open is None for p in panes):
+            # ยังไม่มี state (รอบแรก) → tab แรกคือ tab ที่แสดง
+            for i, p in enumerate(panes):
+                p.open = i == 0
+        return panes
+    choice = st.radio(" ", list(labels), horizontal=True, key=key, label_visibility="collapsed")
+    return [_Pane(st.container(), label == choice) for label in labels]
+
+
+def expander(label: str, *, key: str, expanded: bool = False, parent=st):
+    """เหมือน st.expander แต่มี .open (ปิดอยู่ → False ไม่ต้อง build เนื้อหา) / parent=st.sidebar ได้"""
+    if _TRACKS_OPEN:
+        exp = parent.expander(label, expanded=expanded, key=key, on_change="rerun")
+        if exp.open is None:
+            exp.open = expanded
+        return exp
+    return _Pane(parent.expander(label, expanded=expanded), True)
@@ -0,0 +1,120 @@
+# utils/paged_table.py
+"""
+ตารางแบบแบ่งหน้า: ค้นหา / เรียง / ตัดหน้าในฝั่ง Python แล้วส่งไป browser เฉพาะหน้าที่มองเห็น
+
+    view = df_filtered.copy()
+    paged_table(view, key="cpu_main", style=analyzer._table_style(view))
+
+- style = TableStyle (utils/styling.py) ของทั้งตาราง → สร้าง Styler แค่แถวในหน้านั้น
+  (ตาราง 200k แถวใช้เวลา render เท่าตาราง 200 แถว ไม่ต้องพึ่ง styler.render.max_elements)
+- ตารางที่ไม่เกิน page_size แถว → แสดงทั้งตารางเหมือนเดิม ไม่มี control เพิ่ม
+- ค้นหา = substring (ไม่สนตัวพิมพ์) ในคอลัมน์ข้อความ เทียบครั้งเดียวต่อค่า unique ของแต่ละคอลัมน์
+- state ของ control อยู่ใน session_state ใต้ key (f"{key}_q", f"{key}_sort", ...)
+"""
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pandas.api.types import is_numeric_dtype
+
+from utils.styling import TableStyle
+
+PAGE_SIZES = (50, 100, 200, 500, 1000)
+ORIGINAL_ORDER = "(original order)"
+
+
+def search_mask(df: pd.DataFrame, text: str) -> np.ndarray:
+    """แถวที่มีคอลัมน์ข้อความใดคอลัมน์หนึ่งมี text อยู่ (ไม่สนตัวพิมพ์)"""
+    hit = np.zeros(len(df), dtype=bool)
+    text = text.strip()
+    if not text:
+        return ~hit
+    for c in df.columns:
+        s = df[c]
+        if is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype):
+            continue
+        codes, uniques = pd.factorize(s)
+        if not len(uniques):
+            continue
+        found = pd.Index(uniques).astype(str).str.contains(text, case=False, regex=False)
+        found = np.append(np.asarray(found, dtype=bool), False)   # code -1 (NaN) → False
+        hit |= found[codes]
+    return hit
+
+
+def sort_positions(df: pd.DataFrame, positions: np.ndarray, col: str, descending: bool) -> np.ndarray:
+    """positions เรียงตามค่าในคอลัมน์ col (stable, NaN ท้ายสุด)"""
+    s = df[col].iloc[positions].reset_index(drop=True)
+    try:
+        order = s.sort_values(ascending=not descending, kind="stable", na_position="last").index
+    except TypeError:
+        # ค่าหลายชนิดปนกันในคอลัมน์ object → เรียงเป็นข้อความ
+        order = s.astype(str).where(s.notna()).sort_values(
+            ascending=not descending, kind="stable", na_position="last"
+        ).index
+    return positions[order.to_numpy()]
+
+
+def paged_table(
+    df: pd.DataFrame,
+    *,
+    key: str,
+    style: Optional[TableStyle] = None,
+    page_size: int = 200,
+    height: Optional[int] = None,
+) -> pd.DataFrame:
+    """แสดง df แบบแบ่งหน้า (คืน DataFrame ของหน้าที่แสดง)"""
+    style = style or TableStyle()
+    sizing = {"use_container_width": True}
+    if height is not None:
+        sizing["height"] = height
+    n = len(df)
+    if n <= page_size:
+        st.dataframe(style.render(df), **sizing)
+        return df
+
+    c_q, c_sort, c_desc, c_size, c_page = st.columns([2, 1.5, 0.7, 0.8, 0.8])
+    with c_q:
+        text = st.text_input("🔎 Search", key=f"{key}_q", placeholder="contains…")
+    with c_sort:
+        sort_col = st.selectbox("Sort by", [ORIGINAL_ORDER, *map(str, df.columns)], key=f"{key}_sort")
+    with c_desc:
+        descending = st.checkbox("Desc", key=f"{key}_desc")
+    with c_size:
+        size = st.selectbox(
+            "Rows/page", PAGE_SIZES,
+            index=PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 0,
+            key=f"{key}_size",
+        )
+
+    positions = np.arange(n)
+    if text.strip():
+        positions = positions[search_mask(df, text)]
+    if sort_col != ORIGINAL_ORDER and sort_col in df.columns:
+        positions = sort_positions(df, positions, sort_col, descending)
+    elif descending:
+        positions = positions[::-1]
+
+    pages = max(1, math.ceil(len(positions) / size))
+    page_key = f"{key}_page"
+    # filter / page size เปลี่ยนแล้วหน้าเดิมเกินจำนวนหน้า → กลับไปหน้าสุดท้าย
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    with c_page:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+
+    start = (int(page) - 1) * size
+    shown = positions[start:start + size]
+    df_page = df.iloc[shown]
+    st.dataframe(style.take(shown, n).render(df_page), **sizing)
+
+    if len(positions):
+        note = f"rows {start + 1:,}–{start + len(shown):,} of {len(positions):,}"
+    else:
+        note = "no matching rows"
+    if len(positions) != n:
+        note += f" (search matched from {n:,})"
+    st.caption(note)
+    return df_page
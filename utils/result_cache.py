@@ -0,0 +1,97 @@
+# utils/result_cache.py
+"""
+cache ผลการ parse / วิเคราะห์ ตาม content hash (checksum ของไฟล์ที่อัปโหลด)
+
+ไฟล์เดียวกันที่ถูกอัปโหลดหลายวัน (checksum เดียวกัน) จะ parse และ prepare analyzer แค่ครั้งแรก
+ครั้งต่อไปคืนสำเนาของผลเดิม — อยู่ระดับ process จึงใช้ร่วมกันข้าม rerun / session ได้
+
+ค่าที่เก็บเป็นข้อมูลล้วน (DataFrame / dict / tuple / ค่า immutable) ไม่ใช่ object ทั้งตัว
+สำเนาทำครั้งเดียวต่อการเรียก: miss → เก็บสำเนา คืนตัวจริง / hit → คืนสำเนา
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def copy_result(value: Any) -> Any:
+    """สำเนาของผลใน cache: DataFrame / Series / ndarray → .copy(), dict / list / tuple → ทีละชั้น
+    ค่าอื่น (str, ตัวเลข, object ที่ไม่ถูกแก้หลังสร้าง เช่น FlappingSweep) ใช้ร่วมกันได้"""
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: copy_result(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(copy_result(v) for v in value)
+    return value
+
+
+class ResultCache:
+    """LRU cache แบบ thread-safe; key=None หมายถึงไม่ cache (เช่น ไฟล์เก่าที่ไม่มี checksum)"""
+
+    def __init__(self, max_entries: int = 32, copy: Callable[[Any], Any] = copy_result):
+        self.max_entries = max_entries
+        self._copy = copy
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_build(
+        self,
+        key: Optional[Hashable],
+        build: Callable[[], Any],
+        store_key: Optional[Callable[[], Optional[Hashable]]] = None,
+    ) -> Any:
+        """คืนสำเนาของผลใน cache หรือ build ใหม่ (เก็บสำเนาไว้ คืนตัวที่ build)
+
+        store_key: key ที่ใช้เก็บหลัง build — เมื่อ build เปลี่ยน state ที่อยู่ใน key เอง
+        (เช่น prepare() ของ fiberflapping เพิ่ม alarm เข้า index) default = key เดิม
+        """
+        if key is None:
+            return build()
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return self._copy(cached)
+        self.misses += 1
+        value = build()
+        new_key = key if store_key is None else store_key()
+        if new_key is not None:
+            self.put(new_key, self._copy(value))
+        return value
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """ลบทุก entry ที่ predicate(key) เป็นจริง (เช่น ไฟล์ถูกลบ) → จำนวนที่ลบ"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# parse ของไฟล์ที่อัปโหลด: key = (checksum, ชื่อไฟล์, cutoff ของ OSC)
+parse_cache = ResultCache(max_entries=32)
+# ผล prepare() ของ analyzer ({attribute: ผล}, สถานะ sidebar):
+# key = (analyzer key, checksum ของข้อมูลต้นทาง, version ของ reference, state อื่นที่ผลขึ้นกับ)
+analysis_cache = ResultCache(max_entries=64)
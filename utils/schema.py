@@ -0,0 +1,190 @@
+# utils/schema.py
+"""
+Typed schema registry สำหรับไฟล์ input แต่ละประเภท (cpu, fan, msu, line, client, osc, fm, atten)
+และ reference workbook ใน data/ (cpu_ref, fan_ref, msu_ref, line_ref, client_ref)
+
+ใช้ครั้งเดียวตอน ingest (หลังอ่าน Excel ออกมาเป็น DataFrame) เพื่อ:
+  - normalize ชื่อคอลัมน์ (strip / ยุบช่องว่าง / \\u00a0)
+  - ตรวจคอลัมน์ที่จำเป็น (ขาด → ValueError)
+  - cast dtype ให้เรียบร้อย: ค่าวัด / threshold → float, ME/Measure Object/Site Name → category, เวลา → datetime64
+
+หลังจากนี้ analyzer / Dashboard ไม่ต้อง cast ซ้ำทุกครั้งที่ rerun
+(ตารางที่ merge ข้อมูลกับ reference แล้ว ค่าวัดและ threshold เป็น float64 ทั้งคู่)
+"""
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import pandas as pd
+
+# key ใน df.attrs ที่บอกว่า DataFrame ผ่าน schema แล้ว
+SCHEMA_ATTR = "schema_kind"
+
+
+@dataclass(frozen=True)
+class KindSchema:
+    kind: str
+    required: Tuple[str, ...]
+    numeric: Tuple[str, ...] = ()
+    categorical: Tuple[str, ...] = ()
+    datetime: Tuple[str, ...] = ()
+    # float64 เป็นค่า default: ค่าวัดส่วนใหญ่ถูกเทียบกับ threshold (float64)
+    # ถ้าเก็บเป็น float32 ค่าที่อยู่ตรงขอบ threshold อาจถูกตัดสินต่างจากเดิม
+    float_dtype: str = "float64"
+
+
+_ID_COLS = ("ME", "Measure Object")
+_TIME_COLS = ("Begin Time", "End Time")
+_REF_TH = ("Maximum threshold", "Minimum threshold")
+_REF_TH_IO = ("Maximum threshold(out)", "Minimum threshold(out)", "Maximum threshold(in)", "Minimum threshold(in)")
+
+SCHEMAS: Dict[str, KindSchema] = {
+    "cpu": KindSchema(
+        kind="cpu",
+        required=("ME", "Measure Object", "CPU utilization ratio"),
+        numeric=(
+            "CPU utilization ratio", "Max CPU utilization ratio", "Min CPU utilization ratio",
+            "RAM utilization ratio", "Max RAM utilization ratio", "Min RAM utilization ratio",
+        ),
+        categorical=_ID_COLS,
+        datetime=_TIME_COLS,
+    ),
+    "fan": KindSchema(
+        kind="fan",
+        required=("ME", "Measure Object", "Begin Time", "End Time", "Value of Fan Rotate Speed(Rps)"),
+        numeric=(
+            "Value of Fan Rotate Speed(Rps)",
+            "Max Value of Fan Rotate Speed(Rps)", "Min Value of Fan Rotate Speed(Rps)",
+        ),
+        categorical=_ID_COLS,
+        datetime=_TIME_COLS,
+    ),
+    "msu": KindSchema(
+        kind="msu",
+        required=("ME", "Measure Object", "Laser Bias Current(mA)"),
+        numeric=(
+            "Laser Bias Current(mA)",
+            "Max Value of Laser Bias Current(mA)", "Min Value of Laser Bias Current(mA)",
+        ),
+        categorical=_ID_COLS,
+        datetime=_TIME_COLS,
+    ),
+    "line": KindSchema(
+        kind="line",
+        required=(
+            "ME", "Measure Object", "Instant BER After FEC",
+            "Input Optical Power(dBm)", "Output Optical Power (dBm)",
+        ),
+        numeric=(
+            "Instant BER After FEC", "Max Instant BER After FEC", "Min Instant BER After FEC",
+            "Instant BER Before FEC", "Max Instant BER Before FEC", "Min Instant BER Before FEC",
+            "Input Optical Power(dBm)", "Output Optical Power (dBm)",
+            "Max Value of Input Optical Power(dBm)", "Min Value of Input Optical Power(dBm)",
+            "Max Value of Output Optical Power(dBm)", "Min Value of Output Optical Power(dBm)",
+        ),
+        categorical=_ID_COLS,
+        datetime=_TIME_COLS,
+    ),
+    "client": KindSchema(
+        kind="client",
+        required=("ME", "Measure Object", "Input Optical Power(dBm)", "Output Optical Power (dBm)"),
+        numeric=(
+            "Input Optical Power(dBm)", "Output Optical Power (dBm)",
+            "Max Value of Input Optical Power(dBm)", "Min Value of Input Optical Power(dBm)",
+            "Max Value of Output Optical Power(dBm)", "Min Value of Output Optical Power(dBm)",
+        ),
+        categorical=_ID_COLS,
+        datetime=_TIME_COLS,
+    ),
+    "osc": KindSchema(
+        kind="osc",
+        required=(
+            "ME", "Measure Object", "Begin Time", "End Time",
+            "Max Value of Input Optical Power(dBm)", "Min Value of Input Optical Power(dBm)",
+        ),
+        numeric=(
+            "Max Value of Input Optical Power(dBm)", "Min Value of Input Optical Power(dBm)",
+            "Input Optical Power(dBm)",
+        ),
+        categorical=_ID_COLS,
+        datetime=_TIME_COLS,
+    ),
+    "fm": KindSchema(
+        kind="fm",
+        required=("Occurrence Time", "Clear Time"),
+        datetime=("Occurrence Time", "Clear Time"),
+    ),
+    # atten: "Optical Attenuation (dB)" ต้องคงค่าดิบไว้ (EOL/Core ใช้ค่าที่แปลงเป็นเลขไม่ได้ = Fiber Break)
+    "atten": KindSchema(
+        kind="atten",
+        required=("Source Port", "Sink Port", "Optical Attenuation (dB)"),
+        numeric=("Benchmark (dB)", "Fiber Length (km)"),
+    ),
+    # ---- reference workbook (data/*.xlsx) ----
+    "cpu_ref": KindSchema(kind="cpu_ref", required=("Mapping", *_REF_TH), numeric=_REF_TH, categorical=("Site Name",)),
+    "fan_ref": KindSchema(kind="fan_ref", required=("Mapping", *_REF_TH), numeric=_REF_TH, categorical=("Site Name",)),
+    "msu_ref": KindSchema(
+        kind="msu_ref", required=("Mapping", "Maximum threshold"),
+        numeric=("Maximum threshold",), categorical=("Site Name",),
+    ),
+    "line_ref": KindSchema(
+        kind="line_ref", required=("Mapping", "Threshold", *_REF_TH_IO),
+        numeric=("Threshold", *_REF_TH_IO), categorical=("Site Name",),
+    ),
+    "client_ref": KindSchema(
+        kind="client_ref", required=("Mapping", *_REF_TH_IO), numeric=_REF_TH_IO, categorical=("Site Name",),
+    ),
+}
+
+
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """normalize ชื่อคอลัมน์ (in-place) แล้วคืน df เดิม"""
+    df.columns = (
+        df.columns.astype(str)
+        .str.replace("\u00a0", " ")
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    return df
+
+
+def missing_columns(df: pd.DataFrame, required) -> list:
+    return [c for c in required if c not in df.columns]
+
+
+def is_typed(df: pd.DataFrame, kind: str | None = None) -> bool:
+    """True ถ้า df ผ่าน apply_schema มาแล้ว (และตรง kind ถ้าระบุ)"""
+    got = getattr(df, "attrs", {}).get(SCHEMA_ATTR)
+    return got is not None and (kind is None or got == kind)
+
+
+def apply_schema(kind: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    normalize + validate + cast ตาม schema ของ kind
+    - kind ที่ไม่มีใน registry (wason/preset ฯลฯ) → คืนค่าเดิม
+    - ขาดคอลัมน์ที่จำเป็น → ValueError
+    """
+    schema = SCHEMAS.get(kind)
+    if schema is None or not isinstance(df, pd.DataFrame):
+        return df
+    if is_typed(df, kind):
+        return df
+
+    df = normalize_columns(df.copy())
+
+    missing = missing_columns(df, schema.required)
+    if missing:
+        raise ValueError(f"{kind.upper()} file missing required columns: {', '.join(missing)}")
+
+    for c in schema.numeric:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype(schema.float_dtype)
+    for c in schema.datetime:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+    for c in schema.categorical:
+        if c in df.columns:
+            s = df[c]
+            df[c] = s.where(s.isna(), s.astype(str).str.strip()).astype("category")
+
+    df.attrs[SCHEMA_ATTR] = kind
+    return df
@@ -0,0 +1,194 @@
+# utils/storage_cache.py
+"""
+read-through cache บนดิสก์สำหรับไฟล์ที่ดาวน์โหลดจาก Supabase Storage
+
+- key = stored path + checksum (object เปลี่ยนเนื้อหา → checksum เปลี่ยน → ไม่ใช้ของเก่า)
+- จำกัดขนาดรวม (LRU ตามเวลาใช้งานล่าสุด) ตั้งได้ด้วย env STORAGE_CACHE_MB (default 2048)
+- ตรวจ MD5 ทุกครั้งที่อ่านจาก cache ถ้าไม่ตรงจะลบทิ้งแล้วโหลดใหม่
+- prefetch() ดึงหลายไฟล์พร้อมกันล่วงหน้า
+
+fetch(dest) คือฟังก์ชันที่เขียนเนื้อหาไฟล์ลง file object dest แล้วคืน True ถ้าสำเร็จ
+"""
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Tuple
+
+from utils.diag_log import get_logger
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "storage")
+DEFAULT_CACHE_MB = 2048
+_READ_BLOCK = 1024 * 1024
+
+log = get_logger("storage_cache")
+
+Fetch = Callable[[object], bool]
+
+
+def _md5_file(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class _HashingWriter:
+    """file wrapper ที่คำนวณ MD5 ระหว่างเขียน"""
+
+    def __init__(self, f):
+        self._f = f
+        self.md5 = hashlib.md5()
+
+    def write(self, data) -> int:
+        self.md5.update(data)
+        return self._f.write(data)
+
+    def seek(self, *args):
+        # fetch อาจ seek(0)+truncate เพื่อเริ่มใหม่ → เริ่ม hash ใหม่ด้วย
+        self.md5 = hashlib.md5()
+        return self._f.seek(*args)
+
+    def truncate(self, *args):
+        return self._f.truncate(*args)
+
+
+class StorageCache:
+    def __init__(self, root: str | None = None, max_bytes: int | None = None):
+        self.root = root or os.getenv("STORAGE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            try:
+                max_bytes = int(float(os.getenv("STORAGE_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024)
+            except ValueError:
+                max_bytes = DEFAULT_CACHE_MB * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # กันไม่ให้ดาวน์โหลด key เดียวกันซ้ำพร้อมกัน (prefetch + อ่านจริง)
+        self._key_locks: dict = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    # -------------------- paths --------------------
+    def _entry_path(self, stored_path: str, checksum: str | None) -> str:
+        digest = hashlib.sha1(stored_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}_{checksum or 'nochecksum'}")
+
+    def _key_lock(self, entry: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(entry, threading.Lock())
+
+    # -------------------- read --------------------
+    def get(self, stored_path: str, checksum: str | None):
+        """เปิดไฟล์จาก cache (ตรวจ checksum แล้ว) หรือ None ถ้าไม่มี/เสีย"""
+        entry = self._entry_path(stored_path, checksum)
+        if not os.path.exists(entry):
+            return None
+        if checksum and _md5_file(entry) != checksum:
+            log.warning("checksum_mismatch", path=stored_path)
+            self._remove(entry)
+            return None
+        try:
+            os.utime(entry)  # อัปเดตเวลาใช้งานล่าสุด (LRU)
+            return open(entry, "rb")
+        except OSError:
+            return None
+
+    def open(self, stored_path: str, checksum: str | None, fetch: Fetch):
+        """read-through: คืนไฟล์จาก cache หรือดาวน์โหลดผ่าน fetch แล้วเก็บลง cache"""
+        cached = self.get(stored_path, checksum)
+        if cached is not None:
+            return cached
+        if not self.fill(stored_path, checksum, fetch):
+            return None
+        return self.get(stored_path, checksum)
+
+    # -------------------- write --------------------
+    def fill(self, stored_path: str, checksum: str | None, fetch: Fetch) -> bool:
+        """ดาวน์โหลดลง cache (ถ้ายังไม่มี) — True ถ้าไฟล์พร้อมใช้ใน cache"""
+        entry = self._entry_path(stored_path, checksum)
+        with self._key_lock(entry):
+            if os.path.exists(entry):
+                return True
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            tmp = f"{entry}.{uuid.uuid4().hex}.part"
+            try:
+                with open(tmp, "w+b") as f:
+                    writer = _HashingWriter(f)
+                    if not fetch(writer):
+                        return False
+                if checksum and writer.md5.hexdigest() != checksum:
+                    log.warning("download_checksum_mismatch", path=stored_path)
+                    return False
+                os.replace(tmp, entry)
+            finally:
+                if os.path.exists(tmp):
+                    self._remove(tmp)
+        self._evict()
+        return True
+
+    def prefetch(self, items: Iterable[Tuple[str, Optional[str], Fetch]], max_workers: int = 4) -> int:
+        """ดึงหลายไฟล์ลง cache พร้อมกัน: items = [(stored_path, checksum, fetch), ...]
+        คืนจำนวนไฟล์ที่พร้อมใช้ใน cache"""
+        items = list(items)
+        if not items:
+            return 0
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+            results = list(pool.map(lambda it: self._safe_fill(*it), items))
+        return sum(results)
+
+    def _safe_fill(self, stored_path, checksum, fetch) -> bool:
+        try:
+            return self.fill(stored_path, checksum, fetch)
+        except Exception as e:
+            log.warning("prefetch_failed", path=stored_path, error=e)
+            return False
+
+    # -------------------- eviction --------------------
+    def _entries(self):
+        for dirpath, _, names in os.walk(self.root):
+            for n in names:
+                if n.endswith(".part"):
+                    continue
+                p = os.path.join(dirpath, n)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                yield p, st.st_size, st.st_mtime
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])  # เก่าสุดก่อน
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def discard(self, stored_path: str, checksum: str | None) -> None:
+        """ลบ entry ของ object ที่ถูกลบจาก Storage แล้ว"""
+        self._remove(self._entry_path(stored_path, checksum))
+
+    def clear(self) -> None:
+        for path, _, _ in list(self._entries()):
+            self._remove(path)
+
+
+_default_cache: StorageCache | None = None
+
+
+def get_storage_cache() -> StorageCache:
+    """cache กลางของ process (สร้างครั้งแรกที่เรียก)"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = StorageCache()
+    return _default_cache
@@ -0,0 +1,114 @@
+# utils/styling.py
+"""
+สร้าง CSS ของ Styler ทั้งตารางจาก boolean mask ที่คำนวณไว้ก่อน (แทน .apply(axis=1) ทีละแถว)
+
+    layers = [
+        MaskLayer(GRAY_ROW, row_issue),                       # ทั้งแถว
+        MaskLayer(RED_CELL, out_of_range(v, lo, hi), [COL]),  # เฉพาะคอลัมน์
+    ]
+    styled = style_masks(df, layers).format(...)
+
+- mask = array/Series bool ยาวเท่าจำนวนแถว (NaN = False)
+- cols = None → ทุกคอลัมน์ของแถวนั้น, list → เฉพาะคอลัมน์ที่มีอยู่จริง (ไม่มี → ข้าม)
+- หลาย layer ทับเซลล์เดียวกัน → CSS ต่อกันตามลำดับ (เหมือน .apply หลายครั้งต่อกัน ตัวหลังชนะ)
+
+แต่ละเซลล์ได้ bit ของ layer ที่โดน แล้วแปลง bit pattern (มีไม่กี่แบบ) เป็นข้อความ CSS ครั้งเดียว
+
+TableStyle = layers + format ของทั้งตาราง (mask คำนวณครั้งเดียว) → take(positions) ตัดเฉพาะแถวที่จะแสดง
+ให้ utils/paged_table.py สร้าง Styler แค่หน้าที่มองเห็น
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.io.formats.style import Styler
+
+# สีที่ใช้ร่วมกันในหลายหน้า
+GRAY_ROW = "background-color:#e6e6e6; color:black"
+RED_CELL = "background-color:#ff4d4d; color:white"
+PINK_CELL = "background-color:#ff9999; color:black"
+BLUE_CELL = "background-color:lightblue; color:black"
+
+
+@dataclass
+class MaskLayer:
+    css: str
+    mask: object
+    cols: Optional[Sequence[str]] = None
+
+
+def numeric(df: pd.DataFrame, col: str) -> np.ndarray:
+    """คอลัมน์เป็น float (แปลงไม่ได้ / ไม่มีคอลัมน์ → NaN)"""
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def out_of_range(v, lo, hi) -> np.ndarray:
+    """ค่าอยู่นอก [lo, hi] โดยทั้งสามค่าต้องไม่เป็น NaN"""
+    v, lo, hi = (np.asarray(x, dtype=float) for x in (v, lo, hi))
+    return ~np.isnan(v) & ~np.isnan(lo) & ~np.isnan(hi) & ((v < lo) | (v > hi))
+
+
+def startswith(df: pd.DataFrame, col: str, prefix: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return df[col].astype(str).str.startswith(prefix).fillna(False).to_numpy(dtype=bool)
+
+
+def _as_bool(mask, n: int) -> np.ndarray:
+    if isinstance(mask, pd.Series):
+        mask = mask.fillna(False).to_numpy(dtype=bool)
+    mask = np.asarray(mask, dtype=bool)
+    if mask.shape != (n,):
+        raise ValueError(f"mask length {mask.shape} does not match {n} rows")
+    return mask
+
+
+def css_matrix(df: pd.DataFrame, layers: Sequence[MaskLayer]) -> pd.DataFrame:
+    """DataFrame ของข้อความ CSS (shape/label เดียวกับ df) จาก layers"""
+    n, m = df.shape
+    if len(layers) > 62:
+        raise ValueError("too many style layers")
+    bits = np.zeros((n, m), dtype=np.int64)
+    for k, layer in enumerate(layers):
+        rows = _as_bool(layer.mask, n)
+        cols = np.ones(m, dtype=bool) if layer.cols is None else df.columns.isin(list(layer.cols))
+        if not cols.any() or not rows.any():
+            continue
+        bits |= np.outer(rows, cols).astype(np.int64) << k
+
+    codes, inverse = np.unique(bits, return_inverse=True)
+    table = np.array(
+        ["; ".join(layer.css for k, layer in enumerate(layers) if int(code) >> k & 1) for code in codes],
+        dtype=object,
+    )
+    return pd.DataFrame(table[inverse].reshape(n, m), index=df.index, columns=df.columns)
+
+
+def style_masks(df: pd.DataFrame, layers: Sequence[MaskLayer], styler: Optional[Styler] = None) -> Styler:
+    """df.style (หรือ styler ที่ให้มา) + CSS จาก layers ในการ apply ครั้งเดียว"""
+    css = css_matrix(df, layers)
+    styler = df.style if styler is None else styler
+    return styler.apply(lambda _: css, axis=None)
+
+
+@dataclass
+class TableStyle:
+    """ไฮไลต์ + format ของตาราง (mask ยาวเท่าจำนวนแถวของ df ทั้งตาราง)"""
+    layers: list = field(default_factory=list)
+    formats: Dict[str, str] = field(default_factory=dict)
+    na_rep: Optional[str] = None
+
+    def take(self, positions: np.ndarray, n: int) -> "TableStyle":
+        """เฉพาะแถวที่ตำแหน่ง positions (n = จำนวนแถวของตารางเต็ม)"""
+        layers = [MaskLayer(layer.css, _as_bool(layer.mask, n)[positions], layer.cols) for layer in self.layers]
+        return TableStyle(layers, self.formats, self.na_rep)
+
+    def render(self, df: pd.DataFrame) -> Styler:
+        styled = style_masks(df, self.layers)
+        formats = {c: f for c, f in self.formats.items() if c in df.columns}
+        if formats or self.na_rep is not None:
+            styled = styled.format(formats, na_rep=self.na_rep)
+        return styled
@@ -0,0 +1,71 @@
+# utils/zip_extract.py
+"""
+แตก ZIP (รวม ZIP ซ้อน ZIP) แบบ streaming โดยจำกัดหน่วยความจำ
+
+เดิม find_in_zip ใช้ zipfile.ZipFile(io.BytesIO(zf.read(name))) กับ ZIP ชั้นใน
+ทำให้ไฟล์ใหญ่ถูกถือไว้ใน RAM ซ้ำหลายชั้น ที่นี่ member แต่ละตัวถูก copy ทีละ chunk
+ลง SpooledTemporaryFile: ถ้าเล็กกว่า budget อยู่ใน RAM, ถ้าใหญ่กว่าจะ spill ลงดิสก์เอง
+
+ตั้ง budget ได้ด้วย env ZIP_MEMORY_BUDGET_MB (default 64 MB ต่อ member)
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_BUDGET_MB = 64
+
+
+def memory_budget() -> int:
+    """budget (bytes) ต่อ member ที่ยอมให้อยู่ใน RAM"""
+    try:
+        mb = float(os.getenv("ZIP_MEMORY_BUDGET_MB", DEFAULT_BUDGET_MB))
+    except ValueError:
+        mb = DEFAULT_BUDGET_MB
+    return max(int(mb * 1024 * 1024), CHUNK_SIZE)
+
+
+@contextmanager
+def spooled_member(zf: zipfile.ZipFile, name: str, budget: int | None = None):
+    """เปิด member ของ ZIP เป็นไฟล์ที่ seek ได้ (RAM ถ้าเล็ก / temp file ถ้าเกิน budget)"""
+    budget = budget or memory_budget()
+    spool = tempfile.SpooledTemporaryFile(max_size=budget)
+    try:
+        with zf.open(name) as src:
+            shutil.copyfileobj(src, spool, CHUNK_SIZE)
+        spool.seek(0)
+        yield spool
+    finally:
+        spool.close()
+
+
+def iter_zip_members(
+    zip_src,
+    budget: int | None = None,
+    want: Callable[[str], bool] | None = None,
+) -> Iterator[Tuple[str, object]]:
+    """
+    เดินทุก member (ยกเว้น directory) แบบ recursive เข้า ZIP ชั้นใน
+    yield (name, fileobj) — fileobj seek ได้และใช้ได้เฉพาะภายในรอบของ loop นั้น
+    want(name) → False = ข้าม member นั้นโดยไม่อ่านข้อมูลเลย (ZIP ชั้นในถูกเปิดเสมอ)
+    ผู้เรียกหยุดก่อนได้ (break / return) ไฟล์ temp จะถูกปิดให้เอง
+    """
+    budget = budget or memory_budget()
+    with zipfile.ZipFile(zip_src) as zf:
+        for name in zf.namelist():
+            if name.endswith("/"):
+                continue
+            is_zip = name.lower().endswith(".zip")
+            if not is_zip and want is not None and not want(name):
+                continue
+            with spooled_member(zf, name, budget) as member:
+                if is_zip:
+                    try:
+                        yield from iter_zip_members(member, budget, want)
+                    except zipfile.BadZipFile:
+                        pass
+                    continue
+                yield name, member